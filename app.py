@@ -1,13 +1,18 @@
 import streamlit as st
 import pandas as pd
-from io import BytesIO
 import json
 import ast
 import os
+import copy
 
 # Importa il motore di calcolo e i dati di default
-from engine import generate_schedule
-from utils import load_config, save_config
+from engine import ModelCache, ScheduleData, ScheduleJob, SOLVER_PROFILES, DEFAULT_SOLVER_PROFILE, reload_schedule
+from utils import config_hash, load_config, save_config, validate_config
+from solution import solution_from_dict, solution_from_excel, remap_solution
+from result_cache import ResultCache, reproducible
+from history import HISTORY_FILE, RunHistory
+from validator import validate_timetable
+from substitutes import AvailabilityIndex
 from version import get_version, get_full_version
 
 # --- Funzioni di supporto per l'UI ---
@@ -38,15 +43,6 @@ def show_advanced_loading(message="Elaborazione in corso...", steps=None):
     else:
         return show_loading_spinner(message)
 
-def dataframe_to_excel_bytes(dfs):
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        for sheet_name, df in dfs.items():
-            df.to_excel(writer, sheet_name=sheet_name)
-    processed_data = output.getvalue()
-    return processed_data
-
-
 def style_days(row):
     day_colors = {"LUN": "#FFFFCC", "MAR": "#CCFFCC", "MER": "#CCE5FF", "GIO": "#FFDDCC", "VEN": "#E5CCFF"}
     
@@ -61,306 +57,150 @@ def style_days(row):
     return [''] * len(row)
 
 
-# --- VALIDAZIONE CONFIG ---
-def _is_half_hour_multiple(v):
-    try:
-        return abs((float(v) * 2) - round(float(v) * 2)) < 1e-6
-    except Exception:
-        return False
-
-
-def validate_config(cfg: dict):
-    """Valida la configurazione costruita via UI. Ritorna (ok, errors, warnings)."""
-    errors = []
-    warnings = []
-
-    # Chiavi essenziali
-    required_keys = [
-        'GIORNI', 'CLASSI', 'SLOT_1', 'SLOT_2', 'SLOT_3',
-        'ASSEGNAZIONE_SLOT', 'ORE_SETTIMANALI_CLASSI',
-        'MAX_ORE_SETTIMANALI_DOCENTI', 'ASSEGNAZIONE_DOCENTI'
-    ]
-    for k in required_keys:
-        if k not in cfg:
-            errors.append(f"Chiave di configurazione mancante: {k}")
-
-    if errors:
-        return False, errors, warnings
-
-    # GIORNI
-    giorni = cfg['GIORNI']
-    if not isinstance(giorni, (list, tuple)) or not giorni:
-        errors.append("'GIORNI' deve essere una lista non vuota.")
-    if len(set(giorni)) != len(giorni):
-        warnings.append("'GIORNI' contiene duplicati. Verranno considerati una sola volta.")
-
-    # SLOT
-    for slot_name in ['SLOT_1', 'SLOT_2', 'SLOT_3']:
-        slot = cfg.get(slot_name, [])
-        if not isinstance(slot, (list, tuple)) or len(slot) == 0:
-            errors.append(f"'{slot_name}' deve essere una lista non vuota di [fascia_oraria, durata].")
-            continue
-        for idx, item in enumerate(slot):
-            if not isinstance(item, (list, tuple)) or len(item) != 2:
-                errors.append(f"{slot_name}[{idx}] non è una coppia valida [fascia_oraria, durata].")
-                continue
-            fascia, durata = item
-            if not isinstance(fascia, str) or '-' not in fascia:
-                warnings.append(f"{slot_name}[{idx}] ha una fascia oraria non standard: '{fascia}'. Formato atteso 'H:MM-H:MM'.")
-            try:
-                d = float(durata)
-                if d <= 0:
-                    errors.append(f"{slot_name}[{idx}] ha una durata <= 0.")
-                elif not _is_half_hour_multiple(d):
-                    warnings.append(f"{slot_name}[{idx}] durata {d} non è multiplo di 0.5h: sarà arrotondata internamente.")
-            except Exception:
-                errors.append(f"{slot_name}[{idx}] durata non numerica: '{durata}'.")
-
-    # CLASSI
-    classi = cfg['CLASSI']
-    if not isinstance(classi, (list, tuple)) or not classi:
-        errors.append("'CLASSI' deve essere una lista non vuota.")
-
-    # ORE_SETTIMANALI_CLASSI
-    ore_cl = cfg['ORE_SETTIMANALI_CLASSI']
-    for cl in classi:
-        v = ore_cl.get(cl)
-        if v is None:
-            errors.append(f"Manca 'ORE_SETTIMANALI_CLASSI' per la classe {cl}.")
-            continue
-        try:
-            vv = int(v)
-            if vv <= 0:
-                errors.append(f"Ore settimanali per {cl} devono essere > 0.")
-        except Exception:
-            errors.append(f"Ore settimanali per {cl} non numeriche: '{v}'.")
-
-    # ASSEGNAZIONE_SLOT per ogni classe e giorno
-    valid_slots = {"SLOT_1", "SLOT_2", "SLOT_3"}
-    for cl in classi:
-        per_class = cfg['ASSEGNAZIONE_SLOT'].get(cl)
-        if per_class is None:
-            errors.append(f"Manca 'ASSEGNAZIONE_SLOT' per la classe {cl}.")
-            continue
-        for day in giorni:
-            slot_val = per_class.get(day)
-            if slot_val not in valid_slots:
-                errors.append(f"ASSEGNAZIONE_SLOT per {cl} nel giorno {day} non valido: {slot_val}.")
-
-    # MAX_ORE_SETTIMANALI_DOCENTI
-    try:
-        max_ore_doc = int(cfg['MAX_ORE_SETTIMANALI_DOCENTI'])
-        if max_ore_doc <= 0:
-            errors.append("'MAX_ORE_SETTIMANALI_DOCENTI' deve essere > 0.")
-    except Exception:
-        errors.append("'MAX_ORE_SETTIMANALI_DOCENTI' non è numerico.")
-
-    # ASSEGNAZIONE_DOCENTI
-    per_classe_assegnate = {cl: 0 for cl in classi}
-    for docente, assignments in cfg['ASSEGNAZIONE_DOCENTI'].items():
-        if not isinstance(assignments, dict):
-            errors.append(f"Assegnazioni del docente {docente} non valide.")
-            continue
-        total_doc_hours = 0
-        for k, v in assignments.items():
-            if k == 'copertura':
-                try:
-                    cov = int(v)
-                    if cov < 0:
-                        errors.append(f"Docente {docente}: ore di copertura negative.")
-                    total_doc_hours += max(0, cov)
-                except Exception:
-                    errors.append(f"Docente {docente}: ore di copertura non numeriche: '{v}'.")
-                continue
-            if k not in classi:
-                errors.append(f"Docente {docente}: classe '{k}' non esiste nella lista CLASSI.")
-                continue
-            try:
-                hv = int(v)
-                if hv <= 0:
-                    errors.append(f"Docente {docente} in {k}: ore devono essere > 0.")
-                else:
-                    per_classe_assegnate[k] += hv
-                    total_doc_hours += hv
-            except Exception:
-                errors.append(f"Docente {docente} in {k}: ore non numeriche: '{v}'.")
-        if 'MAX_ORE_SETTIMANALI_DOCENTI' in cfg and total_doc_hours > cfg['MAX_ORE_SETTIMANALI_DOCENTI']:
-            errors.append(f"Docente {docente}: ore totali assegnate {total_doc_hours} superano il massimo {cfg['MAX_ORE_SETTIMANALI_DOCENTI']}.")
-
-    # Copertura ore richieste per classe
-    for cl in classi:
-        req = ore_cl.get(cl, 0)
-        got = per_classe_assegnate.get(cl, 0)
-        if got < req:
-            errors.append(f"Classe {cl}: ore assegnate {got} < richieste {req}.")
-
-    # VALIDAZIONE ASSEGNAZIONE_DOCENTI_SPECIFICHE
-    if 'ASSEGNAZIONE_DOCENTI_SPECIFICHE' in cfg:
-        specifiche = cfg['ASSEGNAZIONE_DOCENTI_SPECIFICHE']
-        
-        # Supporta sia il formato dict che il formato lista (interno)
-        if isinstance(specifiche, dict):
-            # Formato JSON: {docente: [classe, giorno, orario, durata]} o {docente: [[classe, giorno, orario, durata], ...]}
-            for docente, assegnazioni in specifiche.items():
-                # Verifica che il docente esista in ASSEGNAZIONE_DOCENTI
-                if docente not in cfg['ASSEGNAZIONE_DOCENTI']:
-                    errors.append(f"Docente {docente} in ASSEGNAZIONE_DOCENTI_SPECIFICHE non trovato in ASSEGNAZIONE_DOCENTI.")
-                    continue
-                
-                # Gestisce sia formato singolo che multiplo
-                assignments_to_check = []
-                if isinstance(assegnazioni, list):
-                    if len(assegnazioni) == 4 and isinstance(assegnazioni[0], str):
-                        # Formato singolo: [classe, giorno, orario, durata]
-                        assignments_to_check = [assegnazioni]
-                    else:
-                        # Formato multiplo: [[classe, giorno, orario, durata], ...]
-                        assignments_to_check = assegnazioni
-                
-                for i, assegnazione in enumerate(assignments_to_check):
-                    # Verifica formato dell'assegnazione: [classe, giorno, orario, durata]
-                    if not isinstance(assegnazione, (list, tuple)) or len(assegnazione) != 4:
-                        errors.append(f"Assegnazione {i+1} per docente {docente} deve essere [classe, giorno, orario, durata].")
-                        continue
-                        
-                    classe, giorno, orario, durata = assegnazione
-                    
-                    # Verifica che la classe esista
-                    if classe not in classi:
-                        errors.append(f"Classe {classe} per {docente} in ASSEGNAZIONE_DOCENTI_SPECIFICHE non esiste.")
-                        continue
-                        
-                    # Verifica che il docente sia assegnato a quella classe
-                    if classe not in cfg['ASSEGNAZIONE_DOCENTI'][docente]:
-                        errors.append(f"Docente {docente} ha assegnazione specifica per {classe} ma non è assegnato a quella classe.")
-                        continue
-                    
-                    # Verifica formato giorno, orario, durata
-                    if giorno not in cfg['GIORNI']:
-                        errors.append(f"Giorno {giorno} per {docente}-{classe} non valido.")
-                    
-                    # Verifica che l'orario sia un orario di inizio valido dagli slot
-                    valid_times = set()
-                    for slot_name in ['SLOT_1', 'SLOT_2', 'SLOT_3']:
-                        if slot_name in cfg:
-                            for time_range, duration in cfg[slot_name]:
-                                start_time = time_range.split('-')[0]
-                                valid_times.add(start_time)
-                    
-                    if orario not in valid_times:
-                        errors.append(f"Orario {orario} per {docente}-{classe} non valido. Orari disponibili: {sorted(valid_times)}.")
-                    
-                    try:
-                        durata_num = float(durata)
-                        if durata_num <= 0 or durata_num > 6:
-                            errors.append(f"Durata {durata} per {docente}-{classe} deve essere tra 0 e 6 ore.")
-                    except (ValueError, TypeError):
-                        errors.append(f"Durata {durata} per {docente}-{classe} non è un numero valido.")
-                        continue
-                    
-                    # --- VALIDAZIONI AVANZATE DI COMPATIBILITÀ ---
-                    
-                    # 1. Verifica compatibilità con ASSEGNAZIONE_SLOT
-                    if 'ASSEGNAZIONE_SLOT' in cfg and classe in cfg['ASSEGNAZIONE_SLOT'] and giorno in cfg['ASSEGNAZIONE_SLOT'][classe]:
-                        slot_type = cfg['ASSEGNAZIONE_SLOT'][classe][giorno]
-                        if slot_type in cfg:
-                            class_slots = cfg[slot_type]
-                            # Verifica che l'orario sia disponibile per quella classe in quel giorno
-                            available_for_class = [time_range.split('-')[0] for time_range, _ in class_slots]
-                            if orario not in available_for_class:
-                                errors.append(f"Orario {orario} non disponibile per classe {classe} il {giorno} (usa {slot_type}).")
-                            
-                            # Verifica che ci sia spazio sufficiente per la durata richiesta
-                            try:
-                                start_idx = available_for_class.index(orario)
-                                total_duration_available = sum(dur for _, dur in class_slots[start_idx:])
-                                if durata_num > total_duration_available:
-                                    errors.append(f"Durata {durata}h per {docente}-{classe} alle {orario} di {giorno} eccede il tempo disponibile ({total_duration_available}h).")
-                            except (ValueError, IndexError):
-                                pass
-                    
-                    # 2. Verifica compatibilità con START_AT
-                    if 'START_AT' in cfg and docente in cfg['START_AT'] and giorno in cfg['START_AT'][docente]:
-                        min_start_hour = cfg['START_AT'][docente][giorno]
-                        try:
-                            orario_hour = float(orario.split(':')[0]) + float(orario.split(':')[1])/60
-                            if orario_hour < min_start_hour:
-                                errors.append(f"Orario {orario} per {docente} il {giorno} viola il vincolo START_AT (min {min_start_hour}).")
-                        except (ValueError, IndexError):
-                            pass
-                    
-                    # 3. Verifica compatibilità con END_AT
-                    if 'END_AT' in cfg and docente in cfg['END_AT'] and giorno in cfg['END_AT'][docente]:
-                        max_end_hour = cfg['END_AT'][docente][giorno]
-                        try:
-                            orario_hour = float(orario.split(':')[0]) + float(orario.split(':')[1])/60
-                            end_hour = orario_hour + durata_num
-                            if end_hour > max_end_hour:
-                                errors.append(f"Orario {orario}+{durata}h per {docente} il {giorno} viola il vincolo END_AT (max {max_end_hour}).")
-                        except (ValueError, IndexError, TypeError):
-                            pass
-                    
-                    # 4. Verifica compatibilità con ONLY_DAYS
-                    if 'ONLY_DAYS' in cfg and docente in cfg['ONLY_DAYS']:
-                        allowed_days = cfg['ONLY_DAYS'][docente]
-                        if isinstance(allowed_days, (list, set)) and giorno not in allowed_days:
-                            errors.append(f"Giorno {giorno} per {docente} viola il vincolo ONLY_DAYS ({list(allowed_days)}).")
-                    
-                    # 5. Verifica compatibilità con MAX_DAILY_HOURS_PER_CLASS
-                    if 'MAX_DAILY_HOURS_PER_CLASS' in cfg and 'USE_MAX_DAILY_HOURS_PER_CLASS' in cfg and cfg['USE_MAX_DAILY_HOURS_PER_CLASS']:
-                        max_daily = cfg['MAX_DAILY_HOURS_PER_CLASS']
-                        if durata_num > max_daily:
-                            warnings.append(f"Durata {durata}h per {docente}-{classe} eccede MAX_DAILY_HOURS_PER_CLASS ({max_daily}h).")
-                    
-                    # 6. Verifica compatibilità con HOURS_PER_DAY_PER_CLASS
-                    if 'HOURS_PER_DAY_PER_CLASS' in cfg and docente in cfg['HOURS_PER_DAY_PER_CLASS']:
-                        exact_hours = cfg['HOURS_PER_DAY_PER_CLASS'][docente]
-                        if durata_num != exact_hours:
-                            errors.append(f"Durata {durata}h per {docente}-{classe} viola HOURS_PER_DAY_PER_CLASS (richieste esattamente {exact_hours}h).")
-                    
-                    # 7. Verifica compatibilità con ORE_SETTIMANALI_CLASSI
-                    if 'ORE_SETTIMANALI_CLASSI' in cfg and classe in cfg['ORE_SETTIMANALI_CLASSI']:
-                        if docente in cfg['ORE_SETTIMANALI_CLASSI'][classe]:
-                            weekly_hours = cfg['ORE_SETTIMANALI_CLASSI'][classe][docente]
-                            # Calcola le ore totali specifiche per questa combinazione docente-classe
-                            total_specific_hours = 0
-                            for spec_classe, spec_giorno, spec_orario, spec_durata in assignments_to_check:
-                                if spec_classe == classe:
-                                    try:
-                                        total_specific_hours += float(spec_durata)
-                                    except (ValueError, TypeError):
-                                        pass
-                            
-                            if total_specific_hours > weekly_hours:
-                                errors.append(f"Ore specifiche totali {total_specific_hours}h per {docente}-{classe} eccedono ORE_SETTIMANALI_CLASSI ({weekly_hours}h).")
-                            elif total_specific_hours == weekly_hours:
-                                warnings.append(f"Ore specifiche {total_specific_hours}h per {docente}-{classe} saturano completamente ORE_SETTIMANALI_CLASSI.")
-        
-        elif isinstance(specifiche, list):
-            # Formato interno: [[docente, classe, giorno, orario, durata], ...]
-            for i, assegnazione in enumerate(specifiche):
-                if not isinstance(assegnazione, (list, tuple)) or len(assegnazione) != 5:
-                    errors.append(f"Assegnazione specifica {i+1} deve essere [docente, classe, giorno, orario, durata].")
-                    continue
-                    
-                docente, classe, giorno, orario, durata = assegnazione
-                
-                # Verifica che il docente esista
-                if docente not in cfg['ASSEGNAZIONE_DOCENTI']:
-                    errors.append(f"Docente {docente} in assegnazione specifica {i+1} non trovato in ASSEGNAZIONE_DOCENTI.")
-                    continue
-                    
-                # Verifica che la classe esista
-                if classe not in classi:
-                    errors.append(f"Classe {classe} in assegnazione specifica {i+1} non esiste.")
-                    continue
-                    
-                # Verifica che il docente sia assegnato a quella classe
-                if classe not in cfg['ASSEGNAZIONE_DOCENTI'][docente]:
-                    errors.append(f"Docente {docente} ha assegnazione specifica per {classe} ma non è assegnato a quella classe.")
-                    continue
-
-    return len(errors) == 0, errors, warnings
+@st.cache_resource
+def get_result_cache():
+    """Cache dei risultati condivisa tra rerun e sessioni, in memoria e su disco nella cartella di lavoro."""
+    return ResultCache(directory=os.path.join(os.getcwd(), "cache_orari"))
+
+
+@st.cache_resource
+def get_run_history():
+    """Storico SQLite delle generazioni nella cartella di lavoro, condiviso tra rerun e sessioni."""
+    return RunHistory(os.path.join(os.getcwd(), HISTORY_FILE))
+
+
+def load_hint_from_upload(uploaded, config):
+    """Legge una soluzione di partenza da un file caricato (JSON di soluzione o orario Excel)."""
+    if uploaded.name.lower().endswith('.xlsx'):
+        return solution_from_excel(uploaded, ScheduleData(config).GLOBAL_SCHEDULING_TIMES)
+    return solution_from_dict(json.load(uploaded))
+
+
+def get_availability_index(solution, config):
+    """
+    Indice delle disponibilità dell'orario e voci non collocabili nella configurazione,
+    ricostruiti solo se cambiano soluzione o configurazione.
+    """
+    key = (id(solution), config_hash(config))
+    cached = st.session_state.get('availability_index')
+    if cached is None or cached[0] != key:
+        problems = []
+        index = AvailabilityIndex.from_solution(config, solution, problems)
+        cached = st.session_state.availability_index = (key, index, problems)
+    return cached[1], cached[2]
+
+
+def get_model_cache():
+    """Ultimo modello costruito nella sessione: la generazione successiva lo ricostruisce in modo incrementale."""
+    return st.session_state.setdefault('model_cache', ModelCache())
+
+
+def substitutes_frame(substitutes):
+    """Tabella dei supplenti ordinati (find_substitutes)."""
+    return pd.DataFrame([{"Docente": s.teacher, "Stato": s.status_label, "Copertura (h/sett.)": s.copertura_hours, "Ore in giornata": s.daily_hours}
+                         for s in substitutes], columns=["Docente", "Stato", "Copertura (h/sett.)", "Ore in giornata"])
+
+
+def render_progress(update, history):
+    """Mostra l'ultima soluzione intermedia del solver (penalità, limite, buchi, tempo) e l'andamento della penalità."""
+    if update is None:
+        st.markdown("**🔄 Costruzione del modello e ricerca della prima soluzione...**")
+        return
+    st.markdown(f"**🔄 Ricerca in corso** — soluzione #{update['solution_index']}"
+                + (f" (fase {update['phase']})" if update['phase'] != 'unica' else ""))
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Penalità buchi", "-" if update['objective'] is None else f"{update['objective']:.0f}")
+    c2.metric("Limite inferiore", "-" if update['bound'] is None else f"{update['bound']:.0f}")
+    c3.metric("Ore di buco", f"{update['hole_hours']:g}")
+    c4.metric("Tempo", f"{update['elapsed']:.0f}s")
+    points = [{'Tempo (s)': u['elapsed'], 'Penalità buchi': u['objective']} for u in history if u['objective'] is not None]
+    if len(points) > 1:
+        st.line_chart(pd.DataFrame(points).set_index('Tempo (s)'))
+
+
+@st.fragment(run_every=1.0)
+def show_job_progress():
+    """Pannello aggiornato ogni secondo mentre la generazione in background è in corso."""
+    job = st.session_state.get('schedule_job')
+    if job is None:
+        return
+    if not job.running:
+        st.rerun()
+    show_advanced_loading(f"🔄 Generazione orario in corso... ({job.elapsed:.0f}s)")
+    render_progress(job.latest, list(job.history))
+    if job.stop_requested:
+        st.info("✋ Arresto richiesto: completamento di diagnostica ed export con la migliore soluzione trovata...")
+    elif st.button("⏹️ Ferma e usa la migliore soluzione trovata", use_container_width=True, key="stop_job"):
+        job.stop()
+
+
+def show_schedule_tables(df_classi, df_docenti):
+    """Anteprime dell'orario per classi e per docenti."""
+    st.subheader("🗓️ Anteprima Orario - Vista per Classi")
+    st.dataframe(df_classi.style.apply(style_days, axis=1), use_container_width=True)
+    st.subheader("👨‍🏫 Anteprima Orario - Vista per Docenti")
+    st.dataframe(df_docenti.style.apply(style_days, axis=1), use_container_width=True)
+
+
+def show_reloaded_result(result, key):
+    """Orario riaperto senza risolvere (file salvato o storico): tempi, download, anteprime, log e diagnostica."""
+    st.success(f"✅ Orario ricaricato in {result.stats['reload_time'] * 1000:.0f} ms.")
+    st.session_state.last_solution = result.solution
+    st.download_button(label="📥 Scarica l'Orario (Excel)", data=result.excel_bytes, file_name="orario_ricaricato.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", use_container_width=True, key=f"{key}_download")
+    show_schedule_tables(result.df_classi, result.df_docenti)
+    st.caption("📝 Log e diagnostica")
+    st.code(result.log + "\n\n" + result.diagnostics)
+
+
+def show_job_result(job):
+    """Mostra l'esito di una generazione conclusa: anteprime, download, log e diagnostica."""
+    if job.error is not None:
+        st.error(f"Errore durante la generazione: {job.error}")
+        return
+    result = job.result
+    df_classi, df_docenti, log_output, diagnostics_output = result.as_tuple()
+    if result.ok:
+        if job.stop_requested:
+            st.warning("✋ Ricerca interrotta: l'orario mostrato è la migliore soluzione trovata fino all'arresto.")
+        st.success("🎉 Orario generato con successo!")
+        if job.from_cache:
+            st.info("⚡ Configurazione e parametri identici a una generazione precedente: risultato ripreso dalla cache, senza risolvere.")
+            if not reproducible(result.stats):
+                st.caption("🎲 Risultato di una ricerca non riproducibile (seed casuale o limite di tempo): una nuova risoluzione potrebbe trovare un orario diverso. "
+                           "Deseleziona \"Riusa il risultato già calcolato\" per risolvere di nuovo.")
+        elif job.run_id is not None:
+            st.caption(f"🗂️ Esecuzione #{job.run_id} registrata nello storico.")
+        build = result.stats.get('model_build')
+        if build and build['mode'] == 'incremental':
+            st.caption(f"♻️ Modello ricostruito in modo incrementale in {build['time'] * 1000:.0f} ms invece di {build['full_time'] * 1000:.0f} ms "
+                       f"(famiglie di vincoli riemesse: {', '.join(build['families']) or 'nessuna'}).")
+        st.info(f"Il file 'orario_settimanale.xlsx' è stato salvato automaticamente nella cartella: `{os.getcwd()}`")
+        st.download_button(label="📥 Scarica una Copia dell'Orario (Excel)", data=result.excel_bytes, file_name="orario_generato.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", use_container_width=True)
+        st.session_state.last_solution = result.solution
+        if 'moved' in result.stats.get('repair', {}):
+            r = result.stats['repair']
+            st.info(f"🛠️ Riparazione ({r['level']}, {r['time']:.1f}s): spostate {r['moved']}/{r['previous']} assegnazioni dell'orario di partenza.")
+            if r['moves']:
+                st.dataframe(pd.DataFrame([{"Docente": t, "Tolte": ", ".join(" ".join(e) for e in change['removed']), "Aggiunte": ", ".join(" ".join(e) for e in change['added'])}
+                                           for t, change in r['moves'].items()]), use_container_width=True, hide_index=True)
+        elif 'hint' in result.stats:
+            h = result.stats['hint']
+            st.info(f"🔁 Warm start: riutilizzate {h['applied']}/{h['total']} assegnazioni della soluzione di partenza.")
+        st.download_button(label="💾 Scarica la Soluzione (riapribile senza risolvere e riutilizzabile come warm start)", data=json.dumps(result.record, ensure_ascii=False, separators=(',', ':')), file_name="orario_generato.soluzione.json", mime="application/json", use_container_width=True)
+        show_schedule_tables(df_classi, df_docenti)
+    elif job.stop_requested:
+        st.error("❌ Ricerca interrotta prima di trovare una soluzione valida.")
+    else:
+        st.error("❌ Impossibile trovare una soluzione con i vincoli e i dati forniti. Controlla il log e la diagnostica qui sotto per dettagli.")
+        conflict = result.stats.get('conflict')
+        if conflict and conflict['status'] == 'conflict':
+            st.warning("🧩 **Regole in conflitto tra loro** (rimuovine o allentane almeno una):\n" + "\n".join(f"- {rule}" for rule in conflict['rules']))
+        elif conflict and conflict['status'] == 'feasible':
+            st.info("⏱️ Le regole sono compatibili tra loro: serve più tempo di risoluzione (profilo 'Approfondito') o un warm start.")
+    with st.expander("📝 Mostra Log dell'elaborazione"):
+        st.code(log_output)
+    with st.expander("🔍 Mostra Diagnostica e Verifica Vincoli"):
+        st.code(diagnostics_output)
 
 
 # --- INIZIALIZZAZIONE DELLO STATO ---
@@ -801,6 +641,84 @@ with st.expander("⚙️ **Apri per configurare Dati e Vincoli**", expanded=Fals
                     help="Se attivo, il solver ottimizza l'orario per minimizzare i buchi orari. Se disattivo, trova semplicemente una soluzione valida diversa ogni volta."
                 )
 
+            with st.container(border=True):
+                profile_keys = list(SOLVER_PROFILES)
+                current_profile = st.session_state.config.get('SOLVER_PROFILE', DEFAULT_SOLVER_PROFILE)
+                st.session_state.config['SOLVER_PROFILE'] = st.selectbox(
+                    "**Profilo del solver**",
+                    profile_keys,
+                    index=profile_keys.index(current_profile) if current_profile in profile_keys else profile_keys.index(DEFAULT_SOLVER_PROFILE),
+                    format_func=lambda k: f"{SOLVER_PROFILES[k]['label']} ({SOLVER_PROFILES[k]['time_limit']}s)",
+                    help="Anteprima rapida: risultato in un minuto. Bilanciato: comportamento standard. Approfondito: più tempo e linearizzazione massima. Riproducibile: seed fisso e ricerca deterministica, stesso orario a ogni esecuzione."
+                )
+                with st.expander("Parametri avanzati del solver (vuoto = valore del profilo)"):
+                    col1, col2, col3, col4 = st.columns(4)
+                    overrides = [
+                        (col1, 'SOLVER_TIME_LIMIT', "Tempo massimo (s)", float, dict(min_value=5.0, step=30.0)),
+                        (col2, 'SOLVER_WORKERS', "Worker (0 = tutte le CPU)", int, dict(min_value=0, step=1)),
+                        (col3, 'SOLVER_SEED', "Seed", int, dict(min_value=0, step=1)),
+                        (col4, 'SOLVER_LINEARIZATION_LEVEL', "Linearizzazione (0-2)", int, dict(min_value=0, max_value=2, step=1)),
+                    ]
+                    for col, key, label, cast, kwargs in overrides:
+                        with col:
+                            current = st.session_state.config.get(key)
+                            value = st.number_input(label, value=None if current is None else cast(current), placeholder="profilo", key=f"override_{key}", **kwargs)
+                            if value is None:
+                                st.session_state.config.pop(key, None)
+                            else:
+                                st.session_state.config[key] = value
+
+            with st.container(border=True):
+                col1, col2 = st.columns([3, 1])
+                with col1:
+                    st.session_state.config['USE_TWO_PHASE_SOLVE'] = st.checkbox(
+                        "**Risoluzione in due fasi**",
+                        value=st.session_state.config.get('USE_TWO_PHASE_SOLVE', False),
+                        help="Fase 1: cerca rapidamente un orario valido senza ottimizzare. Fase 2: minimizza i buchi partendo da quell'orario, con il tempo rimanente. Ha effetto solo con l'ottimizzazione buchi attiva."
+                    )
+                with col2:
+                    if st.session_state.config.get('USE_TWO_PHASE_SOLVE', False):
+                        split_pct = st.slider(
+                            "Tempo fase 1 (%)",
+                            min_value=5,
+                            max_value=90,
+                            value=int(round(st.session_state.config.get('TWO_PHASE_SPLIT', 0.2) * 100)),
+                            step=5,
+                            help="Quota del tempo totale dedicata alla ricerca della prima soluzione valida"
+                        )
+                        st.session_state.config['TWO_PHASE_SPLIT'] = split_pct / 100
+
+            with st.container(border=True):
+                st.markdown("**Arresto anticipato della ricerca**")
+                st.caption("Il solver trova di solito l'orario quasi definitivo in pochi secondi e impiega il resto del tempo a dimostrarne la qualità. Queste regole lo fermano prima (0 = regola disattiva).")
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    gap_pct = st.number_input(
+                        "Gap relativo (%)",
+                        min_value=0.0, max_value=100.0, step=1.0,
+                        value=float(st.session_state.config.get('EARLY_STOP_RELATIVE_GAP', 0.0)) * 100,
+                        help="Si ferma quando la penalità buchi è entro questa percentuale dal limite inferiore dimostrato."
+                    )
+                    st.session_state.config['EARLY_STOP_RELATIVE_GAP'] = gap_pct / 100
+                with col2:
+                    target = st.number_input(
+                        "Penalità obiettivo",
+                        min_value=0, step=10,
+                        value=int(st.session_state.config.get('EARLY_STOP_OBJECTIVE_TARGET') or 0),
+                        help="Si ferma appena trova un orario con penalità buchi minore o uguale a questo valore."
+                    )
+                    if target > 0:
+                        st.session_state.config['EARLY_STOP_OBJECTIVE_TARGET'] = target
+                    else:
+                        st.session_state.config.pop('EARLY_STOP_OBJECTIVE_TARGET', None)
+                with col3:
+                    st.session_state.config['EARLY_STOP_NO_IMPROVEMENT_SECONDS'] = st.number_input(
+                        "Senza miglioramenti (s)",
+                        min_value=0, max_value=300, step=5,
+                        value=int(st.session_state.config.get('EARLY_STOP_NO_IMPROVEMENT_SECONDS', 0)),
+                        help="Si ferma se per questi secondi non trova orari migliori."
+                    )
+
             with st.container(border=True):
                 col1, col2 = st.columns([3, 1])
                 with col1:
@@ -837,18 +755,129 @@ with st.expander("⚙️ **Apri per configurare Dati e Vincoli**", expanded=Fals
                     help="Ogni docente può avere al massimo un'ora di buco tra due lezioni nello stesso giorno. Questo vincolo forza la compattezza dell'orario."
                 )
 
+# Validazione immediata a ogni modifica degli editor: l'esito è in cache per hash della configurazione
+config_validation = validate_config(st.session_state.config)
+if not config_validation.ok:
+    st.error(f"⚠️ Configurazione non valida ({len(config_validation.errors)} errori, la generazione verrà rifiutata): {config_validation.errors[0]}")
+
 # --- Pulsante di Generazione e Area Risultati ---
 st.divider()
-if st.button("🚀 **GENERA ORARIO**", use_container_width=True, type="primary"):
-    # Mostra indicatore durante la validazione
-    validation_placeholder = st.empty()
-    with validation_placeholder.container():
-        show_loading_spinner("🔍 Validazione configurazione in corso...")
-    
-    # Valida e salva il config prima di generare
-    ok, errs, warns = validate_config(st.session_state.config)
-    validation_placeholder.empty()
-    
+with st.expander("🔁 Warm start: riparti da una soluzione precedente", expanded=False):
+    st.caption("Il solver parte dalla soluzione scelta come suggerimento (hint): utile quando la configurazione cambia poco. Docenti, classi e slot non più presenti vengono ignorati.")
+    hint_options = ["Nessuno", "Ultima esecuzione di questa sessione", "File soluzione (.json) o orario Excel (.xlsx)"]
+    hint_source = st.radio("Soluzione di partenza", hint_options, index=0, key="hint_source", horizontal=True)
+    if hint_source == hint_options[1] and 'last_solution' not in st.session_state:
+        st.info("Nessuna esecuzione precedente in questa sessione: verrà avviata una ricerca da zero.")
+    hint_file = None
+    if hint_source == hint_options[2]:
+        hint_file = st.file_uploader("Carica soluzione o orario", type=["json", "xlsx"], key="hint_file")
+    hint_map_text = st.text_area(
+        "Rinomina classi e docenti (opzionale, JSON)",
+        value="",
+        placeholder='{"classi": {"1A": "2A"}, "docenti": {"ROSSI": "BIANCHI"}}',
+        help="Per riusare l'orario dell'anno precedente: mappa i vecchi nomi sui nuovi.",
+        key="hint_map_text"
+    )
+    repair_mode = st.checkbox(
+        "🛠️ Ripara la soluzione di partenza spostando il minor numero di lezioni",
+        value=False,
+        help="Per le modifiche a metà anno (docente sostituito, ore in più a una classe): le parti non toccate dalla modifica restano fisse e il log elenca chi si sposta.",
+        key="repair_mode"
+    )
+
+with st.expander("✅ Verifica un orario modificato a mano", expanded=False):
+    st.caption("Controlla un orario Excel generato dall'applicazione e poi modificato (fogli 'Classi' e 'Docenti') rispetto alla configurazione corrente, senza rigenerarlo: vincoli, copertura, sovrapposizioni e buchi.")
+    edited_file = st.file_uploader("Carica l'orario (.xlsx)", type=["xlsx"], key="validate_file")
+    if edited_file is not None and st.button("🔎 Verifica orario", use_container_width=True, key="validate_button"):
+        try:
+            validation = validate_timetable(edited_file, st.session_state.config)
+        except Exception as e:
+            st.error(f"Errore nella lettura dell'orario: {e}")
+        else:
+            if validation.ok:
+                st.success(f"✅ Nessuna violazione ({validation.elapsed * 1000:.0f} ms).")
+            else:
+                st.error(f"❌ {validation.failures} controlli falliti: dettagli qui sotto.")
+            st.code(validation.text)
+
+with st.expander("📂 Riapri un orario salvato", expanded=False):
+    st.caption("Ricarica una soluzione salvata (file .soluzione.json accanto all'Excel, o scaricata qui sotto dopo una generazione) e ne mostra l'orario e la diagnostica in pochi millisecondi, senza risolvere di nuovo.")
+    saved_file = st.file_uploader("Carica la soluzione (.json)", type=["json"], key="reload_file")
+    if saved_file is not None and st.button("📂 Apri orario", use_container_width=True, key="reload_button"):
+        try:
+            reloaded = reload_schedule(saved_file, st.session_state.config)
+        except Exception as e:
+            st.error(f"Errore nel caricamento della soluzione: {e}")
+        else:
+            show_reloaded_result(reloaded, "reload")
+
+with st.expander("🗂️ Storico delle generazioni", expanded=False):
+    st.caption("Ogni generazione viene registrata con configurazione, parametri del solver, tempi, esito e soluzione. Le esecuzioni si possono confrontare e riaprire con la loro configurazione senza risolvere.")
+    run_history = get_run_history()
+    runs = run_history.list_runs(50)
+    if not runs:
+        st.info("Nessuna esecuzione registrata.")
+    else:
+        st.dataframe(pd.DataFrame(runs).drop(columns=["has_solution"]).rename(columns={
+            "id": "#", "created": "Data", "source": "Origine", "config_hash": "Configurazione", "status": "Stato",
+            "objective": "Penalità", "hole_hours": "Ore di buco", "solve_time": "Risoluzione (s)", "total_time": "Totale (s)",
+            "variables": "Variabili", "constraints": "Vincoli"}), hide_index=True, use_container_width=True)
+        labels = {run["id"]: f"#{run['id']} - {run['created']} ({run['status']})" for run in runs}
+        col_reopen, col_compare = st.columns(2)
+        with col_reopen:
+            reopen_id = st.selectbox("Esecuzione da riaprire", [run["id"] for run in runs if run["has_solution"]], format_func=labels.get, key="history_reopen_id")
+            reopen_clicked = st.button("📂 Riapri esecuzione", use_container_width=True, key="history_reopen", disabled=reopen_id is None)
+        with col_compare:
+            compare_ids = st.multiselect("Esecuzioni da confrontare", list(labels), format_func=labels.get, max_selections=2, key="history_compare_ids")
+            compare_clicked = st.button("🔍 Confronta", use_container_width=True, key="history_compare", disabled=len(compare_ids) != 2)
+        if compare_clicked:
+            st.code("\n".join(run_history.compare(*compare_ids)))
+        if reopen_clicked:
+            try:
+                reopened = run_history.reopen(reopen_id)
+            except Exception as e:
+                st.error(f"Errore nella riapertura dell'esecuzione: {e}")
+            else:
+                show_reloaded_result(reopened, "history")
+
+with st.expander("🧑‍🏫 Supplenze: chi è libero", expanded=False):
+    st.caption("Sull'ultimo orario generato o riaperto: docenti a disposizione in copertura, in buco o liberi a un dato orario, ordinati come supplenti (prima copertura e buchi, poi più ore di copertura settimanali e giornata meno carica).")
+    last_solution = st.session_state.get('last_solution')
+    if last_solution is None:
+        st.info("Genera o riapri un orario per cercare i supplenti.")
+    else:
+        index, problems = get_availability_index(last_solution, st.session_state.config)
+        if problems:
+            st.warning(f"⚠️ {len(problems)} voci dell'ultimo orario non corrispondono alla configurazione corrente e sono ignorate: rigenera l'orario per risultati affidabili.")
+        col_day, col_time, col_absent = st.columns(3)
+        with col_day:
+            sub_day = st.selectbox("Giorno", index.days, key="substitute_day")
+        with col_time:
+            sub_time = st.selectbox("Orario", ["Tutte le lezioni del docente assente"] + list(index.labels), key="substitute_time")
+        with col_absent:
+            sub_absent = st.selectbox("Docente assente", [""] + list(index.teachers), key="substitute_absent")
+        if sub_time in index.label_index:
+            st.dataframe(substitutes_frame(index.find_substitutes(sub_day, sub_time, absent=sub_absent or None)), use_container_width=True, hide_index=True)
+        elif sub_absent:
+            plan = index.absence_plan(sub_absent, sub_day)
+            if not plan:
+                st.info(f"{sub_absent} non ha lezioni né copertura il {sub_day}.")
+            for label, what, substitutes in plan:
+                st.markdown(f"**{label}** · {what}")
+                st.dataframe(substitutes_frame(substitutes), use_container_width=True, hide_index=True)
+        else:
+            st.info("Scegli un orario oppure il docente assente.")
+
+schedule_job = st.session_state.get('schedule_job')
+job_running = schedule_job is not None and schedule_job.running
+
+use_cache = st.checkbox("Riusa il risultato già calcolato per una configurazione identica", value=True, key="use_result_cache",
+                        help="Se configurazione, parametri del solver e soluzione di partenza coincidono con una generazione precedente, l'orario viene ripreso dalla cache invece di risolvere di nuovo. "
+                             "Vengono riusati tutti i risultati tranne quelli di una ricerca fermata a mano; quelli che una nuova risoluzione potrebbe cambiare (seed casuale, limite di tempo) sono indicati come tali.")
+
+if st.button("🚀 **GENERA ORARIO**", use_container_width=True, type="primary", disabled=job_running):
+    # Valida e salva il config prima di generare (stesso esito della validazione immediata, ripreso dalla cache)
+    ok, errs, warns = validate_config(st.session_state.config).as_tuple()
     if warns:
         for w in warns:
             st.warning(w)
@@ -864,42 +893,31 @@ if st.button("🚀 **GENERA ORARIO**", use_container_width=True, type="primary")
         st.error(f"Errore nel salvataggio della configurazione: {e}")
         st.stop()
 
-    # Mostra l'indicatore di caricamento personalizzato avanzato
-    loading_placeholder = st.empty()
-    with loading_placeholder.container():
-        show_advanced_loading(
-            "🔄 Generazione orario in corso...", 
-            [
-                "Analisi vincoli e configurazione",
-                "Costruzione modello matematico", 
-                "Ricerca soluzione ottimale",
-                "Validazione risultati",
-                "Preparazione output Excel"
-            ]
-        )
-    
+    hint = None
     try:
-        df_classi, df_docenti, log_output, diagnostics_output = generate_schedule(st.session_state.config)
-        # Rimuove l'indicatore di caricamento
-        loading_placeholder.empty()
+        if hint_source == hint_options[1]:
+            hint = st.session_state.get('last_solution')
+        elif hint_source == hint_options[2] and hint_file is not None:
+            hint = load_hint_from_upload(hint_file, st.session_state.config)
+        if hint and hint_map_text.strip():
+            name_map = json.loads(hint_map_text)
+            hint = remap_solution(hint, name_map.get('classi', {}), name_map.get('docenti', {}))
     except Exception as e:
-        loading_placeholder.empty()
-        st.error(f"Errore durante la generazione: {e}")
+        st.error(f"Errore nel caricamento della soluzione di partenza: {e}")
         st.stop()
-    if df_classi is not None and df_docenti is not None:
-        st.success("🎉 Orario generato con successo!")
-        st.info(f"Il file 'orario_settimanale.xlsx' è stato salvato automaticamente nella cartella: `{os.getcwd()}`")
-        excel_data = dataframe_to_excel_bytes({"Classi": df_classi, "Docenti": df_docenti})
-        st.download_button(label="📥 Scarica una Copia dell'Orario (Excel)", data=excel_data, file_name="orario_generato.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", use_container_width=True)
-        st.subheader("🗓️ Anteprima Orario - Vista per Classi")
-        st.dataframe(df_classi.style.apply(style_days, axis=1), use_container_width=True)
-        st.subheader("👨‍🏫 Anteprima Orario - Vista per Docenti")
-        st.dataframe(df_docenti.style.apply(style_days, axis=1), use_container_width=True)
-    else:
-        st.error("❌ Impossibile trovare una soluzione con i vincoli e i dati forniti. Controlla il log e la diagnostica qui sotto per dettagli.")
-    with st.expander("📝 Mostra Log dell'elaborazione"):
-        st.code(log_output)
-    with st.expander("🔍 Mostra Diagnostica e Verifica Vincoli"):
-        st.code(diagnostics_output)
+    if repair_mode and not hint:
+        st.error("Per la riparazione serve una soluzione di partenza (ultima esecuzione o file caricato).")
+        st.stop()
+
+    # La generazione gira in background: lo script resta libero per il pulsante di stop
+    schedule_job = ScheduleJob(copy.deepcopy(st.session_state.config), hint=hint, cache=get_result_cache() if use_cache else None,
+                               run_history=get_run_history(), repair=repair_mode, model_cache=get_model_cache()).start()
+    st.session_state.schedule_job = schedule_job
+    job_running = True
+
+if schedule_job is None:
+    st.info("Controlla la configurazione nell'area espandibile qui sopra, poi clicca su 'GENERA ORARIO'.")
+elif job_running:
+    show_job_progress()
 else:
-    st.info("Controlla la configurazione nell'area espandibile qui sopra, poi clicca su 'GENERA ORARIO'.")
\ No newline at end of file
+    show_job_result(schedule_job)
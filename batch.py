@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Esecuzione in batch di più scenari (configurazioni alternative dello stesso orario).
+Risolve ogni configurazione di una cartella o di un pattern glob in un pool di processi
+limitato, salva i risultati di ogni scenario in una cartella dedicata e produce una
+tabella riassuntiva (stato, penalità, ore di buco, tempo di risoluzione, dimensione del modello).
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from engine import DEFAULT_OUTPUT_FILE, run_schedule
+from utils import gather_pool_results, validate_config
+
+
+SUMMARY_FILE = "riepilogo.csv"
+SUMMARY_FIELDS = ['scenario', 'status', 'objective', 'hole_hours', 'solve_time', 'variables', 'constraints', 'output_dir', 'error']
+
+
+def find_configs(patterns):
+    """Espande cartelle (tutti i *.json contenuti) e pattern glob in una lista ordinata di file di configurazione."""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, '*.json'))
+        else:
+            matches = glob.glob(pattern)
+        paths.extend(p for p in sorted(matches) if os.path.isfile(p) and p not in paths)
+    return paths
+
+
+def scenario_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _solve_scenario(path, output_dir, overrides):
+    """Eseguito in un processo separato: carica, risolve e salva uno scenario nella sua cartella."""
+    from utils import load_config
+    from solution import save_solution
+
+    row = {'scenario': scenario_name(path), 'status': 'ERRORE', 'objective': None, 'hole_hours': None,
+           'solve_time': None, 'variables': None, 'constraints': None, 'output_dir': output_dir, 'error': ''}
+    os.makedirs(output_dir, exist_ok=True)
+    try:
+        config = load_config(os.path.abspath(path))
+    except SystemExit:
+        # load_config stampa l'errore ed esce: nel batch lo scenario viene solo segnato come fallito
+        row['error'] = "configurazione non leggibile"
+        return row
+    config.update(overrides)
+    try:
+        result = run_schedule(config, output_path=os.path.join(output_dir, DEFAULT_OUTPUT_FILE))
+    except Exception as e:
+        row['error'] = str(e)
+        return row
+
+    with open(os.path.join(output_dir, "log.txt"), 'w', encoding='utf-8') as f:
+        f.write(result.log)
+    with open(os.path.join(output_dir, "diagnostica.txt"), 'w', encoding='utf-8') as f:
+        f.write(result.diagnostics)
+    if result.solution:
+        save_solution(result.solution, os.path.join(output_dir, "soluzione.json"))
+
+    stats = result.stats
+    row['status'] = stats.get('status', 'PREVALIDAZIONE FALLITA')
+    if stats.get('prevalidation_errors'):
+        errors = stats['prevalidation_errors']
+        row['error'] = errors[0] + (f" (e altri {len(errors) - 1} errori, vedi log.txt)" if len(errors) > 1 else "")
+    row['objective'] = stats.get('objective')
+    row['hole_hours'] = stats.get('hole_hours')
+    row['solve_time'] = stats.get('solve_time')
+    row['variables'] = stats.get('model_size', {}).get('variables')
+    row['constraints'] = stats.get('model_size', {}).get('constraints')
+    return row
+
+
+def _invalid_scenario(path, output_dir):
+    """
+    Riga di riepilogo di uno scenario con configurazione non valida (validate_config), scartato
+    senza avviare il suo processo; None se valido o non leggibile (lo segnala il processo).
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(config, dict):
+        return None
+    validation = validate_config(config)
+    if validation.ok:
+        return None
+    errors = validation.errors
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "log.txt"), 'w', encoding='utf-8') as f:
+        f.write("CONFIGURAZIONE NON VALIDA:\n" + "\n".join(f" - {e}" for e in errors) + "\n")
+    return {'scenario': scenario_name(path), 'status': 'CONFIGURAZIONE NON VALIDA', 'objective': None, 'hole_hours': None,
+            'solve_time': None, 'variables': None, 'constraints': None, 'output_dir': output_dir,
+            'error': errors[0] + (f" (e altri {len(errors) - 1} errori, vedi log.txt)" if len(errors) > 1 else "")}
+
+
+def run_batch(paths, output_root, jobs=None, overrides=None):
+    """
+    Risolve gli scenari `paths` con al massimo `jobs` processi contemporanei (default: uno per CPU).
+    Ogni scenario scrive in output_root/<nome scenario>; se SOLVER_WORKERS non è negli
+    override, le CPU vengono divise tra i processi. Gli scenari con configurazione non valida
+    sono scartati prima di avviare il pool. Ritorna le righe del riepilogo, nell'ordine di `paths`.
+    """
+    invalid = {}
+    for path in paths:
+        row = _invalid_scenario(path, os.path.join(output_root, scenario_name(path)))
+        if row is not None:
+            invalid[path] = row
+    valid = [path for path in paths if path not in invalid]
+    if not valid:
+        return [invalid[path] for path in paths]
+
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(valid)))
+    overrides = dict(overrides or {})
+    overrides.setdefault('SOLVER_WORKERS', max(1, (os.cpu_count() or 1) // jobs))
+    overrides.setdefault('SOLVER_LOG_SEARCH_PROGRESS', False)
+
+    def failed(i, error):
+        # Scenario annullato dopo Ctrl+C o processo terminato (BrokenProcessPool)
+        interrupted = isinstance(error, (CancelledError, BrokenProcessPool))
+        return {'scenario': scenario_name(valid[i]), 'status': 'INTERROTTO' if interrupted else 'ERRORE',
+                'output_dir': os.path.join(output_root, scenario_name(valid[i])), 'error': str(error)}
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(_solve_scenario, path, os.path.join(output_root, scenario_name(path)), overrides) for path in valid]
+        solved = dict(zip(valid, gather_pool_results(pool, futures, failed)))
+    rows = [invalid[path] if path in invalid else solved[path] for path in paths]
+    return rows
+
+
+def write_summary(rows, path):
+    """Salva il riepilogo in CSV e ritorna il percorso scritto."""
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def format_batch_table(rows):
+    def fmt(value, spec, suffix=""):
+        return format(value, spec) + suffix if value is not None else "-"
+
+    width = max([len("Scenario")] + [len(r['scenario']) for r in rows])
+    lines = [f"  {'Scenario':<{width}} {'Stato':<24} {'Penalità':>9} {'Buchi':>7} {'Tempo':>8} {'Variabili':>10} {'Vincoli':>9}"]
+    for r in rows:
+        lines.append(f"  {r['scenario']:<{width}} {r['status']:<24} {fmt(r.get('objective'), '.0f'):>9} {fmt(r.get('hole_hours'), 'g'):>7} "
+                     f"{fmt(r.get('solve_time'), '.1f', 's'):>8} {fmt(r.get('variables'), 'd'):>10} {fmt(r.get('constraints'), 'd'):>9}")
+        if r.get('error'):
+            lines.append(f"  {'':<{width}} ↳ {r['error']}")
+    return lines
+
+
+def run_batch_cli(patterns, output_root, jobs=None, overrides=None):
+    """Esegue il batch stampando avanzamento e riepilogo (usato da batch.py e da engine.py --batch). Ritorna il codice di uscita."""
+    paths = find_configs(patterns)
+    if not paths:
+        print(f"❌ Nessun file di configurazione trovato in: {', '.join(patterns)}")
+        return 1
+    names = [scenario_name(p) for p in paths]
+    duplicates = sorted({n for n in names if names.count(n) > 1})
+    if duplicates:
+        print(f"❌ Scenari con lo stesso nome (userebbero la stessa cartella): {', '.join(duplicates)}")
+        return 1
+
+    os.makedirs(output_root, exist_ok=True)
+    print(f"🗂️  {len(paths)} scenari, risultati in {os.path.abspath(output_root)}")
+    start = time.time()
+    rows = run_batch(paths, output_root, jobs, overrides)
+    print(f"\nBatch completato in {time.time() - start:.1f}s:\n")
+    print("\n".join(format_batch_table(rows)))
+    print(f"\n📄 Riepilogo salvato: {os.path.abspath(write_summary(rows, os.path.join(output_root, SUMMARY_FILE)))}")
+    return 0 if all(r['status'] in ('OPTIMAL', 'FEASIBLE') for r in rows) else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Risolve in batch più scenari di configurazione",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Esempi di utilizzo:
+  python batch.py scenari/                      # Tutti i *.json della cartella
+  python batch.py "scenari/slot_*.json" --jobs 2 --time-limit 120
+        """
+    )
+    parser.add_argument('configs', nargs='+', help='Cartelle o pattern glob di file di configurazione JSON')
+    parser.add_argument('--output', '-o', type=str, default='risultati_batch', help='Cartella dei risultati, una sottocartella per scenario (default: risultati_batch)')
+    parser.add_argument('--jobs', '-j', type=int, default=None, help='Scenari risolti contemporaneamente (default: uno per CPU)')
+    parser.add_argument('--profile', type=str, default=None, help='Profilo del solver per tutti gli scenari (SOLVER_PROFILE)')
+    parser.add_argument('--time-limit', type=float, default=None, help='Tempo massimo di risoluzione per scenario in secondi (SOLVER_TIME_LIMIT)')
+    args = parser.parse_args(argv)
+
+    overrides = {}
+    if args.profile is not None: overrides['SOLVER_PROFILE'] = args.profile
+    if args.time_limit is not None: overrides['SOLVER_TIME_LIMIT'] = args.time_limit
+    return run_batch_cli(args.configs, args.output, args.jobs, overrides)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Benchmark delle prestazioni dell'engine.
+
+- Costruzione del modello (default): replica la configurazione di partenza più volte
+  (classi e docenti con suffisso) e misura il tempo di build_model, per verificare che
+  la costruzione del modello cresca linearmente all'aumentare di classi e docenti, e il tempo
+  della ricostruzione incrementale (rebuild_model) dopo una modifica tipica della GUI.
+- Suite completa (--suite): esegue un corpus fisso di configurazioni, dalla piccola alla
+  molto grande, misurando ogni fase (prevalidazione, variabili, ogni famiglia di vincoli,
+  risoluzione, diagnostica, Excel), memoria di picco, dimensione del modello e penalità.
+  Confronta i risultati con un baseline salvato e fallisce se un budget viene superato.
+"""
+
+import argparse
+import copy
+import json
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from engine import ScheduleData, build_model, rebuild_model, run_schedule
+
+
+def _suffix(name, k):
+    return name if k == 1 else f"{name}_{k}"
+
+
+def scale_config(config, factor):
+    """Ritorna una copia della configurazione (già normalizzata da load_config) con classi e docenti replicati `factor` volte."""
+    scaled = copy.deepcopy(config)
+    classi = config['CLASSI']
+    scaled['CLASSI'] = [_suffix(cl, k) for k in range(1, factor + 1) for cl in classi]
+    scaled['ORE_SETTIMANALI_CLASSI'] = {_suffix(cl, k): h for k in range(1, factor + 1) for cl, h in config['ORE_SETTIMANALI_CLASSI'].items()}
+    scaled['ASSEGNAZIONE_SLOT'] = {_suffix(cl, k): dict(days) for k in range(1, factor + 1) for cl, days in config['ASSEGNAZIONE_SLOT'].items()}
+    scaled['ASSEGNAZIONE_DOCENTI'] = {
+        _suffix(t, k): {(cl if cl == 'copertura' else _suffix(cl, k)): h for cl, h in assign.items()}
+        for k in range(1, factor + 1) for t, assign in config['ASSEGNAZIONE_DOCENTI'].items()
+    }
+    for key in ['GROUP_DAILY_TWO_CLASSES', 'MIN_TWO_HOURS_IF_PRESENT_SPECIFIC']:
+        if key in config:
+            scaled[key] = {_suffix(t, k) for k in range(1, factor + 1) for t in config[key]}
+    for key in ['HOURS_PER_DAY_PER_CLASS', 'ONLY_DAYS', 'START_AT', 'END_AT']:
+        if key in config:
+            scaled[key] = {_suffix(t, k): copy.deepcopy(v) for k in range(1, factor + 1) for t, v in config[key].items()}
+    if 'ASSEGNAZIONE_DOCENTI_SPECIFICHE' in config:
+        scaled['ASSEGNAZIONE_DOCENTI_SPECIFICHE'] = [
+            [_suffix(t, k), _suffix(cl, k), day, start, dur]
+            for k in range(1, factor + 1) for t, cl, day, start, dur in config['ASSEGNAZIONE_DOCENTI_SPECIFICHE']
+        ]
+    return scaled
+
+
+def time_model_build(config, repeats=3):
+    """Costruisce il modello `repeats` volte e ritorna (tempo minimo in secondi, n. variabili, n. vincoli)."""
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        sm = build_model(ScheduleData(config), [])
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    proto = sm.model.Proto()
+    return best, len(proto.variables), len(proto.constraints)
+
+
+def time_model_rebuild(config, repeats=3):
+    """Tempo minimo in secondi di rebuild_model dopo una modifica tipica della GUI: massimo
+    giornaliero per classe alzato di un'ora (riemette una sola famiglia di vincoli)."""
+    previous = build_model(ScheduleData(config), [])
+    changed = dict(config, MAX_DAILY_HOURS_PER_CLASS=config.get('MAX_DAILY_HOURS_PER_CLASS', 4.0) + 1)
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        rebuild_model(previous, ScheduleData(changed), ['MAX_DAILY_HOURS_PER_CLASS'], [])
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_build_benchmark(config, factors, repeats=3):
+    """Esegue il benchmark di costruzione per ogni fattore di scala e ritorna le righe dei risultati."""
+    rows = []
+    for factor in factors:
+        scaled = scale_config(config, factor)
+        elapsed, n_vars, n_constraints = time_model_build(scaled, repeats)
+        rows.append({
+            'factor': factor,
+            'classes': len(scaled['CLASSI']),
+            'teachers': len(scaled['ASSEGNAZIONE_DOCENTI']),
+            'variables': n_vars,
+            'constraints': n_constraints,
+            'build_s': elapsed,
+            'rebuild_s': time_model_rebuild(scaled, repeats),
+            'us_per_constraint': elapsed * 1e6 / max(n_constraints, 1),
+        })
+    return rows
+
+
+def print_build_table(rows):
+    print(f"{'Fattore':>7} {'Classi':>7} {'Docenti':>8} {'Variabili':>10} {'Vincoli':>9} {'Build (s)':>10} {'µs/vincolo':>11} {'Rebuild (s)':>12}")
+    for r in rows:
+        print(f"{r['factor']:>7} {r['classes']:>7} {r['teachers']:>8} {r['variables']:>10} {r['constraints']:>9} {r['build_s']:>10.3f} {r['us_per_constraint']:>11.1f} {r['rebuild_s']:>12.3f}")
+    if len(rows) > 1:
+        first, last = rows[0], rows[-1]
+        growth = last['build_s'] / first['build_s'] if first['build_s'] else float('inf')
+        size_growth = last['constraints'] / first['constraints'] if first['constraints'] else float('inf')
+        print(f"\nCrescita tempo di build: x{growth:.1f} a fronte di x{size_growth:.1f} vincoli "
+              f"(x{last['classes'] / first['classes']:.0f} classi e docenti).")
+
+
+# --- Suite end-to-end ---
+
+BASELINE_FILE = "benchmark_baseline.json"
+
+# Corpus fisso: la configurazione di esempio e istanze sintetiche (generator.py) riproducibili dal seed
+SUITE_CORPUS = [
+    {'name': 'config', 'config': 'config.json'},
+    {'name': 'small', 'classes': 10, 'seed': 1},
+    {'name': 'medium', 'classes': 20, 'seed': 2},
+    {'name': 'large', 'classes': 40, 'seed': 3},
+    {'name': 'xlarge', 'classes': 80, 'seed': 4},
+]
+
+# Solver deterministico con budget fisso: a parità di modello la penalità trovata è ripetibile
+SUITE_SOLVER = {'SOLVER_PROFILE': 'reproducible', 'SOLVER_TIME_LIMIT': 10, 'SOLVER_LOG_SEARCH_PROGRESS': False}
+
+# Margini rispetto al baseline oltre i quali la suite fallisce (frazioni del valore di baseline)
+BUDGETS = {
+    'time': 0.5,         # tempi di ogni fase
+    'time_slack': 0.05,  # secondi di tolleranza assoluta, per le fasi di pochi millisecondi
+    'memory': 0.25,      # memoria di picco del processo
+    'size': 0.10,        # variabili e vincoli del modello
+    'objective': 0.10,   # penalità buchi (più alta = peggiore)
+}
+
+
+def _peak_memory_mb():
+    """Memoria di picco del processo in MB, None dove il modulo resource non esiste (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def suite_config(entry):
+    """Configurazione normalizzata di una voce del corpus."""
+    if 'config' in entry:
+        from utils import load_config
+        return load_config(entry['config'])
+    from generator import generate_instance
+    return generate_instance(n_classes=entry['classes'], seed=entry['seed'])[0]
+
+
+def _run_suite_entry(entry, solver_overrides):
+    """Eseguito in un processo nuovo per ogni voce, così la memoria di picco è quella della sola voce."""
+    config = suite_config(entry)
+    config.update(solver_overrides)
+    data = ScheduleData(config)
+    start = time.perf_counter()
+    result = run_schedule(config, output_path=None)  # il workbook viene generato ma non salvato
+    total = time.perf_counter() - start
+    stats = result.stats
+    return {
+        'name': entry['name'],
+        'classes': len(data.CLASSI),
+        'teachers': len(data.teachers),
+        'status': stats.get('status', 'PREVALIDAZIONE FALLITA'),
+        'objective': stats.get('objective'),
+        'variables': stats.get('model_size', {}).get('variables'),
+        'constraints': stats.get('model_size', {}).get('constraints'),
+        'timings': stats.get('timings', {}),
+        'total': total,
+        'peak_memory_mb': _peak_memory_mb(),
+    }
+
+
+def run_suite(corpus=None, solver_overrides=None):
+    """Esegue le voci del corpus una alla volta, ognuna in un processo dedicato. Ritorna i risultati per voce."""
+    corpus = corpus or SUITE_CORPUS
+    solver_overrides = dict(SUITE_SOLVER, **(solver_overrides or {}))
+    results = []
+    for entry in corpus:
+        print(f"⏱️  {entry['name']}...", flush=True)
+        with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as pool:
+            results.append(pool.submit(_run_suite_entry, entry, solver_overrides).result())
+    return results
+
+
+def compare_to_baseline(results, baseline, budgets=None):
+    """Confronta i risultati con il baseline. Ritorna la lista dei budget superati (vuota se tutto è nei limiti)."""
+    budgets = dict(BUDGETS, **(budgets or {}))
+    previous = {r['name']: r for r in baseline.get('results', [])}
+    violations = []
+    for r in results:
+        base = previous.get(r['name'])
+        if base is None:
+            continue
+        name = r['name']
+        phases = dict(r['timings'], total=r['total'])
+        base_phases = dict(base.get('timings', {}), total=base.get('total'))
+        for phase, value in phases.items():
+            reference = base_phases.get(phase)
+            if reference is None: continue
+            limit = reference * (1 + budgets['time']) + budgets['time_slack']
+            if value > limit:
+                violations.append(f"{name}: fase '{phase}' {value:.3f}s > budget {limit:.3f}s (baseline {reference:.3f}s)")
+        if r['peak_memory_mb'] is not None and base.get('peak_memory_mb'):
+            limit = base['peak_memory_mb'] * (1 + budgets['memory'])
+            if r['peak_memory_mb'] > limit:
+                violations.append(f"{name}: memoria di picco {r['peak_memory_mb']:.0f}MB > budget {limit:.0f}MB (baseline {base['peak_memory_mb']:.0f}MB)")
+        for key, label in [('variables', "variabili"), ('constraints', "vincoli")]:
+            if r[key] is not None and base.get(key):
+                limit = base[key] * (1 + budgets['size'])
+                if r[key] > limit:
+                    violations.append(f"{name}: {label} {r[key]} > budget {limit:.0f} (baseline {base[key]})")
+        if base.get('objective') is not None:
+            if r['objective'] is None:
+                violations.append(f"{name}: nessuna soluzione (stato {r['status']}), nel baseline penalità {base['objective']:.0f}")
+            else:
+                limit = base['objective'] * (1 + budgets['objective'])
+                if r['objective'] > limit:
+                    violations.append(f"{name}: penalità buchi {r['objective']:.0f} > budget {limit:.0f} (baseline {base['objective']:.0f})")
+    return violations
+
+
+def print_suite_table(results, detail=False):
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else "-"
+
+    print(f"{'Voce':<8} {'Classi':>6} {'Docenti':>7} {'Variabili':>9} {'Vincoli':>8} {'Preval.':>8} {'Variab.':>8} {'Vincoli':>8} "
+          f"{'Solve':>7} {'Diagn.':>7} {'Excel':>7} {'Totale':>7} {'Mem MB':>7} {'Penalità':>8}")
+    for r in results:
+        t = r['timings']
+        constraints = sum(v for k, v in t.items() if k.startswith('constraints.'))
+        print(f"{r['name']:<8} {r['classes']:>6} {r['teachers']:>7} {fmt(r['variables'], 'd'):>9} {fmt(r['constraints'], 'd'):>8} "
+              f"{fmt(t.get('prevalidation'), '.3f'):>8} {fmt(t.get('variables'), '.3f'):>8} {constraints:>8.3f} {fmt(t.get('solve'), '.2f'):>7} "
+              f"{fmt(t.get('diagnostics'), '.2f'):>7} {fmt(t.get('excel'), '.2f'):>7} {r['total']:>7.2f} {fmt(r['peak_memory_mb'], '.0f'):>7} {fmt(r['objective'], '.0f'):>8}")
+        if detail:
+            families = sorted(((k[len('constraints.'):], v) for k, v in t.items() if k.startswith('constraints.')), key=lambda kv: -kv[1])
+            print("         " + ", ".join(f"{k} {v:.3f}s" for k, v in families))
+
+
+def _machine():
+    return {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()}
+
+
+def save_baseline(results, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'machine': _machine(), 'solver': SUITE_SOLVER, 'results': results}, f, ensure_ascii=False, indent=1)
+    return path
+
+
+def load_baseline(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def run_suite_cli(args):
+    """Esegue la suite, la confronta con il baseline e ritorna il codice di uscita (1 se un budget è superato)."""
+    corpus = [e for e in SUITE_CORPUS if not args.corpus or e['name'] in args.corpus]
+    overrides = {'SOLVER_TIME_LIMIT': args.time_limit} if args.time_limit is not None else {}
+    results = run_suite(corpus, overrides)
+    print()
+    print_suite_table(results, detail=args.detail)
+
+    if args.results:
+        with open(args.results, 'w', encoding='utf-8') as f:
+            json.dump({'machine': _machine(), 'results': results}, f, ensure_ascii=False, indent=1)
+    if args.save_baseline:
+        print(f"\n📌 Baseline salvato: {os.path.abspath(save_baseline(results, args.baseline))}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"\nℹ️  Nessun baseline in {args.baseline}: salvalo con --save-baseline per i confronti successivi.")
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if baseline.get('machine') != _machine():
+        print(f"\n⚠️  Baseline registrato su una macchina diversa ({baseline.get('machine')}): i tempi potrebbero non essere confrontabili.")
+    violations = compare_to_baseline(results, baseline, {'time': args.time_tolerance} if args.time_tolerance is not None else None)
+    if violations:
+        print(f"\n❌ {len(violations)} budget superati rispetto al baseline:")
+        for v in violations: print(f"  - {v}")
+        return 1
+    print("\n✅ Tutte le fasi sono entro i budget del baseline.")
+    return 0
+
+
+def main():
+    from utils import load_config
+
+    parser = argparse.ArgumentParser(description="Benchmark della costruzione del modello CP-SAT e suite end-to-end")
+    parser.add_argument('--config', '-c', type=str, default='config.json', help='Configurazione di partenza (default: config.json)')
+    parser.add_argument('--factors', type=int, nargs='+', default=[1, 2, 4, 8], help='Fattori di replica di classi e docenti (default: 1 2 4 8)')
+    parser.add_argument('--repeats', type=int, default=3, help='Ripetizioni per fattore, si tiene il tempo minimo (default: 3)')
+    parser.add_argument('--suite', action='store_true', help='Esegue la suite end-to-end sul corpus fisso e la confronta con il baseline')
+    parser.add_argument('--corpus', type=str, nargs='+', default=None, help=f"Voci del corpus da eseguire (default: tutte: {', '.join(e['name'] for e in SUITE_CORPUS)})")
+    parser.add_argument('--baseline', type=str, default=BASELINE_FILE, help=f'File del baseline (default: {BASELINE_FILE})')
+    parser.add_argument('--save-baseline', action='store_true', help='Salva i risultati come nuovo baseline invece di confrontarli')
+    parser.add_argument('--results', type=str, default=None, help='Salva anche i risultati di questa esecuzione in JSON')
+    parser.add_argument('--time-tolerance', type=float, default=None, help=f"Margine sui tempi rispetto al baseline, es. 0.5 = +50% (default: {BUDGETS['time']})")
+    parser.add_argument('--time-limit', type=float, default=None, help=f"Tempo di risoluzione per voce (default: {SUITE_SOLVER['SOLVER_TIME_LIMIT']}s deterministici)")
+    parser.add_argument('--detail', action='store_true', help='Mostra il tempo di ogni famiglia di vincoli')
+    args = parser.parse_args()
+
+    if args.suite:
+        return run_suite_cli(args)
+
+    config = load_config(args.config)
+    rows = run_build_benchmark(config, args.factors, args.repeats)
+    print_build_table(rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,260 +5,753 @@ Questo modulo contiene la logica di ottimizzazione, diagnostica e output su file
 incapsulata in una funzione per essere chiamata da un'interfaccia esterna.
 """
 
-from ortools.sat.python import cp_model
-from collections import defaultdict
+from ortools.sat.python import cp_model, cp_model_helper
+from collections import Counter, defaultdict
+from dataclasses import asdict, dataclass, field, replace
+import numpy as np
 import pandas as pd
+from io import BytesIO
 from openpyxl import Workbook
-from openpyxl.styles import PatternFill
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import NamedStyle, PatternFill
+from openpyxl.styles.borders import DEFAULT_BORDER
+from openpyxl.styles.fonts import DEFAULT_FONT
+import copy
 import math
+import multiprocessing
+import sqlite3
+import threading
+import time
 import os
 import sys
 
+from solution import COMPACT_SUFFIX, compact_solution_path, encode_solution, load_compact_solution, save_compact_solution
+from utils import config_hash, diff_configs, normalize_config, validate_config
 
-def generate_schedule(config):
-    """
-    Funzione principale che costruisce, risolve, valida e salva l'orario.
-    """
-    log_messages = []
 
-    # --- 1. CONFIGURAZIONE DAI DATI DI INPUT ---
-    CLASSI = config['CLASSI']
-    GIORNI = config['GIORNI']
-    SLOT_1 = config['SLOT_1']
-    SLOT_2 = config['SLOT_2']
-    SLOT_3 = config['SLOT_3']
-    ASSEGNAZIONE_SLOT = config['ASSEGNAZIONE_SLOT']
-    ORE_SETTIMANALI_CLASSI = config['ORE_SETTIMANALI_CLASSI']
-    MAX_ORE_SETTIMANALI_DOCENTI = config['MAX_ORE_SETTIMANALI_DOCENTI']
-    ASSEGNAZIONE_DOCENTI = config['ASSEGNAZIONE_DOCENTI']
-    
-    # Carica i vincoli specifici (attivati dalla presenza della chiave)
-    GROUP_DAILY_TWO_CLASSES = config.get('GROUP_DAILY_TWO_CLASSES', set())
-    HOURS_PER_DAY_PER_CLASS = config.get('HOURS_PER_DAY_PER_CLASS', {})
-    ONLY_DAYS = config.get('ONLY_DAYS', {})
-    START_AT = config.get('START_AT', {})
-    END_AT = config.get('END_AT', {})
-    MIN_TWO_HOURS_IF_PRESENT_SPECIFIC = config.get('MIN_TWO_HOURS_IF_PRESENT_SPECIFIC', set())
-    ASSEGNAZIONE_DOCENTI_SPECIFICHE = config.get('ASSEGNAZIONE_DOCENTI_SPECIFICHE', [])
-    
-    # Carica le flag per i vincoli generici
-    USE_MAX_DAILY_HOURS_PER_CLASS = config.get('USE_MAX_DAILY_HOURS_PER_CLASS', True)
-    MAX_DAILY_HOURS_PER_CLASS = config.get('MAX_DAILY_HOURS_PER_CLASS', 4.0)
-    USE_CONSECUTIVE_BLOCKS = config.get('USE_CONSECUTIVE_BLOCKS', True)
-    USE_MAX_ONE_HOLE = config.get('USE_MAX_ONE_HOLE', True)
-    USE_OPTIMIZE_HOLES = config.get('USE_OPTIMIZE_HOLES', True)
-
-
-    # --- 2. PRE-ELABORAZIONE E DEFINIZIONE STRUTTURE DATI ---
-    UNIT = 0.5
-    def hours_to_units(h): return int(round(h / UNIT))
-    def units_to_hours(u): return u * UNIT
-    def get_scheduling_label(time_str): return time_str.split('-')[0]
-    SLOT_MAP = {"SLOT_1": SLOT_1, "SLOT_2": SLOT_2, "SLOT_3": SLOT_3}
-    class_slots = {cl: {day: [(get_scheduling_label(t), t, hours_to_units(d)) for t,d in SLOT_MAP[ASSEGNAZIONE_SLOT[cl][day]]] for day in GIORNI} for cl in CLASSI}
-    all_full_labels = list(set(t for s in [SLOT_1, SLOT_2, SLOT_3] for t, _ in s))
-    GLOBAL_SCHEDULING_TIMES = sorted(list(set(get_scheduling_label(t) for t in all_full_labels)), key=lambda s_label: int(s_label.split(':')[0]))
-    EXCEL_LABELS = { (day, s_label): f"{day}{i+1}" for day in GIORNI for i, s_label in enumerate(GLOBAL_SCHEDULING_TIMES)}
-    teachers = list(ASSEGNAZIONE_DOCENTI.keys())
-    allowed_teachers_per_class = defaultdict(list)
-    for t,assign in ASSEGNAZIONE_DOCENTI.items():
-        for cl in assign:
-            if cl != 'copertura': allowed_teachers_per_class[cl].append(t)
-    total_copertura_units = sum(hours_to_units(assign.get('copertura', 0)) for assign in ASSEGNAZIONE_DOCENTI.values())
+UNIT = 0.5
+DEFAULT_TIME_LIMIT = 300  # secondi, budget complessivo del solver
+DEFAULT_OUTPUT_FILE = "orario_settimanale.xlsx"
+DAY_COLORS = {"LUN": "FFFFCC", "MAR": "CCFFCC", "MER": "CCE5FF", "GIO": "FFDDCC", "VEN": "E5CCFF"}
+
+# Profili del solver. workers/seed a None: tutte le CPU disponibili / seed casuale.
+# 'reproducible' usa la ricerca parallela deterministica (interleave_search) con un
+# limite di tempo deterministico, così due esecuzioni sulla stessa macchina coincidono.
+SOLVER_PROFILES = {
+    'quick_preview': {'label': "Anteprima rapida", 'time_limit': 60, 'workers': None, 'seed': None, 'linearization_level': 0, 'randomize_search': True, 'deterministic': False},
+    'balanced': {'label': "Bilanciato", 'time_limit': DEFAULT_TIME_LIMIT, 'workers': None, 'seed': None, 'linearization_level': 1, 'randomize_search': True, 'deterministic': False},
+    'thorough': {'label': "Approfondito", 'time_limit': 900, 'workers': None, 'seed': None, 'linearization_level': 2, 'randomize_search': True, 'deterministic': False},
+    'reproducible': {'label': "Riproducibile", 'time_limit': DEFAULT_TIME_LIMIT, 'workers': 8, 'seed': 42, 'linearization_level': 1, 'randomize_search': False, 'deterministic': True},
+}
+DEFAULT_SOLVER_PROFILE = 'balanced'
+def hours_to_units(h): return int(round(h / UNIT))
+def units_to_hours(u): return u * UNIT
+def get_scheduling_label(time_str): return time_str.split('-')[0]
+
+
+def build_copertura_slots(total_units, giorni):
+    """Distribuisce le unità di copertura sui giorni in slot da 1h (o 0.5h) a rotazione tra le 9:00 e le 12:00."""
     copertura_slots = defaultdict(list)
-    if total_copertura_units > 0:
+    if total_units > 0:
         copertura_time_options = ['9:00-10:00', '10:00-11:00', '11:00-12:00', '12:00-13:00']
-        units_per_day = math.ceil(total_copertura_units / len(GIORNI)); remaining = total_copertura_units; time_idx = 0
-        for day in GIORNI:
+        units_per_day = math.ceil(total_units / len(giorni)); remaining = total_units; time_idx = 0
+        for day in giorni:
             units_today = min(units_per_day, remaining)
             while units_today > 0:
                 unit = 2 if units_today >= 2 else 1; time_label = copertura_time_options[time_idx % len(copertura_time_options)]
                 copertura_slots[day].append((get_scheduling_label(time_label), time_label, unit)); units_today -= unit; remaining -= unit; time_idx += 1
             if remaining <= 0: break
+    return copertura_slots
+
+
+def sheet_dataframe(sheet_rows):
+    """
+    DataFrame di un foglio dell'orario (prima riga intestazione, prima colonna indice),
+    identico a quello che pd.read_excel(..., index_col=0) leggerebbe dal file salvato:
+    celle vuote come NaN e colonne interamente vuote come float.
+    """
+    header, rows = sheet_rows[0], sheet_rows[1:]
+    def cell(v): return np.nan if v == "" else v
+    return pd.DataFrame([[cell(v) for v in r[1:]] for r in rows], index=pd.Index([cell(r[0]) for r in rows], name=header[0]),
+                        columns=header[1:])
+
+
+def write_schedule_workbook(sheets, target):
+    """
+    Scrive i fogli `sheets` [(titolo, righe)] in `target` (percorso o file-like) con openpyxl
+    in modalità write-only: le righe vanno su disco man mano, con memoria limitata anche per
+    molti fogli. Ogni riga 'GIORNO<n>' (tutte tranne intestazione, riga vuota e totali) usa
+    uno stile con nome per giorno, creato una sola volta, con il colore di DAY_COLORS.
+    """
+    wb = Workbook(write_only=True)
+    for day, color in DAY_COLORS.items():
+        wb.add_named_style(NamedStyle(name=f"giorno_{day}", font=DEFAULT_FONT, border=DEFAULT_BORDER, fill=PatternFill(start_color=color, end_color=color, fill_type="solid")))
+    for title, rows in sheets:
+        ws = wb.create_sheet(title)
+        ws.append(rows[0])
+        for row_data in rows[1:-2]:
+            style = f"giorno_{row_data[0][:3]}" if row_data[0][:3] in DAY_COLORS else None
+            if style is None:
+                ws.append(row_data)
+                continue
+            cells = []
+            for value in row_data:
+                cell = WriteOnlyCell(ws, value=value)
+                cell.style = style
+                cells.append(cell)
+            ws.append(cells)
+        for row_data in rows[-2:]:
+            ws.append(row_data)
+    wb.save(target)
+
+
+class ScheduleData:
+    """
+    Dati di input pre-elaborati: griglie degli slot per classe, etichette di
+    schedulazione globali, docenti ammessi per classe e slot di copertura.
+    Non dipende dal modello CP-SAT.
+    """
+
+    def __init__(self, config):
+        # --- 1. CONFIGURAZIONE DAI DATI DI INPUT ---
+        self.CLASSI = config['CLASSI']
+        self.GIORNI = config['GIORNI']
+        self.SLOT_1 = config['SLOT_1']
+        self.SLOT_2 = config['SLOT_2']
+        self.SLOT_3 = config['SLOT_3']
+        self.ASSEGNAZIONE_SLOT = config['ASSEGNAZIONE_SLOT']
+        self.ORE_SETTIMANALI_CLASSI = config['ORE_SETTIMANALI_CLASSI']
+        self.MAX_ORE_SETTIMANALI_DOCENTI = config['MAX_ORE_SETTIMANALI_DOCENTI']
+        self.ASSEGNAZIONE_DOCENTI = config['ASSEGNAZIONE_DOCENTI']
+
+        # Carica i vincoli specifici (attivati dalla presenza della chiave)
+        self.GROUP_DAILY_TWO_CLASSES = config.get('GROUP_DAILY_TWO_CLASSES', set())
+        self.HOURS_PER_DAY_PER_CLASS = config.get('HOURS_PER_DAY_PER_CLASS', {})
+        self.ONLY_DAYS = config.get('ONLY_DAYS', {})
+        self.START_AT = config.get('START_AT', {})
+        self.END_AT = config.get('END_AT', {})
+        self.MIN_TWO_HOURS_IF_PRESENT_SPECIFIC = config.get('MIN_TWO_HOURS_IF_PRESENT_SPECIFIC', set())
+        self.ASSEGNAZIONE_DOCENTI_SPECIFICHE = config.get('ASSEGNAZIONE_DOCENTI_SPECIFICHE', [])
+
+        # Carica le flag per i vincoli generici
+        self.USE_MAX_DAILY_HOURS_PER_CLASS = config.get('USE_MAX_DAILY_HOURS_PER_CLASS', True)
+        self.MAX_DAILY_HOURS_PER_CLASS = config.get('MAX_DAILY_HOURS_PER_CLASS', 4.0)
+        self.USE_CONSECUTIVE_BLOCKS = config.get('USE_CONSECUTIVE_BLOCKS', True)
+        self.USE_MAX_ONE_HOLE = config.get('USE_MAX_ONE_HOLE', True)
+        self.USE_OPTIMIZE_HOLES = config.get('USE_OPTIMIZE_HOLES', True)
+
+        # Risoluzione in due fasi: prima una soluzione valida, poi minimizzazione buchi
+        self.USE_TWO_PHASE_SOLVE = config.get('USE_TWO_PHASE_SOLVE', False)
+        self.TWO_PHASE_SPLIT = config.get('TWO_PHASE_SPLIT', 0.2)
+
+        # Parametri del solver: profilo (SOLVER_PROFILES) e override espliciti (None = valore del profilo)
+        self.SOLVER_PROFILE = config.get('SOLVER_PROFILE', DEFAULT_SOLVER_PROFILE)
+        self.SOLVER_TIME_LIMIT = config.get('SOLVER_TIME_LIMIT')
+        self.SOLVER_WORKERS = config.get('SOLVER_WORKERS')
+        self.SOLVER_SEED = config.get('SOLVER_SEED')
+        self.SOLVER_LINEARIZATION_LEVEL = config.get('SOLVER_LINEARIZATION_LEVEL')
+        self.SOLVER_LOG_SEARCH_PROGRESS = config.get('SOLVER_LOG_SEARCH_PROGRESS', True)
 
-    # --- Prevalidazione ---
+        # Portfolio di risoluzioni indipendenti (vedi portfolio.py): 0 o 1 = disattivo
+        self.PORTFOLIO_SIZE = config.get('PORTFOLIO_SIZE', 0)
+        self.PORTFOLIO_PROCESSES = config.get('PORTFOLIO_PROCESSES')
+
+        # Arresto anticipato della minimizzazione buchi (0 o None = regola disattiva)
+        self.EARLY_STOP_RELATIVE_GAP = config.get('EARLY_STOP_RELATIVE_GAP', 0.0)
+        self.EARLY_STOP_OBJECTIVE_TARGET = config.get('EARLY_STOP_OBJECTIVE_TARGET', None)
+        self.EARLY_STOP_NO_IMPROVEMENT_SECONDS = config.get('EARLY_STOP_NO_IMPROVEMENT_SECONDS', 0)
+
+        # Riparazione di un orario esistente (vedi repair.py): peso di ogni lezione spostata e tempo massimo complessivo
+        self.REPAIR_MOVE_WEIGHT = config.get('REPAIR_MOVE_WEIGHT', 20)
+        self.REPAIR_TIME_LIMIT = config.get('REPAIR_TIME_LIMIT', 60)
+
+        # --- 2. PRE-ELABORAZIONE E DEFINIZIONE STRUTTURE DATI ---
+        SLOT_MAP = {"SLOT_1": self.SLOT_1, "SLOT_2": self.SLOT_2, "SLOT_3": self.SLOT_3}
+        self.class_slots = {cl: {day: [(get_scheduling_label(t), t, hours_to_units(d)) for t,d in SLOT_MAP[self.ASSEGNAZIONE_SLOT[cl][day]]] for day in self.GIORNI} for cl in self.CLASSI}
+        all_full_labels = list(set(t for s in [self.SLOT_1, self.SLOT_2, self.SLOT_3] for t, _ in s))
+        self.GLOBAL_SCHEDULING_TIMES = sorted(set(get_scheduling_label(t) for t in all_full_labels), key=lambda s_label: tuple(int(p) for p in s_label.split(':')))
+        self.EXCEL_LABELS = { (day, s_label): f"{day}{i+1}" for day in self.GIORNI for i, s_label in enumerate(self.GLOBAL_SCHEDULING_TIMES)}
+        self.teachers = list(self.ASSEGNAZIONE_DOCENTI.keys())
+        self.allowed_teachers_per_class = defaultdict(list)
+        for t,assign in self.ASSEGNAZIONE_DOCENTI.items():
+            for cl in assign:
+                if cl != 'copertura': self.allowed_teachers_per_class[cl].append(t)
+        self.total_copertura_units = sum(hours_to_units(assign.get('copertura', 0)) for assign in self.ASSEGNAZIONE_DOCENTI.values())
+        self.copertura_slots = build_copertura_slots(self.total_copertura_units, self.GIORNI)
+
+    def teacher_classes(self, t):
+        """Classi (esclusa la copertura) assegnate al docente, nell'ordine della configurazione."""
+        return [cl for cl in self.ASSEGNAZIONE_DOCENTI.get(t, {}) if cl != 'copertura']
+
+
+def prevalidate(data):
+    """Controlla che le ore assegnate coprano le classi e rispettino i massimi docenti, poi i limiti di capacità (capacity_checks). Ritorna la lista degli errori."""
     errors = []
-    for cl in CLASSI:
-        total_assigned = sum(t_assign.get(cl, 0) for t_assign in ASSEGNAZIONE_DOCENTI.values())
-        required = ORE_SETTIMANALI_CLASSI.get(cl, 0)
+    for cl in data.CLASSI:
+        total_assigned = sum(t_assign.get(cl, 0) for t_assign in data.ASSEGNAZIONE_DOCENTI.values())
+        required = data.ORE_SETTIMANALI_CLASSI.get(cl, 0)
         if total_assigned < required:
             errors.append(f"Classe {cl}: ore assegnate totali {total_assigned}h < richieste {required}h")
-    for t, assign in ASSEGNAZIONE_DOCENTI.items():
+    for t, assign in data.ASSEGNAZIONE_DOCENTI.items():
         lesson_hours = sum(v for k,v in assign.items() if k != 'copertura')
         cov = assign.get('copertura', 0)
         total = lesson_hours + cov
-        if total > MAX_ORE_SETTIMANALI_DOCENTI:
-            errors.append(f"Docente {t}: ore totali assegnate {total}h > max settimanale {MAX_ORE_SETTIMANALI_DOCENTI}h")
-    
-    if errors:
-        log_messages.append('PREVALIDAZIONE DATI FALLITA:')
-        log_messages.extend([f' - {e}' for e in errors])
-        return None, None, "\n".join(log_messages), "Prevalidazione fallita, nessuna diagnostica eseguita."
-    else:
-        log_messages.append('Prevalidazione dati OK: assegnazioni coprono le richieste di classe e rispettano i massimi docenti.')
+        if total > data.MAX_ORE_SETTIMANALI_DOCENTI:
+            errors.append(f"Docente {t}: ore totali assegnate {total}h > max settimanale {data.MAX_ORE_SETTIMANALI_DOCENTI}h")
+    if data.SOLVER_PROFILE not in SOLVER_PROFILES:
+        errors.append(f"Profilo solver '{data.SOLVER_PROFILE}' sconosciuto (validi: {', '.join(SOLVER_PROFILES)})")
+    errors.extend(capacity_checks(data))
+    return errors
+
+
+def unavailability_reason(data, t, day, sched_label):
+    """Regola (ONLY_DAYS/START_AT/END_AT) che esclude il docente dall'orario indicato, None se è disponibile."""
+    if t in data.ONLY_DAYS and day not in data.ONLY_DAYS[t]:
+        return "ONLY_DAYS"
+    hour = int(sched_label.split(':')[0])
+    start = data.START_AT.get(t, {}).get(day)
+    if start is not None and hour < start:
+        return f"START_AT {start:g}"
+    end = data.END_AT.get(t, {}).get(day)
+    if end is not None and hour >= end:
+        return f"END_AT {end:g}"
+    return None
+
+
+def _fmt_units(u):
+    return f"{units_to_hours(u):g}h"
+
+
+def pinned_slots(data, teacher, classe, day, start_time, duration):
+    """Indici degli slot della classe fissati da un'assegnazione specifica (stessa regola di add_specific_assignments), oppure il messaggio d'errore."""
+    where = f"Assegnazione specifica {teacher} in {classe} il {day} alle {start_time} per {duration}h"
+    if classe not in data.CLASSI: return None, f"{where}: classe {classe} inesistente"
+    if day not in data.GIORNI: return None, f"{where}: giorno {day} non presente in GIORNI"
+    if classe not in data.teacher_classes(teacher): return None, f"{where}: {teacher} non è assegnato alla classe {classe}"
+    day_slots = data.class_slots[classe][day]
+    starts = [sl for sl, _, _ in day_slots]
+    if start_time not in starts:
+        return None, f"{where}: slot {start_time} assente nella griglia di {classe} il {day} ({data.ASSEGNAZIONE_SLOT[classe][day]}: {', '.join(starts)})"
+    s_idx = starts.index(start_time)
+    u = day_slots[s_idx][2]
+    required_units = hours_to_units(duration)
+    slots_needed = -(-required_units // u)
+    if s_idx + slots_needed > len(day_slots):
+        return None, f"{where}: servono {slots_needed} slot consecutivi ma la giornata di {classe} ne ha solo {len(day_slots) - s_idx} da {start_time}"
+    return list(range(s_idx, s_idx + slots_needed)), None
+
+
+def _max_matching(candidates):
+    """Accoppiamento massimo domanda -> docente (cammini aumentanti). Ritorna {indice domanda: docente}."""
+    match_of_teacher = {}
+
+    def augment(i, seen):
+        for t in candidates[i]:
+            if t in seen: continue
+            seen.add(t)
+            if t not in match_of_teacher or augment(match_of_teacher[t], seen):
+                match_of_teacher[t] = i
+                return True
+        return False
+
+    for i in range(len(candidates)): augment(i, set())
+    return {i: t for t, i in match_of_teacher.items()}
+
+
+def capacity_checks(data):
+    """
+    Controlli analitici di capacità, senza costruire il modello (pochi millisecondi).
+    Ogni errore descrive una condizione che rende l'orario certamente impossibile:
+    ore dei docenti oltre gli slot lasciati liberi da ONLY_DAYS/START_AT/END_AT,
+    lezioni contemporanee più numerose dei docenti disponibili, HOURS_PER_DAY_PER_CLASS
+    non realizzabile e assegnazioni specifiche fuori dalle griglie orarie.
+    """
+    errors = []
+    max_daily = hours_to_units(data.MAX_DAILY_HOURS_PER_CLASS) if data.USE_MAX_DAILY_HOURS_PER_CLASS else None
+
+    # --- Griglia delle classi e ore assegnate ---
+    for cl in data.CLASSI:
+        grid_units = sum(u for day in data.GIORNI for _, _, u in data.class_slots[cl][day])
+        required = hours_to_units(data.ORE_SETTIMANALI_CLASSI.get(cl, 0))
+        if grid_units != required:
+            errors.append(f"Classe {cl}: la griglia oraria settimanale ha {_fmt_units(grid_units)} ma ORE_SETTIMANALI_CLASSI ne richiede {_fmt_units(required)}")
+        assigned = sum(hours_to_units(assign.get(cl, 0)) for assign in data.ASSEGNAZIONE_DOCENTI.values())
+        if assigned > required:
+            errors.append(f"Classe {cl}: ore assegnate totali {_fmt_units(assigned)} > richieste {_fmt_units(required)} (ogni docente deve svolgere esattamente le sue ore)")
+    for t in data.teachers:
+        for cl in data.teacher_classes(t):
+            if cl not in data.CLASSI: errors.append(f"Docente {t}: classe {cl} non presente in CLASSI")
+
+    # --- Assegnazioni specifiche contro le griglie ---
+    pinned = {}
+    pinned_units = defaultdict(int)
+    for teacher, classe, day, start_time, duration in data.ASSEGNAZIONE_DOCENTI_SPECIFICHE:
+        if teacher not in data.ASSEGNAZIONE_DOCENTI:
+            errors.append(f"Assegnazione specifica {teacher} in {classe} il {day} alle {start_time}: docente non presente in ASSEGNAZIONE_DOCENTI")
+            continue
+        slots, error = pinned_slots(data, teacher, classe, day, start_time, duration)
+        if error:
+            errors.append(error)
+            continue
+        for s_idx in slots:
+            sl, fl, u = data.class_slots[classe][day][s_idx]
+            reason = unavailability_reason(data, teacher, day, sl)
+            if reason:
+                errors.append(f"Assegnazione specifica {teacher} in {classe} il {day} alle {start_time}: lo slot {fl} è escluso da {reason} di {teacher}")
+            other = pinned.setdefault((classe, day, s_idx), teacher)
+            if other != teacher:
+                errors.append(f"Assegnazioni specifiche in conflitto: {classe} il {day} alle {fl} fissata sia a {other} sia a {teacher}")
+            pinned_units[(teacher, classe, day)] += u
+    for (t, cl, day), units in pinned_units.items():
+        if max_daily is not None and units > max_daily:
+            errors.append(f"Assegnazioni specifiche di {t} in {cl} il {day}: {_fmt_units(units)} > MAX_DAILY_HOURS_PER_CLASS {data.MAX_DAILY_HOURS_PER_CLASS}h")
+    for t, cl in sorted({(t, cl) for t, cl, _ in pinned_units}):
+        units = sum(pinned_units.get((t, cl, day), 0) for day in data.GIORNI)
+        if units > hours_to_units(data.ASSEGNAZIONE_DOCENTI[t].get(cl, 0)):
+            errors.append(f"Assegnazioni specifiche di {t} in {cl}: {_fmt_units(units)} fissate ma solo {data.ASSEGNAZIONE_DOCENTI[t][cl]}h assegnate")
 
-    # --- 3. MODELLO E VARIABILI ---
-    model = cp_model.CpModel()
-    x = { (cl, day, s_idx, t): model.NewBoolVar(f"x_{cl}_{day}_{s_idx}_{t}") for cl in CLASSI for day in GIORNI for s_idx, _ in enumerate(class_slots[cl][day]) for t in allowed_teachers_per_class[cl] }
-    copertura_vars = { (day, s_idx, t): (model.NewBoolVar(f"cop_{day}_{s_idx}_{t}"), sl, fl, u) for day, slots in copertura_slots.items() for s_idx, (sl, fl, u) in enumerate(slots) for t in teachers if ASSEGNAZIONE_DOCENTI.get(t, {}).get('copertura', 0) > 0 }
-    b = { (t, day, sched_label): model.NewBoolVar(f"b_{t}_{day}_{sched_label}") for t in teachers for day in GIORNI for sched_label in GLOBAL_SCHEDULING_TIMES }
+    # --- Ore di ogni docente contro gli slot rimasti liberi ---
+    available = {(t, day): {sl for sl in data.GLOBAL_SCHEDULING_TIMES if unavailability_reason(data, t, day, sl) is None} for t in data.teachers for day in data.GIORNI}
+    for t in data.teachers:
+        rules = [name for name, rule in (("ONLY_DAYS", data.ONLY_DAYS), ("START_AT", data.START_AT), ("END_AT", data.END_AT)) if t in rule]
+        after = f" dopo {'/'.join(rules)}" if rules else ""
+        exact = data.HOURS_PER_DAY_PER_CLASS.get(t)
+        slot_units = defaultdict(int)  # (giorno, orario) -> unità massime collocabili
+        for cl in data.teacher_classes(t):
+            if cl not in data.CLASSI: continue
+            hours = data.ASSEGNAZIONE_DOCENTI[t][cl]
+            day_caps = []
+            for day in data.GIORNI:
+                free = 0
+                for sl, _, u in data.class_slots[cl][day]:
+                    if sl in available[(t, day)]:
+                        free += u
+                        slot_units[(day, sl)] = max(slot_units[(day, sl)], u)
+                day_caps.append(free if max_daily is None else min(free, max_daily))
+            if t in data.GROUP_DAILY_TWO_CLASSES and len(data.teacher_classes(t)) == 2:
+                missing = [day for day, free in zip(data.GIORNI, day_caps) if free < hours_to_units(1)]
+                if missing:
+                    errors.append(f"Docente {t}: GROUP_DAILY_TWO_CLASSES richiede 1h/giorno in {cl} ma {', '.join(missing)} senza slot liberi{after}")
+            # Ore non divisibili: add_hours_per_day_per_class avvisa e non applica il vincolo alla classe
+            if exact and hours_to_units(hours) % hours_to_units(exact) == 0:
+                exact_units = hours_to_units(exact)
+                if max_daily is not None and exact_units > max_daily:
+                    errors.append(f"Docente {t} in {cl}: HOURS_PER_DAY_PER_CLASS {exact}h/giorno > MAX_DAILY_HOURS_PER_CLASS {data.MAX_DAILY_HOURS_PER_CLASS}h")
+                    continue
+                days_needed = hours_to_units(hours) // exact_units
+                days_free = sum(1 for free in day_caps if free >= exact_units)
+                if days_needed > days_free:
+                    errors.append(f"Docente {t} in {cl}: servono {days_needed} giorni da {exact}h ma solo {days_free} giorni hanno {exact}h libere{after}")
+                continue
+            capacity = sum(day_caps)
+            if hours_to_units(hours) > capacity:
+                limit = f" e MAX_DAILY_HOURS_PER_CLASS {data.MAX_DAILY_HOURS_PER_CLASS}h" if max_daily is not None else ""
+                errors.append(f"Docente {t} in {cl}: {hours}h assegnate ma solo {_fmt_units(capacity)} collocabili{after}{limit}")
+
+        copertura = hours_to_units(data.ASSEGNAZIONE_DOCENTI[t].get('copertura', 0))
+        if copertura:
+            cop_capacity = sum(u for day, slots in data.copertura_slots.items() for sl, _, u in slots if sl in available[(t, day)])
+            if copertura > cop_capacity:
+                errors.append(f"Docente {t}: {_fmt_units(copertura)} di copertura ma solo {_fmt_units(cop_capacity)} di slot di copertura liberi{after}")
+            for day, slots in data.copertura_slots.items():
+                for sl, _, u in slots:
+                    if sl in available[(t, day)]: slot_units[(day, sl)] = max(slot_units[(day, sl)], u)
+        total = sum(hours_to_units(h) for h in data.ASSEGNAZIONE_DOCENTI[t].values())
+        capacity = sum(slot_units.values())
+        if total > capacity:
+            errors.append(f"Docente {t}: {_fmt_units(total)} assegnate tra lezioni e copertura ma solo {_fmt_units(capacity)} di slot disponibili{after}")
+
+    # --- Domanda per orario contro docenti disponibili (accoppiamento) ---
+    copertura_teachers = [t for t in data.teachers if data.ASSEGNAZIONE_DOCENTI[t].get('copertura', 0) > 0]
+    for day in data.GIORNI:
+        demand = defaultdict(list)  # orario -> [(descrizione, docenti candidati)]
+        for cl in data.CLASSI:
+            for s_idx, (sl, fl, _) in enumerate(data.class_slots[cl][day]):
+                teachers = [pinned[(cl, day, s_idx)]] if (cl, day, s_idx) in pinned else data.allowed_teachers_per_class[cl]
+                candidates = [t for t in teachers if sl in available[(t, day)]]
+                if not candidates:
+                    excluded = ', '.join(f"{t} ({unavailability_reason(data, t, day, sl)})" for t in teachers) or "nessuno"
+                    errors.append(f"Classe {cl} {day} {fl}: nessun docente disponibile (docenti della classe: {excluded})")
+                demand[sl].append((cl, candidates))
+        for sl, fl, _ in data.copertura_slots.get(day, []):
+            demand[sl].append(("copertura", [t for t in copertura_teachers if sl in available[(t, day)]]))
+        for sl in data.GLOBAL_SCHEDULING_TIMES:
+            items = [item for item in demand.get(sl, []) if item[1]]
+            candidates = [c for _, c in items]
+            matched = _max_matching(candidates)
+            if len(matched) == len(items): continue
+            # Insieme di Hall: domande raggiungibili da una non coperta con cammini alternanti
+            match_of_teacher = {t: i for i, t in matched.items()}
+            unmatched = next(i for i in range(len(items)) if i not in matched)
+            reached, teachers, frontier = {unmatched}, set(), [unmatched]
+            while frontier:
+                i = frontier.pop()
+                for t in candidates[i]:
+                    if t in teachers: continue
+                    teachers.add(t)
+                    j = match_of_teacher[t]
+                    if j not in reached:
+                        reached.add(j); frontier.append(j)
+            names = [items[i][0] for i in sorted(reached)]
+            errors.append(f"{day} alle {sl}: {len(names)} lezioni contemporanee ({', '.join(names)}) ma i docenti disponibili sono {len(teachers)} ({', '.join(sorted(teachers))})")
+    return errors
+
+
+def solver_settings(data):
+    """Parametri effettivi del solver: il profilo scelto con gli override espliciti della configurazione."""
+    settings = dict(SOLVER_PROFILES[data.SOLVER_PROFILE], profile=data.SOLVER_PROFILE)
+    overrides = {'time_limit': data.SOLVER_TIME_LIMIT, 'workers': data.SOLVER_WORKERS,
+                 'seed': data.SOLVER_SEED, 'linearization_level': data.SOLVER_LINEARIZATION_LEVEL}
+    settings.update({k: v for k, v in overrides.items() if v is not None})
+    if not settings['workers']: settings['workers'] = os.cpu_count() or 8
+    settings['log_search_progress'] = data.SOLVER_LOG_SEARCH_PROGRESS
+    return settings
+
+
+def describe_solver_settings(settings):
+    """Riga di log con i parametri effettivi del solver."""
+    return (f"⚙️ Parametri solver (profilo '{settings['profile']}' - {settings['label']}): "
+            f"tempo max {settings['time_limit']:g}s{' deterministico' if settings['deterministic'] else ''}, "
+            f"worker {settings['workers']}, seed {settings['seed'] if settings['seed'] is not None else 'casuale'}, "
+            f"linearizzazione {settings['linearization_level']}, "
+            f"ricerca {'randomizzata' if settings['randomize_search'] else 'non randomizzata'}")
+
+
+class ScheduleModel:
+    """
+    Modello CP-SAT con le variabili di decisione e un livello di indici costruito
+    una sola volta, letto da tutte le famiglie di vincoli:
+      - busy_vars[(t, day, sched_label)]: variabili (lezioni e copertura) che occupano il docente
+      - class_day_slots[(cl, day)]: slot della classe con le variabili per docente
+      - lesson_terms[(t, cl, day)]: coppie (var, unità, sched_label) delle lezioni del docente nella classe
+      - copertura_terms[(t, day)]: coppie (var, unità) di copertura del docente nel giorno
+    In questo modo ogni vincolo costa quanto le variabili che coinvolge, senza
+    riscansionare classi, slot o il dizionario della copertura.
+    """
+
+    def __init__(self, data, guarded=False):
+        self.data = data
+        d = data
+        # --- 3. MODELLO E VARIABILI ---
+        model = self.model = cp_model.CpModel()
+        self.x = { (cl, day, s_idx, t): model.NewBoolVar(f"x_{cl}_{day}_{s_idx}_{t}") for cl in d.CLASSI for day in d.GIORNI for s_idx, _ in enumerate(d.class_slots[cl][day]) for t in d.allowed_teachers_per_class[cl] }
+        self.copertura_vars = { (day, s_idx, t): (model.NewBoolVar(f"cop_{day}_{s_idx}_{t}"), sl, fl, u) for day, slots in d.copertura_slots.items() for s_idx, (sl, fl, u) in enumerate(slots) for t in d.teachers if d.ASSEGNAZIONE_DOCENTI.get(t, {}).get('copertura', 0) > 0 }
+        self.b = { (t, day, sched_label): model.NewBoolVar(f"b_{t}_{day}_{sched_label}") for t in d.teachers for day in d.GIORNI for sched_label in d.GLOBAL_SCHEDULING_TIMES }
+        self.holes = {}
+        self.objective = None
+        self.moved = None  # assegnazioni spostate rispetto all'orario di partenza (add_repair_objective)
+        self.active_constraints_for_report = []
+        # Modello diagnostico: ogni regola specifica ha un letterale che la attiva (vedi find_conflicting_rules)
+        self.rule_literals = {} if guarded else None
+        # Tempi di costruzione per fase (variabili e famiglie di vincoli), vedi build_model
+        self.timings = {}
+        # Famiglie di vincoli emesse: vincoli del proto [inizio, fine), righe di report e di log (vedi rebuild_model)
+        self.families = {}
+        self.cleared_constraints = 0  # vincoli svuotati dalle ricostruzioni incrementali
+
+        # --- Indici (un solo passaggio su x e copertura) ---
+        self.busy_vars = defaultdict(list)
+        self.class_day_slots = {}
+        self.lesson_terms = defaultdict(list)
+        self.copertura_terms = defaultdict(list)
+        for cl in d.CLASSI:
+            for day in d.GIORNI:
+                slots = []
+                for s_idx, (sl, fl, u) in enumerate(d.class_slots[cl][day]):
+                    vars_by_teacher = {t: self.x[(cl, day, s_idx, t)] for t in d.allowed_teachers_per_class[cl]}
+                    slots.append((s_idx, sl, u, vars_by_teacher))
+                    for t, var in vars_by_teacher.items():
+                        self.busy_vars[(t, day, sl)].append(var)
+                        self.lesson_terms[(t, cl, day)].append((var, u, sl))
+                self.class_day_slots[(cl, day)] = slots
+        for (day, s_idx, t), (var, sl, fl, u) in self.copertura_vars.items():
+            self.busy_vars[(t, day, sl)].append(var)
+            self.copertura_terms[(t, day)].append((var, u))
+
+    # --- Espressioni di supporto basate sugli indici ---
+    def class_units(self, t, cl, day):
+        """Unità insegnate dal docente nella classe nel giorno."""
+        return sum(var * u for var, u, _ in self.lesson_terms.get((t, cl, day), []))
+
+    def teacher_day_terms(self, t, day):
+        """Termini (var * unità) di lezione e copertura del docente nel giorno."""
+        terms = [var * u for cl in self.data.teacher_classes(t) for var, u, _ in self.lesson_terms.get((t, cl, day), [])]
+        terms.extend(var * u for var, u in self.copertura_terms.get((t, day), []))
+        return terms
+
+    def rule_guard(self, name):
+        """Letterale che attiva la regola `name` nel modello diagnostico; None nel modello normale."""
+        if self.rule_literals is None: return None
+        if name not in self.rule_literals:
+            self.rule_literals[name] = self.model.NewBoolVar(f"rule_{len(self.rule_literals)}")
+        return self.rule_literals[name]
+
+    def timed(self, add_family, *args, **kwargs):
+        """
+        Esegue un metodo add_* registrando il tempo in timings['constraints.<famiglia>'] e in
+        families[<famiglia>] l'intervallo dei vincoli aggiunti al proto e le righe di report e
+        di log prodotte (log_messages è il primo argomento, se presente).
+        """
+        name = add_family.__name__[len('add_'):]
+        log_messages = args[0] if args else []
+        first, report_start, log_start = len(self.model.Proto().constraints), len(self.active_constraints_for_report), len(log_messages)
+        start = time.perf_counter()
+        add_family(*args, **kwargs)
+        self.timings[f"constraints.{name}"] = time.perf_counter() - start
+        self.families[name] = {'constraints': (first, len(self.model.Proto().constraints)),
+                               'report': self.active_constraints_for_report[report_start:], 'log': log_messages[log_start:]}
+
+    def copy(self):
+        """Copia con il modello CP-SAT clonato: variabili e indici restano validi (sono indici del
+        proto), mentre hint, obiettivi e vincoli aggiunti alla copia non toccano l'originale."""
+        clone = copy.copy(self)
+        clone.model = self.model.clone()
+        clone.timings = dict(self.timings)
+        clone.families = dict(self.families)
+        clone.active_constraints_for_report = list(self.active_constraints_for_report)
+        return clone
+
+    @staticmethod
+    def enforce(constraint, guard, *literals):
+        """Condiziona il vincolo ai `literals` e al letterale della regola, se presente."""
+        literals = list(literals) + ([guard] if guard is not None else [])
+        if literals: constraint.OnlyEnforceIf(literals)
+        return constraint
+
+    # --- WARM START: HINT DA UNA SOLUZIONE PRECEDENTE ---
+    def apply_hint(self, solution, log_messages, fix=False):
+        """
+        Imposta come AddHint su x e copertura_vars una soluzione precedente (vedi solution.py).
+        Classi, docenti e slot che non esistono più nella configurazione vengono ignorati.
+        Con `fix=True` i valori diventano vincoli: il solver riproduce esattamente la soluzione.
+        Ritorna un dizionario con le statistiche sulla parte di hint sopravvissuta.
+        """
+        d = self.data; model = self.model
+        set_value = (lambda var, value: model.Add(var == value)) if fix else model.AddHint
+        known_classes, known_teachers = set(d.CLASSI), set(d.teachers)
+        missing_classes, missing_teachers = set(), set()
+        hinted_lessons = {}
+        invalid = 0
+        for cl, day, sl, t in solution.get('lessons', []):
+            if cl not in known_classes: missing_classes.add(cl); continue
+            if t not in known_teachers: missing_teachers.add(t); continue
+            hinted_lessons.setdefault((cl, day, sl), t)
+
+        applied = 0; hinted_slots = 0; total_slots = 0
+        for (cl, day), slots in self.class_day_slots.items():
+            for s_idx, sl, u, vars_by_teacher in slots:
+                total_slots += 1
+                t = hinted_lessons.pop((cl, day, sl), None)
+                if t is None: continue
+                if t not in vars_by_teacher: invalid += 1; continue
+                for tt, var in vars_by_teacher.items(): set_value(var, tt == t)
+                applied += 1; hinted_slots += 1
+        invalid += len(hinted_lessons)  # slot non più presenti nella griglia della classe
+
+        # Copertura: ogni voce (giorno, orario, docente) occupa il primo slot libero con la stessa etichetta.
+        # Da fissare conta invece quante volte il docente copre l'etichetta: gli slot con la stessa
+        # etichetta possono differire nella durata e una parte della soluzione li assegnerebbe in un altro ordine.
+        free_copertura = defaultdict(list)
+        for day, slots in d.copertura_slots.items():
+            for s_idx, (sl, fl, u) in enumerate(slots): free_copertura[(day, sl)].append(s_idx)
+        fixed_copertura = Counter()
+        for day, sl, t in solution.get('copertura', []):
+            if t not in known_teachers: missing_teachers.add(t); continue
+            candidates = [s_idx for s_idx in free_copertura.get((day, sl), []) if (day, s_idx, t) in self.copertura_vars]
+            if not candidates: invalid += 1; continue
+            s_idx = candidates[0]; free_copertura[(day, sl)].remove(s_idx)
+            if fix: fixed_copertura[(day, sl, t)] += 1
+            else:
+                for tt in d.teachers:
+                    if (day, s_idx, tt) in self.copertura_vars: set_value(self.copertura_vars[(day, s_idx, tt)][0], tt == t)
+            applied += 1
+        if fixed_copertura:
+            by_label = defaultdict(list)
+            for (day, s_idx, t), (var, sl, fl, u) in self.copertura_vars.items(): by_label[(day, sl, t)].append(var)
+            for key, count in fixed_copertura.items(): model.Add(sum(by_label[key]) >= count)
+
+        total = len(solution.get('lessons', [])) + len(solution.get('copertura', []))
+        pct = 100.0 * applied / total if total else 0.0
+        if fix: log_messages.append(f"🔒 Soluzione fissata: {applied}/{total} assegnazioni ({pct:.0f}%), slot classe fissati {hinted_slots}/{total_slots}.")
+        else: log_messages.append(f"🔁 Warm start: applicate {applied}/{total} assegnazioni della soluzione precedente ({pct:.0f}%), slot classe suggeriti {hinted_slots}/{total_slots}.")
+        if missing_teachers: log_messages.append(f"  - Ignorati docenti non presenti nella configurazione: {sorted(missing_teachers)}")
+        if missing_classes: log_messages.append(f"  - Ignorate classi non presenti nella configurazione: {sorted(missing_classes)}")
+        if invalid: log_messages.append(f"  - Ignorate {invalid} assegnazioni non più compatibili con slot o assegnazioni docenti.")
+        return {'applied': applied, 'total': total, 'hinted_slots': hinted_slots, 'total_slots': total_slots,
+                'missing_teachers': sorted(missing_teachers), 'missing_classes': sorted(missing_classes), 'invalid': invalid}
+
+    def extract_solution(self, solver):
+        """Legge dal solver le assegnazioni risolte nel formato portabile di solution.py."""
+        return Schedule.from_solver(self, solver).to_solution()
 
     # --- 4. APPLICAZIONE DEI VINCOLI FONDAMENTALI ---
-    for t, day, sched_label in b:
-        vars_at_time = [x.get((cl, day, s_idx, t)) for cl in CLASSI for s_idx, (s_label, fl, u) in enumerate(class_slots[cl][day]) if s_label == sched_label]
-        vars_at_time.extend(var for (d, s_idx, tt), (var, s_label, fl, u) in copertura_vars.items() if d == day and tt == t and s_label == sched_label)
-        vars_at_time = [v for v in vars_at_time if v is not None]
-        model.Add(sum(vars_at_time) <= 1)
-        if vars_at_time:
-            model.Add(sum(vars_at_time) >= 1).OnlyEnforceIf(b[(t, day, sched_label)])
-            model.Add(sum(vars_at_time) == 0).OnlyEnforceIf(b[(t, day, sched_label)].Not())
-        else: model.Add(b[(t, day, sched_label)] == 0)
-
-    for cl in CLASSI:
-        for day in GIORNI:
-            for s_idx, _ in enumerate(class_slots[cl][day]): model.Add(sum(x[(cl, day, s_idx, t)] for t in allowed_teachers_per_class[cl]) == 1)
-
-    for cl in CLASSI:
-        model.Add(sum(x[(cl, day, s_idx, t)] * u for day in GIORNI for s_idx, (sl, fl, u) in enumerate(class_slots[cl][day]) for t in allowed_teachers_per_class[cl]) == hours_to_units(ORE_SETTIMANALI_CLASSI[cl]))
-
-    for t, assign in ASSEGNAZIONE_DOCENTI.items():
-        for cl, hours in assign.items():
-            if cl != 'copertura': model.Add(sum(x.get((cl, day, s_idx, t), 0) * u for day in GIORNI for s_idx, (sl, fl, u) in enumerate(class_slots[cl][day])) == hours_to_units(hours))
-
-    if total_copertura_units > 0:
-        for day, slots in copertura_slots.items():
-            for s_idx, _ in enumerate(slots): model.Add(sum(copertura_vars[(day, s_idx, t)][0] for t in teachers if (day, s_idx, t) in copertura_vars) == 1)
-        for t in teachers:
-            needed = hours_to_units(ASSEGNAZIONE_DOCENTI.get(t, {}).get('copertura', 0))
-            model.Add(sum(var * u for (d, s_idx, tt), (var, sl, fl, u) in copertura_vars.items() if tt == t) == needed)
+    def add_busy_links(self):
+        model = self.model
+        for key, busy in self.b.items():
+            vars_at_time = self.busy_vars.get(key, [])
+            model.Add(sum(vars_at_time) <= 1)
+            if vars_at_time:
+                model.Add(sum(vars_at_time) >= 1).OnlyEnforceIf(busy)
+                model.Add(sum(vars_at_time) == 0).OnlyEnforceIf(busy.Not())
+            else: model.Add(busy == 0)
 
-    # --- 5. VINCOLI DI QUALITA' E SPECIFICI ---
-    log_messages.append("\nApplicazione vincoli...")
-    active_constraints_for_report = []
+    def add_class_coverage(self):
+        d = self.data; model = self.model
+        for cl in d.CLASSI:
+            for day in d.GIORNI:
+                for s_idx, sl, u, vars_by_teacher in self.class_day_slots[(cl, day)]: model.Add(sum(vars_by_teacher.values()) == 1)
 
-    # --- VINCOLI GENERICI ---
-    if USE_MAX_DAILY_HOURS_PER_CLASS:
-        log_messages.append(f"- Vincolo ATTIVO: Massimo {MAX_DAILY_HOURS_PER_CLASS} ore per docente per classe al giorno")
-        for t, assignments in ASSEGNAZIONE_DOCENTI.items():
-            for cl in assignments:
-                if cl == 'copertura': continue
-                for day in GIORNI:
-                    daily_class_units = sum(x.get((cl, day, s_idx, t), 0) * u for s_idx, (sl, fl, u) in enumerate(class_slots[cl][day]))
-                    model.Add(daily_class_units <= hours_to_units(MAX_DAILY_HOURS_PER_CLASS))
+        for cl in d.CLASSI:
+            model.Add(sum(var * u for day in d.GIORNI for s_idx, sl, u, vars_by_teacher in self.class_day_slots[(cl, day)] for var in vars_by_teacher.values()) == hours_to_units(d.ORE_SETTIMANALI_CLASSI[cl]))
 
-    # --- VINCOLI SPECIFICI (attivati dalla presenza dei dati) ---
-    if HOURS_PER_DAY_PER_CLASS:
-        active_constraints_for_report.append(f"Ore giornaliere per classe per {list(HOURS_PER_DAY_PER_CLASS.keys())}")
-        for t, exact_hours in HOURS_PER_DAY_PER_CLASS.items():
+    def add_teacher_class_hours(self):
+        d = self.data; model = self.model
+        for t, assign in d.ASSEGNAZIONE_DOCENTI.items():
+            for cl, hours in assign.items():
+                if cl != 'copertura': model.Add(sum(var * u for day in d.GIORNI for var, u, _ in self.lesson_terms.get((t, cl, day), [])) == hours_to_units(hours))
+
+    def add_copertura(self):
+        d = self.data; model = self.model
+        if d.total_copertura_units > 0:
+            for day, slots in d.copertura_slots.items():
+                for s_idx, _ in enumerate(slots): model.Add(sum(self.copertura_vars[(day, s_idx, t)][0] for t in d.teachers if (day, s_idx, t) in self.copertura_vars) == 1)
+            for t in d.teachers:
+                needed = hours_to_units(d.ASSEGNAZIONE_DOCENTI.get(t, {}).get('copertura', 0))
+                model.Add(sum(var * u for day in d.GIORNI for var, u in self.copertura_terms.get((t, day), [])) == needed)
+
+    # --- 5. VINCOLI DI QUALITA' E SPECIFICI ---
+    def add_max_daily_hours_per_class(self, log_messages):
+        d = self.data; model = self.model
+        log_messages.append(f"- Vincolo ATTIVO: Massimo {d.MAX_DAILY_HOURS_PER_CLASS} ore per docente per classe al giorno")
+        for t in d.teachers:
+            guard = self.rule_guard(f"USE_MAX_DAILY_HOURS_PER_CLASS: {t} max {d.MAX_DAILY_HOURS_PER_CLASS}h/giorno nella stessa classe")
+            for cl in d.teacher_classes(t):
+                for day in d.GIORNI:
+                    self.enforce(model.Add(self.class_units(t, cl, day) <= hours_to_units(d.MAX_DAILY_HOURS_PER_CLASS)), guard)
+
+    def add_hours_per_day_per_class(self, log_messages):
+        d = self.data; model = self.model
+        self.active_constraints_for_report.append(f"Ore giornaliere per classe per {list(d.HOURS_PER_DAY_PER_CLASS.keys())}")
+        for t, exact_hours in d.HOURS_PER_DAY_PER_CLASS.items():
             # Applica il vincolo solo alle classi a cui il docente è effettivamente assegnato
-            teacher_assignments = ASSEGNAZIONE_DOCENTI.get(t, {})
+            teacher_assignments = d.ASSEGNAZIONE_DOCENTI.get(t, {})
             for cl in teacher_assignments:
                 if cl == 'copertura': continue  # Salta la copertura
                 total_hours_for_class = teacher_assignments[cl]
-                
+
                 # Verifica che sia matematicamente possibile
                 if total_hours_for_class % exact_hours != 0:
                     log_messages.append(f"⚠️  ATTENZIONE: {t} ha {total_hours_for_class}h assegnate in {cl} ma vincolo di {exact_hours}h/giorno. Non è divisibile!")
                     continue
-                
-                for day in GIORNI: 
-                    daily_units = sum(x.get((cl, day, s_idx, t), 0) * u for s_idx, (sl, fl, u) in enumerate(class_slots[cl][day]))
+
+                guard = self.rule_guard(f"HOURS_PER_DAY_PER_CLASS: {t} {exact_hours}h/giorno in {cl}")
+                for day in d.GIORNI:
+                    daily_units = self.class_units(t, cl, day)
                     # Vincolo di ore: 0 o exact_hours
                     is_present = model.NewBoolVar(f"present_{t}_{cl}_{day}")
-                    model.Add(daily_units >= hours_to_units(exact_hours)).OnlyEnforceIf(is_present)
-                    model.Add(daily_units <= hours_to_units(exact_hours)).OnlyEnforceIf(is_present)
-                    model.Add(daily_units == 0).OnlyEnforceIf(is_present.Not())
-    
-    if ONLY_DAYS:
-        active_constraints_for_report.append(f"Regole di giorni consentiti per {list(ONLY_DAYS.keys())}")
-        for teacher, allowed_days in ONLY_DAYS.items():
-            for day in set(GIORNI) - allowed_days:
-                for sched_label in GLOBAL_SCHEDULING_TIMES:
-                    if (teacher, day, sched_label) in b: model.Add(b[(teacher, day, sched_label)] == 0)
-    
-    if GROUP_DAILY_TWO_CLASSES:
-        active_constraints_for_report.append(f"Almeno 1h/giorno in entrambe le classi per {GROUP_DAILY_TWO_CLASSES}")
-        for t in GROUP_DAILY_TWO_CLASSES:
-            classes = [c for c in ASSEGNAZIONE_DOCENTI.get(t, {}) if c != 'copertura']
+                    self.enforce(model.Add(daily_units >= hours_to_units(exact_hours)), guard, is_present)
+                    self.enforce(model.Add(daily_units <= hours_to_units(exact_hours)), guard, is_present)
+                    self.enforce(model.Add(daily_units == 0), guard, is_present.Not())
+
+    def add_only_days(self):
+        d = self.data; model = self.model
+        self.active_constraints_for_report.append(f"Regole di giorni consentiti per {list(d.ONLY_DAYS.keys())}")
+        for teacher, allowed_days in d.ONLY_DAYS.items():
+            guard = self.rule_guard(f"ONLY_DAYS: {teacher} solo {[day for day in d.GIORNI if day in allowed_days]}")
+            for day in [day for day in d.GIORNI if day not in allowed_days]:
+                for sched_label in d.GLOBAL_SCHEDULING_TIMES:
+                    if (teacher, day, sched_label) in self.b: self.enforce(model.Add(self.b[(teacher, day, sched_label)] == 0), guard)
+
+    def add_group_daily_two_classes(self):
+        d = self.data; model = self.model
+        self.active_constraints_for_report.append(f"Almeno 1h/giorno in entrambe le classi per {d.GROUP_DAILY_TWO_CLASSES}")
+        for t in sorted(d.GROUP_DAILY_TWO_CLASSES):
+            classes = d.teacher_classes(t)
             if len(classes) == 2:
-                for day in GIORNI:
-                    for cl in classes: model.Add(sum(x.get((cl, day, s_idx, t), 0) * u for s_idx, (sl, fl, u) in enumerate(class_slots[cl][day])) >= hours_to_units(1))
-    
-    if START_AT:
-        active_constraints_for_report.append(f"Regole di inizio orario per {list(START_AT.keys())}")
-        for teacher, rules in START_AT.items():
+                guard = self.rule_guard(f"GROUP_DAILY_TWO_CLASSES: {t} almeno 1h/giorno in {classes[0]} e {classes[1]}")
+                for day in d.GIORNI:
+                    for cl in classes: self.enforce(model.Add(self.class_units(t, cl, day) >= hours_to_units(1)), guard)
+
+    def add_start_at(self):
+        d = self.data; model = self.model
+        self.active_constraints_for_report.append(f"Regole di inizio orario per {list(d.START_AT.keys())}")
+        for teacher, rules in d.START_AT.items():
             for day, start_hour in rules.items():
-                for sched_label in GLOBAL_SCHEDULING_TIMES:
+                guard = self.rule_guard(f"START_AT: {teacher} il {day} non prima delle {start_hour}")
+                for sched_label in d.GLOBAL_SCHEDULING_TIMES:
                     if int(sched_label.split(':')[0]) < start_hour:
-                        if (teacher, day, sched_label) in b: model.Add(b[(teacher, day, sched_label)] == 0)
-    
-    if END_AT:
-        active_constraints_for_report.append(f"Regole di fine orario per {list(END_AT.keys())}")
-        for teacher, rules in END_AT.items():
+                        if (teacher, day, sched_label) in self.b: self.enforce(model.Add(self.b[(teacher, day, sched_label)] == 0), guard)
+
+    def add_end_at(self):
+        d = self.data; model = self.model
+        self.active_constraints_for_report.append(f"Regole di fine orario per {list(d.END_AT.keys())}")
+        for teacher, rules in d.END_AT.items():
             for day, end_hour in rules.items():
-                for sched_label in GLOBAL_SCHEDULING_TIMES:
+                guard = self.rule_guard(f"END_AT: {teacher} il {day} entro le {end_hour}")
+                for sched_label in d.GLOBAL_SCHEDULING_TIMES:
                     if int(sched_label.split(':')[0]) >= end_hour:
-                        if (teacher, day, sched_label) in b: model.Add(b[(teacher, day, sched_label)] == 0)
-
-    if MIN_TWO_HOURS_IF_PRESENT_SPECIFIC:
-        active_constraints_for_report.append(f"Minimo 2 ore/giorno se presente per {MIN_TWO_HOURS_IF_PRESENT_SPECIFIC}")
-        for t in MIN_TWO_HOURS_IF_PRESENT_SPECIFIC:
-            for day in GIORNI:
-                daily_units_for_teacher = model.NewIntVar(0, hours_to_units(MAX_ORE_SETTIMANALI_DOCENTI), f'daily_units_teach_{t}_{day}')
-                class_vars_for_day = [x.get((cl, day, s_idx, t), 0) * u for cl in ASSEGNAZIONE_DOCENTI.get(t, {}) if cl != 'copertura' for s_idx, (_, _, u) in enumerate(class_slots[cl][day])]
-                copertura_vars_for_day = [var * u for (d, s_idx, tt), (var, sl, fl, u) in copertura_vars.items() if tt == t and d == day]
-                all_units_for_day = class_vars_for_day + copertura_vars_for_day
+                        if (teacher, day, sched_label) in self.b: self.enforce(model.Add(self.b[(teacher, day, sched_label)] == 0), guard)
+
+    def add_min_two_hours_if_present(self):
+        d = self.data; model = self.model
+        self.active_constraints_for_report.append(f"Minimo 2 ore/giorno se presente per {d.MIN_TWO_HOURS_IF_PRESENT_SPECIFIC}")
+        for t in sorted(d.MIN_TWO_HOURS_IF_PRESENT_SPECIFIC):
+            guard = self.rule_guard(f"MIN_TWO_HOURS_IF_PRESENT_SPECIFIC: {t} almeno 2h nei giorni di presenza")
+            for day in d.GIORNI:
+                daily_units_for_teacher = model.NewIntVar(0, hours_to_units(d.MAX_ORE_SETTIMANALI_DOCENTI), f'daily_units_teach_{t}_{day}')
+                all_units_for_day = self.teacher_day_terms(t, day)
                 if all_units_for_day:
                     model.Add(daily_units_for_teacher == sum(all_units_for_day))
                     is_present_today = model.NewBoolVar(f'is_present_today_{t}_{day}')
                     model.Add(daily_units_for_teacher > 0).OnlyEnforceIf(is_present_today)
                     model.Add(daily_units_for_teacher == 0).OnlyEnforceIf(is_present_today.Not())
-                    model.Add(daily_units_for_teacher >= hours_to_units(2)).OnlyEnforceIf(is_present_today)
+                    self.enforce(model.Add(daily_units_for_teacher >= hours_to_units(2)), guard, is_present_today)
 
-    if ASSEGNAZIONE_DOCENTI_SPECIFICHE:
-        active_constraints_for_report.append(f"Assegnazioni specifiche per {len(ASSEGNAZIONE_DOCENTI_SPECIFICHE)} vincoli")
-        for assignment in ASSEGNAZIONE_DOCENTI_SPECIFICHE:
+    def add_specific_assignments(self, log_messages):
+        d = self.data; model = self.model; x = self.x
+        self.active_constraints_for_report.append(f"Assegnazioni specifiche per {len(d.ASSEGNAZIONE_DOCENTI_SPECIFICHE)} vincoli")
+        for assignment in d.ASSEGNAZIONE_DOCENTI_SPECIFICHE:
             teacher, classe, day, start_time, duration = assignment
-            
+            guard = self.rule_guard(f"ASSEGNAZIONE_DOCENTI_SPECIFICHE: {teacher} in {classe} il {day} alle {start_time} per {duration}h")
+
             # Verifica che il docente sia assegnato alla classe specificata
-            if teacher not in ASSEGNAZIONE_DOCENTI or classe not in ASSEGNAZIONE_DOCENTI[teacher]:
+            if teacher not in d.ASSEGNAZIONE_DOCENTI or classe not in d.ASSEGNAZIONE_DOCENTI[teacher]:
                 log_messages.append(f"AVVISO: {teacher} non è assegnato alla classe {classe} - assegnazione specifica ignorata")
                 continue
-            
-            # Trova l'indice dell'orario di inizio nel sistema di scheduling globale  
-            if start_time not in GLOBAL_SCHEDULING_TIMES:
+
+            # Trova l'indice dell'orario di inizio nel sistema di scheduling globale
+            if start_time not in d.GLOBAL_SCHEDULING_TIMES:
                 log_messages.append(f"AVVISO: Orario {start_time} non trovato per {teacher} in {classe} - assegnazione specifica ignorata")
                 continue
-                
-            start_idx = GLOBAL_SCHEDULING_TIMES.index(start_time)
-            
+
             # Calcola gli slot necessari per la durata richiesta
             required_units = hours_to_units(duration)
-            
+
             # Trova lo slot che corrisponde all'orario di inizio nella classe
             class_slot_found = False
-            for s_idx, (sl, fl, u) in enumerate(class_slots[classe][day]):
+            day_slots = d.class_slots[classe][day]
+            for s_idx, (sl, fl, u) in enumerate(day_slots):
                 if sl == start_time:
                     # Questo è lo slot di inizio richiesto
                     class_slot_found = True
-                    
+
                     # Calcola quanti slot consecutivi servono per la durata
                     slots_needed = required_units // u if required_units % u == 0 else (required_units // u) + 1
-                    
+
                     # Verifica che ci siano abbastanza slot consecutivi disponibili
-                    if s_idx + slots_needed <= len(class_slots[classe][day]):
+                    if s_idx + slots_needed <= len(day_slots):
                         # Forza l'utilizzo degli slot richiesti
                         total_units_used = 0
                         for i in range(slots_needed):
                             slot_idx = s_idx + i
-                            if slot_idx < len(class_slots[classe][day]):
-                                _, _, slot_units = class_slots[classe][day][slot_idx]
+                            if slot_idx < len(day_slots):
+                                _, _, slot_units = day_slots[slot_idx]
                                 if (classe, day, slot_idx, teacher) in x:
-                                    model.Add(x[(classe, day, slot_idx, teacher)] == 1)
+                                    self.enforce(model.Add(x[(classe, day, slot_idx, teacher)] == 1), guard)
                                     total_units_used += slot_units
                                 else:
                                     log_messages.append(f"AVVISO: Variabile x[{classe}, {day}, {slot_idx}, {teacher}] non trovata")
-                        
+
                         # Assicurati che il totale delle unità usate corrisponda alla durata richiesta
                         if total_units_used >= required_units:
                             log_messages.append(f"INFO: Assegnazione specifica applicata: {teacher} in {classe} il {day} alle {start_time} per {duration}h")
@@ -266,21 +759,22 @@ def generate_schedule(config):
                             log_messages.append(f"AVVISO: Unità insufficienti per {teacher} in {classe} il {day} alle {start_time}")
                     else:
                         log_messages.append(f"AVVISO: Slot consecutivi insufficienti per {teacher} in {classe} il {day} alle {start_time}")
-                    
+
                     break
-            
+
             if not class_slot_found:
                 log_messages.append(f"AVVISO: Slot {start_time} non trovato per classe {classe} nel giorno {day}")
 
-    # --- ALTRI VINCOLI GENERICI ---
-    if USE_CONSECUTIVE_BLOCKS:
+    def add_consecutive_blocks(self, log_messages):
+        d = self.data; model = self.model
         log_messages.append("- Vincolo ATTIVO: Blocchi di 2 o 3 ore in una classe devono essere consecutivi")
-        for t in teachers:
-            if t in HOURS_PER_DAY_PER_CLASS and HOURS_PER_DAY_PER_CLASS[t] <= 1: continue
-            for cl in ASSEGNAZIONE_DOCENTI.get(t, {}):
-                if cl == 'copertura': continue
-                for day in GIORNI:
-                    daily_class_units = sum(x.get((cl, day, s_idx, t), 0) * u for s_idx, (sl, fl, u) in enumerate(class_slots[cl][day]))
+        for t in d.teachers:
+            if t in d.HOURS_PER_DAY_PER_CLASS and d.HOURS_PER_DAY_PER_CLASS[t] <= 1: continue
+            guard = self.rule_guard(f"USE_CONSECUTIVE_BLOCKS: {t} blocchi di 2-3h consecutivi")
+            for cl in d.teacher_classes(t):
+                for day in d.GIORNI:
+                    terms = self.lesson_terms.get((t, cl, day), [])
+                    daily_class_units = sum(var * u for var, u, _ in terms)
                     is_2_or_3_hours = model.NewBoolVar(f'is_2_or_3h_{t}_{cl}_{day}')
                     is_exactly_two = model.NewBoolVar(f'exactly_2h_{t}_{cl}_{day}')
                     is_exactly_three = model.NewBoolVar(f'exactly_3h_{t}_{cl}_{day}')
@@ -291,10 +785,12 @@ def generate_schedule(config):
                     model.AddBoolOr([is_exactly_two, is_exactly_three]).OnlyEnforceIf(is_2_or_3_hours)
                     model.AddImplication(is_2_or_3_hours.Not(), is_exactly_two.Not())
                     model.AddImplication(is_2_or_3_hours.Not(), is_exactly_three.Not())
+                    vars_by_label = defaultdict(list)
+                    for var, u, s_label in terms: vars_by_label[s_label].append(var)
                     teaches_this_class = []
-                    for sl in GLOBAL_SCHEDULING_TIMES:
+                    for sl in d.GLOBAL_SCHEDULING_TIMES:
                         presence_in_slot = model.NewBoolVar(f'presence_{t}_{cl}_{day}_{sl.replace(":", "")}')
-                        vars_in_slot = [x.get((cl, day, s_idx, t)) for s_idx, (s_label, _, _) in enumerate(class_slots[cl][day]) if s_label == sl]
+                        vars_in_slot = vars_by_label.get(sl)
                         if not vars_in_slot: model.Add(presence_in_slot == 0)
                         else:
                             model.Add(sum(vars_in_slot) >= 1).OnlyEnforceIf(presence_in_slot)
@@ -306,52 +802,56 @@ def generate_schedule(config):
                         model.AddBoolAnd([teaches_this_class[i], teaches_this_class[i-1].Not()]).OnlyEnforceIf(starts[i])
                         model.AddBoolOr([starts[i], teaches_this_class[i].Not(), teaches_this_class[i-1]])
                     num_class_blocks = sum(starts)
-                    model.Add(num_class_blocks <= 1).OnlyEnforceIf(is_2_or_3_hours)
+                    self.enforce(model.Add(num_class_blocks <= 1), guard, is_2_or_3_hours)
 
-    if USE_MAX_ONE_HOLE:
+    def add_max_one_hole(self, log_messages):
+        d = self.data; model = self.model
         log_messages.append("- Vincolo ATTIVO: Continuità oraria flessibile (max 1 buco) per tutti i docenti")
-        for t in teachers:
-            for day in GIORNI:
-                works_at_time = [b[(t, day, sched_label)] for sched_label in GLOBAL_SCHEDULING_TIMES]
-                starts = [model.NewBoolVar(f'start_{t}_{day}_{i}') for i in range(len(GLOBAL_SCHEDULING_TIMES))]
+        for t in d.teachers:
+            guard = self.rule_guard(f"USE_MAX_ONE_HOLE: {t} max 1 buco al giorno")
+            for day in d.GIORNI:
+                works_at_time = [self.b[(t, day, sched_label)] for sched_label in d.GLOBAL_SCHEDULING_TIMES]
+                starts = [model.NewBoolVar(f'start_{t}_{day}_{i}') for i in range(len(d.GLOBAL_SCHEDULING_TIMES))]
                 model.Add(starts[0] == works_at_time[0])
-                for i in range(1, len(GLOBAL_SCHEDULING_TIMES)):
+                for i in range(1, len(d.GLOBAL_SCHEDULING_TIMES)):
                     model.AddBoolAnd([works_at_time[i], works_at_time[i-1].Not()]).OnlyEnforceIf(starts[i])
                     model.AddBoolOr([starts[i], works_at_time[i].Not(), works_at_time[i-1]])
-                model.Add(sum(starts) <= 2)
+                self.enforce(model.Add(sum(starts) <= 2), guard)
 
     # --- 6. OBIETTIVO DI OTTIMIZZAZIONE (MINIMIZZAZIONE BUCHI) ---
-    # Le variabili holes vengono SEMPRE create per l'analisi e visualizzazione
-    log_messages.append("- Creazione variabili per analisi buchi orari")
-    holes = {}
-    for t in teachers:
-        for day in GIORNI:
-            works_at_time = [b[(t, day, sl)] for sl in GLOBAL_SCHEDULING_TIMES]
-            has_worked_before = [model.NewBoolVar(f'hwb_{t}_{day}_{i}') for i in range(len(GLOBAL_SCHEDULING_TIMES))]
-            model.Add(has_worked_before[0] == 0)
-            for i in range(1, len(GLOBAL_SCHEDULING_TIMES)):
-                model.AddBoolOr([has_worked_before[i-1], works_at_time[i-1]]).OnlyEnforceIf(has_worked_before[i])
-                model.AddImplication(has_worked_before[i].Not(), has_worked_before[i-1].Not())
-                model.AddImplication(has_worked_before[i].Not(), works_at_time[i-1].Not())
-            will_work_after = [model.NewBoolVar(f'wwa_{t}_{day}_{i}') for i in range(len(GLOBAL_SCHEDULING_TIMES))]
-            model.Add(will_work_after[-1] == 0)
-            for i in range(len(GLOBAL_SCHEDULING_TIMES) - 2, -1, -1):
-                model.AddBoolOr([will_work_after[i+1], works_at_time[i+1]]).OnlyEnforceIf(will_work_after[i])
-                model.AddImplication(will_work_after[i].Not(), will_work_after[i+1].Not())
-                model.AddImplication(will_work_after[i].Not(), works_at_time[i+1].Not())
-            for i, sl in enumerate(GLOBAL_SCHEDULING_TIMES):
-                h = model.NewBoolVar(f'h_{t}_{day}_{i}')
-                model.AddBoolAnd([works_at_time[i].Not(), has_worked_before[i], will_work_after[i]]).OnlyEnforceIf(h)
-                model.AddBoolOr([h, works_at_time[i], has_worked_before[i].Not(), will_work_after[i].Not()])
-                holes[(t, day, sl)] = h
+    def add_holes(self, log_messages):
+        # Le variabili holes vengono SEMPRE create per l'analisi e visualizzazione
+        d = self.data; model = self.model
+        log_messages.append("- Creazione variabili per analisi buchi orari")
+        n_times = len(d.GLOBAL_SCHEDULING_TIMES)
+        for t in d.teachers:
+            for day in d.GIORNI:
+                works_at_time = [self.b[(t, day, sl)] for sl in d.GLOBAL_SCHEDULING_TIMES]
+                has_worked_before = [model.NewBoolVar(f'hwb_{t}_{day}_{i}') for i in range(n_times)]
+                model.Add(has_worked_before[0] == 0)
+                for i in range(1, n_times):
+                    model.AddBoolOr([has_worked_before[i-1], works_at_time[i-1]]).OnlyEnforceIf(has_worked_before[i])
+                    model.AddImplication(has_worked_before[i].Not(), has_worked_before[i-1].Not())
+                    model.AddImplication(has_worked_before[i].Not(), works_at_time[i-1].Not())
+                will_work_after = [model.NewBoolVar(f'wwa_{t}_{day}_{i}') for i in range(n_times)]
+                model.Add(will_work_after[-1] == 0)
+                for i in range(n_times - 2, -1, -1):
+                    model.AddBoolOr([will_work_after[i+1], works_at_time[i+1]]).OnlyEnforceIf(will_work_after[i])
+                    model.AddImplication(will_work_after[i].Not(), will_work_after[i+1].Not())
+                    model.AddImplication(will_work_after[i].Not(), works_at_time[i+1].Not())
+                for i, sl in enumerate(d.GLOBAL_SCHEDULING_TIMES):
+                    h = model.NewBoolVar(f'h_{t}_{day}_{i}')
+                    model.AddBoolAnd([works_at_time[i].Not(), has_worked_before[i], will_work_after[i]]).OnlyEnforceIf(h)
+                    model.AddBoolOr([h, works_at_time[i], has_worked_before[i].Not(), will_work_after[i].Not()])
+                    self.holes[(t, day, sl)] = h
 
-    # Ottimizzazione condizionale
-    if USE_OPTIMIZE_HOLES:
+    def add_hole_objective(self, log_messages, minimize=True):
+        d = self.data; model = self.model
         log_messages.append("- Ottimizzazione ATTIVA: Minimizzazione buchi orari")
         total_penalty = []
-        for t in teachers:
-            for day in GIORNI:
-                daily_hole_units = sum(holes[(t, day, sl)] for sl in GLOBAL_SCHEDULING_TIMES)
+        for t in d.teachers:
+            for day in d.GIORNI:
+                daily_hole_units = sum(self.holes[(t, day, sl)] for sl in d.GLOBAL_SCHEDULING_TIMES)
                 is_zero_holes = model.NewBoolVar(f'is_zero_h_{t}_{day}'); model.Add(daily_hole_units == 0).OnlyEnforceIf(is_zero_holes); model.Add(daily_hole_units != 0).OnlyEnforceIf(is_zero_holes.Not())
                 is_two_hour_hole = model.NewBoolVar(f'is_2h_h_{t}_{day}'); model.Add(daily_hole_units == hours_to_units(2)).OnlyEnforceIf(is_two_hour_hole); model.Add(daily_hole_units != hours_to_units(2)).OnlyEnforceIf(is_two_hour_hole.Not())
                 is_good_hole_day = model.NewBoolVar(f'is_good_h_day_{t}_{day}'); model.AddBoolOr([is_zero_holes, is_two_hour_hole]).OnlyEnforceIf(is_good_hole_day)
@@ -361,32 +861,1098 @@ def generate_schedule(config):
                 model.Add(daily_penalty == 1).OnlyEnforceIf(is_two_hour_hole)
                 model.Add(daily_penalty == daily_hole_units * 10).OnlyEnforceIf(is_good_hole_day.Not())
                 total_penalty.append(daily_penalty)
-        model.Minimize(sum(total_penalty))
+        self.objective = sum(total_penalty)
+        if minimize: model.Minimize(self.objective)
+
+    # --- RIPARAZIONE: MINIMO NUMERO DI ASSEGNAZIONI SPOSTATE ---
+    def add_repair_objective(self, previous, log_messages):
+        """
+        Obiettivo della riparazione (vedi repair.py): REPAIR_MOVE_WEIGHT per ogni assegnazione
+        di `previous` (formato di solution.py) che non resta al suo posto, più la penalità buchi
+        se l'ottimizzazione è attiva. Le voci non più collocabili contano come spostamenti obbligati.
+        Ritorna le statistiche: assegnazioni di partenza, spostamenti obbligati e peso.
+        """
+        d = self.data; model = self.model
+        slot_index = {(cl, day, sl): s_idx for (cl, day), slots in self.class_day_slots.items() for s_idx, sl, _, _ in slots}
+        kept = []; forced = 0
+        for cl, day, sl, t in previous.get('lessons', []):
+            var = self.x.get((cl, day, slot_index.get((cl, day, sl)), t))
+            if var is None: forced += 1
+            else: kept.append(var)
+        # Gli slot di copertura con la stessa etichetta sono intercambiabili: resta al suo posto il minimo tra voci e slot
+        copertura = defaultdict(list)
+        for (day, s_idx, t), (var, sl, _, _) in self.copertura_vars.items(): copertura[(day, sl, t)].append(var)
+        for (day, sl, t), count in Counter(map(tuple, previous.get('copertura', []))).items():
+            candidates = copertura.get((day, sl, t), [])
+            forced += max(0, count - len(candidates))
+            if not candidates: continue
+            k = model.NewIntVar(0, min(count, len(candidates)), f"cop_kept_{day}_{sl}_{t}")
+            model.Add(k <= sum(candidates))
+            kept.append(k)
+        total = len(previous.get('lessons', [])) + len(previous.get('copertura', []))
+        self.moved = total - sum(kept)
+        model.Minimize(d.REPAIR_MOVE_WEIGHT * self.moved + (self.objective if self.objective is not None else 0))
+        log_messages.append(f"- Riparazione ATTIVA: {d.REPAIR_MOVE_WEIGHT} punti per ogni assegnazione spostata rispetto all'orario di partenza ({forced} spostamenti obbligati su {total})")
+        return {'weight': d.REPAIR_MOVE_WEIGHT, 'previous': total, 'forced': forced}
+
+    def hint_from_solver(self, solver):
+        """Sostituisce gli hint con la soluzione completa (tutte le variabili) trovata da `solver`."""
+        self.model.ClearHints()
+        values = list(solver.ResponseProto().solution)
+        hint = self.model.Proto().solution_hint
+        hint.vars.extend(range(len(values)))
+        hint.values.extend(values)
+
+
+# Chiavi di configurazione lette da ogni famiglia di vincoli (oltre alla struttura di model_structure):
+# una modifica a una di queste chiavi fa riemettere la famiglia in rebuild_model
+FAMILY_CONFIG_KEYS = {
+    'busy_links': (),
+    'class_coverage': ('ORE_SETTIMANALI_CLASSI',),
+    'teacher_class_hours': ('ASSEGNAZIONE_DOCENTI',),
+    'copertura': ('ASSEGNAZIONE_DOCENTI',),
+    'max_daily_hours_per_class': ('USE_MAX_DAILY_HOURS_PER_CLASS', 'MAX_DAILY_HOURS_PER_CLASS'),
+    'hours_per_day_per_class': ('HOURS_PER_DAY_PER_CLASS', 'ASSEGNAZIONE_DOCENTI'),
+    'only_days': ('ONLY_DAYS',),
+    'group_daily_two_classes': ('GROUP_DAILY_TWO_CLASSES', 'ASSEGNAZIONE_DOCENTI'),
+    'start_at': ('START_AT',),
+    'end_at': ('END_AT',),
+    'min_two_hours_if_present': ('MIN_TWO_HOURS_IF_PRESENT_SPECIFIC', 'MAX_ORE_SETTIMANALI_DOCENTI'),
+    'specific_assignments': ('ASSEGNAZIONE_DOCENTI_SPECIFICHE', 'ASSEGNAZIONE_DOCENTI'),
+    'consecutive_blocks': ('USE_CONSECUTIVE_BLOCKS', 'HOURS_PER_DAY_PER_CLASS'),
+    'max_one_hole': ('USE_MAX_ONE_HOLE',),
+    'holes': (),
+    'hole_objective': ('USE_OPTIMIZE_HOLES', 'USE_TWO_PHASE_SOLVE'),
+}
+
+# Oltre questa frazione di vincoli svuotati conviene ricostruire il modello da zero
+REBUILD_MAX_CLEARED_FRACTION = 0.5
+
+
+def _emit_families(sm, log_messages, guarded=False, reuse=()):
+    """
+    Applica le famiglie di vincoli attive nell'ordine di build_model. Le famiglie in `reuse`
+    sono già nel modello (rebuild_model): di queste vengono ripetute solo le righe di log e di report.
+    """
+    data = sm.data
+    sm.active_constraints_for_report = []
+
+    def emit(add_family, *args, **kwargs):
+        name = add_family.__name__[len('add_'):]
+        if name in reuse:
+            log_messages.extend(sm.families[name]['log'])
+            sm.active_constraints_for_report.extend(sm.families[name]['report'])
+        else:
+            sm.timed(add_family, *args, **kwargs)
+
+    emit(sm.add_busy_links)
+    emit(sm.add_class_coverage)
+    emit(sm.add_teacher_class_hours)
+    emit(sm.add_copertura)
+
+    log_messages.append("\nApplicazione vincoli...")
+
+    # --- VINCOLI GENERICI ---
+    if data.USE_MAX_DAILY_HOURS_PER_CLASS: emit(sm.add_max_daily_hours_per_class, log_messages)
+
+    # --- VINCOLI SPECIFICI (attivati dalla presenza dei dati) ---
+    if data.HOURS_PER_DAY_PER_CLASS: emit(sm.add_hours_per_day_per_class, log_messages)
+    if data.ONLY_DAYS: emit(sm.add_only_days)
+    if data.GROUP_DAILY_TWO_CLASSES: emit(sm.add_group_daily_two_classes)
+    if data.START_AT: emit(sm.add_start_at)
+    if data.END_AT: emit(sm.add_end_at)
+    if data.MIN_TWO_HOURS_IF_PRESENT_SPECIFIC: emit(sm.add_min_two_hours_if_present)
+    if data.ASSEGNAZIONE_DOCENTI_SPECIFICHE: emit(sm.add_specific_assignments, log_messages)
+
+    # --- ALTRI VINCOLI GENERICI ---
+    if data.USE_CONSECUTIVE_BLOCKS: emit(sm.add_consecutive_blocks, log_messages)
+    if data.USE_MAX_ONE_HOLE: emit(sm.add_max_one_hole, log_messages)
+
+    if guarded: return
+    emit(sm.add_holes, log_messages)
+
+    # Ottimizzazione condizionale
+    if data.USE_OPTIMIZE_HOLES: emit(sm.add_hole_objective, log_messages, minimize=not data.USE_TWO_PHASE_SOLVE)
+    else: log_messages.append("- Ottimizzazione DISATTIVA: Ricerca soluzione valida senza ottimizzazione buchi")
+
+
+def build_model(data, log_messages, guarded=False):
+    """
+    Costruisce il modello CP-SAT applicando tutte le famiglie di vincoli attive.
+    Con `guarded=True` costruisce il modello diagnostico: regole attivate da letterali
+    (rule_literals), senza variabili dei buchi né obiettivo.
+    I tempi di creazione delle variabili e di ogni famiglia finiscono in sm.timings.
+    """
+    start = time.perf_counter()
+    sm = ScheduleModel(data, guarded=guarded)
+    sm.timings['variables'] = time.perf_counter() - start
+    _emit_families(sm, log_messages, guarded)
+    return sm
+
+
+def model_structure(data):
+    """Dati da cui dipendono variabili e indici di ScheduleModel (griglie, docenti ammessi,
+    slot di copertura): se cambiano, rebuild_model non è applicabile e serve build_model."""
+    return (list(data.CLASSI), list(data.GIORNI), data.class_slots, data.GLOBAL_SCHEDULING_TIMES, data.teachers,
+            {t: data.teacher_classes(t) for t in data.teachers}, data.copertura_slots,
+            [t for t in data.teachers if data.ASSEGNAZIONE_DOCENTI[t].get('copertura', 0) > 0])
+
+
+def rebuild_model(previous, data, changed_keys, log_messages):
+    """
+    Modello per `data` ricavato da `previous` (costruito da build_model o rebuild_model e non
+    ancora modificato da hint o obiettivi) quando cambiano solo chiavi lette dalle famiglie di
+    vincoli (`changed_keys`, es. ConfigDiff.changes): clona il modello, svuota i vincoli delle
+    famiglie toccate e riemette solo quelle. CP-SAT non permette di togliere vincoli, quindi i
+    vincoli svuotati restano come voci vuote del proto e le variabili ausiliarie rimaste senza
+    vincoli vengono eliminate dal presolve.
+    Ritorna None (serve build_model) per il modello diagnostico, se cambia model_structure o
+    se i vincoli svuotati supererebbero REBUILD_MAX_CLEARED_FRACTION del modello.
+    """
+    if previous.rule_literals is not None or model_structure(previous.data) != model_structure(data):
+        return None
+    start = time.perf_counter()
+    changed_keys = set(changed_keys)
+    affected = [name for name in previous.families if changed_keys.intersection(FAMILY_CONFIG_KEYS[name])]
+    cleared = sum(end - first for first, end in (previous.families[name]['constraints'] for name in affected))
+    n_constraints = len(previous.model.Proto().constraints)
+    if previous.cleared_constraints + cleared > REBUILD_MAX_CLEARED_FRACTION * n_constraints:
+        return None
+
+    sm = previous.copy()
+    sm.data = data
+    constraints = sm.model.Proto().constraints
+    empty = cp_model_helper.ConstraintProto()
+    for name in affected:
+        first, end = sm.families.pop(name)['constraints']
+        for i in range(first, end): constraints[i].copy_from(empty)
+    sm.cleared_constraints += cleared
+    if 'hole_objective' in affected:
+        sm.model.ClearObjective()
+        sm.objective = None
+    sm.timings = {'constraints.reuse': time.perf_counter() - start}
+    _emit_families(sm, log_messages, reuse=set(sm.families))
+    return sm
+
+
+class ModelCache:
+    """
+    Ultimo modello costruito da run_schedule, intatto (senza hint né obiettivi della risoluzione),
+    con la sua configurazione: per la configurazione successiva diff_configs individua le chiavi
+    cambiate e rebuild_model riemette solo le famiglie di vincoli toccate. Pensata per la GUI,
+    dove si rigenera dopo ogni piccola modifica; thread-safe (i job girano in thread separati).
+    """
+
+    def __init__(self):
+        self.config = None
+        self.model = None
+        self.full_build_time = None
+        self._lock = threading.Lock()
+
+    def model_for(self, config, data, log_messages):
+        """
+        ScheduleModel per `config` (ScheduleData `data`), da usare per una sola risoluzione: è una
+        copia, il modello in cache resta intatto. Ritorna anche le statistiche della costruzione:
+        modo ('full' o 'incremental'), tempo, tempo dell'ultima costruzione completa, famiglie
+        riemesse, vincoli svuotati e modifiche rispetto alla configurazione precedente.
+        """
+        with self._lock:
+            start = time.perf_counter()
+            sm, changes = None, []
+            if self.model is not None:
+                diff = diff_configs(self.config, config)
+                changes = diff.describe()
+                sm = rebuild_model(self.model, data, diff.changes, log_messages)
+            mode = 'full' if sm is None else 'incremental'
+            if sm is None: sm = build_model(data, log_messages)
+            elapsed = time.perf_counter() - start
+            if mode == 'full': self.full_build_time = elapsed
+            self.config, self.model = normalize_config(config), sm
+            families = [key[len('constraints.'):] for key in sm.timings if key.startswith('constraints.') and key != 'constraints.reuse']
+            stats = {'mode': mode, 'time': elapsed, 'full_time': self.full_build_time, 'families': families,
+                     'cleared': sm.cleared_constraints, 'changes': changes}
+            return sm.copy(), stats
+
+
+def format_model_build(build):
+    """Riga di log della costruzione del modello tramite ModelCache."""
+    if build['mode'] == 'full':
+        return f"🧱 Modello costruito da zero in {build['time'] * 1000:.0f} ms."
+    return (f"♻️ Modello ricostruito in modo incrementale in {build['time'] * 1000:.0f} ms "
+            f"(costruzione completa: {build['full_time'] * 1000:.0f} ms), famiglie riemesse: {', '.join(build['families']) or 'nessuna'}.")
+
+
+def find_conflicting_rules(data, time_limit=60.0, settings=None):
+    """
+    Cerca un piccolo insieme di regole specifiche in conflitto tra loro.
+    Costruisce il modello diagnostico con un letterale per regola, lo risolve con tutte
+    le regole come assumption e riduce il nucleo restituito da CP-SAT togliendo una
+    regola alla volta finché il tempo lo consente.
+    Ritorna {'status', 'rules', 'minimal', 'time'}: status 'conflict' (regole in conflitto),
+    'base' (insolubile anche senza regole specifiche), 'feasible' (il modello ammette
+    soluzioni: è mancato il tempo) o 'unknown'.
+    """
+    start = time.time()
+    deadline = start + time_limit
+    settings = dict(settings or solver_settings(data), log_search_progress=False, deterministic=False)
+    sm = build_model(data, [], guarded=True)
+    names = {lit.Index(): name for name, lit in sm.rule_literals.items()}
+
+    def check(rule_names):
+        sm.model.ClearAssumptions()
+        sm.model.AddAssumptions([sm.rule_literals[n] for n in rule_names])
+        solver = _new_solver(max(0.5, deadline - time.time()), settings)
+        res = solver.Solve(sm.model)
+        core = [names[i] for i in solver.SufficientAssumptionsForInfeasibility() if i in names] if res == cp_model.INFEASIBLE else None
+        return res, core
+
+    res, core = check(list(sm.rule_literals))
+    outcome = {'status': 'unknown', 'rules': [], 'minimal': False, 'time': 0.0}
+    if res in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        outcome['status'] = 'feasible'
+    elif res == cp_model.INFEASIBLE:
+        if not core:
+            # Nucleo vuoto: o i dati di base sono già insolubili, o CP-SAT non ha ridotto le assumption
+            res, _ = check([])
+            core = [] if res == cp_model.INFEASIBLE else list(sm.rule_literals)
+        outcome['status'] = 'conflict' if core else 'base'
+        if core:
+            # Riduzione per eliminazione: una regola che non serve al conflitto viene tolta
+            minimal = True
+            for name in list(core):
+                if time.time() >= deadline: minimal = False; break
+                if name not in core: continue
+                trial = [n for n in core if n != name]
+                res, trial_core = check(trial)
+                if res == cp_model.INFEASIBLE: core = trial_core if trial_core else trial
+                elif res not in (cp_model.OPTIMAL, cp_model.FEASIBLE): minimal = False
+            outcome['minimal'] = minimal
+        outcome['rules'] = core
+    outcome['time'] = time.time() - start
+    return outcome
+
+
+def _new_solver(time_limit, settings, control=None):
+    solver = cp_model.CpSolver()
+    if settings['deterministic']:
+        solver.parameters.max_deterministic_time = time_limit
+        solver.parameters.interleave_search = True
     else:
-        log_messages.append("- Ottimizzazione DISATTIVA: Ricerca soluzione valida senza ottimizzazione buchi")
+        solver.parameters.max_time_in_seconds = time_limit
+    solver.parameters.num_search_workers = settings['workers']
+    solver.parameters.randomize_search = settings['randomize_search']
+    if settings['seed'] is not None: solver.parameters.random_seed = settings['seed']
+    solver.parameters.linearization_level = settings['linearization_level']
+    solver.parameters.log_search_progress = settings['log_search_progress']  # Log del progresso per debug
+    if control is not None:
+        # L'interruzione (es. Ctrl+C) la gestisce il chiamante tramite SolveControl
+        solver.parameters.catch_sigint_signal = False
+    return solver
+
+
+class SolveControl:
+    """
+    Permette di fermare da un altro thread la ricerca in corso accettando la migliore
+    soluzione trovata finora (StopSearch). Se la richiesta arriva durante la fase 1,
+    la fase 2 non viene avviata.
+    """
+
+    def __init__(self):
+        self.stop_requested = False
+        self._solver = None
+        self._lock = threading.Lock()
+
+    def attach(self, solver):
+        with self._lock:
+            self._solver = solver
+            if self.stop_requested:
+                # Richiesta arrivata prima dell'avvio (es. durante la costruzione del modello)
+                solver.parameters.max_time_in_seconds = 0.0
+
+    def detach(self):
+        with self._lock:
+            self._solver = None
+
+    def stop(self):
+        with self._lock:
+            self.stop_requested = True
+            if self._solver is not None: self._solver.StopSearch()
+
+
+def relative_gap(objective, bound):
+    """Gap relativo come lo calcola CP-SAT: |obiettivo - limite| / max(1, |obiettivo|)."""
+    return abs(objective - bound) / max(1.0, abs(objective))
+
+
+STOP_REASONS = {
+    'optimal': "ottimo dimostrato",
+    'first_solution': "trovata una soluzione valida (nessun obiettivo da ottimizzare)",
+    'gap': "gap relativo entro la soglia di {EARLY_STOP_RELATIVE_GAP:.1%} (EARLY_STOP_RELATIVE_GAP)",
+    'target': "penalità buchi entro l'obiettivo {EARLY_STOP_OBJECTIVE_TARGET:g} (EARLY_STOP_OBJECTIVE_TARGET)",
+    'stagnation': "nessun miglioramento per {EARLY_STOP_NO_IMPROVEMENT_SECONDS:g}s (EARLY_STOP_NO_IMPROVEMENT_SECONDS)",
+    'user': "interruzione richiesta dall'utente",
+    'time_limit': "limite di tempo raggiunto",
+    'infeasible': "modello insolubile",
+    'model_invalid': "modello non valido",
+}
+
+
+class SolutionProgressCallback(cp_model.CpSolverSolutionCallback):
+    """
+    Riceve le soluzioni intermedie del solver e le inoltra a `on_progress` come dizionari:
+      - phase: 'unica', 'fattibilita' o 'ottimizzazione'
+      - solution_index: numero progressivo della soluzione nella fase
+      - objective / bound: penalità buchi e limite inferiore (None senza obiettivo)
+      - elapsed: secondi dall'inizio della risoluzione (comprese le fasi precedenti)
+      - hole_hours: ore di buco totali dei docenti
+      - snapshot: assegnazioni nel formato portabile di solution.py
+    Se `on_progress` ritorna True la ricerca si ferma accettando la soluzione corrente.
+
+    Con un obiettivo applica anche le regole di arresto anticipato su gap relativo e
+    penalità obiettivo; `last_improvement` serve al controllo di stagnazione.
+    """
+
+    def __init__(self, sm, on_progress=None, phase='unica', time_offset=0.0, has_objective=True):
+        super().__init__()
+        self.sm = sm
+        self.on_progress = on_progress
+        self.phase = phase
+        self.time_offset = time_offset
+        self.has_objective = has_objective
+        self.history = []
+        self.first_solution_time = None
+        self.last_improvement = None  # time.monotonic() dell'ultimo miglioramento
+        self.stop_reason = None
+
+    def request_stop(self, reason):
+        if self.stop_reason is None: self.stop_reason = reason
+        self.StopSearch()
+
+    def on_solution_callback(self):
+        sm = self.sm; d = sm.data
+        elapsed = self.time_offset + self.WallTime()
+        if self.first_solution_time is None: self.first_solution_time = elapsed
+        self.last_improvement = time.monotonic()
+        if self.has_objective:
+            objective, bound = self.ObjectiveValue(), self.BestObjectiveBound()
+        else:
+            objective = self.Value(sm.objective) if sm.objective is not None else None
+            bound = None
+        self.history.append({'phase': self.phase, 'elapsed': round(elapsed, 3), 'objective': objective, 'bound': bound})
+        if self.has_objective:
+            if d.EARLY_STOP_OBJECTIVE_TARGET is not None and objective <= d.EARLY_STOP_OBJECTIVE_TARGET:
+                self.request_stop('target')
+            elif d.EARLY_STOP_RELATIVE_GAP and relative_gap(objective, bound) <= d.EARLY_STOP_RELATIVE_GAP:
+                self.request_stop('gap')
+        if self.on_progress is None:
+            return
+        update = dict(self.history[-1],
+                      solution_index=len(self.history),
+                      hole_hours=units_to_hours(sum(self.Value(h) for h in sm.holes.values())),
+                      snapshot=sm.extract_solution(self))
+        if self.on_progress(update):
+            self.request_stop('user')
+
+
+def format_progress(update):
+    """Riga di log leggibile per un aggiornamento di SolutionProgressCallback."""
+    parts = [f"⏳ {update['elapsed']:7.1f}s", f"soluzione #{update['solution_index']}"]
+    if update['phase'] != 'unica': parts.append(f"fase {update['phase']}")
+    if update['objective'] is not None: parts.append(f"penalità {update['objective']:.0f}")
+    if update['bound'] is not None:
+        parts.append(f"limite {update['bound']:.0f}")
+        parts.append(f"gap {100.0 * relative_gap(update['objective'], update['bound']):.1f}%")
+    parts.append(f"buchi {update['hole_hours']:g}h")
+    return " | ".join(parts)
+
+
+def _watch_stagnation(callback, seconds, done):
+    """Ferma la ricerca se non arrivano soluzioni migliori per `seconds` secondi dalla prima trovata."""
+    while not done.wait(0.25):
+        last = callback.last_improvement
+        if last is not None and time.monotonic() - last >= seconds:
+            callback.request_stop('stagnation')
+            return
+
+
+def _stop_reason(solver, res, callback, control):
+    if callback.stop_reason is not None: return callback.stop_reason
+    if control is not None and control.stop_requested: return 'user'
+    if res == cp_model.OPTIMAL:
+        if not callback.has_objective: return 'first_solution'
+        gap_limit = solver.parameters.relative_gap_limit
+        if gap_limit and solver.ObjectiveValue() != solver.BestObjectiveBound(): return 'gap'
+        return 'optimal'
+    if res == cp_model.INFEASIBLE: return 'infeasible'
+    if res == cp_model.MODEL_INVALID: return 'model_invalid'
+    return 'time_limit'
+
+
+def _run_phase(sm, time_limit, settings, phase, on_progress, control, time_offset=0.0):
+    d = sm.data
+    has_objective = sm.model.HasObjective()
+    solver = _new_solver(time_limit, settings, control)
+    if has_objective and d.EARLY_STOP_RELATIVE_GAP:
+        # Il solver si ferma da solo anche quando è il limite inferiore a chiudere il gap
+        solver.parameters.relative_gap_limit = d.EARLY_STOP_RELATIVE_GAP
+    callback = SolutionProgressCallback(sm, on_progress, phase, time_offset, has_objective=has_objective)
+    watchdog_done = threading.Event()
+    if has_objective and d.EARLY_STOP_NO_IMPROVEMENT_SECONDS:
+        threading.Thread(target=_watch_stagnation, args=(callback, d.EARLY_STOP_NO_IMPROVEMENT_SECONDS, watchdog_done), daemon=True).start()
+    if control is not None: control.attach(solver)
+    try:
+        res = solver.Solve(sm.model, callback)
+    finally:
+        watchdog_done.set()
+        if control is not None: control.detach()
+    callback.stop_reason = _stop_reason(solver, res, callback, control)
+    return solver, res, callback
+
+
+def _record_stop_reason(solver, res, callback, stats, log_messages):
+    stats['stop_reason'] = callback.stop_reason
+    stats['stop_detail'] = STOP_REASONS[callback.stop_reason].format(**vars(callback.sm.data))
+    if callback.has_objective and res in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        stats['objective'] = solver.ObjectiveValue()
+        stats['bound'] = solver.BestObjectiveBound()
+    log_messages.append(f"🛑 Arresto della ricerca: {stats['stop_detail']}")
+
+
+def solve_model(sm, log_messages, stats, time_limit=None, on_progress=None, control=None):
+    """
+    Risolve il modello e ritorna (solver, stato) della soluzione da usare per diagnostica e output.
+
+    In modalità a due fasi (USE_TWO_PHASE_SOLVE) la fase 1 cerca una soluzione valida senza
+    obiettivo con una quota TWO_PHASE_SPLIT del tempo; la fase 2 minimizza i buchi partendo
+    dalla soluzione della fase 1 come hint, con il tempo rimanente.
+
+    `on_progress` riceve ogni soluzione intermedia (vedi SolutionProgressCallback); `control`
+    (SolveControl) permette di fermare la ricerca da un altro thread. I parametri del solver
+    vengono da solver_settings; `time_limit`, se indicato, sostituisce quello del profilo.
+    """
+    d = sm.data; model = sm.model
+    settings = solver_settings(d)
+    if time_limit is not None: settings['time_limit'] = time_limit
+    time_limit = settings['time_limit']
+    stats['solver'] = settings
+    log_messages.append(describe_solver_settings(settings))
+    ok = (cp_model.OPTIMAL, cp_model.FEASIBLE)
+    if not d.USE_TWO_PHASE_SOLVE or sm.objective is None:
+        solver, res, callback = _run_phase(sm, time_limit, settings, 'unica', on_progress, control)
+        stats['solve_time'] = solver.WallTime()
+        stats['progress'] = callback.history
+        stats['first_solution_time'] = callback.first_solution_time
+        _record_stop_reason(solver, res, callback, stats, log_messages)
+        return solver, res
+
+    phase1_limit = max(1.0, time_limit * d.TWO_PHASE_SPLIT)
+    log_messages.append(f"🅰️ Fase 1: ricerca soluzione valida senza obiettivo (max {phase1_limit:.0f}s)")
+    solver1, res1, callback1 = _run_phase(sm, phase1_limit, settings, 'fattibilita', on_progress, control)
+    time1 = solver1.WallTime()
+    phase1 = {'name': 'fattibilita', 'time': time1, 'status': solver1.StatusName(res1), 'stop_reason': callback1.stop_reason}
+    if res1 in ok:
+        phase1['objective'] = solver1.Value(sm.objective)
+        log_messages.append(f"⏱️ Fase 1 completata in {time1:.1f}s (stato: {phase1['status']}, penalità buchi: {phase1['objective']})")
+    else:
+        log_messages.append(f"⏱️ Fase 1 completata in {time1:.1f}s senza soluzione (stato: {phase1['status']})")
+    stats['phases'] = [phase1]
+    stats['progress'] = list(callback1.history)
+    stats['first_solution_time'] = callback1.first_solution_time
+    if res1 in (cp_model.INFEASIBLE, cp_model.MODEL_INVALID):
+        stats['solve_time'] = time1
+        _record_stop_reason(solver1, res1, callback1, stats, log_messages)
+        return solver1, res1
+    if control is not None and control.stop_requested:
+        stats['solve_time'] = time1
+        log_messages.append("✋ Ricerca interrotta dall'utente durante la fase 1: la fase 2 non viene eseguita.")
+        _record_stop_reason(solver1, res1, callback1, stats, log_messages)
+        return solver1, res1
+
+    # In modalità deterministica il budget è in tempo deterministico, non in secondi reali
+    used1 = solver1.ResponseProto().deterministic_time if settings['deterministic'] else time1
+    remaining = max(1.0, time_limit - used1)
+    model.Minimize(sm.objective)
+    if res1 in ok:
+        sm.hint_from_solver(solver1)
+    log_messages.append(f"🅱️ Fase 2: minimizzazione buchi {'a partire dalla soluzione della fase 1 ' if res1 in ok else ''}(max {remaining:.0f}s)")
+    solver2, res2, callback2 = _run_phase(sm, remaining, settings, 'ottimizzazione', on_progress, control, time_offset=time1)
+    time2 = solver2.WallTime()
+    phase2 = {'name': 'ottimizzazione', 'time': time2, 'status': solver2.StatusName(res2), 'stop_reason': callback2.stop_reason}
+    if res2 in ok:
+        phase2['objective'] = solver2.ObjectiveValue()
+        log_messages.append(f"⏱️ Fase 2 completata in {time2:.1f}s (stato: {phase2['status']}, penalità buchi: {phase2['objective']:.0f})")
+    else:
+        log_messages.append(f"⏱️ Fase 2 completata in {time2:.1f}s senza soluzione (stato: {phase2['status']})")
+    stats['phases'].append(phase2)
+    stats['progress'].extend(callback2.history)
+    if stats['first_solution_time'] is None: stats['first_solution_time'] = callback2.first_solution_time
+    stats['solve_time'] = time1 + time2
+    log_messages.append(f"⏱️ Tempo totale di risoluzione: {time1 + time2:.1f}s")
+    _record_stop_reason(solver2, res2, callback2, stats, log_messages)
+
+    if res2 not in ok and res1 in ok:
+        log_messages.append("⚠️ La fase 2 non ha prodotto soluzioni: uso la soluzione della fase 1.")
+        return solver1, res1
+    return solver2, res2
+
+
+# Codici di teacher_grid diversi da un indice di classe
+FREE, COPERTURA, HOLE = -1, -2, -3
+
+
+def format_duration(hours):
+    """Formatta la durata in formato (1h 30m) o (1h)"""
+    if hours == 0:
+        return ""
+    h = int(hours)
+    m = int((hours - h) * 60)
+    if m == 0:
+        return f"({h}h)"
+    else:
+        return f"({h}h {m}m)"
+
+
+def merge_consecutive(entries):
+    """
+    Testi delle celle di una giornata: `entries` ha per ogni etichetta (nome, unità), None
+    se vuota, oppure (testo, None) per una cella già formattata da non unire. Le voci
+    consecutive con lo stesso nome diventano un blocco: solo il nome, e nell'ultima cella
+    il nome con la durata complessiva.
+    """
+    cells = []
+    i = 0
+    while i < len(entries):
+        if entries[i] is None:
+            cells.append(""); i += 1
+            continue
+        name, units = entries[i]
+        if units is None:
+            cells.append(name); i += 1
+            continue
+        j = i + 1
+        while j < len(entries) and entries[j] is not None and entries[j][1] is not None and entries[j][0] == name:
+            j += 1
+        cells.extend([name] * (j - i - 1))
+        cells.append(f"{name} {format_duration(units_to_hours(sum(u for _, u in entries[i:j])))}")
+        i = j
+    return cells
+
+
+class Schedule:
+    """
+    Orario risolto in forma compatta, letto dal solver una sola volta. Gli indici interi
+    seguono l'ordine di ScheduleData (CLASSI, teachers, GIORNI, GLOBAL_SCHEDULING_TIMES):
+      - class_teacher[classe, giorno, slot]: docente della lezione nello slot della classe (FREE se assente)
+      - copertura_teacher[giorno, slot]: docente di ogni slot di copertura (data.copertura_slots)
+      - teacher_grid[docente, giorno, etichetta]: classe insegnata, COPERTURA, HOLE (buco) o FREE
+      - teacher_units[docente, giorno, etichetta]: durata in unità di quanto occupa il docente
+      - class_grid[classe, giorno, etichetta]: docente della lezione che inizia all'etichetta (FREE se nessuna)
+      - lesson_units[docente, classe, giorno] e copertura_units[docente, giorno]: unità insegnate
+    Fogli Excel, blocchi consecutivi, totali e diagnostica derivano tutti da questi array.
+    """
+
+    def __init__(self, data, class_teacher, copertura_teacher):
+        d = self.data = data
+        self.class_teacher = class_teacher
+        self.copertura_teacher = copertura_teacher
+        self.class_index = {cl: i for i, cl in enumerate(d.CLASSI)}
+        self.teacher_index = {t: i for i, t in enumerate(d.teachers)}
+        self.day_index = {day: i for i, day in enumerate(d.GIORNI)}
+        self.label_index = {sl: i for i, sl in enumerate(d.GLOBAL_SCHEDULING_TIMES)}
+        n_t, n_d, n_l = len(d.teachers), len(d.GIORNI), len(d.GLOBAL_SCHEDULING_TIMES)
+
+        # Griglie degli slot (etichetta e durata di ogni slot di classe e di copertura)
+        self.slot_label = np.full(class_teacher.shape, -1, dtype=np.int16)
+        self.slot_units = np.zeros(class_teacher.shape, dtype=np.int16)
+        for c, cl in enumerate(d.CLASSI):
+            for di, day in enumerate(d.GIORNI):
+                for s_idx, (sl, _, u) in enumerate(d.class_slots[cl][day]):
+                    self.slot_label[c, di, s_idx] = self.label_index[sl]; self.slot_units[c, di, s_idx] = u
+        self.copertura_label = np.full(copertura_teacher.shape, -1, dtype=np.int16)
+        self.copertura_slot_units = np.zeros(copertura_teacher.shape, dtype=np.int16)
+        for di, day in enumerate(d.GIORNI):
+            for k, (sl, _, u) in enumerate(d.copertura_slots.get(day, [])):
+                self.copertura_label[di, k] = self.label_index.get(sl, -1); self.copertura_slot_units[di, k] = u
+
+        # Lezioni: unità per docente/classe/giorno e occupazione del docente per etichetta
+        c, di, s = np.nonzero(class_teacher >= 0)
+        t, lab, units = class_teacher[c, di, s], self.slot_label[c, di, s], self.slot_units[c, di, s]
+        self.lesson_units = np.zeros((n_t, len(d.CLASSI), n_d), dtype=np.int32)
+        np.add.at(self.lesson_units, (t, c, di), units)
+        self.teacher_grid = np.full((n_t, n_d, n_l), FREE, dtype=np.int16)
+        self.teacher_units = np.zeros((n_t, n_d, n_l), dtype=np.int16)
+        self.teacher_grid[t, di, lab] = c
+        self.teacher_units[t, di, lab] = units
+        # Vista delle classi sulle etichette globali: docente e durata della lezione che inizia a ogni etichetta
+        self.class_grid = np.full((len(d.CLASSI), n_d, n_l), FREE, dtype=np.int16)
+        self.class_grid_units = np.zeros((len(d.CLASSI), n_d, n_l), dtype=np.int16)
+        self.class_grid[c, di, lab] = t
+        self.class_grid_units[c, di, lab] = units
+
+        # Copertura (le etichette fuori griglia contano nelle ore ma non occupano il docente)
+        di, k = np.nonzero(copertura_teacher >= 0)
+        t, lab, units = copertura_teacher[di, k], self.copertura_label[di, k], self.copertura_slot_units[di, k]
+        self.copertura_units = np.zeros((n_t, n_d), dtype=np.int32)
+        np.add.at(self.copertura_units, (t, di), units)
+        in_grid = lab >= 0
+        self.teacher_grid[t[in_grid], di[in_grid], lab[in_grid]] = COPERTURA
+        self.teacher_units[t[in_grid], di[in_grid], lab[in_grid]] = units[in_grid]
+
+        # Buchi: etichetta libera con lavoro prima e dopo nella stessa giornata (stessa definizione di add_holes)
+        self.busy = self.teacher_grid != FREE
+        worked = np.logical_or.accumulate(self.busy, axis=2)
+        will_work = np.logical_or.accumulate(self.busy[:, :, ::-1], axis=2)[:, :, ::-1]
+        before = np.zeros_like(self.busy); before[:, :, 1:] = worked[:, :, :-1]
+        after = np.zeros_like(self.busy); after[:, :, :-1] = will_work[:, :, 1:]
+        self.holes = ~self.busy & before & after
+        self.teacher_grid[self.holes] = HOLE
+        self.teacher_units[self.holes] = np.broadcast_to(self._hole_label_units(), self.holes.shape)[self.holes]
+
+    def _hole_label_units(self):
+        """Durata mostrata per un buco a ogni etichetta: quella dell'etichetta nell'ultima griglia SLOT_n che la contiene (1h se assente)."""
+        d = self.data
+        units = []
+        for sl in d.GLOBAL_SCHEDULING_TIMES:
+            duration = 1.0
+            for slot_times in (d.SLOT_1, d.SLOT_2, d.SLOT_3):
+                duration = next((dur for time_str, dur in slot_times if get_scheduling_label(time_str) == sl), duration)
+            units.append(hours_to_units(duration))
+        return np.array(units, dtype=np.int16)
+
+    @classmethod
+    def from_solver(cls, sm, solver):
+        """Legge in un solo passaggio i valori di lezioni e copertura dalla risposta del solver."""
+        d = sm.data
+        values = np.asarray(solver.response_proto.solution)  # CpSolver o callback delle soluzioni intermedie
+        n_slots = max([len(d.class_slots[cl][day]) for cl in d.CLASSI for day in d.GIORNI] + [0])
+        class_teacher = np.full((len(d.CLASSI), len(d.GIORNI), n_slots), FREE, dtype=np.int16)
+        teacher_index = {t: i for i, t in enumerate(d.teachers)}
+        keys = list(sm.x)
+        chosen = values[[sm.x[k].Index() for k in keys]] if keys else np.zeros(0)
+        class_index = {cl: i for i, cl in enumerate(d.CLASSI)}
+        day_index = {day: i for i, day in enumerate(d.GIORNI)}
+        for (cl, day, s_idx, t), value in zip(keys, chosen):
+            if value: class_teacher[class_index[cl], day_index[day], s_idx] = teacher_index[t]
+
+        n_cop = max([len(slots) for slots in d.copertura_slots.values()] + [0])
+        copertura_teacher = np.full((len(d.GIORNI), n_cop), FREE, dtype=np.int16)
+        keys = list(sm.copertura_vars)
+        chosen = values[[sm.copertura_vars[k][0].Index() for k in keys]] if keys else np.zeros(0)
+        for (day, s_idx, t), value in zip(keys, chosen):
+            if value: copertura_teacher[day_index[day], s_idx] = teacher_index[t]
+        return cls(d, class_teacher, copertura_teacher)
+
+    @classmethod
+    def from_solution(cls, data, solution, problems=None):
+        """
+        Schedule da una soluzione nel formato portabile di solution.py (es. letta da un Excel).
+        Le voci non collocabili nella griglia (nomi sconosciuti, slot inesistenti o già
+        occupati) vengono scartate e descritte in `problems`, se è una lista.
+        """
+        d = data
+        problems = problems if problems is not None else []
+        class_index = {cl: i for i, cl in enumerate(d.CLASSI)}
+        teacher_index = {t: i for i, t in enumerate(d.teachers)}
+        day_index = {day: i for i, day in enumerate(d.GIORNI)}
+        n_slots = max([len(d.class_slots[cl][day]) for cl in d.CLASSI for day in d.GIORNI] + [0])
+        class_teacher = np.full((len(d.CLASSI), len(d.GIORNI), n_slots), FREE, dtype=np.int16)
+        for cl, day, sl, t in solution.get('lessons', []):
+            if cl not in class_index: problems.append(f"Classe {cl} non presente nella configurazione ({t} il {day} alle {sl})"); continue
+            if day not in day_index: problems.append(f"Giorno {day} non presente in GIORNI ({t} in {cl} alle {sl})"); continue
+            if t not in teacher_index: problems.append(f"Docente {t} non presente nella configurazione ({cl} il {day} alle {sl})"); continue
+            starts = [s_label for s_label, _, _ in d.class_slots[cl][day]]
+            if sl not in starts: problems.append(f"{cl} il {day} non ha uno slot alle {sl} ({t})"); continue
+            c, di, s_idx = class_index[cl], day_index[day], starts.index(sl)
+            if class_teacher[c, di, s_idx] != FREE:
+                problems.append(f"{cl} il {day} alle {sl}: più docenti nello stesso slot ({d.teachers[class_teacher[c, di, s_idx]]}, {t})"); continue
+            class_teacher[c, di, s_idx] = teacher_index[t]
+
+        n_cop = max([len(slots) for slots in d.copertura_slots.values()] + [0])
+        copertura_teacher = np.full((len(d.GIORNI), n_cop), FREE, dtype=np.int16)
+        for day, sl, t in solution.get('copertura', []):
+            if day not in day_index: problems.append(f"Giorno {day} non presente in GIORNI (copertura di {t} alle {sl})"); continue
+            if t not in teacher_index: problems.append(f"Docente {t} non presente nella configurazione (copertura del {day} alle {sl})"); continue
+            free = [k for k, (s_label, _, _) in enumerate(d.copertura_slots.get(day, [])) if s_label == sl and copertura_teacher[day_index[day], k] == FREE]
+            if not free: problems.append(f"Copertura di {t} il {day} alle {sl}: nessuno slot di copertura libero a quell'ora"); continue
+            copertura_teacher[day_index[day], free[0]] = teacher_index[t]
+        return cls(d, class_teacher, copertura_teacher)
+
+    def to_solution(self):
+        """Soluzione nel formato portabile di solution.py."""
+        d = self.data
+        lessons = [[cl, day, sl, d.teachers[self.class_teacher[c, di, s_idx]]]
+                   for c, cl in enumerate(d.CLASSI) for di, day in enumerate(d.GIORNI)
+                   for s_idx, (sl, _, _) in enumerate(d.class_slots[cl][day]) if self.class_teacher[c, di, s_idx] >= 0]
+        copertura = [[day, sl, d.teachers[self.copertura_teacher[di, k]]]
+                     for di, day in enumerate(d.GIORNI) for k, (sl, _, _) in enumerate(d.copertura_slots.get(day, []))
+                     if self.copertura_teacher[di, k] >= 0]
+        return {"lessons": lessons, "copertura": copertura}
+
+    # --- Interrogazioni per nome (False/0 per docenti, classi o giorni sconosciuti) ---
+    def units(self, t, cl, day):
+        """Unità insegnate dal docente nella classe nel giorno."""
+        if t not in self.teacher_index or cl not in self.class_index or day not in self.day_index: return 0
+        return int(self.lesson_units[self.teacher_index[t], self.class_index[cl], self.day_index[day]])
+
+    def is_busy(self, t, day, sched_label):
+        if t not in self.teacher_index or day not in self.day_index or sched_label not in self.label_index: return False
+        return bool(self.busy[self.teacher_index[t], self.day_index[day], self.label_index[sched_label]])
+
+    def teacher_at(self, cl, day, s_idx):
+        """Docente della lezione nello slot s_idx della classe, None se libero."""
+        t = self.class_teacher[self.class_index[cl], self.day_index[day], s_idx]
+        return self.data.teachers[t] if t >= 0 else None
+
+    @property
+    def hole_units(self):
+        """Etichette di buco totali (ognuna conta un'unità, come le variabili holes del modello)."""
+        return int(self.holes.sum())
+
+    @property
+    def hole_penalty(self):
+        """Penalità buchi come in add_hole_objective: per docente e giorno 0 senza buchi, 1 con un buco di 2 ore, altrimenti 10 per unità."""
+        daily = self.holes.sum(axis=2)
+        return int(np.where(daily == 0, 0, np.where(daily == hours_to_units(2), 1, daily * 10)).sum())
+
+    # --- Fogli dell'orario ---
+    def class_sheet_rows(self):
+        """Righe del foglio 'Classi': intestazione, una riga per giorno/etichetta, riga vuota e totali."""
+        d = self.data
+        n_c, n_d, n_l = len(d.CLASSI), len(d.GIORNI), len(d.GLOBAL_SCHEDULING_TIMES)
+        grid, grid_units = self.class_grid, self.class_grid_units
+
+        columns = []
+        for c in range(n_c):
+            column = []
+            for di in range(n_d):
+                column.extend(merge_consecutive([(d.teachers[grid[c, di, l]], int(grid_units[c, di, l])) if grid[c, di, l] >= 0 else None for l in range(n_l)]))
+            columns.append(column)
+        column = []
+        for di in range(n_d):
+            entries = [[] for _ in range(n_l)]
+            for k in range(self.copertura_teacher.shape[1]):
+                if self.copertura_teacher[di, k] >= 0 and self.copertura_label[di, k] >= 0:
+                    entries[self.copertura_label[di, k]].append((d.teachers[self.copertura_teacher[di, k]], int(self.copertura_slot_units[di, k])))
+            # Più docenti alla stessa etichetta finiscono nella stessa cella, senza unioni. Scelta voluta:
+            # l'export originale univa la cella alle vicine con lo stesso primo docente e perdeva gli altri
+            column.extend(merge_consecutive([None if not e else e[0] if len(e) == 1 else (" ".join(f"{t} {format_duration(units_to_hours(u))}" for t, u in e), None) for e in entries]))
+        columns.append(column)
+
+        rows = [["Slot"] + d.CLASSI + ["Copertura"]]
+        labels = [d.EXCEL_LABELS[(day, sl)] for day in d.GIORNI for sl in d.GLOBAL_SCHEDULING_TIMES]
+        rows.extend([label] + [col[i] for col in columns] for i, label in enumerate(labels))
+        rows.append([""] * (n_c + 2))
+        rows.append(["TOTALE"] + [format_duration(units_to_hours(int(u))) for u in self.lesson_units.sum(axis=(0, 2))]
+                    + [format_duration(units_to_hours(int(self.copertura_units.sum())))])
+        return rows
+
+    def teacher_sheet_rows(self):
+        """Righe del foglio 'Docenti' (lezioni, COPERTURA e BUCO): intestazione, giorni/etichette, riga vuota e totali."""
+        d = self.data
+        n_d, n_l = len(d.GIORNI), len(d.GLOBAL_SCHEDULING_TIMES)
+        columns = []
+        for ti in range(len(d.teachers)):
+            column = []
+            for di in range(n_d):
+                entries = []
+                for l in range(n_l):
+                    code = self.teacher_grid[ti, di, l]
+                    name = d.CLASSI[code] if code >= 0 else "COPERTURA" if code == COPERTURA else "BUCO" if code == HOLE else None
+                    entries.append((name, int(self.teacher_units[ti, di, l])) if name else None)
+                column.extend(merge_consecutive(entries))
+            columns.append(column)
+
+        rows = [["Slot"] + d.teachers]
+        labels = [d.EXCEL_LABELS[(day, sl)] for day in d.GIORNI for sl in d.GLOBAL_SCHEDULING_TIMES]
+        rows.extend([label] + [col[i] for col in columns] for i, label in enumerate(labels))
+        rows.append([""] * (len(d.teachers) + 1))
+        totals = self.lesson_units.sum(axis=(1, 2)) + self.copertura_units.sum(axis=1)
+        rows.append(["TOTALE"] + [format_duration(units_to_hours(int(u))) for u in totals])
+        return rows
+
+
+def verify_schedule(schedule):
+    """
+    Verifica post-risoluzione di tutte le famiglie di vincoli sugli array di `schedule`,
+    con operazioni vettoriali NumPy. Ritorna le righe [PASS]/[FAIL] del report di
+    diagnostica e l'analisi dei buchi.
+    """
+    d = schedule.data
+    report = []
+    hours = lambda u: units_to_hours(int(u))
+    teacher_index, class_index, day_index = schedule.teacher_index, schedule.class_index, schedule.day_index
+    labels = d.GLOBAL_SCHEDULING_TIMES
+    lesson_units, busy = schedule.lesson_units, schedule.busy
+    # Coppie docente-classe nell'ordine di ASSEGNAZIONE_DOCENTI
+    pairs = [(t, cl, h) for t, assignments in d.ASSEGNAZIONE_DOCENTI.items() for cl, h in assignments.items() if cl != 'copertura']
+    pair_t = np.array([teacher_index[t] for t, _, _ in pairs], dtype=np.intp)
+    pair_c = np.array([class_index[cl] for _, cl, _ in pairs], dtype=np.intp)
+    pair_units = lesson_units[pair_t, pair_c]  # [coppia, giorno]
+
+    required = np.array([hours_to_units(d.ORE_SETTIMANALI_CLASSI[cl]) for cl in d.CLASSI], dtype=np.int64)
+    found = lesson_units.sum(axis=(0, 2))
+    fails = np.flatnonzero(required != found)
+    report.append(f"[{'PASS' if fails.size == 0 else 'FAIL'}] Ore settimanali totali per classe")
+    report.extend(f"  - FAIL: Classe {d.CLASSI[c]} - Richieste: {hours(required[c])}h, Trovate: {hours(found[c])}h" for c in fails)
+
+    required = np.array([hours_to_units(h) for _, _, h in pairs], dtype=np.int64)
+    found = pair_units.sum(axis=1)
+    fails = np.flatnonzero(required != found)
+    report.append(f"[{'PASS' if fails.size == 0 else 'FAIL'}] Ore specifiche Docente-Classe")
+    report.extend(f"  - FAIL: Docente {pairs[p][0]} in Classe {pairs[p][1]} - Richieste: {hours(required[p])}h, Trovate: {hours(found[p])}h" for p in fails)
+
+    if d.USE_MAX_DAILY_HOURS_PER_CLASS:
+        fails = np.argwhere(pair_units > hours_to_units(d.MAX_DAILY_HOURS_PER_CLASS))
+        report.append(f"[{'PASS' if len(fails) == 0 else 'FAIL'}] Massimo {d.MAX_DAILY_HOURS_PER_CLASS} ore/giorno per docente nella stessa classe")
+        report.extend(f"  - FAIL: {pairs[p][0]} in {pairs[p][1]} il {d.GIORNI[di]} ha {hours(pair_units[p, di])}h (> {d.MAX_DAILY_HOURS_PER_CLASS}h)." for p, di in fails)
+
+    if d.USE_MAX_ONE_HOLE:
+        # Blocchi di lavoro per docente/giorno: etichette occupate precedute da un'etichetta libera
+        blocks = busy[:, :, 0].astype(np.int64) + (busy[:, :, 1:] & ~busy[:, :, :-1]).sum(axis=2)
+        max_blocks_found = int(blocks.max()) if blocks.size else 0
+        report.append(f"[{'PASS' if max_blocks_found <= 2 else 'FAIL'}] Continuità oraria (max 1 buco): Max blocchi trovati: {max_blocks_found}.")
+        report.extend(f"  - FAIL: {d.teachers[ti]} il {d.GIORNI[di]} ha {blocks[ti, di] - 1} buchi." for ti, di in np.argwhere(blocks > 2))
+
+    if d.USE_CONSECUTIVE_BLOCKS:
+        # Etichette in cui il docente insegna nella classe: lezioni di 2 o 3 ore senza salti
+        taught = schedule.class_grid[pair_c] == pair_t[:, None, None]  # [coppia, giorno, etichetta]
+        count = taught.sum(axis=2)
+        first = taught.argmax(axis=2)
+        last = taught.shape[2] - 1 - taught[:, :, ::-1].argmax(axis=2)
+        checked = np.array([not (t in d.HOURS_PER_DAY_PER_CLASS and d.HOURS_PER_DAY_PER_CLASS[t] <= 1) for t, _, _ in pairs], dtype=bool)
+        fails = np.argwhere(checked[:, None] & np.isin(pair_units, [hours_to_units(2), hours_to_units(3)]) & (count > 0) & (last - first > count - 1))
+        report.append(f"[{'PASS' if len(fails) == 0 else 'FAIL'}] Lezioni di 2 o 3 ore sono consecutive")
+        report.extend(f"  - FAIL: {pairs[p][0]} in {pairs[p][1]} il {d.GIORNI[di]} ha {hours(pair_units[p, di])} ore non consecutive ({', '.join(labels[l] for l in np.flatnonzero(taught[p, di]))})." for p, di in fails)
+
+    if d.HOURS_PER_DAY_PER_CLASS:
+        details = []
+        for t, exact_hours in d.HOURS_PER_DAY_PER_CLASS.items():
+            # Come add_hours_per_day_per_class salta le classi con ore non divisibili per exact_hours
+            rows = [p for p, (pt, _, h) in enumerate(pairs) if pt == t and h % exact_hours == 0]
+            taught_hours = pair_units[rows] * UNIT
+            for p, di in np.argwhere((taught_hours != 0) & (taught_hours != exact_hours)):
+                details.append(f"  - FAIL: {t} in {pairs[rows[p]][1]} il {d.GIORNI[di]} ha {hours(pair_units[rows[p], di])}h (dovrebbe essere 0 o {exact_hours}h)")
+        report.append(f"[{'PASS' if not details else 'FAIL'}] Ore giornaliere per classe per {list(d.HOURS_PER_DAY_PER_CLASS.keys())}"); report.extend(details)
+
+    if d.ONLY_DAYS:
+        works_on_day = busy.any(axis=2)
+        details = []
+        for teacher, allowed_days in d.ONLY_DAYS.items():
+            for day in set(d.GIORNI) - allowed_days:
+                if teacher in teacher_index and works_on_day[teacher_index[teacher], day_index[day]]:
+                    details.append(f"  - FAIL: {teacher} lavora il {day}, che non è un giorno consentito.")
+        report.append(f"[{'PASS' if not details else 'FAIL'}] Regole di giorni consentiti per {list(d.ONLY_DAYS.keys())}"); report.extend(details)
+
+    if d.GROUP_DAILY_TWO_CLASSES:
+        details = []
+        for t in d.GROUP_DAILY_TWO_CLASSES:
+            classes = d.teacher_classes(t)
+            if len(classes) == 2:
+                units = lesson_units[teacher_index[t], [class_index[cl] for cl in classes]].T  # [giorno, classe]
+                for di, k in np.argwhere(units < hours_to_units(1)):
+                    details.append(f"  - FAIL: {t} in {classes[k]} il {d.GIORNI[di]} ha solo {hours(units[di, k])}h (richiesta >= 1h).")
+        report.append(f"[{'PASS' if not details else 'FAIL'}] Almeno 1h/giorno in entrambe le classi per {d.GROUP_DAILY_TWO_CLASSES}"); report.extend(details)
+
+    label_hour = np.array([int(sl.split(':')[0]) for sl in labels])
+    for rules_by_teacher, outside, rule, title in ((d.START_AT, lambda h: label_hour < h, "inizio", "inizio orario"),
+                                                    (d.END_AT, lambda h: label_hour >= h, "fine", "fine orario")):
+        if not rules_by_teacher: continue
+        details = []
+        for teacher, rules in rules_by_teacher.items():
+            for day, limit_hour in rules.items():
+                if teacher not in teacher_index or day not in day_index: continue
+                for l in np.flatnonzero(busy[teacher_index[teacher], day_index[day]] & outside(limit_hour)):
+                    details.append(f"  - FAIL: {teacher} lavora alle {labels[l]} di {day}, violando la regola di {rule} ore {limit_hour}.")
+        report.append(f"[{'PASS' if not details else 'FAIL'}] Regole di {title} per {list(rules_by_teacher.keys())}"); report.extend(details)
+
+    if d.MIN_TWO_HOURS_IF_PRESENT_SPECIFIC:
+        daily_units = lesson_units.sum(axis=1) + schedule.copertura_units  # [docente, giorno]
+        details = []
+        for t in d.MIN_TWO_HOURS_IF_PRESENT_SPECIFIC:
+            if t not in teacher_index: continue
+            for di in np.flatnonzero((daily_units[teacher_index[t]] > 0) & (daily_units[teacher_index[t]] < hours_to_units(2))):
+                details.append(f"  - FAIL: Docente {t} il {d.GIORNI[di]} ha solo {hours(daily_units[teacher_index[t], di])}h di lezione (richieste min 2h se presente).")
+        report.append(f"[{'PASS' if not details else 'FAIL'}] Minimo 2 ore/giorno se presente per {d.MIN_TWO_HOURS_IF_PRESENT_SPECIFIC}"); report.extend(details)
+
+    if d.ASSEGNAZIONE_DOCENTI_SPECIFICHE:
+        is_ok = True; details = []
+        for teacher, classe, day, start_time, duration in d.ASSEGNAZIONE_DOCENTI_SPECIFICHE:
+            # Gli stessi slot che add_specific_assignments fissa al docente, dall'orario di inizio
+            slots, error = pinned_slots(d, teacher, classe, day, start_time, duration)
+            if error or teacher not in teacher_index:
+                is_ok = False
+                details.append(f"  - FAIL: {error or f'{teacher} non è un docente della configurazione'}.")
+                continue
+            c, di = class_index[classe], day_index[day]
+            held = schedule.class_teacher[c, di, slots] == teacher_index[teacher]
+            units_held = int(schedule.slot_units[c, di, slots][held].sum())
+            if not held.any():
+                is_ok = False
+                details.append(f"  - FAIL: {teacher} non è assegnato alla classe {classe} alle {start_time} di {day} come richiesto.")
+            elif not held.all():
+                is_ok = False
+                details.append(f"  - FAIL: {teacher} in {classe} alle {start_time} di {day} ha solo {hours(units_held)}h (richieste {duration}h).")
+            else:
+                details.append(f"  - PASS: {teacher} in {classe} alle {start_time} di {day} ha {hours(units_held)}h (richieste {duration}h).")
+        report.append(f"[{'PASS' if is_ok else 'FAIL'}] Assegnazioni specifiche per {len(d.ASSEGNAZIONE_DOCENTI_SPECIFICHE)} vincoli"); report.extend(details)
+
+    # Analisi dei buchi (sempre eseguita per informazione)
+    daily_hole_units = schedule.holes.sum(axis=2)
+    non_2h_hole_days = int(((daily_hole_units > 0) & (daily_hole_units != hours_to_units(2))).sum())
+    report.append(f"[INFO] Analisi buchi: Trovate {units_to_hours(schedule.hole_units)} ore di buco totali.")
+    if non_2h_hole_days > 0:
+        report.append(f"  - ATTENZIONE: Ci sono {non_2h_hole_days} orari giornalieri con buchi di durata diversa da 2 ore.")
+    else:
+        report.append("  - OTTIMO: Tutti i buchi presenti sono di 0 o 2 ore.")
+
+    # Note sui vincoli attivi
+    if d.USE_MAX_ONE_HOLE:
+        report.append("  - Nota: Vincolo 'max 1 buco' attivo.")
+    if d.USE_OPTIMIZE_HOLES:
+        report.append("  - Nota: Ottimizzazione buchi attiva nella soluzione.")
+    if not d.USE_MAX_ONE_HOLE and not d.USE_OPTIMIZE_HOLES:
+        report.append("  - Nota: Nessun vincolo sui buchi attivo (solo analisi informativa).")
+    return report
+
+
+# Statistiche della risoluzione conservate nel file compatto della soluzione
+SAVED_STATS = ('status', 'objective', 'bound', 'solve_time', 'stop_reason', 'hole_hours', 'model_size', 'timings')
+
+
+@dataclass
+class ScheduleResult:
+    """Esito di una generazione: tabelle per classi e docenti, log, diagnostica e soluzione portabile."""
+    df_classi: object = None
+    df_docenti: object = None
+    log: str = ""
+    diagnostics: str = ""
+    solution: dict = None
+    stats: dict = field(default_factory=dict)
+    excel_bytes: bytes = None  # workbook generato, lo stesso salvato su disco
+    schedule: object = None  # Schedule della soluzione (array per classi e docenti)
+    record: dict = None  # soluzione in formato compatto (vedi solution.py), salvata accanto all'Excel
+
+    @property
+    def ok(self):
+        return self.df_classi is not None and self.df_docenti is not None
+
+    def as_tuple(self):
+        return self.df_classi, self.df_docenti, self.log, self.diagnostics
+
+
+def generate_schedule(config, hint=None):
+    """
+    Funzione principale che costruisce, risolve, valida e salva l'orario.
+    Ritorna (df_classi, df_docenti, log, diagnostica); vedi run_schedule per i parametri.
+    """
+    return run_schedule(config, hint=hint).as_tuple()
+
+
+def run_schedule(config, hint=None, on_progress=None, control=None, fixed=None, output_path=DEFAULT_OUTPUT_FILE,
+                 repair=None, explain_infeasible=True, model_cache=None):
+    """
+    Costruisce, risolve, valida e salva l'orario in `output_path` (None: nessun file, il
+    workbook resta in ScheduleResult.excel_bytes), ritornando uno ScheduleResult.
+    `hint` è una soluzione precedente (formato di solution.py) usata come warm start;
+    `fixed` è una soluzione da riprodurre esattamente (es. la migliore di un portfolio)
+    o la sua parte da non toccare; `repair` è l'orario di partenza di cui minimizzare le
+    assegnazioni spostate (vedi repair.py). Con `explain_infeasible=False` un modello
+    senza soluzione non avvia la ricerca delle regole in conflitto. Una configurazione
+    rifiutata da utils.validate_config o da prevalidate non costruisce il modello.
+    `on_progress` riceve le soluzioni intermedie e `control` (SolveControl) permette di
+    fermare la ricerca accettando la migliore soluzione trovata (vedi solve_model).
+    Con `model_cache` (ModelCache) il modello viene ricostruito in modo incrementale a
+    partire da quello della configurazione precedente (non in riparazione): modo e tempi
+    finiscono in stats['model_build'].
+    """
+    log_messages = []
+    stats = {}
+
+    # --- Prevalidazione: configurazione (utils.validate_config), poi ore e capacità ---
+    start = time.perf_counter()
+    validation = validate_config(config)
+    stats['config_issues'] = [asdict(issue) for issue in validation.issues]
+    errors = validation.errors
+    if not errors:
+        data = ScheduleData(config)
+        errors = prevalidate(data)
+    stats['prevalidation_time'] = time.perf_counter() - start
+    stats['timings'] = {'prevalidation': stats['prevalidation_time']}  # secondi per fase (vedi benchmark.py)
+    if errors:
+        stats['prevalidation_errors'] = errors
+        log_messages.append(f'PREVALIDAZIONE DATI FALLITA ({stats["prevalidation_time"] * 1000:.0f} ms):')
+        log_messages.extend([f' - {e}' for e in errors])
+        return ScheduleResult(log="\n".join(log_messages), diagnostics="Prevalidazione fallita, nessuna diagnostica eseguita.", stats=stats)
+    else:
+        log_messages.append(f'Prevalidazione dati OK ({stats["prevalidation_time"] * 1000:.0f} ms): assegnazioni coprono le richieste di classe, rispettano i massimi docenti e i limiti di capacità.')
+
+    if repair is not None:
+        # La riparazione ottimizza in un'unica fase spostamenti e buchi nello stesso obiettivo
+        data.USE_TWO_PHASE_SOLVE = False
+    if model_cache is not None and repair is None:
+        sm, stats['model_build'] = model_cache.model_for(config, data, log_messages)
+        log_messages.append(format_model_build(stats['model_build']))
+    else:
+        sm = build_model(data, log_messages)
+    stats['timings'].update(sm.timings)
+    if hint:
+        stats['hint'] = sm.apply_hint(hint, log_messages)
+    if fixed:
+        stats['fixed'] = sm.apply_hint(fixed, log_messages, fix=True)
+    if repair is not None:
+        stats['repair'] = sm.add_repair_objective(repair, log_messages)
+    model = sm.model
+    proto = model.Proto()
+    stats['model_size'] = {'variables': len(proto.variables), 'constraints': len(proto.constraints)}
+    active_constraints_for_report = sm.active_constraints_for_report
+
+    USE_OPTIMIZE_HOLES = data.USE_OPTIMIZE_HOLES
 
     # --- 7. RISOLUZIONE ---
     log_messages.append(f"Vincoli specifici attivi: {active_constraints_for_report if active_constraints_for_report else ['Nessuno']}")
-    if USE_OPTIMIZE_HOLES:
+    if USE_OPTIMIZE_HOLES and data.USE_TWO_PHASE_SOLVE:
+        log_messages.append(f"\nAvvio risoluzione in due fasi (quota fase 1: {data.TWO_PHASE_SPLIT:.0%} del tempo)...")
+        log_messages.append(f"⏳ Risoluzione in corso... Questo può richiedere fino a {solver_settings(data)['time_limit']:g} secondi per configurazioni complesse")
+    elif USE_OPTIMIZE_HOLES:
         log_messages.append("\nAvvio ottimizzazione modello (minimizzazione buchi)...")
-        log_messages.append("⏳ Risoluzione in corso... Questo può richiedere fino a 5 minuti per configurazioni complesse")
+        log_messages.append(f"⏳ Risoluzione in corso... Questo può richiedere fino a {solver_settings(data)['time_limit']:g} secondi per configurazioni complesse")
     else:
         log_messages.append("\nAvvio ricerca soluzione valida (senza ottimizzazione)...")
-        log_messages.append("⏳ Risoluzione in corso... Questo può richiedere fino a 5 minuti per configurazioni complesse")
-    solver = cp_model.CpSolver(); 
-    solver.parameters.max_time_in_seconds = 300;  # Aumentato a 5 minuti
-    solver.parameters.num_search_workers = os.cpu_count() or 8;
-    solver.parameters.randomize_search = True
-    solver.parameters.log_search_progress = True  # Log del progresso per debug
-    res = solver.Solve(model)
+        log_messages.append(f"⏳ Risoluzione in corso... Questo può richiedere fino a {solver_settings(data)['time_limit']:g} secondi per configurazioni complesse")
+    start = time.perf_counter()
+    solver, res = solve_model(sm, log_messages, stats, on_progress=on_progress, control=control)
+    stats['timings']['solve'] = time.perf_counter() - start
+    start = time.perf_counter()
 
     # --- 8. DIAGNOSTICA POST-RISOLUZIONE ---
     diagnostics_report = []
     has_solution = res in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+    stats['status'] = solver.StatusName(res)
+    # Unica lettura dei valori dal solver: diagnostica, tabelle, totali ed export derivano da `schedule`
+    schedule = Schedule.from_solver(sm, solver) if has_solution else None
+    if schedule is not None:
+        stats['hole_hours'] = units_to_hours(schedule.hole_units)
     
     if not has_solution:
         diagnostics_report.append("--- ANALISI DI FATTIBILITA' DEI VINCOLI ---")
-        if active_constraints_for_report:
+        conflict = None
+        # Solo un modello dimostrato insolubile: dopo un limite di tempo (UNKNOWN) il budget è già esaurito
+        if res == cp_model.INFEASIBLE and stats.get('stop_reason') != 'user' and explain_infeasible:
+            log_messages.append("🔎 Ricerca delle regole in conflitto...")
+            conflict = stats['conflict'] = find_conflicting_rules(data, time_limit=min(60.0, stats['solver']['time_limit']), settings=stats['solver'])
+        if conflict and conflict['status'] == 'conflict':
+            diagnostics_report.append(f"Regole in conflitto ({'insieme minimo' if conflict['minimal'] else 'insieme ridotto'}, trovato in {conflict['time']:.1f}s):")
+            for rule in conflict['rules']: diagnostics_report.append(f"  - {rule}")
+            diagnostics_report.append("\nSUGGERIMENTO: Rimuovi o allenta almeno una di queste regole e rigenera l'orario.")
+        elif conflict and conflict['status'] == 'base':
+            diagnostics_report.append("Il modello è insolubile anche senza vincoli specifici. Controllare i dati di base (ore, assegnazioni).")
+        elif conflict and conflict['status'] == 'feasible':
+            diagnostics_report.append("Le regole attive sono compatibili tra loro: il solver non ha trovato una soluzione nel tempo disponibile.")
+            diagnostics_report.append("\nSUGGERIMENTO: Aumenta il tempo (SOLVER_TIME_LIMIT o profilo 'thorough'), usa la risoluzione in due fasi o un warm start.")
+        elif res == cp_model.UNKNOWN:
+            diagnostics_report.append("Nessuna soluzione trovata nel tempo disponibile: il modello non è stato dimostrato insolubile.")
+            diagnostics_report.append("\nSUGGERIMENTO: Aumenta il tempo (SOLVER_TIME_LIMIT o profilo 'thorough'), usa la risoluzione in due fasi o un warm start.")
+        elif active_constraints_for_report:
             diagnostics_report.append("Il modello è insolubile con i seguenti vincoli attivi:")
             for c in active_constraints_for_report: diagnostics_report.append(f"  - {c}")
             diagnostics_report.append("\nSUGGERIMENTO: Prova a disattivare i vincoli più restrittivi (es. START_AT, END_AT, GROUP_DAILY) uno alla volta per trovare il punto di conflitto.")
@@ -395,543 +1961,201 @@ def generate_schedule(config):
     else:
         #... (Il resto della diagnostica e dell'output non cambia)
         diagnostics_report.append("--- VERIFICA DEI VINCOLI SULLA SOLUZIONE TROVATA ---")
-        
-        is_ok_class_hours = True; details_class_hours = []
-        for cl in CLASSI:
-            required = hours_to_units(ORE_SETTIMANALI_CLASSI[cl])
-            found = sum(solver.Value(x[(cl, day, s_idx, t)]) * u for day in GIORNI for s_idx, (_, _, u) in enumerate(class_slots[cl][day]) for t in allowed_teachers_per_class[cl])
-            if required != found: is_ok_class_hours = False; details_class_hours.append(f"  - FAIL: Classe {cl} - Richieste: {units_to_hours(required)}h, Trovate: {units_to_hours(found)}h")
-        diagnostics_report.append(f"[{'PASS' if is_ok_class_hours else 'FAIL'}] Ore settimanali totali per classe"); diagnostics_report.extend(details_class_hours)
-        
-        is_ok_teacher_assign = True; details_teacher_assign = []
-        for t, assignments in ASSEGNAZIONE_DOCENTI.items():
-            for cl, hours in assignments.items():
-                if cl == 'copertura': continue
-                required = hours_to_units(hours)
-                found = sum(solver.Value(x.get((cl, day, s_idx, t), 0)) * u for day in GIORNI for s_idx, (_, _, u) in enumerate(class_slots[cl][day]))
-                if required != found: is_ok_teacher_assign = False; details_teacher_assign.append(f"  - FAIL: Docente {t} in Classe {cl} - Richieste: {units_to_hours(required)}h, Trovate: {units_to_hours(found)}h")
-        diagnostics_report.append(f"[{'PASS' if is_ok_teacher_assign else 'FAIL'}] Ore specifiche Docente-Classe"); diagnostics_report.extend(details_teacher_assign)
-        
-        if USE_MAX_DAILY_HOURS_PER_CLASS:
-            is_ok_max_daily = True; details_max_daily = []
-            for t, assignments in ASSEGNAZIONE_DOCENTI.items():
-                for cl in assignments:
-                    if cl == 'copertura': continue
-                    for day in GIORNI:
-                        found_units = sum(solver.Value(x.get((cl, day, s_idx, t), 0)) * u for s_idx, (_, _, u) in enumerate(class_slots[cl][day]))
-                        if found_units > hours_to_units(MAX_DAILY_HOURS_PER_CLASS): is_ok_max_daily = False; details_max_daily.append(f"  - FAIL: {t} in {cl} il {day} ha {units_to_hours(found_units)}h (> {MAX_DAILY_HOURS_PER_CLASS}h).")
-            diagnostics_report.append(f"[{'PASS' if is_ok_max_daily else 'FAIL'}] Massimo {MAX_DAILY_HOURS_PER_CLASS} ore/giorno per docente nella stessa classe"); diagnostics_report.extend(details_max_daily)
-
-        if USE_MAX_ONE_HOLE:
-            max_blocks_found = 0; violations = []
-            for t in teachers:
-                for day in GIORNI:
-                    works_at_time = [solver.Value(b.get((t, day, sl), 0)) for sl in GLOBAL_SCHEDULING_TIMES]
-                    if not any(works_at_time): continue
-                    num_blocks = sum([works_at_time[0]] + [1 for i in range(1, len(works_at_time)) if works_at_time[i] and not works_at_time[i-1]])
-                    max_blocks_found = max(max_blocks_found, num_blocks)
-                    if num_blocks > 2: violations.append(f"  - FAIL: {t} il {day} ha {num_blocks-1} buchi.")
-            diagnostics_report.append(f"[{'PASS' if max_blocks_found <= 2 else 'FAIL'}] Continuità oraria (max 1 buco): Max blocchi trovati: {max_blocks_found}."); diagnostics_report.extend(violations)
-
-        if USE_CONSECUTIVE_BLOCKS:
-            is_ok_consecutive = True; details_consecutive = []
-            for t in teachers:
-                if t in HOURS_PER_DAY_PER_CLASS and HOURS_PER_DAY_PER_CLASS[t] <= 1: continue
-                for cl in ASSEGNAZIONE_DOCENTI.get(t, {}):
-                    if cl == 'copertura': continue
-                    for day in GIORNI:
-                        daily_units = sum(solver.Value(x.get((cl, day, s_idx, t), 0)) * u for s_idx, (_, _, u) in enumerate(class_slots[cl][day]))
-                        if daily_units in [hours_to_units(2), hours_to_units(3)]:
-                            indices = [i for i, sl in enumerate(GLOBAL_SCHEDULING_TIMES) if any(solver.Value(x.get((cl, day, s_idx, t), 0)) for s_idx, (s_label, _, _) in enumerate(class_slots[cl][day]) if s_label == sl)]
-                            if len(indices) > 0 and (max(indices) - min(indices) > len(indices) - 1):
-                                is_ok_consecutive = False
-                                taught_at = [GLOBAL_SCHEDULING_TIMES[i] for i in indices]
-                                details_consecutive.append(f"  - FAIL: {t} in {cl} il {day} ha {units_to_hours(daily_units)} ore non consecutive ({', '.join(taught_at)}).")
-            diagnostics_report.append(f"[{'PASS' if is_ok_consecutive else 'FAIL'}] Lezioni di 2 o 3 ore sono consecutive"); diagnostics_report.extend(details_consecutive)
-
-        if HOURS_PER_DAY_PER_CLASS:
-            is_ok = True; details = []
-            for t, exact_hours in HOURS_PER_DAY_PER_CLASS.items():
-                for cl, hours in ASSEGNAZIONE_DOCENTI.get(t, {}).items():
-                    if cl == 'copertura': continue
-                    for day in GIORNI:
-                        units_taught = sum(solver.Value(x.get((cl, day, s_idx, t), 0)) * u for s_idx, (_, _, u) in enumerate(class_slots[cl][day]))
-                        hours_taught = units_to_hours(units_taught)
-                        if hours_taught != 0 and hours_taught != exact_hours: 
-                            is_ok = False; details.append(f"  - FAIL: {t} in {cl} il {day} ha {hours_taught}h (dovrebbe essere 0 o {exact_hours}h)")
-            diagnostics_report.append(f"[{'PASS' if is_ok else 'FAIL'}] Ore giornaliere per classe per {list(HOURS_PER_DAY_PER_CLASS.keys())}"); diagnostics_report.extend(details)
-        
-        if ONLY_DAYS:
-            is_ok = True; details = []
-            for teacher, allowed_days in ONLY_DAYS.items():
-                for day in set(GIORNI) - allowed_days:
-                    work_on_forbidden_day = any(solver.Value(b.get((teacher, day, sl), 0)) for sl in GLOBAL_SCHEDULING_TIMES)
-                    if work_on_forbidden_day: is_ok = False; details.append(f"  - FAIL: {teacher} lavora il {day}, che non è un giorno consentito.")
-            diagnostics_report.append(f"[{'PASS' if is_ok else 'FAIL'}] Regole di giorni consentiti per {list(ONLY_DAYS.keys())}"); diagnostics_report.extend(details)
-        
-        if GROUP_DAILY_TWO_CLASSES:
-            is_ok = True; details = []
-            for t in GROUP_DAILY_TWO_CLASSES:
-                classes = [c for c in ASSEGNAZIONE_DOCENTI.get(t, {}) if c != 'copertura']
-                if len(classes) == 2:
-                    for day in GIORNI:
-                        for cl in classes:
-                            units_taught = sum(solver.Value(x.get((cl, day, s_idx, t), 0)) * u for s_idx, (_, _, u) in enumerate(class_slots[cl][day]))
-                            if units_taught < hours_to_units(1): is_ok = False; details.append(f"  - FAIL: {t} in {cl} il {day} ha solo {units_to_hours(units_taught)}h (richiesta >= 1h).")
-            diagnostics_report.append(f"[{'PASS' if is_ok else 'FAIL'}] Almeno 1h/giorno in entrambe le classi per {GROUP_DAILY_TWO_CLASSES}"); diagnostics_report.extend(details)
-        
-        if START_AT:
-            is_ok = True; details = []
-            for teacher, rules in START_AT.items():
-                for day, start_hour in rules.items():
-                    for sched_label in GLOBAL_SCHEDULING_TIMES:
-                        if int(sched_label.split(':')[0]) < start_hour:
-                            if solver.Value(b.get((teacher, day, sched_label), 0)): is_ok = False; details.append(f"  - FAIL: {teacher} lavora alle {sched_label} di {day}, violando la regola di inizio ore {start_hour}.")
-            diagnostics_report.append(f"[{'PASS' if is_ok else 'FAIL'}] Regole di inizio orario per {list(START_AT.keys())}"); diagnostics_report.extend(details)
-        
-        if END_AT:
-            is_ok = True; details = []
-            for teacher, rules in END_AT.items():
-                for day, end_hour in rules.items():
-                    for sched_label in GLOBAL_SCHEDULING_TIMES:
-                        if int(sched_label.split(':')[0]) >= end_hour:
-                            if solver.Value(b.get((teacher, day, sched_label), 0)): is_ok = False; details.append(f"  - FAIL: {teacher} lavora alle {sched_label} di {day}, violando la regola di fine ore {end_hour}.")
-            diagnostics_report.append(f"[{'PASS' if is_ok else 'FAIL'}] Regole di fine orario per {list(END_AT.keys())}"); diagnostics_report.extend(details)
-
-        if MIN_TWO_HOURS_IF_PRESENT_SPECIFIC:
-            is_ok = True; details = []
-            for t in MIN_TWO_HOURS_IF_PRESENT_SPECIFIC:
-                for day in GIORNI:
-                    daily_total_units = 0
-                    for cl in ASSEGNAZIONE_DOCENTI.get(t, {}):
-                        if cl == 'copertura': continue
-                        daily_total_units += sum(solver.Value(x.get((cl, day, s_idx, t), 0)) * u for s_idx, (_, _, u) in enumerate(class_slots[cl][day]))
-                    daily_total_units += sum(solver.Value(var) * u for (d, s_idx, tt), (var, _, _, u) in copertura_vars.items() if tt == t and d == day)
-                    if daily_total_units > 0 and daily_total_units < hours_to_units(2):
-                        is_ok = False
-                        details.append(f"  - FAIL: Docente {t} il {day} ha solo {units_to_hours(daily_total_units)}h di lezione (richieste min 2h se presente).")
-            diagnostics_report.append(f"[{'PASS' if is_ok else 'FAIL'}] Minimo 2 ore/giorno se presente per {MIN_TWO_HOURS_IF_PRESENT_SPECIFIC}"); diagnostics_report.extend(details)
-
-        if ASSEGNAZIONE_DOCENTI_SPECIFICHE:
-            is_ok = True; details = []
-            for assignment in ASSEGNAZIONE_DOCENTI_SPECIFICHE:
-                teacher, classe, day, start_time, duration = assignment
-                required_units = hours_to_units(duration)
-                
-                # Verifica che il docente sia effettivamente assegnato nel giorno/orario/classe specificato
-                assignment_found = False
-                total_units_at_time = 0
-                
-                for s_idx, (sl, fl, u) in enumerate(class_slots[classe][day]):
-                    if sl == start_time:
-                        if solver.Value(x.get((classe, day, s_idx, teacher), 0)):
-                            assignment_found = True
-                            total_units_at_time += u
-                
-                if not assignment_found:
-                    is_ok = False
-                    details.append(f"  - FAIL: {teacher} non è assegnato alla classe {classe} alle {start_time} di {day} come richiesto.")
-                elif total_units_at_time < required_units:
-                    is_ok = False
-                    details.append(f"  - FAIL: {teacher} in {classe} alle {start_time} di {day} ha solo {units_to_hours(total_units_at_time)}h (richieste {duration}h).")
-                else:
-                    details.append(f"  - PASS: {teacher} in {classe} alle {start_time} di {day} ha {units_to_hours(total_units_at_time)}h (richieste {duration}h).")
-            
-            diagnostics_report.append(f"[{'PASS' if is_ok else 'FAIL'}] Assegnazioni specifiche per {len(ASSEGNAZIONE_DOCENTI_SPECIFICHE)} vincoli"); diagnostics_report.extend(details)
-
-        # Analisi dei buchi (sempre eseguita per informazione)
-        total_hole_units = sum(solver.Value(h) for h in holes.values())
-        non_2h_hole_days = 0
-        for t in teachers:
-            for day in GIORNI:
-                daily_hole_units = sum(solver.Value(holes.get((t, day, sl), 0)) for sl in GLOBAL_SCHEDULING_TIMES)
-                if daily_hole_units > 0 and daily_hole_units != hours_to_units(2):
-                    non_2h_hole_days += 1
-        
-        diagnostics_report.append(f"[INFO] Analisi buchi: Trovate {units_to_hours(total_hole_units)} ore di buco totali.")
-        if non_2h_hole_days > 0:
-            diagnostics_report.append(f"  - ATTENZIONE: Ci sono {non_2h_hole_days} orari giornalieri con buchi di durata diversa da 2 ore.")
-        else:
-            diagnostics_report.append("  - OTTIMO: Tutti i buchi presenti sono di 0 o 2 ore.")
-        
-        # Note sui vincoli attivi
-        if USE_MAX_ONE_HOLE:
-            diagnostics_report.append("  - Nota: Vincolo 'max 1 buco' attivo.")
-        if USE_OPTIMIZE_HOLES:
-            diagnostics_report.append("  - Nota: Ottimizzazione buchi attiva nella soluzione.")
-        if not USE_MAX_ONE_HOLE and not USE_OPTIMIZE_HOLES:
-            diagnostics_report.append("  - Nota: Nessun vincolo sui buchi attivo (solo analisi informativa).")
+        diagnostics_report.extend(verify_schedule(schedule))
+
+        if 'stop_reason' in stats:
+            diagnostics_report.append(f"[INFO] Arresto della ricerca dopo {stats['solve_time']:.1f}s: {stats['stop_detail']}.")
+            if 'objective' in stats:
+                diagnostics_report.append(f"  - {'Obiettivo (spostamenti e buchi)' if repair is not None else 'Penalità buchi'}: {stats['objective']:.0f}, limite inferiore: {stats['bound']:.0f} (gap {100.0 * relative_gap(stats['objective'], stats['bound']):.1f}%).")
 
     diagnostics_string = "\n".join(diagnostics_report)
+    stats['timings']['diagnostics'] = time.perf_counter() - start
+    if repair is not None and 'objective' in stats:
+        # Record e storico conservano la penalità buchi; l'obiettivo combinato resta nelle statistiche della riparazione
+        stats['repair'].update(objective=stats.pop('objective'), bound=stats.pop('bound'))
+        if data.USE_OPTIMIZE_HOLES: stats['objective'] = schedule.hole_penalty
 
     if not has_solution:
         log_messages.append("\nNessuna soluzione trovata.")
-        return None, None, "\n".join(log_messages), diagnostics_string
+        return ScheduleResult(log="\n".join(log_messages), diagnostics=diagnostics_string, stats=stats)
+
+    solution = schedule.to_solution()
+    record = encode_solution(solution, config_hash(config), stats.get('objective'),
+                             {k: stats[k] for k in SAVED_STATS if k in stats})
 
     # --- 9. GENERAZIONE OUTPUT ---
+    start = time.perf_counter()
     log_messages.append("\nSoluzione trovata. Generazione output...")
-    log_messages.append("⏳ Elaborazione dati per Excel...")
-    
-    def format_duration(hours):
-        """Formatta la durata in formato (1h 30m) o (1h)"""
-        if hours == 0:
-            return ""
-        h = int(hours)
-        m = int((hours - h) * 60)
-        if m == 0:
-            return f"({h}h)"
-        else:
-            return f"({h}h {m}m)"
-    
-    def process_consecutive_entries_by_day(column_data, slot_labels):
-        """
-        Processa una colonna per raggruppare le voci consecutive uguali,
-        ma solo all'interno della stessa giornata.
-        """
-        if not column_data or len(column_data) == 0:
-            return column_data
-            
-        def extract_name_and_duration(cell_text):
-            """Estrae il nome base e la durata da una cella"""
-            if not cell_text or cell_text == "" or str(cell_text).lower() == "nan":
-                return None, 0
-            
-            cell_text = str(cell_text).strip()
-            if "(" in cell_text and ")" in cell_text:
-                try:
-                    name = cell_text.split("(")[0].strip()
-                    duration_str = cell_text.split("(")[1].split(")")[0]
-                    
-                    # Parse della durata (es: "1h", "1h 30m", "2h")
-                    hours = 0
-                    minutes = 0
-                    
-                    if "h" in duration_str:
-                        parts = duration_str.split("h")
-                        try:
-                            hours = int(parts[0].strip())
-                        except:
-                            hours = 1
-                        
-                        if len(parts) > 1 and parts[1].strip():
-                            minute_part = parts[1].strip()
-                            if "m" in minute_part:
-                                try:
-                                    minutes = int(minute_part.replace("m", "").strip())
-                                except:
-                                    minutes = 0
-                    
-                    duration = hours + minutes / 60.0
-                    return name, duration
-                except:
-                    # Se il parsing fallisce, tratta come testo normale
-                    return cell_text, 1.0
-            else:
-                # Nessuna durata specificata, assume 1 ora
-                return cell_text, 1.0
-        
-        def get_day_from_slot(slot_label):
-            """Estrae il giorno da un'etichetta slot (es: 'LUN1' -> 'LUN')"""
-            if not slot_label or len(slot_label) < 3:
-                return ""
-            return slot_label[:3]  # Primi 3 caratteri sono il giorno
-        
-        processed = []
-        i = 0
-        max_iterations = len(column_data) * 2  # Controllo di sicurezza
-        iterations = 0
-        
-        while i < len(column_data) and iterations < max_iterations:
-            iterations += 1
-            current_name, current_duration = extract_name_and_duration(column_data[i])
-            current_day = get_day_from_slot(slot_labels[i])
-            
-            # Se cella vuota o nan, aggiungi così com'è
-            if current_name is None:
-                processed.append(column_data[i])
-                i += 1
-                continue
-            
-            # Trova tutte le celle consecutive con lo stesso nome NELLO STESSO GIORNO
-            consecutive_group = [(current_name, current_duration)]
-            j = i + 1
-            
-            while j < len(column_data):
-                next_name, next_duration = extract_name_and_duration(column_data[j])
-                next_day = get_day_from_slot(slot_labels[j])
-                
-                # Controlla se è lo stesso nome E lo stesso giorno
-                if next_name == current_name and next_day == current_day:
-                    consecutive_group.append((next_name, next_duration))
-                    j += 1
-                else:
-                    break
-            
-            # Genera l'output per il gruppo
-            if len(consecutive_group) == 1:
-                # Singola occorrenza, mantieni l'originale
-                processed.append(column_data[i])
-            else:
-                # Multiple occorrenze consecutive nello stesso giorno
-                cumulative_duration = 0
-                for k, (name, duration) in enumerate(consecutive_group):
-                    cumulative_duration += duration
-                    if k == len(consecutive_group) - 1:
-                        # Ultima occorrenza: nome + durata cumulativa totale
-                        processed.append(f"{name} {format_duration(cumulative_duration)}")
-                    else:
-                        # Tutte le altre occorrenze: solo il nome
-                        processed.append(name)
-            
-            i = j
-        
-        if iterations >= max_iterations:
-            log_messages.append("⚠️ Warning: Raggiunto limite iterazioni in process_consecutive_entries_by_day")
-            
-        return processed
-
-    def process_consecutive_entries(column_data):
-        """
-        Processa una colonna per raggruppare le voci consecutive uguali.
-        Versione ottimizzata con controlli di sicurezza.
-        """
-        if not column_data or len(column_data) == 0:
-            return column_data
-            
-        def extract_name_and_duration(cell_text):
-            """Estrae il nome base e la durata da una cella"""
-            if not cell_text or cell_text == "" or str(cell_text).lower() == "nan":
-                return None, 0
-            
-            cell_text = str(cell_text).strip()
-            if "(" in cell_text and ")" in cell_text:
-                try:
-                    name = cell_text.split("(")[0].strip()
-                    duration_str = cell_text.split("(")[1].split(")")[0]
-                    
-                    # Parse della durata (es: "1h", "1h 30m", "2h")
-                    hours = 0
-                    minutes = 0
-                    
-                    if "h" in duration_str:
-                        parts = duration_str.split("h")
-                        try:
-                            hours = int(parts[0].strip())
-                        except:
-                            hours = 1
-                        
-                        if len(parts) > 1 and parts[1].strip():
-                            minute_part = parts[1].strip()
-                            if "m" in minute_part:
-                                try:
-                                    minutes = int(minute_part.replace("m", "").strip())
-                                except:
-                                    minutes = 0
-                    
-                    duration = hours + minutes / 60.0
-                    return name, duration
-                except:
-                    # Se il parsing fallisce, tratta come testo normale
-                    return cell_text, 1.0
-            else:
-                # Nessuna durata specificata, assume 1 ora
-                return cell_text, 1.0
-        
-        processed = []
-        i = 0
-        max_iterations = len(column_data) * 2  # Controllo di sicurezza
-        iterations = 0
-        
-        while i < len(column_data) and iterations < max_iterations:
-            iterations += 1
-            current_name, current_duration = extract_name_and_duration(column_data[i])
-            
-            # Se cella vuota o nan, aggiungi così com'è
-            if current_name is None:
-                processed.append(column_data[i])
-                i += 1
-                continue
-            
-            # Trova tutte le celle consecutive con lo stesso nome
-            consecutive_group = [(current_name, current_duration)]
-            j = i + 1
-            
-            while j < len(column_data):
-                next_name, next_duration = extract_name_and_duration(column_data[j])
-                if next_name == current_name:
-                    consecutive_group.append((next_name, next_duration))
-                    j += 1
-                else:
-                    break
-            
-            # Genera l'output per il gruppo
-            if len(consecutive_group) == 1:
-                # Singola occorrenza, mantieni l'originale
-                processed.append(column_data[i])
-            else:
-                # Multiple occorrenze consecutive
-                cumulative_duration = 0
-                for k, (name, duration) in enumerate(consecutive_group):
-                    cumulative_duration += duration
-                    if k == len(consecutive_group) - 1:
-                        # Ultima occorrenza: nome + durata cumulativa totale
-                        processed.append(f"{name} {format_duration(cumulative_duration)}")
-                    else:
-                        # Tutte le altre occorrenze: solo il nome
-                        processed.append(name)
-            
-            i = j
-        
-        if iterations >= max_iterations:
-            log_messages.append("⚠️ Warning: Raggiunto limite iterazioni in process_consecutive_entries")
-            
-        return processed
-    
-    log_messages.append("📊 Inizializzazione file Excel...")
-    wb = Workbook(); day_colors = {"LUN": "FFFFCC", "MAR": "CCFFCC", "MER": "CCE5FF", "GIO": "FFDDCC", "VEN": "E5CCFF"}
-    
-    # === FOGLIO CLASSI ===
-    log_messages.append("📊 Generazione foglio Classi...")
-    ws_classi = wb.active; ws_classi.title = "Classi"; ws_classi.append(["Slot"] + CLASSI + ["Copertura"])
-    orario_classi = defaultdict(dict); orario_copertura = defaultdict(str)
-    
-    for (cl, day, s_idx, t), var in x.items():
-        if solver.Value(var) == 1: 
-            slot_key = (day, class_slots[cl][day][s_idx][0])
-            duration = units_to_hours(class_slots[cl][day][s_idx][2])
-            orario_classi[slot_key][cl] = f"{t} {format_duration(duration)}"
-            
-    for (d, s_idx, t), (var, sl, fl, u) in copertura_vars.items():
-        if solver.Value(var) == 1: 
-            duration = units_to_hours(u)
-            orario_copertura[(d, sl)] += f"{t} {format_duration(duration)} "
-    
-    # Costruisci prima tutte le righe, poi processa le colonne per raggruppamenti consecutivi
-    log_messages.append("📋 Costruzione dati tabella classi...")
-    all_rows_data = []
-    for day in GIORNI:
-        for sched_label in GLOBAL_SCHEDULING_TIMES:
-            row_data = [EXCEL_LABELS[(day, sched_label)]] + [orario_classi.get((day, sched_label), {}).get(cl, "") for cl in CLASSI] + [orario_copertura.get((day, sched_label), "").strip()]
-            all_rows_data.append(row_data)
-    
-    # Processa ogni colonna per i raggruppamenti consecutivi (esclusa la prima colonna che è l'etichetta)
-    # Ma considera solo raggruppamenti all'interno della stessa giornata
-    log_messages.append("🔄 Applicazione raggruppamenti consecutivi classi...")
-    for col_idx in range(1, len(all_rows_data[0])):
-        column_data = [row[col_idx] for row in all_rows_data]
-        slot_labels = [row[0] for row in all_rows_data]  # Etichette slot per identificare i giorni
-        processed_column = process_consecutive_entries_by_day(column_data, slot_labels)
-        for row_idx, processed_value in enumerate(processed_column):
-            all_rows_data[row_idx][col_idx] = processed_value
-    
-    # Aggiungi le righe processate al foglio
-    log_messages.append("📝 Scrittura foglio classi...")
-    for row_data in all_rows_data:
-        ws_classi.append(row_data)
-        # Trova il giorno dalla prima colonna per applicare il colore
-        day_label = row_data[0][:3]  # Prendi i primi 3 caratteri (LUN, MAR, ecc.)
-        for cell in ws_classi[ws_classi.max_row]: 
-            cell.fill = PatternFill(start_color=day_colors[day_label], end_color=day_colors[day_label], fill_type="solid")
-
-    # Riga vuota
-    ws_classi.append([""] * (len(CLASSI) + 2))
-    
-    # Riga totali per classi
-    log_messages.append("🧮 Calcolo totali classi...")
-    totals_row = ["TOTALE"]
-    for cl in CLASSI:
-        total_hours = sum(solver.Value(x[(cl, day, s_idx, t)]) * units_to_hours(u) for day in GIORNI for s_idx, (_, _, u) in enumerate(class_slots[cl][day]) for t in allowed_teachers_per_class[cl])
-        totals_row.append(format_duration(total_hours))
-    # Totale copertura
-    total_copertura = sum(units_to_hours(u) for (d, s_idx, t), (var, sl, fl, u) in copertura_vars.items() if solver.Value(var) == 1)
-    totals_row.append(format_duration(total_copertura))
-    ws_classi.append(totals_row)
-
-    # === FOGLIO DOCENTI ===
-    log_messages.append("👨‍🏫 Generazione foglio Docenti...")
-    ws_docenti = wb.create_sheet("Docenti"); ws_docenti.append(["Slot"] + teachers)
-    orario_docenti = defaultdict(dict)
-    
-    for (cl, day, s_idx, t), var in x.items():
-        if solver.Value(var) == 1: 
-            slot_key = (day, class_slots[cl][day][s_idx][0])
-            duration = units_to_hours(class_slots[cl][day][s_idx][2])
-            orario_docenti[slot_key][t] = f"{cl} {format_duration(duration)}"
-            
-    for (d, s_idx, t), (var, sl, fl, u) in copertura_vars.items():
-        if solver.Value(var) == 1: 
-            duration = units_to_hours(u)
-            orario_docenti[(d, sl)][t] = f"COPERTURA {format_duration(duration)}"
-    
-    # Aggiungi sempre i buchi per visualizzazione completa
-    log_messages.append("🕳️ Aggiunta buchi orari...")
-    for t in teachers:
-        for day in GIORNI:
-            for sl in GLOBAL_SCHEDULING_TIMES:
-                if solver.Value(holes[(t, day, sl)]):
-                    # Trova la durata dello slot per questo orario
-                    slot_duration = 1.0  # Default 1 ora
-                    # Cerca in tutti gli slot per trovare la durata di questo orario
-                    for slot_name, slot_times in [("SLOT_1", SLOT_1), ("SLOT_2", SLOT_2), ("SLOT_3", SLOT_3)]:
-                        for time_str, duration in slot_times:
-                            if get_scheduling_label(time_str) == sl:
-                                slot_duration = duration
-                                break
-                    orario_docenti[(day, sl)][t] = f"BUCO {format_duration(slot_duration)}"
-
-    # Costruisci prima tutte le righe, poi processa le colonne per raggruppamenti consecutivi
-    log_messages.append("📋 Costruzione dati tabella docenti...")
-    all_rows_data_docenti = []
-    for day in GIORNI:
-        for sched_label in GLOBAL_SCHEDULING_TIMES:
-            row_data = [EXCEL_LABELS[(day, sched_label)]] + [orario_docenti.get((day, sched_label), {}).get(t, "") for t in teachers]
-            all_rows_data_docenti.append(row_data)
-    
-    # Processa ogni colonna per i raggruppamenti consecutivi (esclusa la prima colonna che è l'etichetta)
-    # Ma considera solo raggruppamenti all'interno della stessa giornata
-    log_messages.append("🔄 Applicazione raggruppamenti consecutivi docenti...")
-    for col_idx in range(1, len(all_rows_data_docenti[0])):
-        column_data = [row[col_idx] for row in all_rows_data_docenti]
-        slot_labels = [row[0] for row in all_rows_data_docenti]  # Etichette slot per identificare i giorni
-        processed_column = process_consecutive_entries_by_day(column_data, slot_labels)
-        for row_idx, processed_value in enumerate(processed_column):
-            all_rows_data_docenti[row_idx][col_idx] = processed_value
-    
-    # Aggiungi le righe processate al foglio
-    log_messages.append("📝 Scrittura foglio docenti...")
-    for row_data in all_rows_data_docenti:
-        ws_docenti.append(row_data)
-        # Trova il giorno dalla prima colonna per applicare il colore
-        day_label = row_data[0][:3]  # Prendi i primi 3 caratteri (LUN, MAR, ecc.)
-        for cell in ws_docenti[ws_docenti.max_row]: 
-            cell.fill = PatternFill(start_color=day_colors[day_label], end_color=day_colors[day_label], fill_type="solid")
-    
-    # Riga vuota
-    ws_docenti.append([""] * (len(teachers) + 1))
-    
-    # Riga totali per docenti
-    log_messages.append("🧮 Calcolo totali docenti...")
-    totals_row = ["TOTALE"]
-    for t in teachers:
-        # Calcola ore di lezione
-        lesson_hours = sum(solver.Value(x.get((cl, day, s_idx, t), 0)) * units_to_hours(u) for cl in CLASSI for day in GIORNI for s_idx, (_, _, u) in enumerate(class_slots[cl][day]))
-        # Calcola ore di copertura
-        copertura_hours = sum(solver.Value(var) * units_to_hours(u) for (d, s_idx, tt), (var, sl, fl, u) in copertura_vars.items() if tt == t)
-        total_hours = lesson_hours + copertura_hours
-        totals_row.append(format_duration(total_hours))
-    ws_docenti.append(totals_row)
-    
+    df_classi, df_docenti, excel_bytes = render_schedule(schedule, log_messages, output_path)
+    if output_path:
+        save_compact_solution(record, compact_solution_path(output_path))
+        log_messages.append(f"💾 Soluzione compatta salvata in '{compact_solution_path(output_path)}' (ricaricabile senza risolvere).")
+    stats['timings']['excel'] = time.perf_counter() - start
+
+    log_messages.append("🎉 Elaborazione completata con successo!")
+    return ScheduleResult(df_classi, df_docenti, "\n".join(log_messages), diagnostics_string, solution, stats, excel_bytes, schedule, record)
+
+
+def render_schedule(schedule, log_messages, output_path=None):
+    """Fogli Classi e Docenti di `schedule`: ritorna (df_classi, df_docenti, workbook Excel in bytes), salvato anche in `output_path` se dato."""
+    log_messages.append("📊 Generazione fogli Classi e Docenti (blocchi consecutivi e totali)...")
+    sheet_classi = schedule.class_sheet_rows()
+    sheet_docenti = schedule.teacher_sheet_rows()
+
+    # Le tabelle per la visualizzazione nascono dalle stesse righe del workbook, senza rileggere il file
+    df_classi = sheet_dataframe(sheet_classi)
+    df_docenti = sheet_dataframe(sheet_docenti)
+
     log_messages.append("💾 Salvataggio file Excel...")
-    output_filename = "orario_settimanale.xlsx"
-    wb.save(output_filename)
-    log_messages.append(f"✅ File '{output_filename}' generato con successo!")
+    buffer = BytesIO()
+    write_schedule_workbook([("Classi", sheet_classi), ("Docenti", sheet_docenti)], buffer)
+    excel_bytes = buffer.getvalue()
+    if output_path:
+        with open(output_path, 'wb') as f:
+            f.write(excel_bytes)
+        log_messages.append(f"✅ File '{output_path}' generato con successo!")
+    return df_classi, df_docenti, excel_bytes
 
-    log_messages.append("📖 Caricamento dati per visualizzazione...")
-    df_classi = pd.read_excel(output_filename, sheet_name="Classi", index_col=0, engine='openpyxl')
-    df_docenti = pd.read_excel(output_filename, sheet_name="Docenti", index_col=0, engine='openpyxl')
 
-    log_messages.append("🎉 Elaborazione completata con successo!")
-    return df_classi, df_docenti, "\n".join(log_messages), diagnostics_string
+def record_run(history, config, result, source):
+    """
+    Registra l'esecuzione nello storico (RunHistory) senza modificare `result`, che può essere
+    anche in cache. Ritorna (id, riga di log): id None se il database non è scrivibile.
+    """
+    try:
+        run_id = history.record(config, result, source)
+    except (sqlite3.Error, OSError) as e:
+        return None, f"⚠️ Esecuzione non registrata nello storico: {e}"
+    return run_id, f"🗂️ Esecuzione #{run_id} registrata nello storico."
+
+
+def reload_schedule(source, config, output_path=None, name=None):
+    """
+    Riapre una soluzione salvata in formato compatto (percorso, file-like o record, vedi solution.py)
+    e ne ricostruisce tabelle, Excel e diagnostica senza risolvere. Se la configurazione è
+    cambiata rispetto a quella della soluzione, le voci non più valide vengono scartate e
+    segnalate nel log; `name` è il nome mostrato nel log (default: quello del file).
+    Ritorna uno ScheduleResult come run_schedule.
+    """
+    start = time.perf_counter()
+    log_messages = []
+    solution, meta = load_compact_solution(source)
+    data = ScheduleData(config)
+    name = name or (os.path.basename(source) if isinstance(source, str) else getattr(source, 'name', 'caricata'))
+    objective = f", penalità buchi {meta['objective']:.0f}" if meta.get('objective') is not None else ""
+    log_messages.append(f"📂 Soluzione '{name}' del {meta.get('created', '?')} ({meta.get('stats', {}).get('status', 'stato sconosciuto')}{objective}), nessuna risoluzione.")
+    if meta.get('config_hash') != config_hash(config):
+        log_messages.append("⚠️ La configurazione è diversa da quella con cui la soluzione è stata generata: le voci non più valide vengono scartate.")
+    problems = []
+    schedule = Schedule.from_solution(data, solution, problems)
+    log_messages.extend(f" - Scartata: {p}" for p in problems)
+    diagnostics = "\n".join(["--- VERIFICA DEI VINCOLI SULLA SOLUZIONE CARICATA ---"] + verify_schedule(schedule))
+    df_classi, df_docenti, excel_bytes = render_schedule(schedule, log_messages, output_path)
+    stats = dict(meta.get('stats', {}))
+    stats['reload_time'] = time.perf_counter() - start
+    log_messages.append(f"✅ Orario ricaricato in {stats['reload_time'] * 1000:.0f} ms.")
+    solution = schedule.to_solution()
+    record = encode_solution(solution, config_hash(config), meta.get('objective'), meta.get('stats'))
+    return ScheduleResult(df_classi, df_docenti, "\n".join(log_messages), diagnostics, solution, stats, excel_bytes, schedule, record)
+
+class ScheduleJob:
+    """
+    Handle di una generazione eseguita in un thread in background (run_schedule).
+    Espone l'ultimo aggiornamento del solver, permette di fermare la ricerca accettando
+    la migliore soluzione trovata (stop) e, a fine esecuzione, il risultato o l'errore.
+    Con `cache` (ResultCache di result_cache.py) una richiesta già risolta non viene
+    ricalcolata: il risultato memorizzato viene salvato in `output_path` e restituito subito.
+    Con `run_history` (RunHistory di history.py) ogni esecuzione risolta viene registrata nello storico.
+    Con `repair=True` `hint` è l'orario da riparare con il minimo di spostamenti (run_repair di repair.py).
+    Con `model_cache` (ModelCache) il modello della generazione precedente viene ricostruito
+    in modo incrementale invece che da zero.
+    """
+
+    def __init__(self, config, hint=None, on_progress=None, cache=None, output_path=DEFAULT_OUTPUT_FILE, run_history=None, source="gui", repair=False,
+                 model_cache=None):
+        self.config = config
+        self.hint = hint
+        self.repair = repair
+        self.on_progress = on_progress
+        self.cache = cache
+        self.model_cache = model_cache
+        self.output_path = output_path
+        self.run_history = run_history
+        self.source = source
+        self.from_cache = False
+        self.run_id = None      # id dell'esecuzione nello storico
+        self.control = SolveControl()
+        self.latest = None      # ultimo aggiornamento di SolutionProgressCallback
+        self.history = []       # aggiornamenti senza snapshot, per grafici e riepiloghi
+        self.result = None
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self._done = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="schedule-job", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            if self.repair:
+                # La riparazione parte dall'orario corrente: nessun risultato in cache da riusare
+                from repair import run_repair
+                self.result = run_repair(self.config, self.hint, on_progress=self._handle_progress, control=self.control, output_path=self.output_path)
+            else:
+                cached = self.cache.get(self.config, self.hint) if self.cache is not None else None
+                if cached is not None:
+                    self.from_cache = True
+                    if self.output_path:
+                        with open(self.output_path, 'wb') as f:
+                            f.write(cached.excel_bytes)
+                        save_compact_solution(cached.record, compact_solution_path(self.output_path))
+                    self.result = cached
+                    return
+                self.result = run_schedule(self.config, hint=self.hint, on_progress=self._handle_progress, control=self.control, output_path=self.output_path,
+                                           model_cache=self.model_cache)
+                if self.cache is not None and not self.stop_requested:
+                    self.cache.put(self.config, self.hint, self.result)
+            if self.run_history is not None:
+                self.run_id, message = record_run(self.run_history, self.config, self.result, self.source)
+                # Copia: il risultato memorizzato nella cache resta senza la riga dello storico
+                self.result = replace(self.result, log=f"{self.result.log}\n{message}")
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.finished_at = time.time()
+            self._done.set()
+
+    def _handle_progress(self, update):
+        self.latest = update
+        self.history.append({k: v for k, v in update.items() if k != 'snapshot'})
+        return bool(self.on_progress(update)) if self.on_progress else False
+
+    def stop(self):
+        """Ferma la ricerca: il risultato conterrà la migliore soluzione trovata finora."""
+        self.control.stop()
+
+    def wait(self, timeout=None):
+        """Attende la fine della generazione; ritorna True se è terminata."""
+        return self._done.wait(timeout)
+
+    @property
+    def running(self):
+        return self._thread is not None and not self._done.is_set()
+
+    @property
+    def stop_requested(self):
+        return self.control.stop_requested
+
+    @property
+    def elapsed(self):
+        if self.started_at is None: return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
 
 def run_engine_in_cli_mode():
     import argparse
@@ -946,6 +2170,20 @@ Esempi di utilizzo:
   python engine.py                           # Usa config.json nella cartella corrente
   python engine.py --config ./config.json   # Specifica il file di configurazione
   python engine.py --config /path/to/my_config.json  # Percorso assoluto
+  python engine.py --save-solution soluzione.json    # Salva la soluzione per riusarla come hint
+  python engine.py --hint soluzione.json             # Warm start da una soluzione precedente
+  python engine.py --hint orario_2024.xlsx --hint-map rinomina.json  # Orario dell'anno scorso rimappato
+  python engine.py --repair orario_settimanale.soluzione.json  # Ripara l'orario corrente dopo una modifica, spostando il minimo
+  python engine.py --gap-limit 0.05 --no-improvement 30  # Ferma la ricerca con gap <= 5% o senza miglioramenti per 30s
+  python engine.py --profile quick_preview           # Anteprima rapida (60s)
+  python engine.py --profile reproducible --seed 7   # Risultato ripetibile con seed fisso
+  python engine.py --portfolio 4 --time-limit 120    # 4 risoluzioni con seed diversi, tiene la migliore
+  python engine.py --batch scenari/ --batch-jobs 2   # Risolve tutti gli scenari della cartella, 2 alla volta
+  python engine.py --validate orario_modificato.xlsx  # Verifica un orario modificato a mano, senza risolvere
+  python engine.py --load-solution orario_settimanale.soluzione.json  # Riapre un orario salvato, senza risolvere
+  python engine.py --history                         # Elenca le esecuzioni precedenti (vedi history.py)
+  python engine.py --compare-runs 3 5                # Confronta due esecuzioni dello storico
+  python engine.py --reopen-run 3                    # Rigenera l'orario dell'esecuzione 3, senza risolvere
         """
     )
     
@@ -955,9 +2193,193 @@ Esempi di utilizzo:
         default='config.json',
         help='Percorso del file di configurazione JSON (default: config.json)'
     )
+    parser.add_argument(
+        '--hint',
+        type=str,
+        default=None,
+        help=f'Soluzione precedente (JSON salvato con --save-solution, file compatto *{COMPACT_SUFFIX} oppure orario Excel generato) da usare come warm start'
+    )
+    parser.add_argument(
+        '--repair',
+        type=str,
+        default=None,
+        help='Orario corrente (stessi formati di --hint) da riparare dopo una modifica della configurazione: fissa le parti non toccate e sposta il minor numero di lezioni (vedi repair.py)'
+    )
+    parser.add_argument(
+        '--hint-map',
+        type=str,
+        default=None,
+        help='JSON {"classi": {vecchio: nuovo}, "docenti": {vecchio: nuovo}} per rimappare i nomi della soluzione di --hint o --repair'
+    )
+    parser.add_argument(
+        '--save-solution',
+        type=str,
+        default=None,
+        help='Salva la soluzione trovata in questo file JSON'
+    )
+    parser.add_argument(
+        '--two-phase',
+        action='store_true',
+        help='Risoluzione in due fasi: prima una soluzione valida, poi minimizzazione buchi (USE_TWO_PHASE_SOLVE)'
+    )
+    parser.add_argument(
+        '--two-phase-split',
+        type=float,
+        default=None,
+        help='Quota del tempo assegnata alla fase 1, tra 0 e 1 (TWO_PHASE_SPLIT, default 0.2)'
+    )
+    parser.add_argument(
+        '--profile',
+        choices=list(SOLVER_PROFILES),
+        default=None,
+        help=f"Profilo del solver (SOLVER_PROFILE, default {DEFAULT_SOLVER_PROFILE}): " + ", ".join(f"{k} = {p['label']} ({p['time_limit']}s)" for k, p in SOLVER_PROFILES.items())
+    )
+    parser.add_argument(
+        '--time-limit',
+        type=float,
+        default=None,
+        help='Tempo massimo di risoluzione in secondi, sostituisce quello del profilo (SOLVER_TIME_LIMIT)'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='Numero di worker di ricerca, 0 = tutte le CPU (SOLVER_WORKERS)'
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=None,
+        help='Seed casuale del solver (SOLVER_SEED)'
+    )
+    parser.add_argument(
+        '--linearization',
+        type=int,
+        choices=[0, 1, 2],
+        default=None,
+        help='Livello di linearizzazione CP-SAT: 0 = nessuna, 1 = default, 2 = massima (SOLVER_LINEARIZATION_LEVEL)'
+    )
+    parser.add_argument(
+        '--portfolio',
+        type=int,
+        default=None,
+        help='Numero di risoluzioni indipendenti (seed e parametri diversi) da eseguire in parallelo, tenendo la migliore (PORTFOLIO_SIZE)'
+    )
+    parser.add_argument(
+        '--portfolio-processes',
+        type=int,
+        default=None,
+        help='Processi del portfolio eseguiti contemporaneamente (PORTFOLIO_PROCESSES, default: uno per CPU)'
+    )
+    parser.add_argument(
+        '--gap-limit',
+        type=float,
+        default=None,
+        help='Ferma la ricerca quando il gap relativo tra penalità e limite inferiore scende sotto questa soglia, es. 0.05 (EARLY_STOP_RELATIVE_GAP)'
+    )
+    parser.add_argument(
+        '--objective-target',
+        type=float,
+        default=None,
+        help='Ferma la ricerca appena la penalità buchi è minore o uguale a questo valore (EARLY_STOP_OBJECTIVE_TARGET)'
+    )
+    parser.add_argument(
+        '--no-improvement',
+        type=float,
+        default=None,
+        help='Ferma la ricerca se non trova soluzioni migliori per questi secondi (EARLY_STOP_NO_IMPROVEMENT_SECONDS)'
+    )
+    parser.add_argument(
+        '--batch',
+        type=str,
+        nargs='+',
+        default=None,
+        help='Cartelle o pattern glob di configurazioni da risolvere in batch (ignora --config), vedi batch.py'
+    )
+    parser.add_argument(
+        '--batch-output',
+        type=str,
+        default='risultati_batch',
+        help='Cartella dei risultati del batch, una sottocartella per scenario (default: risultati_batch)'
+    )
+    parser.add_argument(
+        '--batch-jobs',
+        type=int,
+        default=None,
+        help='Scenari del batch risolti contemporaneamente (default: uno per CPU)'
+    )
+    parser.add_argument(
+        '--validate',
+        type=str,
+        default=None,
+        help='Verifica un orario Excel (anche modificato a mano) rispetto alla configurazione, senza risolvere (vedi validator.py)'
+    )
+    parser.add_argument(
+        '--load-solution',
+        type=str,
+        default=None,
+        help=f'Riapre una soluzione compatta (*{COMPACT_SUFFIX}, salvata accanto all\'Excel) e rigenera Excel e diagnostica senza risolvere'
+    )
+    parser.add_argument(
+        '--history',
+        action='store_true',
+        help='Elenca le ultime esecuzioni registrate nello storico (storico_orari.sqlite)'
+    )
+    parser.add_argument(
+        '--compare-runs',
+        type=int,
+        nargs=2,
+        metavar=('ID1', 'ID2'),
+        default=None,
+        help='Confronta due esecuzioni dello storico: esito, tempi per fase, configurazione, parametri e lezioni spostate'
+    )
+    parser.add_argument(
+        '--reopen-run',
+        type=int,
+        metavar='ID',
+        default=None,
+        help='Rigenera Excel e diagnostica di un\'esecuzione dello storico con la sua configurazione, senza risolvere'
+    )
+    parser.add_argument(
+        '--no-history',
+        action='store_true',
+        help='Non registra questa esecuzione nello storico'
+    )
     
     # Parse degli argomenti
     args = parser.parse_args()
+
+    # Parametri da riga di comando, applicati alla configurazione (o a ogni scenario del batch)
+    overrides = {}
+    if args.two_phase:
+        overrides['USE_TWO_PHASE_SOLVE'] = True
+    for flag, key in [('two_phase_split', 'TWO_PHASE_SPLIT'), ('profile', 'SOLVER_PROFILE'), ('time_limit', 'SOLVER_TIME_LIMIT'),
+                      ('workers', 'SOLVER_WORKERS'), ('seed', 'SOLVER_SEED'), ('linearization', 'SOLVER_LINEARIZATION_LEVEL'),
+                      ('portfolio', 'PORTFOLIO_SIZE'), ('portfolio_processes', 'PORTFOLIO_PROCESSES'), ('gap_limit', 'EARLY_STOP_RELATIVE_GAP'),
+                      ('objective_target', 'EARLY_STOP_OBJECTIVE_TARGET'), ('no_improvement', 'EARLY_STOP_NO_IMPROVEMENT_SECONDS')]:
+        if getattr(args, flag) is not None:
+            overrides[key] = getattr(args, flag)
+
+    if args.history or args.compare_runs or args.reopen_run is not None:
+        from history import RunHistory, format_runs
+        history = RunHistory()
+        try:
+            if args.compare_runs:
+                print("\n".join(history.compare(*args.compare_runs)))
+            elif args.reopen_run is not None:
+                result = history.reopen(args.reopen_run, output_path=DEFAULT_OUTPUT_FILE)
+                print(result.log + "\n\n" + result.diagnostics)
+                print(f"📁 File salvato: {os.path.abspath(DEFAULT_OUTPUT_FILE)}")
+            else:
+                print("\n".join(format_runs(history.list_runs(20))))
+        except ValueError as e:
+            print(f"\n❌ ERRORE: {e}")
+            sys.exit(1)
+        sys.exit(0)
+
+    if args.batch:
+        from batch import run_batch_cli
+        sys.exit(run_batch_cli(args.batch, args.batch_output, args.batch_jobs, overrides))
     
     print(f"Avvio generazione orario in modalità CLI...")
     print(f"File di configurazione: {args.config}")
@@ -986,10 +2408,85 @@ Esempi di utilizzo:
         sys.exit(1)
     
     print("✅ Configurazione caricata correttamente.")
+    config.update(overrides)
+    validation = validate_config(config)
+    for w in validation.warnings:
+        print(f"⚠️  {w}")
+    if not validation.ok:
+        print(f"\n❌ ERRORE: configurazione non valida ({len(validation.errors)} errori):")
+        for e in validation.errors:
+            print(f" - {e}")
+        sys.exit(1)
+
+    if args.validate:
+        from validator import validate_timetable
+        try:
+            validation = validate_timetable(args.validate, config)
+        except (OSError, ValueError) as e:
+            print(f"\n❌ ERRORE durante la lettura dell'orario: {e}")
+            sys.exit(1)
+        print("\n" + validation.text)
+        sys.exit(0 if validation.ok else 1)
+
+    if args.load_solution:
+        try:
+            result = reload_schedule(args.load_solution, config, output_path=DEFAULT_OUTPUT_FILE)
+        except (OSError, ValueError) as e:
+            print(f"\n❌ ERRORE durante il caricamento della soluzione: {e}")
+            sys.exit(1)
+        print("\n" + result.log)
+        print("\n" + result.diagnostics)
+        print(f"📁 File salvato: {os.path.abspath(DEFAULT_OUTPUT_FILE)}")
+        sys.exit(0)
+
+    hint = None
+    hint_path = args.repair or args.hint
+    if hint_path:
+        from solution import load_solution, load_name_map, remap_solution
+        try:
+            hint = load_solution(hint_path, ScheduleData(config).GLOBAL_SCHEDULING_TIMES)
+            if args.hint_map:
+                class_map, teacher_map = load_name_map(args.hint_map)
+                hint = remap_solution(hint, class_map, teacher_map)
+            print(f"🛠️ Riparazione dell'orario: {hint_path}" if args.repair else f"🔁 Warm start da: {hint_path}")
+        except Exception as e:
+            print(f"\n❌ ERRORE durante il caricamento della soluzione di partenza: {e}")
+            sys.exit(1)
+
     print("🚀 Avvio elaborazione...")
-    
-    # Genera l'orario
-    df_classi, df_docenti, log_output, diagnostics_output = generate_schedule(config)
+    print("ℹ️ Premi Ctrl+C per fermare la ricerca e accettare la migliore soluzione trovata.")
+
+    history = None
+    if not args.no_history:
+        from history import RunHistory
+        try:
+            history = RunHistory()
+        except sqlite3.Error as e:
+            print(f"⚠️ Storico non disponibile, l'esecuzione non verrà registrata: {e}")
+    data = ScheduleData(config)
+    if data.PORTFOLIO_SIZE > 1 and not args.repair:
+        from portfolio import run_portfolio_schedule
+        print(f"🎲 Portfolio di {data.PORTFOLIO_SIZE} risoluzioni con budget condiviso di {solver_settings(data)['time_limit']:g}s...")
+        result = run_portfolio_schedule(config, data.PORTFOLIO_SIZE, processes=data.PORTFOLIO_PROCESSES, hint=hint)
+        if history is not None:
+            result = replace(result, log=f"{result.log}\n{record_run(history, config, result, 'cli')[1]}")
+    else:
+        # Genera l'orario in un thread separato: il thread principale resta libero per Ctrl+C
+        job = ScheduleJob(config, hint=hint, on_progress=lambda update: print(format_progress(update), flush=True),
+                          run_history=history, source="cli", repair=bool(args.repair)).start()
+        while True:
+            try:
+                if job.wait(0.5): break
+            except KeyboardInterrupt:
+                if job.stop_requested:
+                    print("\n⛔ Interruzione forzata.")
+                    sys.exit(130)
+                print("\n✋ Interruzione richiesta: accetto la migliore soluzione trovata (Ctrl+C di nuovo per uscire subito)...")
+                job.stop()
+        if job.error is not None:
+            raise job.error
+        result = job.result
+    df_classi, df_docenti, log_output, diagnostics_output = result.as_tuple()
     
     print("\n" + "="*60)
     print("--- LOG DELL'ELABORAZIONE ---")
@@ -1003,10 +2500,16 @@ Esempi di utilizzo:
     
     if df_classi is not None:
         print("\n🎉 Orario generato con successo!")
-        print(f"📁 File salvato: {os.path.abspath('orario_settimanale.xlsx')}")
+        print(f"📁 File salvato: {os.path.abspath(DEFAULT_OUTPUT_FILE)}")
+        if result.record is not None:
+            print(f"💾 Soluzione compatta: {os.path.abspath(compact_solution_path(DEFAULT_OUTPUT_FILE))} (riapribile con --load-solution)")
+        if args.save_solution:
+            from solution import save_solution
+            print(f"💾 Soluzione salvata: {os.path.abspath(save_solution(result.solution, args.save_solution))}")
     else:
         print("\n❌ Errore nella generazione dell'orario. Controllare i log sopra.")
         sys.exit(1)
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # processi del portfolio nell'eseguibile PyInstaller
     run_engine_in_cli_mode()
\ No newline at end of file
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Generatore di istanze sintetiche per studi di scalabilità (hardware, tempi limite).
+Produce configurazioni nel formato di utils.load_config con numero di classi, docenti,
+giorni, griglie orarie, ore di copertura e densità dei vincoli specifici regolabili.
+
+Con feasible=True l'istanza è risolvibile per costruzione: viene prima "piantato" un
+orario che rispetta tutti i vincoli rigidi (copertura di ogni slot, un docente per ora,
+massimo un buco al giorno, blocchi consecutivi, massimo ore per classe al giorno, ore
+settimanali), poi ore assegnate e vincoli specifici vengono ricavati da quell'orario.
+L'orario piantato è restituito nel formato di solution.py e dimostra la fattibilità.
+Le istanze sono riproducibili dal seed.
+"""
+
+import argparse
+import os
+import random
+import sys
+
+from engine import ScheduleData, build_copertura_slots, hours_to_units, units_to_hours
+
+
+DAY_NAMES = ['LUN', 'MAR', 'MER', 'GIO', 'VEN', 'SAB']
+SLOT_KEYS = ['SLOT_1', 'SLOT_2', 'SLOT_3']  # ScheduleData supporta al massimo tre griglie
+
+
+def _hours(units):
+    h = units_to_hours(units)
+    return int(h) if float(h).is_integer() else h
+
+
+def _label_hour(sched_label):
+    return int(sched_label.split(':')[0])
+
+
+def _slot_templates(rng, n):
+    """Griglie giornaliere da 5 o 6 ore dalle 8:00; a volte l'ultima ora dura 1h30."""
+    templates = []
+    for _ in range(n):
+        n_slots = rng.choice([5, 5, 6])
+        slots = [(f"{8 + i}:00-{9 + i}:00", 1.0) for i in range(n_slots)]
+        if rng.random() < 0.3:
+            last = 8 + n_slots - 1
+            slots[-1] = (f"{last}:00-{last + 1}:30", 1.5)
+        templates.append(slots)
+    return templates
+
+
+def _class_names(n):
+    sections = -(-n // 5)
+    return [f"{year}{chr(ord('A') + s)}" for year in range(1, 6) for s in range(sections)][:n]
+
+
+def _runs(busy, global_times):
+    """Numero di blocchi continui di ore occupate (i blocchi oltre il primo sono separati da buchi)."""
+    return sum(1 for i, sl in enumerate(global_times) if sl in busy and (i == 0 or global_times[i - 1] not in busy))
+
+
+def _split_day(rng, slots):
+    """Divide gli slot di una giornata di classe in blocchi consecutivi da 1-3 slot."""
+    blocks, i = [], 0
+    while i < len(slots):
+        size = min(rng.choice([2, 2, 2, 3, 1]), len(slots) - i)
+        blocks.append(slots[i:i + size])
+        i += size
+    return blocks
+
+
+def generate_instance(n_classes=10, n_teachers=None, n_days=5, n_templates=3, copertura_hours=20,
+                      constraint_density=0.3, feasible=True, seed=0, max_weekly_hours=22, max_daily_hours=4.0):
+    """
+    Genera un'istanza sintetica. Ritorna (config, soluzione piantata).
+    `config` è nel formato interno dell'engine (salvabile con utils.save_config);
+    `n_teachers` è il numero iniziale di docenti (default 1.5 per classe): se l'orario
+    piantato lo richiede ne vengono aggiunti altri. `constraint_density` (0-1) è la
+    probabilità con cui ogni docente idoneo riceve ciascun vincolo specifico.
+    Con feasible=False i vincoli specifici sono casuali e l'istanza può essere impossibile.
+    """
+    rng = random.Random(seed)
+    giorni = DAY_NAMES[:max(1, min(n_days, len(DAY_NAMES)))]
+    templates = _slot_templates(rng, max(1, min(n_templates, len(SLOT_KEYS))))
+    classi = _class_names(n_classes)
+    n_teachers = n_teachers or max(2, round(n_classes * 1.5))
+
+    config = {'CLASSI': classi, 'GIORNI': giorni}
+    for k, key in enumerate(SLOT_KEYS):
+        config[key] = list(templates[k] if k < len(templates) else templates[0])
+    config['ASSEGNAZIONE_SLOT'] = {}
+    for cl in classi:
+        main = rng.randrange(len(templates))
+        config['ASSEGNAZIONE_SLOT'][cl] = {day: SLOT_KEYS[main if rng.random() < 0.7 else rng.randrange(len(templates))] for day in giorni}
+    config['MAX_ORE_SETTIMANALI_DOCENTI'] = max_weekly_hours
+    config['MAX_DAILY_HOURS_PER_CLASS'] = max_daily_hours
+    for flag in ['USE_MAX_DAILY_HOURS_PER_CLASS', 'USE_CONSECUTIVE_BLOCKS', 'USE_MAX_ONE_HOLE', 'USE_OPTIMIZE_HOLES']:
+        config[flag] = True
+    config['ASSEGNAZIONE_DOCENTI'] = {}  # serve a ScheduleData solo per griglie ed etichette
+    config['ORE_SETTIMANALI_CLASSI'] = {}
+    grid = ScheduleData(config)
+    global_times = grid.GLOBAL_SCHEDULING_TIMES
+
+    # --- Docenti e classi collegate: coppie di sezioni dello stesso anno, alcuni docenti trasversali ---
+    teachers = [f"DOC{i + 1:02d}" for i in range(n_teachers)]
+    links = {t: [] for t in teachers}
+    for i, t in enumerate(teachers):
+        if rng.random() < 0.2 and len(classi) > 2:
+            links[t] = rng.sample(classi, rng.randint(3, min(6, len(classi))))
+        else:
+            first = (2 * i) % len(classi)
+            links[t] = sorted({classi[first], classi[(first + 1) % len(classi)]}, key=classi.index)
+    for cl in classi:
+        while sum(cl in ls for ls in links.values()) < 2:
+            links[rng.choice([t for t in teachers if cl not in links[t]])].append(cl)
+    class_teachers = {cl: [t for t in teachers if cl in links[t]] for cl in classi}
+
+    # --- Orario piantato ---
+    max_daily_units = hours_to_units(max_daily_hours)
+    max_weekly_units = hours_to_units(max_weekly_hours)
+    busy = {}                       # (docente, giorno) -> etichette occupate
+    load = {t: 0 for t in teachers}  # unità settimanali
+    units = {}                       # (docente, classe, giorno) -> unità
+    blocks_by_teacher = {}           # docente -> [(classe, giorno, slot del blocco)]
+    solution = {'lessons': [], 'copertura': []}
+
+    def new_teacher():
+        t = f"DOC{len(teachers) + 1:02d}"
+        teachers.append(t); links[t] = []; load[t] = 0
+        return t
+
+    def fits(t, day, labels, block_units, cl=None):
+        taken = busy.get((t, day), set())
+        if any(sl in taken for sl in labels): return False
+        if load[t] + block_units > max_weekly_units: return False
+        if cl is not None and ((t, cl, day) in units or block_units > max_daily_units): return False
+        return _runs(taken | set(labels), global_times) <= 2
+
+    def assign(t, day, labels, block_units, cl=None):
+        busy.setdefault((t, day), set()).update(labels)
+        load[t] += block_units
+        if cl is not None: units[(t, cl, day)] = block_units
+
+    for day in giorni:
+        for cl in rng.sample(classi, len(classi)):
+            for block in _split_day(rng, grid.class_slots[cl][day]):
+                labels = [sl for sl, _, _ in block]
+                block_units = sum(u for _, _, u in block)
+                linked = sorted(rng.sample(class_teachers[cl], len(class_teachers[cl])), key=lambda t: load[t])
+                others = [t for t in teachers if t not in class_teachers[cl] and len(links[t]) < 4]
+                t = next((t for t in linked if fits(t, day, labels, block_units, cl)), None)
+                if t is None:
+                    t = next((t for t in rng.sample(others, len(others)) if fits(t, day, labels, block_units, cl)), None) or new_teacher()
+                    links[t].append(cl); class_teachers[cl].append(t)
+                assign(t, day, labels, block_units, cl)
+                blocks_by_teacher.setdefault(t, []).append((cl, day, block))
+                solution['lessons'].extend([cl, day, sl, t] for sl in labels)
+
+    copertura_slots = build_copertura_slots(hours_to_units(copertura_hours), giorni)
+    copertura_units = {}
+    for day in giorni:
+        for sl, _, u in copertura_slots.get(day, []):
+            candidates = sorted((t for t in teachers if fits(t, day, [sl], u)), key=lambda t: (t not in copertura_units, load[t]))
+            t = candidates[0] if candidates else new_teacher()
+            assign(t, day, [sl], u)
+            copertura_units[t] = copertura_units.get(t, 0) + u
+            solution['copertura'].append([day, sl, t])
+
+    # --- Ore assegnate ricavate dall'orario piantato ---
+    for t in teachers:
+        assign_t = {}
+        if t in copertura_units: assign_t['copertura'] = _hours(copertura_units[t])
+        for cl in classi:
+            total = sum(units.get((t, cl, day), 0) for day in giorni)
+            if total: assign_t[cl] = _hours(total)
+        if assign_t: config['ASSEGNAZIONE_DOCENTI'][t] = assign_t
+    config['ORE_SETTIMANALI_CLASSI'] = {cl: _hours(sum(u for day in giorni for _, _, u in grid.class_slots[cl][day])) for cl in classi}
+
+    if feasible:
+        _planted_rules(rng, config, constraint_density, giorni, global_times, busy, units, blocks_by_teacher, copertura_units)
+    else:
+        _random_rules(rng, config, constraint_density, giorni, global_times, grid)
+    return config, solution
+
+
+def _planted_rules(rng, config, density, giorni, global_times, busy, units, blocks_by_teacher, copertura_units):
+    """Vincoli specifici soddisfatti dall'orario piantato: l'istanza resta risolvibile."""
+    only_days, start_at, end_at, hours_per_day, group_daily, min_two, specific = {}, {}, {}, {}, set(), set(), {}
+    first_hour, last_hour = _label_hour(global_times[0]), _label_hour(global_times[-1])
+    for t, assign_t in config['ASSEGNAZIONE_DOCENTI'].items():
+        classes = [cl for cl in assign_t if cl != 'copertura']
+        present = [day for day in giorni if busy.get((t, day))]
+        if len(present) < len(giorni) and rng.random() < density:
+            only_days[t] = set(present)
+        for day in present:
+            hours = sorted(_label_hour(sl) for sl in busy[(t, day)])
+            if hours[0] > first_hour and rng.random() < density:
+                start_at.setdefault(t, {})[day] = hours[0]
+            if hours[-1] < last_hour and rng.random() < density:
+                end_at.setdefault(t, {})[day] = hours[-1] + 1
+        daily = {units[key] for key in units if key[0] == t}
+        if len(daily) == 1 and t not in copertura_units and rng.random() < density:
+            exact = units_to_hours(daily.pop())
+            if float(exact).is_integer(): hours_per_day[t] = int(exact)
+        if len(classes) == 2 and all(units.get((t, cl, day), 0) >= hours_to_units(1) for cl in classes for day in giorni) and rng.random() < density:
+            group_daily.add(t)
+        day_units = [sum(u for (tt, _, d), u in units.items() if tt == t and d == day) for day in present]
+        if present and t not in copertura_units and min(day_units) >= hours_to_units(2) and rng.random() < density:
+            min_two.add(t)
+        # Assegnazione specifica: un blocco piantato con slot di durata uniforme (vedi add_specific_assignments)
+        uniform = [(cl, day, block) for cl, day, block in blocks_by_teacher.get(t, []) if len({u for _, _, u in block}) == 1]
+        if uniform and rng.random() < density:
+            cl, day, block = rng.choice(uniform)
+            specific.setdefault(t, []).append([cl, day, block[0][0], units_to_hours(sum(u for _, _, u in block))])
+    _store_rules(config, only_days, start_at, end_at, hours_per_day, group_daily, min_two, specific)
+
+
+def _random_rules(rng, config, density, giorni, global_times, grid):
+    """Vincoli specifici casuali, indipendenti dall'orario piantato: l'istanza può essere impossibile."""
+    only_days, start_at, end_at, hours_per_day, group_daily, min_two, specific = {}, {}, {}, {}, set(), set(), {}
+    hours = sorted({_label_hour(sl) for sl in global_times})
+    for t, assign_t in config['ASSEGNAZIONE_DOCENTI'].items():
+        classes = [cl for cl in assign_t if cl != 'copertura']
+        if rng.random() < density: only_days[t] = set(rng.sample(giorni, rng.randint(max(1, len(giorni) - 2), len(giorni))))
+        if rng.random() < density: start_at[t] = {rng.choice(giorni): rng.choice(hours[1:4])}
+        if rng.random() < density: end_at[t] = {rng.choice(giorni): rng.choice(hours[-3:])}
+        if classes and rng.random() < density: hours_per_day[t] = rng.choice([1, 2])
+        if len(classes) == 2 and rng.random() < density: group_daily.add(t)
+        if rng.random() < density: min_two.add(t)
+        if classes and rng.random() < density:
+            cl, day = rng.choice(classes), rng.choice(giorni)
+            specific[t] = [[cl, day, rng.choice(grid.class_slots[cl][day])[0], float(rng.choice([1, 2]))]]
+    _store_rules(config, only_days, start_at, end_at, hours_per_day, group_daily, min_two, specific)
+
+
+def _store_rules(config, only_days, start_at, end_at, hours_per_day, group_daily, min_two, specific):
+    """Aggiunge alla configurazione solo i vincoli specifici non vuoti (si attivano con la presenza della chiave)."""
+    for key, value in [('ONLY_DAYS', only_days), ('START_AT', start_at), ('END_AT', end_at), ('HOURS_PER_DAY_PER_CLASS', hours_per_day),
+                       ('GROUP_DAILY_TWO_CLASSES', group_daily), ('MIN_TWO_HOURS_IF_PRESENT_SPECIFIC', min_two)]:
+        if value: config[key] = value
+    if specific:
+        config['ASSEGNAZIONE_DOCENTI_SPECIFICHE'] = [[t] + row for t, rows in specific.items() for row in rows]
+
+
+def verify_instance(config, solution, time_limit=60.0):
+    """
+    Controlla che la soluzione piantata sia valida per la configurazione: prevalidazione,
+    poi modello completo con la soluzione fissata (apply_hint con fix=True).
+    Ritorna la lista degli errori (vuota se l'istanza è risolvibile).
+    """
+    from ortools.sat.python import cp_model
+    from engine import build_model, prevalidate
+
+    data = ScheduleData(config)
+    errors = prevalidate(data)
+    if errors:
+        return errors
+    log_messages = []
+    sm = build_model(data, log_messages)
+    fixed = sm.apply_hint(solution, log_messages, fix=True)
+    if fixed['applied'] != fixed['total']:
+        return [f"Soluzione piantata applicata solo in parte: {fixed['applied']}/{fixed['total']} assegnazioni"]
+    sm.model.ClearObjective()
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = time_limit
+    res = solver.Solve(sm.model)
+    if res not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        return [f"La soluzione piantata non rispetta i vincoli (stato {solver.StatusName(res)})"]
+    return []
+
+
+def describe_instance(config):
+    data = ScheduleData(config)
+    specific = [key for key in ['ONLY_DAYS', 'START_AT', 'END_AT', 'HOURS_PER_DAY_PER_CLASS', 'GROUP_DAILY_TWO_CLASSES', 'MIN_TWO_HOURS_IF_PRESENT_SPECIFIC', 'ASSEGNAZIONE_DOCENTI_SPECIFICHE'] if config.get(key)]
+    return (f"{len(data.CLASSI)} classi, {len(data.teachers)} docenti, {len(data.GIORNI)} giorni, "
+            f"{len(data.GLOBAL_SCHEDULING_TIMES)} orari, copertura {units_to_hours(data.total_copertura_units):g}h, "
+            f"vincoli specifici: {', '.join(f'{k} ({len(config[k])})' for k in specific) or 'nessuno'}")
+
+
+def main(argv=None):
+    from utils import save_config
+    from solution import save_solution
+
+    parser = argparse.ArgumentParser(
+        description="Genera configurazioni sintetiche per studi di scalabilità",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Esempi di utilizzo:
+  python generator.py --classes 30 --seed 1 -o istanza.json --solution istanza_soluzione.json
+  python generator.py --classes 20 --count 5 -o corpus/    # 5 istanze (seed 0-4) per batch.py
+  python generator.py --classes 10 --random-rules --density 0.5 -o difficile.json
+        """
+    )
+    parser.add_argument('--classes', type=int, default=10, help='Numero di classi (default: 10)')
+    parser.add_argument('--teachers', type=int, default=None, help='Docenti iniziali, ne vengono aggiunti se servono (default: 1.5 per classe)')
+    parser.add_argument('--days', type=int, default=5, help='Giorni di lezione, da LUN (default: 5)')
+    parser.add_argument('--templates', type=int, choices=[1, 2, 3], default=3, help='Griglie orarie diverse SLOT_1..SLOT_3 (default: 3)')
+    parser.add_argument('--copertura', type=float, default=20, help='Ore di copertura settimanali totali (default: 20)')
+    parser.add_argument('--density', type=float, default=0.3, help='Probabilità per docente di ogni vincolo specifico, 0-1 (default: 0.3)')
+    parser.add_argument('--max-weekly', type=float, default=22, help='MAX_ORE_SETTIMANALI_DOCENTI (default: 22)')
+    parser.add_argument('--max-daily', type=float, default=4.0, help='MAX_DAILY_HOURS_PER_CLASS (default: 4)')
+    parser.add_argument('--random-rules', action='store_true', help='Vincoli specifici casuali: fattibilità non garantita')
+    parser.add_argument('--seed', type=int, default=0, help='Seed della generazione (default: 0)')
+    parser.add_argument('--count', type=int, default=1, help='Numero di istanze con seed consecutivi; con più istanze --output è una cartella')
+    parser.add_argument('--output', '-o', type=str, default='istanza.json', help='File (o cartella con --count) di destinazione')
+    parser.add_argument('--solution', type=str, default=None, help="Salva anche l'orario piantato (formato --hint) in questo file")
+    parser.add_argument('--verify', action='store_true', help="Verifica con CP-SAT che l'orario piantato rispetti la configurazione")
+    args = parser.parse_args(argv)
+
+    exit_code = 0
+    for k in range(args.count):
+        seed = args.seed + k
+        config, solution = generate_instance(args.classes, args.teachers, args.days, args.templates, args.copertura,
+                                             args.density, not args.random_rules, seed, args.max_weekly, args.max_daily)
+        if args.count > 1:
+            os.makedirs(args.output, exist_ok=True)
+            path = os.path.join(args.output, f"istanza_{args.classes}c_seed{seed}.json")
+        else:
+            path = args.output
+        print(f"🧪 Seed {seed}: {describe_instance(config)}")
+        if args.verify:
+            errors = verify_instance(config, solution)
+            print("   ✅ Orario piantato valido" if not errors else "   ❌ " + "; ".join(errors))
+            exit_code = exit_code or (1 if errors and not args.random_rules else 0)
+        print(f"   📁 {save_config(config, os.path.abspath(path))}")
+        if args.solution and args.count == 1:
+            print(f"   💾 {os.path.abspath(save_solution(solution, args.solution))}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
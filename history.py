@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Storico locale delle generazioni in SQLite (storico_orari.sqlite nella cartella di lavoro).
+
+Ogni esecuzione registra stato, penalità, ore di buco, tempi per fase, dimensione del
+modello, parametri del solver e la soluzione in formato compatto (vedi solution.py). La
+configurazione è salvata una sola volta per contenuto (hash di utils.config_hash, parametri
+del solver esclusi), così molte esecuzioni della stessa configurazione non la duplicano.
+Le esecuzioni si possono elencare, confrontare e riaprire senza risolvere di nuovo.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from contextlib import closing
+
+from engine import DEFAULT_OUTPUT_FILE, reload_schedule
+from utils import SOLVER_PARAMETER_PREFIXES, config_from_json, config_hash, config_to_json
+
+HISTORY_FILE = "storico_orari.sqlite"
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS configs (
+    hash TEXT PRIMARY KEY,
+    config TEXT NOT NULL,
+    created TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created TEXT NOT NULL,
+    source TEXT,
+    config_hash TEXT NOT NULL REFERENCES configs(hash),
+    solver TEXT,
+    status TEXT,
+    objective REAL,
+    bound REAL,
+    hole_hours REAL,
+    solve_time REAL,
+    total_time REAL,
+    timings TEXT,
+    variables INTEGER,
+    constraints INTEGER,
+    solution TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_config_hash ON runs(config_hash);
+"""
+
+# Colonne dell'elenco (senza configurazione e soluzione, che si leggono con get_run)
+_LIST_COLUMNS = ("id", "created", "source", "config_hash", "status", "objective", "hole_hours",
+                 "solve_time", "total_time", "variables", "constraints")
+
+
+def _phase_times(timings):
+    """Tempi per fase: i tempi di variabili e famiglie di vincoli sommati nella costruzione del modello."""
+    phases = {}
+    for key, seconds in (timings or {}).items():
+        phase = 'model' if key == 'variables' or key.startswith('constraints.') else key
+        phases[phase] = phases.get(phase, 0.0) + seconds
+    return phases
+
+
+class RunHistory:
+    """Storico delle esecuzioni nel database SQLite `path` (creato alla prima apertura)."""
+
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(_SCHEMA)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def record(self, config, result, source="cli"):
+        """Registra l'esito `result` (ScheduleResult) della configurazione `config`; ritorna l'id dell'esecuzione."""
+        stats = result.stats or {}
+        key = config_hash(config)
+        problem = {k: v for k, v in config_to_json(config).items() if not k.startswith(SOLVER_PARAMETER_PREFIXES)}
+        solver = {'parametri': {k: v for k, v in config.items() if k.startswith(SOLVER_PARAMETER_PREFIXES)},
+                  'effettivi': stats.get('solver')}
+        status = stats.get('status') or ('PREVALIDAZIONE_FALLITA' if 'prevalidation_errors' in stats else 'SCONOSCIUTO')
+        timings = stats.get('timings', {})
+        model_size = stats.get('model_size', {})
+        now = time.strftime("%Y-%m-%d %H:%M:%S")
+        with closing(self._connect()) as conn, conn:
+            conn.execute("INSERT OR IGNORE INTO configs (hash, config, created) VALUES (?, ?, ?)",
+                         (key, json.dumps(problem, ensure_ascii=False, sort_keys=True), now))
+            cursor = conn.execute(
+                "INSERT INTO runs (created, source, config_hash, solver, status, objective, bound, hole_hours, solve_time,"
+                " total_time, timings, variables, constraints, solution) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (now, source, key, json.dumps(solver, ensure_ascii=False, default=str), status, stats.get('objective'),
+                 stats.get('bound'), stats.get('hole_hours'), stats.get('solve_time'), sum(timings.values()) if timings else None,
+                 json.dumps(timings), model_size.get('variables'), model_size.get('constraints'),
+                 json.dumps(result.record, ensure_ascii=False, separators=(',', ':')) if result.record else None))
+            return cursor.lastrowid
+
+    def list_runs(self, limit=50):
+        """Ultime `limit` esecuzioni, dalla più recente, come dizionari (senza configurazione e soluzione)."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(f"SELECT {', '.join(_LIST_COLUMNS)}, solution IS NOT NULL AS has_solution"
+                                " FROM runs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_run(self, run_id):
+        """
+        Esecuzione `run_id` con 'config' (formato interno, parametri del solver compresi),
+        'solver', 'timings' e 'record' (soluzione compatta, None se non trovata).
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT runs.*, configs.config AS config_json FROM runs JOIN configs ON configs.hash = runs.config_hash"
+                               " WHERE runs.id = ?", (run_id,)).fetchone()
+        if row is None:
+            raise ValueError(f"Esecuzione #{run_id} non presente nello storico.")
+        run = dict(row)
+        run['solver'] = json.loads(run['solver']) if run['solver'] else {}
+        run['config'] = config_from_json(json.loads(run.pop('config_json')))
+        run['config'].update(run['solver'].get('parametri', {}))
+        run['timings'] = json.loads(run['timings']) if run['timings'] else {}
+        run['record'] = json.loads(run.pop('solution')) if run['solution'] else None
+        return run
+
+    def reopen(self, run_id, output_path=None, config=None):
+        """Ricostruisce tabelle, Excel e diagnostica dell'esecuzione senza risolvere (con la sua configurazione, se `config` è None)."""
+        run = self.get_run(run_id)
+        if run['record'] is None:
+            raise ValueError(f"L'esecuzione #{run_id} non ha una soluzione da riaprire (stato {run['status']}).")
+        return reload_schedule(run['record'], config if config is not None else run['config'], output_path, name=f"esecuzione #{run_id}")
+
+    def compare(self, first_id, second_id):
+        """Righe di confronto tra due esecuzioni: esito, tempi per fase, configurazione, parametri e lezioni spostate."""
+        a, b = self.get_run(first_id), self.get_run(second_id)
+        report = [f"--- CONFRONTO ESECUZIONI #{a['id']} ({a['created']}) E #{b['id']} ({b['created']}) ---"]
+
+        def fmt(value, spec=""):
+            return "-" if value is None else format(value, spec)
+
+        for label, key, spec in (("Stato", 'status', ""), ("Penalità buchi", 'objective', ".0f"), ("Ore di buco", 'hole_hours', "g"),
+                                 ("Tempo risoluzione (s)", 'solve_time', ".1f"), ("Tempo totale (s)", 'total_time', ".1f"),
+                                 ("Variabili", 'variables', ""), ("Vincoli", 'constraints', "")):
+            report.append(f"{label:<24} {fmt(a[key], spec):>22} {fmt(b[key], spec):>22}")
+        phases_a, phases_b = _phase_times(a['timings']), _phase_times(b['timings'])
+        for phase in dict.fromkeys(list(phases_a) + list(phases_b)):
+            report.append(f"  fase {phase + ' (s)':<18} {fmt(phases_a.get(phase), '.2f'):>22} {fmt(phases_b.get(phase), '.2f'):>22}")
+
+        if a['config_hash'] == b['config_hash']:
+            report.append("Configurazione: identica.")
+        else:
+            json_a, json_b = config_to_json(a['config']), config_to_json(b['config'])
+            changed = sorted(k for k in set(json_a) | set(json_b)
+                             if not k.startswith(SOLVER_PARAMETER_PREFIXES) and json_a.get(k) != json_b.get(k))
+            report.append(f"Configurazione: diversa ({', '.join(changed)}).")
+        params_a, params_b = a['solver'].get('effettivi'), b['solver'].get('effettivi')
+        if not params_a or not params_b:
+            report.append("Parametri solver: non confrontabili (almeno un'esecuzione si è fermata prima della risoluzione).")
+        else:
+            changed = [f"{k}: {params_a.get(k)} -> {params_b.get(k)}" for k in sorted(set(params_a) | set(params_b)) if params_a.get(k) != params_b.get(k)]
+            report.append(f"Parametri solver: {'; '.join(changed) if changed else 'identici.'}")
+
+        if a['record'] and b['record']:
+            from solution import decode_solution
+            sol_a, sol_b = decode_solution(a['record'])[0], decode_solution(b['record'])[0]
+            lessons_a, lessons_b = set(map(tuple, sol_a['lessons'])), set(map(tuple, sol_b['lessons']))
+            cop_a, cop_b = sorted(map(tuple, sol_a['copertura'])), sorted(map(tuple, sol_b['copertura']))
+            report.append(f"Lezioni: {len(lessons_a - lessons_b)} di #{a['id']} non presenti in #{b['id']}, "
+                          f"{len(lessons_b - lessons_a)} nuove in #{b['id']} (su {len(lessons_a)} e {len(lessons_b)}); "
+                          f"copertura {'identica' if cop_a == cop_b else 'diversa'}.")
+        else:
+            report.append("Lezioni: non confrontabili (almeno un'esecuzione senza soluzione).")
+        return report
+
+
+def format_runs(runs):
+    """Righe di testo di un elenco di esecuzioni (list_runs)."""
+    lines = [f"{'#':>5}  {'data':<19}  {'origine':<7}  {'config':<16}  {'stato':<22}  {'penalità':>8}  {'buchi':>6}  {'tempo':>7}  {'variabili':>9}"]
+    for run in runs:
+        objective = f"{run['objective']:.0f}" if run['objective'] is not None else "-"
+        holes = f"{run['hole_hours']:g}h" if run['hole_hours'] is not None else "-"
+        elapsed = f"{run['total_time']:.1f}s" if run['total_time'] is not None else "-"
+        lines.append(f"{run['id']:>5}  {run['created']:<19}  {run['source'] or '-':<7}  {run['config_hash']:<16}  {run['status']:<22}  "
+                     f"{objective:>8}  {holes:>6}  {elapsed:>7}  {run['variables'] or '-':>9}")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Storico delle generazioni: elenco, confronto e riapertura senza risolvere",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Esempi di utilizzo:
+  python history.py                  # Ultime 20 esecuzioni
+  python history.py --compare 3 5    # Confronta le esecuzioni 3 e 5
+  python history.py --reopen 3       # Rigenera orario_settimanale.xlsx dall'esecuzione 3
+        """
+    )
+    parser.add_argument('--db', type=str, default=HISTORY_FILE, help=f'Database dello storico (default: {HISTORY_FILE})')
+    parser.add_argument('--limit', type=int, default=20, help='Numero di esecuzioni elencate (default: 20)')
+    parser.add_argument('--compare', type=int, nargs=2, metavar=('ID1', 'ID2'), default=None, help='Confronta due esecuzioni')
+    parser.add_argument('--reopen', type=int, metavar='ID', default=None, help=f"Riapre un'esecuzione e la salva in {DEFAULT_OUTPUT_FILE}")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"❌ Storico '{args.db}' non trovato: nessuna esecuzione registrata.")
+        return 1
+    history = RunHistory(args.db)
+    try:
+        if args.compare:
+            print("\n".join(history.compare(*args.compare)))
+        elif args.reopen is not None:
+            result = history.reopen(args.reopen, output_path=DEFAULT_OUTPUT_FILE)
+            print(result.log + "\n\n" + result.diagnostics)
+        else:
+            print("\n".join(format_runs(history.list_runs(args.limit))))
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
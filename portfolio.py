@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Portfolio di risoluzioni indipendenti dello stesso orario.
+Avvia più solver CP-SAT in processi separati, ognuno con seed e variante di parametri
+diversi, sotto un budget di tempo condiviso. Tiene la soluzione con la penalità buchi
+più bassa e la ripassa a run_schedule (come soluzione fissata) per diagnostica ed export.
+"""
+
+import math
+import os
+import time
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from ortools.sat.python import cp_model
+
+from engine import ScheduleData, ScheduleResult, build_model, prevalidate, solve_model, solver_settings, run_schedule
+from utils import gather_pool_results
+
+
+# Varianti di parametri assegnate a rotazione ai membri del portfolio
+PORTFOLIO_MIXES = [
+    {'name': "standard", 'SOLVER_LINEARIZATION_LEVEL': 1},
+    {'name': "linearizzazione 2", 'SOLVER_LINEARIZATION_LEVEL': 2},
+    {'name': "linearizzazione 0", 'SOLVER_LINEARIZATION_LEVEL': 0},
+    {'name': "due fasi", 'SOLVER_LINEARIZATION_LEVEL': 1, 'USE_TWO_PHASE_SOLVE': True},
+]
+
+
+def portfolio_members(size, base_seed=0):
+    """Ritorna i membri del portfolio: seed consecutivi e varianti di PORTFOLIO_MIXES a rotazione."""
+    return [{'seed': base_seed + i, 'mix': PORTFOLIO_MIXES[i % len(PORTFOLIO_MIXES)]} for i in range(size)]
+
+
+def _solve_member(config, hint, member, deadline, time_slice, workers):
+    """Eseguito in un processo separato: costruisce e risolve il modello, senza scrivere file."""
+    start = time.time()
+    deadline = min(deadline, start + time_slice)
+    mix = member['mix']
+    row = {'seed': member['seed'], 'mix': mix['name'], 'status': 'SALTATO', 'objective': None,
+           'first_solution_time': None, 'solve_time': 0.0, 'build_time': 0.0, 'solution': None}
+    if deadline - start < 1.0:
+        return row
+    cfg = dict(config, SOLVER_SEED=member['seed'], SOLVER_WORKERS=workers, SOLVER_LOG_SEARCH_PROGRESS=False)
+    cfg.update({k: v for k, v in mix.items() if k != 'name'})
+    try:
+        log_messages, stats = [], {}
+        sm = build_model(ScheduleData(cfg), log_messages)
+        if hint: sm.apply_hint(hint, log_messages)
+        row['build_time'] = time.time() - start
+        solver, res = solve_model(sm, log_messages, stats, time_limit=max(1.0, deadline - time.time()))
+    except KeyboardInterrupt:
+        row['status'] = 'INTERROTTO'
+        return row
+    row['status'] = solver.StatusName(res)
+    row['solve_time'] = stats['solve_time']
+    if stats.get('first_solution_time') is not None:
+        row['first_solution_time'] = row['build_time'] + stats['first_solution_time']
+    if res in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        row['objective'] = solver.Value(sm.objective) if sm.objective is not None else 0
+        row['solution'] = sm.extract_solution(solver)
+    return row
+
+
+def run_portfolio(config, size=4, budget=None, processes=None, hint=None, base_seed=None):
+    """
+    Risolve lo stesso orario con `size` membri in un pool di `processes` processi.
+    Il budget (default: tempo massimo del profilo) è condiviso: con più membri che
+    processi ogni membro riceve una quota del budget, così il tempo totale non lo supera.
+    Ritorna (righe per membro, migliore o None).
+    """
+    settings = solver_settings(ScheduleData(config))
+    budget = budget or settings['time_limit']
+    processes = processes or min(size, os.cpu_count() or 1)
+    workers = max(1, (os.cpu_count() or 1) // processes)
+    if base_seed is None: base_seed = settings['seed'] or 0
+    time_slice = budget / math.ceil(size / processes)
+    deadline = time.time() + budget
+
+    members = portfolio_members(size, base_seed)
+
+    def failed(i, error):
+        # Membro annullato dopo Ctrl+C o processo terminato (BrokenProcessPool)
+        interrupted = isinstance(error, (CancelledError, BrokenProcessPool))
+        return {'seed': members[i]['seed'], 'mix': members[i]['mix']['name'], 'status': 'INTERROTTO' if interrupted else 'ERRORE',
+                'objective': None, 'first_solution_time': None, 'solve_time': 0.0, 'build_time': 0.0, 'solution': None, 'error': str(error)}
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [pool.submit(_solve_member, config, hint, member, deadline, time_slice, workers) for member in members]
+        rows = gather_pool_results(pool, futures, failed)
+    solved = [r for r in rows if r['objective'] is not None]
+    best = min(solved, key=lambda r: (r['objective'], r['solve_time'])) if solved else None
+    return rows, best
+
+
+def format_portfolio_table(rows, best):
+    lines = [f"  {'Seed':>5} {'Variante':<18} {'Stato':<10} {'Penalità':>9} {'1ª soluzione':>13} {'Tempo':>8}"]
+    for r in rows:
+        objective = f"{r['objective']:.0f}" if r['objective'] is not None else "-"
+        first = f"{r['first_solution_time']:.1f}s" if r['first_solution_time'] is not None else "-"
+        marker = " 🏆" if r is best else ""
+        lines.append(f"  {r['seed']:>5} {r['mix']:<18} {r['status']:<10} {objective:>9} {first:>13} {r['solve_time']:>7.1f}s{marker}")
+    return lines
+
+
+def run_portfolio_schedule(config, size=4, budget=None, processes=None, hint=None):
+    """Esegue il portfolio e ritorna lo ScheduleResult della soluzione migliore (diagnostica ed Excel compresi)."""
+    errors = prevalidate(ScheduleData(config))
+    if errors:
+        return run_schedule(config)
+
+    start = time.time()
+    rows, best = run_portfolio(config, size, budget, processes, hint)
+    log_messages = [f"🎲 Portfolio: {len(rows)} risoluzioni indipendenti in {time.time() - start:.1f}s"]
+    log_messages.extend(format_portfolio_table(rows, best))
+    table = [{k: v for k, v in r.items() if k != 'solution'} for r in rows]
+    if best is None:
+        log_messages.append("Nessun membro del portfolio ha trovato una soluzione.")
+        return ScheduleResult(log="\n".join(log_messages), diagnostics="Nessuna soluzione trovata dal portfolio.", stats={'portfolio': table})
+
+    log_messages.append(f"🏆 Migliore: seed {best['seed']} ({best['mix']}) con penalità buchi {best['objective']:.0f}\n")
+    result = run_schedule(dict(config, SOLVER_LOG_SEARCH_PROGRESS=False), fixed=best['solution'])
+    result.log = "\n".join(log_messages) + "\n" + result.log
+    result.stats['portfolio'] = table
+    result.stats['portfolio_best_seed'] = best['seed']
+    return result
@@ -0,0 +1,169 @@
+"""
+Riparazione di un orario esistente dopo una modifica a metà anno (docente sostituito,
+classe con due ore in più, nuova regola di disponibilità).
+
+Invece di rigenerare tutto, run_repair parte dall'orario corrente: individua classi e
+docenti toccati dalla modifica (touched_by_change), fissa tutte le altre assegnazioni,
+suggerisce le rimanenti come hint e minimizza le assegnazioni spostate (REPAIR_MOVE_WEIGHT
+per spostamento) insieme alla penalità buchi. Se la parte fissata rende il problema
+insolubile allarga l'intorno (classi dei docenti toccati e docenti delle classi toccate)
+e, come ultima possibilità, lascia libero tutto l'orario mantenendo l'obiettivo di
+spostamento. Il risultato riporta per docente le lezioni spostate.
+"""
+
+import time
+
+import numpy as np
+
+from engine import (DEFAULT_OUTPUT_FILE, FREE, Schedule, ScheduleData, hours_to_units, pinned_slots, run_schedule,
+                    unavailability_reason, units_to_hours)
+from solution import diff_solutions
+
+
+def touched_by_change(data, previous):
+    """
+    Classi e docenti la cui parte di `previous` (formato di solution.py) non è più valida con
+    la configurazione di `data`: assegnazioni a docenti, classi o slot non più ammessi, slot
+    senza docente, ore docente-classe o di copertura diverse da quelle richieste, giorni e
+    orari non disponibili, ore giornaliere per classe, minimo 2 ore, gruppi giornalieri e
+    assegnazioni specifiche. Le violazioni dei vincoli generici (blocchi consecutivi, max un
+    buco) non vengono cercate: le risolve l'allargamento dell'intorno in run_repair.
+    Ritorna (classi, docenti, motivi) con i motivi come righe di testo.
+    """
+    d = data
+    classes, teachers, reasons = set(), set(), []
+
+    def touch(reason, cl=None, t=None):
+        if cl in d.class_slots: classes.add(cl)
+        if t in d.ASSEGNAZIONE_DOCENTI: teachers.add(t)
+        reasons.append(reason)
+
+    for cl, day, sl, t in previous.get('lessons', []):
+        if cl not in d.class_slots: continue  # classe eliminata: le sue lezioni spariscono
+        if t not in d.allowed_teachers_per_class[cl]:
+            touch(f"{t} non insegna più in {cl} ({day} {sl})", cl, t)
+        elif day not in d.GIORNI or sl not in [s_label for s_label, _, _ in d.class_slots[cl][day]]:
+            touch(f"{cl} non ha più lo slot {day} {sl} ({t})", cl, t)
+    for day, sl, t in previous.get('copertura', []):
+        if d.ASSEGNAZIONE_DOCENTI.get(t, {}).get('copertura', 0) <= 0:
+            touch(f"{t} non ha più ore di copertura ({day} {sl})", t=t)
+
+    schedule = Schedule.from_solution(d, previous)
+    hours = lambda u: units_to_hours(int(u))
+    empty = (schedule.slot_label >= 0) & (schedule.class_teacher == FREE)
+    for c in np.flatnonzero(empty.any(axis=(1, 2))):
+        touch(f"{d.CLASSI[c]}: {int(empty[c].sum())} slot senza docente", d.CLASSI[c])
+
+    daily_units = schedule.lesson_units.sum(axis=1) + schedule.copertura_units  # [docente, giorno]
+    for t, assignments in d.ASSEGNAZIONE_DOCENTI.items():
+        ti = schedule.teacher_index[t]
+        for cl, h in assignments.items():
+            if cl == 'copertura':
+                found = schedule.copertura_units[ti].sum()
+                if found != hours_to_units(h): touch(f"{t}: copertura {h:g}h richieste, {hours(found)}h nell'orario", t=t)
+                continue
+            pair_units = schedule.lesson_units[ti, schedule.class_index[cl]]  # [giorno]
+            if pair_units.sum() != hours_to_units(h):
+                touch(f"{t} in {cl}: {h:g}h richieste, {hours(pair_units.sum())}h nell'orario", cl, t)
+            if d.USE_MAX_DAILY_HOURS_PER_CLASS and (pair_units > hours_to_units(d.MAX_DAILY_HOURS_PER_CLASS)).any():
+                touch(f"{t} in {cl}: più di {d.MAX_DAILY_HOURS_PER_CLASS:g}h in un giorno", cl, t)
+            exact = d.HOURS_PER_DAY_PER_CLASS.get(t)
+            if exact is not None and h % exact == 0 and ((pair_units != 0) & (pair_units != hours_to_units(exact))).any():
+                touch(f"{t} in {cl}: giornate diverse da 0 o {exact:g}h (HOURS_PER_DAY_PER_CLASS)", cl, t)
+        for di, day in enumerate(d.GIORNI):
+            busy = [sl for l, sl in enumerate(d.GLOBAL_SCHEDULING_TIMES) if schedule.busy[ti, di, l]]
+            rule = next((r for r in (unavailability_reason(d, t, day, sl) for sl in busy) if r), None)
+            if rule: touch(f"{t} il {day} non è disponibile ({rule})", t=t)
+        if t in d.MIN_TWO_HOURS_IF_PRESENT_SPECIFIC and ((daily_units[ti] > 0) & (daily_units[ti] < hours_to_units(2))).any():
+            touch(f"{t}: giornate con meno di 2h (MIN_TWO_HOURS_IF_PRESENT_SPECIFIC)", t=t)
+        group = d.teacher_classes(t)
+        if t in d.GROUP_DAILY_TWO_CLASSES and len(group) == 2:
+            units = schedule.lesson_units[ti, [schedule.class_index[cl] for cl in group]]
+            if (units < hours_to_units(1)).any():
+                for cl in group: touch(f"{t}: giornate senza lezioni in {group[0]} e {group[1]} (GROUP_DAILY_TWO_CLASSES)", cl, t)
+
+    for t, cl, day, start_time, duration in d.ASSEGNAZIONE_DOCENTI_SPECIFICHE:
+        slots, error = pinned_slots(d, t, cl, day, start_time, duration)
+        if error or t not in schedule.teacher_index: continue  # segnalata dalla prevalidazione
+        if (schedule.class_teacher[schedule.class_index[cl], schedule.day_index[day], slots] != schedule.teacher_index[t]).any():
+            touch(f"{t} in {cl}: assegnazione specifica {day} {start_time} non rispettata", cl, t)
+    return classes, teachers, list(dict.fromkeys(reasons))
+
+
+def expand_neighbourhood(data, classes, teachers):
+    """Intorno allargato: le classi dei docenti toccati e i docenti delle classi toccate."""
+    wider_classes = set(classes) | {cl for t in teachers for cl in data.teacher_classes(t)}
+    wider_teachers = set(teachers) | {t for cl in classes for t in data.allowed_teachers_per_class[cl]}
+    return wider_classes, wider_teachers
+
+
+def frozen_part(previous, classes, teachers):
+    """Assegnazioni di `previous` fuori dalle classi e dai docenti toccati, da fissare nella riparazione."""
+    return {"lessons": [entry for entry in previous.get('lessons', []) if entry[0] not in classes and entry[3] not in teachers],
+            "copertura": [entry for entry in previous.get('copertura', []) if entry[2] not in teachers]}
+
+
+def format_moves(moves):
+    """Righe di testo delle assegnazioni spostate per docente (diff_solutions)."""
+    def entries(items):
+        return ", ".join(f"{'copertura' if cl == 'copertura' else cl} {day} {sl}" for cl, day, sl in items) or "-"
+
+    return [f"  - {t}: tolte {entries(change['removed'])}; aggiunte {entries(change['added'])}" for t, change in moves.items()]
+
+
+def run_repair(config, previous, on_progress=None, control=None, output_path=DEFAULT_OUTPUT_FILE):
+    """
+    Ripara l'orario `previous` (formato di solution.py) per la configurazione modificata
+    `config`, spostando il minor numero possibile di assegnazioni. Il tempo complessivo è
+    SOLVER_TIME_LIMIT se indicato, altrimenti REPAIR_TIME_LIMIT, diviso tra i livelli di
+    fissaggio (intorno della modifica, intorno allargato, orario completo).
+    Ritorna lo ScheduleResult del primo livello risolto, con log e diagnostica completati
+    dall'elenco degli spostamenti e stats['repair'] (livello, spostamenti, docenti toccati).
+    """
+    start = time.perf_counter()
+    data = ScheduleData(config)
+    classes, teachers, reasons = touched_by_change(data, previous)
+    header = ["🛠️ Riparazione dell'orario esistente (minimo numero di spostamenti)."]
+    if reasons:
+        header.append(f"Parti toccate dalla modifica: classi {sorted(classes) or '-'}, docenti {sorted(teachers) or '-'}.")
+        header.extend(f" - {reason}" for reason in reasons[:30])
+        if len(reasons) > 30: header.append(f" - ... altri {len(reasons) - 30} motivi")
+    else:
+        header.append("L'orario di partenza è compatibile con la configurazione: nessuna parte toccata.")
+
+    levels = [("intorno della modifica", classes, teachers)]
+    wider = expand_neighbourhood(data, classes, teachers)
+    if wider != (classes, teachers):
+        levels.append(("intorno allargato", *wider))
+    levels.append(("orario completo", None, None))
+
+    budget = data.SOLVER_TIME_LIMIT if data.SOLVER_TIME_LIMIT is not None else data.REPAIR_TIME_LIMIT
+    attempts = []
+    for n, (name, level_classes, level_teachers) in enumerate(levels):
+        final = n == len(levels) - 1
+        remaining = budget - (time.perf_counter() - start)
+        time_limit = round(max(1.0, remaining if final else remaining / (len(levels) - n)), 1)
+        fixed = frozen_part(previous, level_classes, level_teachers) if level_classes is not None else None
+        result = run_schedule(dict(config, SOLVER_TIME_LIMIT=time_limit), hint=previous, on_progress=on_progress, control=control,
+                              fixed=fixed, output_path=output_path, repair=previous, explain_infeasible=final)
+        frozen = len(fixed['lessons']) + len(fixed['copertura']) if fixed else 0
+        attempts.append({'level': name, 'frozen': frozen, 'status': result.stats.get('status'), 'time': result.stats.get('solve_time')})
+        header.append(f"Livello {n + 1} ({name}): {frozen} assegnazioni fissate, stato {attempts[-1]['status']}"
+                      + (f" in {attempts[-1]['time']:.1f}s." if attempts[-1]['time'] is not None else "."))
+        if result.ok or 'prevalidation_errors' in result.stats or (control is not None and control.stop_requested):
+            break
+
+    repair = result.stats.setdefault('repair', {})
+    repair.update(level=name, levels=attempts, touched_classes=sorted(classes), touched_teachers=sorted(teachers), reasons=reasons)
+    footer = []
+    if result.ok:
+        moves = diff_solutions(previous, result.solution)
+        repair['moved'] = sum(len(change['removed']) for change in moves.values())
+        repair['moves'] = moves
+        summary = f"🔀 Assegnazioni spostate: {repair['moved']} su {repair.get('previous', 0)}, docenti con lezioni cambiate: {len(moves)}."
+        footer = [summary] + format_moves(moves)
+        result.diagnostics += "\n\n--- RIPARAZIONE: ASSEGNAZIONI SPOSTATE PER DOCENTE ---\n" + "\n".join(footer)
+    repair['time'] = time.perf_counter() - start
+    footer.append(f"⏱️ Riparazione completata in {repair['time']:.1f}s.")
+    result.log = "\n".join(header) + "\n\n" + result.log + "\n" + "\n".join(footer)
+    return result
@@ -0,0 +1,172 @@
+"""
+Cache dei risultati di generazione indirizzata per contenuto.
+
+La chiave è l'hash canonico della configurazione normalizzata (utils.config_hash), dei
+parametri di risoluzione effettivi (profilo risolto con gli override, vedi solver_settings)
+e dell'eventuale soluzione di partenza: una richiesta identica restituisce subito orario,
+log e diagnostica già calcolati. Si conservano tutti i risultati con una soluzione, tranne
+quelli di una ricerca fermata dall'utente; reproducible distingue quelli che una nuova
+risoluzione non cambierebbe. I risultati stanno in una LRU in memoria e, se è indicata
+una cartella, anche su disco (un file JSON per chiave con la soluzione in formato compatto),
+con eliminazione dei meno usati oltre `max_bytes`.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from engine import ScheduleData, ScheduleResult, Schedule, render_schedule, solver_settings
+from solution import decode_solution
+from utils import SOLVER_PARAMETER_PREFIXES, config_hash
+
+
+def result_key(config, hint=None):
+    """Chiave di cache di una richiesta: problema, parametri di risoluzione e soluzione di partenza."""
+    settings = solver_settings(ScheduleData(config))
+    run_parameters = {k: v for k, v in config.items() if k.startswith(SOLVER_PARAMETER_PREFIXES)}
+    payload = {'config': config_hash(config), 'solver': settings, 'run': run_parameters, 'hint': hint}
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def cacheable(stats):
+    """True se il risultato con statistiche `stats` va in cache: non se la ricerca è stata fermata dall'utente."""
+    return stats.get('stop_reason') != 'user'
+
+
+def reproducible(stats):
+    """
+    True se risolvendo di nuovo la stessa richiesta si otterrebbe lo stesso risultato: ottimo
+    dimostrato, oppure profilo deterministico con seed fisso (escluso l'arresto per
+    stagnazione, misurato in secondi reali). Gli altri risultati in cache sono una delle
+    soluzioni possibili e nella GUI sono indicati come tali.
+    """
+    settings = stats.get('solver', {})
+    if stats.get('stop_reason') == 'optimal':
+        return True
+    return bool(settings.get('deterministic')) and settings.get('seed') is not None and stats.get('stop_reason') not in ('stagnation', 'user')
+
+
+class ResultCache:
+    """
+    LRU in memoria di ScheduleResult (al massimo `max_entries`) con archivio su disco
+    facoltativo in `directory` (al massimo `max_bytes`). Sicura tra thread: la usano i
+    ScheduleJob in background. Vengono conservati solo i risultati con una soluzione (vedi cacheable).
+    """
+
+    def __init__(self, max_entries=16, directory=None, max_bytes=50 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, config, hint=None):
+        """Risultato memorizzato per la richiesta, None se assente."""
+        key = result_key(config, hint)
+        with self._lock:
+            result = self._memory.get(key)
+            if result is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return result
+        result = self._load(key, config) if self.directory else None
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, result)
+        return result
+
+    def put(self, config, hint, result):
+        """Memorizza il risultato della richiesta (ignorato se non contiene una soluzione o la ricerca è stata fermata dall'utente)."""
+        if not result.ok or result.record is None or not cacheable(result.stats):
+            return
+        key = result_key(config, hint)
+        with self._lock:
+            self._remember(key, result)
+        if self.directory:
+            self._store(key, result)
+
+    def clear(self):
+        """Svuota la cache in memoria e su disco."""
+        with self._lock:
+            self._memory.clear()
+        if self.directory:
+            for name in os.listdir(self.directory):
+                if name.endswith('.json'):
+                    os.remove(os.path.join(self.directory, name))
+
+    def __len__(self):
+        return len(self._memory)
+
+    def _remember(self, key, result):
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _store(self, key, result):
+        entry = {'record': result.record, 'log': result.log, 'diagnostics': result.diagnostics, 'stats': result.stats}
+        # File temporaneo proprio di questa scrittura: due sessioni che finiscono la stessa chiave non si sovrascrivono
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f"{key}.", suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False, separators=(',', ':'), default=str)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        self._evict()
+
+    def _load(self, key, config):
+        """Ricostruisce il risultato dal disco (tabelle ed Excel rigenerati dallo Schedule), None se assente, illeggibile o da non riusare."""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            solution, _ = decode_solution(entry['record'])
+        except (OSError, ValueError, KeyError):
+            return None
+        if not cacheable(entry['stats']):
+            return None
+        os.utime(path)  # il file appena letto è il più recente per l'eliminazione
+        schedule = Schedule.from_solution(ScheduleData(config), solution)
+        df_classi, df_docenti, excel_bytes = render_schedule(schedule, [])
+        return ScheduleResult(df_classi, df_docenti, entry['log'], entry['diagnostics'], solution, entry['stats'],
+                              excel_bytes, schedule, entry['record'])
+
+    def _evict(self):
+        """Elimina i file meno usati di recente finché l'archivio supera `max_bytes`."""
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                path = os.path.join(self.directory, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
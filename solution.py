@@ -0,0 +1,371 @@
+"""
+Rappresentazione portabile di una soluzione (orario risolto), indipendente dal modello CP-SAT.
+
+Una soluzione è un dizionario con chiavi per nome, così sopravvive a modifiche della
+configurazione (docenti o classi aggiunti/rimossi) e può essere usata come hint:
+    {
+        "lessons":   [[classe, giorno, sched_label, docente], ...],
+        "copertura": [[giorno, sched_label, docente], ...]
+    }
+
+Il formato compatto (COMPACT_FORMAT, salvato dall'engine accanto all'Excel) codifica le
+stesse voci come interi, con le tabelle dei nomi, e aggiunge l'hash della configurazione,
+la penalità e le statistiche della risoluzione: si ricarica senza risolvere di nuovo e
+vale anche come hint.
+"""
+
+import json
+import os
+import re
+import time
+from collections import Counter
+
+
+COMPACT_FORMAT = "orario-soluzione"
+COMPACT_VERSION = 1
+COMPACT_SUFFIX = ".soluzione.json"
+
+
+def empty_solution():
+    return {"lessons": [], "copertura": []}
+
+
+def save_solution(solution, path):
+    """Salva la soluzione in JSON e ritorna il percorso scritto."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(solution, f, ensure_ascii=False, indent=1)
+    return path
+
+
+def load_solution(path, global_scheduling_times=None):
+    """Carica una soluzione da file JSON oppure da un orario Excel generato dall'engine.
+
+    Per gli Excel serve la griglia `global_scheduling_times` della configurazione corrente,
+    perché le righe del foglio sono etichettate per posizione (es. 'LUN3').
+    """
+    if path.lower().endswith(('.xlsx', '.xlsm')):
+        if global_scheduling_times is None:
+            raise ValueError("Per leggere un orario Excel serve la griglia degli orari della configurazione.")
+        return solution_from_excel(path, global_scheduling_times)
+    with open(path, 'r', encoding='utf-8') as f:
+        return solution_from_dict(json.load(f))
+
+
+def solution_from_dict(raw):
+    """Valida e normalizza un dizionario di soluzione letto da JSON o dalla sessione (anche in formato compatto)."""
+    if isinstance(raw, dict) and raw.get('format') == COMPACT_FORMAT:
+        return decode_solution(raw)[0]
+    if not isinstance(raw, dict) or 'lessons' not in raw:
+        raise ValueError("Formato soluzione non valido: manca la chiave 'lessons'.")
+    return {
+        "lessons": [list(item) for item in raw.get('lessons', []) if len(item) == 4],
+        "copertura": [list(item) for item in raw.get('copertura', []) if len(item) == 3],
+    }
+
+
+def compact_solution_path(excel_path):
+    """Percorso del file compatto accanto all'orario Excel ('orario.xlsx' -> 'orario.soluzione.json')."""
+    return os.path.splitext(excel_path)[0] + COMPACT_SUFFIX
+
+
+def encode_solution(solution, config_hash=None, objective=None, stats=None):
+    """
+    Codifica la soluzione nel formato compatto: tabelle dei nomi (classi, docenti, giorni,
+    etichette) e voci come indici interi, più hash della configurazione, penalità e statistiche.
+    """
+    tables = {"classi": {}, "docenti": {}, "giorni": {}, "etichette": {}}
+
+    def code(table, name):
+        return tables[table].setdefault(name, len(tables[table]))
+
+    lessons = [[code("classi", cl), code("giorni", day), code("etichette", sl), code("docenti", t)]
+               for cl, day, sl, t in solution.get('lessons', [])]
+    copertura = [[code("giorni", day), code("etichette", sl), code("docenti", t)]
+                 for day, sl, t in solution.get('copertura', [])]
+    record = {"format": COMPACT_FORMAT, "version": COMPACT_VERSION,
+              "created": time.strftime("%Y-%m-%d %H:%M:%S"), "config_hash": config_hash,
+              "objective": objective, "stats": stats or {}}
+    record.update({table: list(names) for table, names in tables.items()})
+    record.update({"lessons": lessons, "copertura": copertura})
+    return record
+
+
+def decode_solution(record):
+    """Decodifica un record compatto: ritorna (soluzione portabile, metadati senza le voci)."""
+    if record.get('format') != COMPACT_FORMAT:
+        raise ValueError("Formato soluzione non valido: non è un file di soluzione compatto.")
+    if not isinstance(record.get('version'), int) or record['version'] > COMPACT_VERSION:
+        raise ValueError(f"Versione del file di soluzione non supportata ({record.get('version')}, massima {COMPACT_VERSION}).")
+    def name(table, i):
+        # Gli indici negativi di Python prenderebbero un nome dalla fine della tabella
+        if isinstance(i, bool) or not isinstance(i, int) or not 0 <= i < len(table):
+            raise IndexError(f"indice {i!r} fuori dalla tabella di {len(table)} nomi")
+        return table[i]
+
+    try:
+        classi, docenti, giorni, etichette = (record[k] for k in ("classi", "docenti", "giorni", "etichette"))
+        solution = {
+            "lessons": [[name(classi, c), name(giorni, d), name(etichette, l), name(docenti, t)] for c, d, l, t in record.get('lessons', [])],
+            "copertura": [[name(giorni, d), name(etichette, l), name(docenti, t)] for d, l, t in record.get('copertura', [])],
+        }
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        raise ValueError(f"File di soluzione compatto danneggiato: {e}") from e
+    meta = {k: v for k, v in record.items() if k not in ("classi", "docenti", "giorni", "etichette", "lessons", "copertura")}
+    return solution, meta
+
+
+def save_compact_solution(record, path):
+    """Salva un record compatto (vedi encode_solution) e ritorna il percorso scritto."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(record, f, ensure_ascii=False, separators=(',', ':'))
+    return path
+
+
+def load_compact_solution(source):
+    """Carica un file compatto (percorso, file-like o record già letto): ritorna (soluzione portabile, metadati)."""
+    if isinstance(source, dict):
+        return decode_solution(source)
+    if isinstance(source, str):
+        with open(source, 'r', encoding='utf-8') as f:
+            return decode_solution(json.load(f))
+    return decode_solution(json.load(source))
+
+
+# Una voce di cella: nome (anche con spazi) seguito da una durata facoltativa, es. 'DE LUCA (1h 30m)'
+_CELL_ENTRY = re.compile(r"\s*([^()]+?)\s*(?:\(([^)]*)\)|$)")
+_DURATION = re.compile(r"(\d+)h(?:\s*(\d+)m)?")
+
+
+def cell_entries(value):
+    """Voci (nome, ore) di una cella del foglio; ore è None se la cella non riporta la durata (es. 'A (1h 30m) B' -> [('A', 1.5), ('B', None)])."""
+    if value is None:
+        return []
+    text = str(value).strip()
+    if not text or text.lower() == 'nan':
+        return []
+    entries = []
+    for name, duration in _CELL_ENTRY.findall(text):
+        if name:
+            match = _DURATION.fullmatch(duration.strip())
+            entries.append((name, int(match.group(1)) + int(match.group(2) or 0) / 60 if match else None))
+    return entries
+
+
+def cell_names(value):
+    """Estrae i nomi da una cella del foglio (es. 'ROSSI (2h)', 'DE LUCA', 'A (1h) B (1h)' -> ['A', 'B'])."""
+    return [name for name, _ in cell_entries(value)]
+
+
+def row_slot(label, global_scheduling_times):
+    """(giorno, sched_label) di un'etichetta di riga 'GIORNO<n>' (es. 'LUN3'), None se non lo è."""
+    match = re.fullmatch(r"([A-Za-z]+)(\d+)", str(label).strip() if label is not None else "")
+    if not match:
+        return None
+    pos = int(match.group(2)) - 1
+    if not 0 <= pos < len(global_scheduling_times):
+        return None
+    return match.group(1), global_scheduling_times[pos]
+
+
+def sheet_rows(wb, name):
+    """(intestazione, righe con la prima cella non vuota) del foglio `name` di un workbook openpyxl, None se il foglio manca."""
+    if name not in wb.sheetnames:
+        return None
+    rows = wb[name].iter_rows(values_only=True)
+    header = [str(h).strip() if h is not None else "" for h in (next(rows, None) or [])]
+    return header, [row for row in rows if row and row[0] is not None]
+
+
+def class_sheet_solution(wb, global_scheduling_times, source_name="caricato", classes=None, problems=None):
+    """Lezioni e copertura del foglio 'Classi' del workbook openpyxl `wb`.
+
+    Le righe sono 'GIORNO<n>': n è la posizione nella griglia `global_scheduling_times`.
+    Con `classes` (le classi della configurazione) le colonne sconosciute vengono scartate;
+    colonne scartate e celle di classe con più docenti sono descritte in `problems`, se è una lista.
+    La colonna 'Copertura' degli export precedenti riporta solo il primo docente di ogni
+    etichetta: la copertura completa è nel foglio 'Docenti' (vedi solution_from_workbook).
+    """
+    classi = sheet_rows(wb, "Classi")
+    if classi is None:
+        raise ValueError(f"Il file '{source_name}' non contiene il foglio 'Classi'.")
+    header, rows = classi
+    problems = problems if problems is not None else []
+    columns = [col if col == "Copertura" or classes is None or col in classes else "" for col in header[1:]]
+    problems.extend(f"Foglio Classi: la colonna '{col}' non è una classe della configurazione"
+                    for col, kept in zip(header[1:], columns) if col and not kept)
+
+    solution = empty_solution()
+    for row in rows:
+        slot = row_slot(row[0], global_scheduling_times)
+        if slot is None:
+            continue
+        day, sched_label = slot
+        for col_name, value in zip(columns, row[1:]):
+            names = cell_names(value)
+            if col_name == "Copertura":
+                solution["copertura"].extend([day, sched_label, t] for t in names)
+            elif col_name and names:
+                if len(names) > 1:
+                    problems.append(f"Foglio Classi: {col_name} il {day} alle {sched_label} ha più docenti nella stessa cella ({', '.join(names)})")
+                solution["lessons"].append([col_name, day, sched_label, names[0]])
+    return solution
+
+
+def teacher_sheet_cells(wb, global_scheduling_times, teachers=None, problems=None):
+    """
+    Celle del foglio 'Docenti': {(docente, giorno, sched_label): (classe o 'COPERTURA', ore)},
+    senza i BUCO (si ricalcolano dall'orario); ore è la durata scritta nell'ultima cella di
+    ogni blocco, None nelle altre. None se il foglio manca. Con `teachers` le colonne
+    sconosciute vengono scartate e descritte in `problems`, se è una lista.
+    """
+    docenti = sheet_rows(wb, "Docenti")
+    if docenti is None:
+        return None
+    header, rows = docenti
+    problems = problems if problems is not None else []
+    columns = [col if teachers is None or col in teachers else "" for col in header[1:]]
+    problems.extend(f"Foglio Docenti: la colonna '{col}' non è un docente della configurazione"
+                    for col, kept in zip(header[1:], columns) if col and not kept)
+
+    cells = {}
+    for row in rows:
+        slot = row_slot(row[0], global_scheduling_times)
+        if slot is None:
+            continue
+        for col_name, value in zip(columns, row[1:]):
+            entries = [entry for entry in cell_entries(value) if entry[0] != "BUCO"]
+            if col_name and entries:
+                cells[(col_name, *slot)] = entries[0]
+    return cells
+
+
+def copertura_from_teacher_cells(teacher_cells, global_scheduling_times, copertura_hours=None):
+    """
+    Voci di copertura [giorno, sched_label, docente] dalle celle COPERTURA del foglio 'Docenti'.
+
+    Alla stessa etichetta possono esserci slot di copertura di durata diversa (es. 1h e 30m):
+    con `copertura_hours` ({giorno: [(sched_label, ore), ...]} nell'ordine degli slot) la durata
+    di ogni voce si ricava dal blocco che la contiene, e le voci di ogni etichetta sono ordinate
+    come gli slot che occupano. Schedule.from_solution assegna infatti a ogni voce il primo
+    slot libero con quell'etichetta.
+    """
+    entries = [[day, sl, t] for (t, day, sl), (name, _) in teacher_cells.items() if name == "COPERTURA"]
+    if not copertura_hours:
+        return entries
+
+    options = {}
+    for day, slots in copertura_hours.items():
+        for sl, hours in slots:
+            options.setdefault((day, sl), set()).add(hours)
+    # Ore di ogni voce: un blocco di etichette consecutive si chiude con la cella che riporta la durata
+    # complessiva, da cui si ricava la sola etichetta con slot di durata diversa, se ce n'è una
+    position = {sl: i for i, sl in enumerate(global_scheduling_times)}
+    entry_hours, block = {}, []
+    for day, sl, t in sorted(entries, key=lambda e: (e[2], e[0], position[e[1]])):
+        if block and (block[-1][2], block[-1][0], position[block[-1][1]] + 1) != (t, day, position[sl]):
+            block = []
+        block.append((day, sl, t))
+        total = teacher_cells[(t, day, sl)][1]
+        if total is None:
+            continue
+        ambiguous = [key for key in block if len(options.get(key[:2], ())) != 1]
+        if len(ambiguous) == 1:
+            entry_hours[ambiguous[0]] = total - sum(next(iter(options[key[:2]])) for key in block if key not in ambiguous)
+        block = []
+
+    ordered = []
+    for day, slots in copertura_hours.items():
+        waiting = {}
+        for e in entries:
+            if e[0] == day:
+                waiting.setdefault(e[1], []).append(e)
+        for sl, hours in slots:
+            candidates = waiting.get(sl)
+            if candidates:
+                match = next((e for e in candidates if entry_hours.get(tuple(e)) == hours), None)
+                match = match or next((e for e in candidates if tuple(e) not in entry_hours), candidates[0])
+                candidates.remove(match)
+                ordered.append(match)
+    placed = {id(e) for e in ordered}
+    return ordered + [e for e in entries if id(e) not in placed]
+
+
+def solution_from_workbook(wb, global_scheduling_times, source_name="caricato", classes=None, teachers=None,
+                           copertura_hours=None, problems=None):
+    """Ricostruisce una soluzione da un workbook openpyxl generato dall'engine.
+
+    Le lezioni vengono dal foglio 'Classi'; la copertura dalle celle COPERTURA del foglio
+    'Docenti', una per docente e etichetta (vedi copertura_from_teacher_cells), oppure dalla
+    colonna 'Copertura' se il foglio manca. `classes`, `teachers` e `problems` come in
+    class_sheet_solution e teacher_sheet_cells.
+    """
+    solution = class_sheet_solution(wb, global_scheduling_times, source_name, classes, problems)
+    teacher_cells = teacher_sheet_cells(wb, global_scheduling_times, teachers, problems)
+    if teacher_cells is not None:
+        solution["copertura"] = copertura_from_teacher_cells(teacher_cells, global_scheduling_times, copertura_hours)
+    return solution
+
+
+def solution_from_excel(source, global_scheduling_times):
+    """Ricostruisce una soluzione dai fogli 'Classi' e 'Docenti' di un orario generato dall'engine.
+
+    `source` è un percorso o un file-like (es. upload di Streamlit).
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        name = os.path.basename(source) if isinstance(source, str) else getattr(source, 'name', 'caricato')
+        return solution_from_workbook(wb, global_scheduling_times, name)
+    finally:
+        wb.close()
+
+
+def remap_solution(solution, class_map=None, teacher_map=None):
+    """Rinomina classi e docenti (es. orario dell'anno precedente: '1A' -> '2A').
+
+    I nomi assenti dalle mappe restano invariati; quelli mappati a None/'' vengono scartati.
+    """
+    class_map = class_map or {}
+    teacher_map = teacher_map or {}
+
+    def rename(name, mapping):
+        return mapping.get(name, name)
+
+    remapped = empty_solution()
+    for cl, day, sl, t in solution.get('lessons', []):
+        new_cl, new_t = rename(cl, class_map), rename(t, teacher_map)
+        if new_cl and new_t:
+            remapped['lessons'].append([new_cl, day, sl, new_t])
+    for day, sl, t in solution.get('copertura', []):
+        new_t = rename(t, teacher_map)
+        if new_t:
+            remapped['copertura'].append([day, sl, new_t])
+    return remapped
+
+
+def diff_solutions(before, after):
+    """
+    Assegnazioni che cambiano tra due soluzioni, per docente:
+    {docente: {"removed": [...], "added": [...]}} con voci [classe, giorno, sched_label]
+    ("copertura" al posto della classe per la copertura). Le voci ripetute (più slot di
+    copertura alla stessa ora) si confrontano come multiinsiemi.
+    """
+    def entries(solution):
+        items = Counter((t, cl, day, sl) for cl, day, sl, t in solution.get('lessons', []))
+        items.update((t, 'copertura', day, sl) for day, sl, t in solution.get('copertura', []))
+        return items
+
+    old, new = entries(before), entries(after)
+    moves = {}
+    for side, changed in (("removed", old - new), ("added", new - old)):
+        for (t, cl, day, sl), count in changed.items():
+            moves.setdefault(t, {"removed": [], "added": []})[side].extend([[cl, day, sl]] * count)
+    return dict(sorted(moves.items()))
+
+
+def load_name_map(path):
+    """Carica una mappa di rinomina {"classi": {...}, "docenti": {...}} da JSON."""
+    with open(path, 'r', encoding='utf-8') as f:
+        raw = json.load(f)
+    return raw.get('classi', {}), raw.get('docenti', {})
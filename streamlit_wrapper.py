@@ -13,7 +13,14 @@ import ctypes
 
 # Import necessari affinché PyInstaller includa questi moduli nel bundle
 import engine  # noqa: F401
+import solution  # noqa: F401
+import portfolio  # noqa: F401
 import utils  # noqa: F401
+import validator  # noqa: F401
+import result_cache  # noqa: F401
+import history  # noqa: F401
+import repair  # noqa: F401
+import substitutes  # noqa: F401
 import version  # noqa: F401
 import pandas as _pandas  # noqa: F401
 import openpyxl  # noqa: F401
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Indice delle disponibilità dei docenti e ricerca dei supplenti.
+
+Da un orario risolto (Schedule) costruisce una volta dei bitset docente × giorno × etichetta
+con la stessa semantica delle variabili `b` (docente occupato) e `holes` (buco) del modello,
+più la copertura e le indisponibilità (ONLY_DAYS, START_AT, END_AT). Le domande del tipo
+"chi è libero o in buco MAR 10:00" diventano operazioni tra interi: istantanee anche con
+centinaia di docenti. I supplenti sono ordinati per stato (a disposizione in copertura,
+in buco, a scuola nella giornata, senza lezioni quel giorno), ore di copertura settimanali
+e carico della giornata.
+"""
+
+import argparse
+import os
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+
+from engine import COPERTURA, DEFAULT_OUTPUT_FILE, Schedule, ScheduleData, get_scheduling_label, unavailability_reason, units_to_hours
+from solution import compact_solution_path
+
+# Stato del docente all'orario richiesto, nell'ordine di preferenza come supplente
+STATUS_LABELS = {
+    'copertura': "a disposizione (copertura)",
+    'buco': "in buco",
+    'presente': "libero, a scuola in giornata",
+    'assente': "libero, senza lezioni in giornata",
+}
+STATUS_ORDER = {status: rank for rank, status in enumerate(STATUS_LABELS)}
+
+
+def _mask(flags):
+    """Bitset (int) di un vettore booleano: il bit i vale 1 se flags[i] è vero."""
+    return int.from_bytes(np.packbits(flags, bitorder='little').tobytes(), 'little')
+
+
+def _members(mask):
+    """Indici dei bit a 1 del bitset, in ordine crescente."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+@dataclass
+class Substitute:
+    """Docente candidato a una supplenza, con i dati usati per l'ordinamento."""
+    teacher: str
+    status: str
+    copertura_hours: float  # ore di copertura settimanali assegnate
+    daily_hours: float      # ore già occupate nella giornata (lezioni e copertura)
+
+    @property
+    def status_label(self):
+        return STATUS_LABELS[self.status]
+
+
+class AvailabilityIndex:
+    """
+    Bitset costruiti da uno Schedule, indicizzati come ScheduleData (teachers, GIORNI,
+    GLOBAL_SCHEDULING_TIMES):
+      - busy[docente][giorno]: etichette in cui il docente è occupato (variabili `b`)
+      - free_at, hole_at, copertura_at[(giorno, etichetta)]: docenti liberi e disponibili,
+        in buco, in copertura
+      - present_on[giorno]: docenti con almeno un'ora nella giornata
+    """
+
+    def __init__(self, schedule):
+        d = self.data = schedule.data
+        self.schedule = schedule
+        self.teachers, self.days, self.labels = d.teachers, d.GIORNI, d.GLOBAL_SCHEDULING_TIMES
+        self.teacher_index, self.day_index, self.label_index = schedule.teacher_index, schedule.day_index, schedule.label_index
+        n_d, n_l = len(self.days), len(self.labels)
+        unavailable = np.array([[[unavailability_reason(d, t, day, sl) is not None for sl in self.labels] for day in self.days]
+                                for t in self.teachers], dtype=bool).reshape(len(self.teachers), n_d, n_l)
+        busy, holes = schedule.busy, schedule.holes
+        self.busy = [[_mask(busy[ti, di]) for di in range(n_d)] for ti in range(len(self.teachers))]
+        self.free_at = {(di, l): _mask(~busy[:, di, l] & ~unavailable[:, di, l]) for di in range(n_d) for l in range(n_l)}
+        self.hole_at = {(di, l): _mask(holes[:, di, l]) for di in range(n_d) for l in range(n_l)}
+        self.copertura_at = {(di, l): _mask(schedule.teacher_grid[:, di, l] == COPERTURA) for di in range(n_d) for l in range(n_l)}
+        self.present_on = [_mask(busy[:, di].any(axis=1)) for di in range(n_d)]
+        self.daily_units = schedule.lesson_units.sum(axis=1) + schedule.copertura_units  # [docente, giorno]
+        self.copertura_hours = [d.ASSEGNAZIONE_DOCENTI[t].get('copertura', 0) for t in self.teachers]
+
+    @classmethod
+    def from_solution(cls, config, solution, problems=None):
+        """Indice di una soluzione nel formato portabile di solution.py per la configurazione `config`
+        (le voci scartate da Schedule.from_solution sono descritte in `problems`, se è una lista)."""
+        return cls(Schedule.from_solution(ScheduleData(config), solution, problems))
+
+    def _day(self, day):
+        if day not in self.day_index: raise ValueError(f"Giorno {day} non presente in GIORNI ({', '.join(self.days)}).")
+        return self.day_index[day]
+
+    def _slot(self, day, label):
+        """Indici (giorno, etichetta); `label` può essere '10:00' o '10:00-11:00'."""
+        label = get_scheduling_label(label)
+        if label not in self.label_index: raise ValueError(f"Orario {label} non presente nella griglia ({', '.join(self.labels)}).")
+        return self._day(day), self.label_index[label]
+
+    def _names(self, mask):
+        return [self.teachers[ti] for ti in _members(mask)]
+
+    def free(self, day, label):
+        """Docenti liberi e disponibili (buchi compresi) all'orario indicato."""
+        return self._names(self.free_at[self._slot(day, label)])
+
+    def in_hole(self, day, label):
+        """Docenti in buco all'orario indicato."""
+        return self._names(self.hole_at[self._slot(day, label)])
+
+    def status(self, teacher, day, label):
+        """Stato del docente all'orario: una chiave di STATUS_LABELS, 'lezione' o 'non disponibile'."""
+        slot = self._slot(day, label)
+        bit = 1 << self.teacher_index[teacher]
+        if self.copertura_at[slot] & bit: return 'copertura'
+        if self.hole_at[slot] & bit: return 'buco'
+        if self.free_at[slot] & bit: return 'presente' if self.present_on[slot[0]] & bit else 'assente'
+        return 'lezione' if self.busy[self.teacher_index[teacher]][slot[0]] >> slot[1] & 1 else 'non disponibile'
+
+    def find_substitutes(self, day, label, absent=None, limit=None):
+        """
+        Supplenti per l'orario indicato, dal più adatto: docenti in copertura, poi in buco,
+        poi liberi ma a scuola nella giornata, poi senza lezioni quel giorno; a parità di stato
+        prima chi ha più ore di copertura settimanali, poi chi ha la giornata meno carica.
+        `absent` (docente o lista di docenti) viene escluso.
+        """
+        di, l = slot = self._slot(day, label)
+        candidates = self.free_at[slot] | self.copertura_at[slot]
+        for teacher in ([absent] if isinstance(absent, str) else absent or []):
+            if teacher in self.teacher_index: candidates &= ~(1 << self.teacher_index[teacher])
+        substitutes = []
+        for ti in _members(candidates):
+            bit = 1 << ti
+            if self.copertura_at[slot] & bit: status = 'copertura'
+            elif self.hole_at[slot] & bit: status = 'buco'
+            elif self.present_on[di] & bit: status = 'presente'
+            else: status = 'assente'
+            substitutes.append(Substitute(self.teachers[ti], status, self.copertura_hours[ti], units_to_hours(int(self.daily_units[ti, di]))))
+        substitutes.sort(key=lambda s: (STATUS_ORDER[s.status], -s.copertura_hours, s.daily_hours, s.teacher))
+        return substitutes[:limit] if limit else substitutes
+
+    def absence_plan(self, teacher, day, limit=3):
+        """Lezioni del docente nella giornata con i migliori `limit` supplenti per ognuna: [(etichetta, classe, [Substitute])]."""
+        if teacher not in self.teacher_index: raise ValueError(f"Docente {teacher} non presente nella configurazione.")
+        ti, di = self.teacher_index[teacher], self._day(day)
+        plan = []
+        for l in _members(self.busy[ti][di]):
+            c = int(self.schedule.teacher_grid[ti, di, l])
+            what = self.data.CLASSI[c] if c >= 0 else 'copertura'
+            plan.append((self.labels[l], what, self.find_substitutes(day, self.labels[l], absent=teacher, limit=limit)))
+        return plan
+
+
+def format_substitutes(substitutes):
+    """Righe di testo di un elenco di supplenti."""
+    if not substitutes: return ["  Nessun docente disponibile."]
+    return [f"  {i:>2}. {s.teacher:<20} {s.status_label:<34} copertura {s.copertura_hours:g}h/sett., {s.daily_hours:g}h in giornata"
+            for i, s in enumerate(substitutes, 1)]
+
+
+def main(argv=None):
+    from solution import load_solution
+    from utils import load_config
+
+    default_solution = compact_solution_path(DEFAULT_OUTPUT_FILE)
+    parser = argparse.ArgumentParser(
+        description="Docenti liberi o in buco a un dato orario e supplenti ordinati per un'assenza",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Esempi di utilizzo:
+  python substitutes.py MAR 10:00                      # Supplenti per MAR 10:00 nell'orario corrente
+  python substitutes.py MAR 10:00 --absent ROSSI       # Escludendo il docente assente
+  python substitutes.py MAR --absent ROSSI             # Tutte le lezioni di ROSSI il martedì, con i supplenti
+        """
+    )
+    parser.add_argument('day', help='Giorno (es. MAR)')
+    parser.add_argument('time', nargs='?', default=None, help="Orario di inizio (es. 10:00); senza orario servono le lezioni di --absent")
+    parser.add_argument('--absent', type=str, default=None, help='Docente assente, escluso dai supplenti')
+    parser.add_argument('--solution', type=str, default=default_solution, help=f'Orario risolto: soluzione compatta, JSON o Excel (default: {default_solution})')
+    parser.add_argument('--config', '-c', type=str, default='config.json', help='File di configurazione JSON (default: config.json)')
+    parser.add_argument('--limit', type=int, default=10, help='Numero massimo di supplenti per orario (default: 10)')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.solution):
+        print(f"❌ File '{args.solution}' non trovato.")
+        return 1
+    config = load_config(args.config)
+    try:
+        solution = load_solution(args.solution, ScheduleData(config).GLOBAL_SCHEDULING_TIMES)
+        index = AvailabilityIndex.from_solution(config, solution)
+        if args.absent is not None and args.absent not in index.teacher_index:
+            raise ValueError(f"Docente {args.absent} non presente nella configurazione.")
+        if args.time is not None:
+            print(f"--- SUPPLENTI {args.day} {args.time} ---")
+            print("\n".join(format_substitutes(index.find_substitutes(args.day, args.time, absent=args.absent, limit=args.limit))))
+        elif args.absent:
+            for label, what, substitutes in index.absence_plan(args.absent, args.day, limit=args.limit):
+                print(f"--- {args.absent} {args.day} {label} ({what}) ---")
+                print("\n".join(format_substitutes(substitutes)))
+        else:
+            parser.error("indicare l'orario oppure il docente assente (--absent)")
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,30 @@
+"""Validazione della configurazione: i valori numerici scritti come stringhe non nascondono gli altri problemi."""
+
+import copy
+import json
+import os
+
+import pytest
+
+from utils import config_from_json, normalize_config, validate_config
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+@pytest.fixture(scope="module")
+def raw_config():
+    with open(os.path.join(DATA_DIR, "baseline_config.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize("form", ["json", "interno"])
+def test_numeric_string_max_daily_hours(raw_config, form):
+    config = copy.deepcopy(raw_config)
+    config['USE_MAX_DAILY_HOURS_PER_CLASS'] = True
+    config['MAX_DAILY_HOURS_PER_CLASS'] = "1"
+    if form == "interno":
+        config = normalize_config(config_from_json(config))
+    result = validate_config(config)
+    assert not any(message.startswith("Configurazione non leggibile") for message in result.errors)
+    assert any("eccede MAX_DAILY_HOURS_PER_CLASS (1h)" in message for message in result.warnings)
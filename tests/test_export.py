@@ -0,0 +1,76 @@
+"""
+Export Excel confrontato cella per cella con un orario prodotto dall'engine originale.
+
+data/baseline_orario.xlsx è stato scritto dall'engine della versione di partenza con
+data/baseline_config.json; data/baseline_solution.json è la soluzione dello stesso run,
+salvata dal solver (con l'ordine degli slot di copertura). L'export attuale della stessa
+soluzione deve avere gli stessi valori e gli stessi stili (riempimenti, font, bordi).
+"""
+
+import io
+import json
+import os
+
+import pytest
+from openpyxl import load_workbook
+
+from engine import Schedule, ScheduleData, write_schedule_workbook
+from solution import solution_from_dict
+from utils import config_from_json
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+# Differenze volute (vedi Schedule.class_sheet_rows): più docenti di copertura alla stessa ora
+# restano nella stessa cella, che non si unisce alle vicine. L'engine originale univa la cella
+# al blocco del primo docente e perdeva gli altri docenti.
+DELIBERATE_DIFFERENCES = {
+    ("Classi", "MAR3", "Copertura"): ("CARDONE", "CARDONE (1h)"),
+    ("Classi", "MAR4", "Copertura"): ("CARDONE (2h)", "CARDONE (1h) PEPE (1h)"),
+    ("Classi", "MER2", "Copertura"): ("PEPE", "PEPE (1h) SABATELLI (1h)"),
+    ("Classi", "MER3", "Copertura"): ("PEPE (2h)", "PEPE (1h) MARANGI (0h 30m)"),
+}
+
+STYLE_ATTRIBUTES = ("fill", "font", "border", "alignment", "number_format", "protection")
+
+
+@pytest.fixture(scope="module")
+def workbooks():
+    with open(os.path.join(DATA_DIR, "baseline_config.json"), encoding="utf-8") as f:
+        data = ScheduleData(config_from_json(json.load(f)))
+    with open(os.path.join(DATA_DIR, "baseline_solution.json"), encoding="utf-8") as f:
+        solution = solution_from_dict(json.load(f))
+    problems = []
+    schedule = Schedule.from_solution(data, solution, problems)
+    assert problems == []
+
+    buffer = io.BytesIO()
+    write_schedule_workbook([("Classi", schedule.class_sheet_rows()), ("Docenti", schedule.teacher_sheet_rows())], buffer)
+    baseline = load_workbook(os.path.join(DATA_DIR, "baseline_orario.xlsx"))
+    current = load_workbook(io.BytesIO(buffer.getvalue()))
+    return baseline, current
+
+
+def _cells(ws):
+    """Celle del foglio per (etichetta di riga, intestazione di colonna)."""
+    header = [c.value for c in ws[1]]
+    for row in ws.iter_rows(min_row=1, max_row=ws.max_row, max_col=ws.max_column):
+        for col, cell in zip(header, row):
+            yield (row[0].value, col), cell
+
+
+@pytest.mark.parametrize("sheet", ["Classi", "Docenti"])
+def test_export_matches_baseline_workbook(workbooks, sheet):
+    baseline, current = workbooks
+    ws_base, ws_cur = baseline[sheet], current[sheet]
+    assert (ws_cur.max_row, ws_cur.max_column) == (ws_base.max_row, ws_base.max_column)
+
+    differences = {}
+    for (key, base_cell), (_, cur_cell) in zip(_cells(ws_base), _cells(ws_cur)):
+        if base_cell.value != cur_cell.value:
+            differences[(sheet, *key)] = (base_cell.value, cur_cell.value)
+        for attr in STYLE_ATTRIBUTES:
+            # repr: gli stili di openpyxl si confrontano per contenuto solo nello stesso workbook
+            assert repr(getattr(cur_cell, attr)) == repr(getattr(base_cell, attr)), f"{sheet} {key}: {attr} diverso"
+    assert differences == {k: v for k, v in DELIBERATE_DIFFERENCES.items() if k[0] == sheet}
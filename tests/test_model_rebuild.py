@@ -0,0 +1,106 @@
+"""
+Ricostruzione incrementale del modello (rebuild_model): deve accettare e rifiutare le stesse
+soluzioni del modello costruito da zero, e FAMILY_CONFIG_KEYS deve elencare tutte le chiavi
+di configurazione lette da ogni famiglia di vincoli.
+"""
+
+import copy
+
+import pytest
+from ortools.sat.python import cp_model
+
+from engine import FAMILY_CONFIG_KEYS, ScheduleData, ScheduleModel, _emit_families, build_model, rebuild_model
+from generator import generate_instance
+from utils import diff_configs
+
+
+# Chiavi da cui dipendono variabili e indici (model_structure): se cambiano, rebuild_model non si applica
+STRUCTURAL_KEYS = {'CLASSI', 'GIORNI', 'SLOT_1', 'SLOT_2', 'SLOT_3', 'ASSEGNAZIONE_SLOT', 'GLOBAL_SCHEDULING_TIMES', 'EXCEL_LABELS'}
+
+
+@pytest.fixture(scope="module")
+def instance():
+    """Istanza del generatore con vincoli specifici (anche ONLY_DAYS) e la sua soluzione piantata."""
+    config, solution = generate_instance(n_classes=10, constraint_density=1.0, seed=2)
+    assert config.get('ONLY_DAYS')
+    return config, solution
+
+
+def accepts(sm, solution):
+    """True se il modello ammette la soluzione, fissata su una copia e senza obiettivo."""
+    sm = sm.copy()
+    fixed = sm.apply_hint(solution, [], fix=True)
+    assert fixed['applied'] == fixed['total']
+    sm.model.ClearObjective()
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = 30
+    res = solver.Solve(sm.model)
+    assert res != cp_model.UNKNOWN
+    return res in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+
+
+@pytest.mark.parametrize("existing", [True, False], ids=["voce esistente", "nuova voce"])
+def test_only_days_toggle_rebuild_matches_fresh_model(instance, existing):
+    config, solution = instance
+    base = build_model(ScheduleData(config), [])
+    assert accepts(base, solution)
+
+    # Un giorno in cui il docente insegna nella soluzione piantata diventa non disponibile
+    only_days = config['ONLY_DAYS']
+    teacher = next(t for t in ScheduleData(config).teachers if (t in only_days) == existing
+                   and any(lesson[3] == t for lesson in solution['lessons']))
+    day = next(lesson[1] for lesson in solution['lessons'] if lesson[3] == teacher)
+    toggled = copy.deepcopy(config)
+    toggled['ONLY_DAYS'][teacher] = set(only_days.get(teacher, config['GIORNI'])) - {day}
+
+    diff = diff_configs(config, toggled)
+    assert set(diff.changes) == {'ONLY_DAYS'}
+    rebuilt = rebuild_model(base, ScheduleData(toggled), diff.changes, [])
+    assert rebuilt is not None
+    assert not accepts(rebuilt, solution)
+    assert not accepts(build_model(ScheduleData(toggled), []), solution)
+
+    reverted = rebuild_model(rebuilt, ScheduleData(config), diff_configs(toggled, config).changes, [])
+    assert reverted is not None
+    assert accepts(reverted, solution)
+
+
+class _RecordingData:
+    """ScheduleData che registra, per la famiglia in costruzione, le chiavi di configurazione lette."""
+
+    def __init__(self, data):
+        self._data = data
+        self.family = None
+        self.reads = {}
+
+    def __getattr__(self, name):
+        if self.family is not None and name.isupper():
+            self.reads.setdefault(self.family, set()).add(name)
+        return getattr(self._data, name)
+
+
+def test_family_config_keys_cover_every_key_read(instance):
+    config = copy.deepcopy(instance[0])
+    # Attiva tutte le famiglie: basta costruirle, la soluzione piantata non serve
+    data = ScheduleData(config)
+    teacher = data.teachers[0]
+    config.setdefault('ONLY_DAYS', {}).setdefault(teacher, set(config['GIORNI']))
+    config.setdefault('HOURS_PER_DAY_PER_CLASS', {teacher: 1})
+    config.setdefault('GROUP_DAILY_TWO_CLASSES', {next(t for t in data.teachers if len(data.teacher_classes(t)) == 2)})
+
+    sm = ScheduleModel(ScheduleData(config))
+    data = sm.data = _RecordingData(sm.data)
+    timed = sm.timed
+
+    def recording_timed(add_family, *args, **kwargs):
+        data.family = add_family.__name__[len('add_'):]
+        try:
+            return timed(add_family, *args, **kwargs)
+        finally:
+            data.family = None
+
+    sm.timed = recording_timed
+    _emit_families(sm, [])
+    assert set(sm.families) == set(FAMILY_CONFIG_KEYS)
+    missing = {name: sorted(keys - STRUCTURAL_KEYS - set(FAMILY_CONFIG_KEYS[name])) for name, keys in data.reads.items()}
+    assert {name: keys for name, keys in missing.items() if keys} == {}
@@ -0,0 +1,73 @@
+"""
+Riparazione di un orario dopo una modifica (repair.py): si spostano solo le assegnazioni
+toccate dalla modifica, e se la parte fissata rende il problema insolubile si passa
+all'intorno allargato.
+"""
+
+import copy
+
+import pytest
+
+from engine import ScheduleData
+from generator import generate_instance
+from repair import expand_neighbourhood, frozen_part, run_repair, touched_by_change
+from solution import diff_solutions
+
+
+@pytest.fixture(scope="module")
+def instance():
+    """Istanza minima del generatore, senza vincoli specifici, con la sua soluzione piantata."""
+    config, solution = generate_instance(n_classes=3, constraint_density=0.0, seed=1, copertura_hours=4)
+    config['SOLVER_TIME_LIMIT'] = 6  # diviso tra i livelli di fissaggio
+    data = ScheduleData(config)
+    teacher = max(data.teachers, key=lambda t: len(data.teacher_classes(t)))
+    return config, solution, teacher
+
+
+def test_renamed_teacher_moves_only_its_entries(instance):
+    config, previous, teacher = instance
+    changed = copy.deepcopy(config)
+    changed['ASSEGNAZIONE_DOCENTI']['NUOVO'] = changed['ASSEGNAZIONE_DOCENTI'].pop(teacher)
+
+    data = ScheduleData(changed)
+    classes, teachers, _ = touched_by_change(data, previous)
+    assert (classes, teachers) == (set(data.teacher_classes('NUOVO')), {'NUOVO'})
+    frozen = frozen_part(previous, classes, teachers)
+    assert all(cl not in classes for cl, _, _, _ in frozen['lessons'])
+
+    result = run_repair(changed, previous, output_path=None)
+    assert result.ok
+    assert result.stats['repair']['level'] == "intorno della modifica"
+    moves = diff_solutions(previous, result.solution)
+    assert set(moves) == {teacher, 'NUOVO'}
+    # Il nuovo docente prende esattamente le lezioni del docente sostituito
+    assert moves[teacher]['added'] == [] and moves['NUOVO']['removed'] == []
+    assert sorted(moves[teacher]['removed']) == sorted(moves['NUOVO']['added'])
+    assert result.stats['repair']['moved'] == len(moves[teacher]['removed'])
+
+
+def test_infeasible_frozen_part_falls_back_to_wider_neighbourhood(instance):
+    config, previous, teacher = instance
+    # Il docente non è più disponibile in un giorno in cui insegna: le sue ore devono andare in
+    # altri giorni delle sue classi, ma lì gli slot degli altri docenti sono fissati
+    day = next(d for _, d, _, t in previous['lessons'] if t == teacher)
+    changed = copy.deepcopy(config)
+    changed['ONLY_DAYS'] = {teacher: set(config['GIORNI']) - {day}}
+
+    data = ScheduleData(changed)
+    classes, teachers, _ = touched_by_change(data, previous)
+    assert (classes, teachers) == (set(), {teacher})
+
+    result = run_repair(changed, previous, output_path=None)
+    assert result.ok
+    levels = result.stats['repair']['levels']
+    assert [(level['level'], level['status']) for level in levels[:1]] == [("intorno della modifica", "INFEASIBLE")]
+    assert result.stats['repair']['level'] == "intorno allargato"
+    assert not any(t == teacher and d == day for _, d, _, t in result.solution['lessons'])
+    # Le assegnazioni fuori dall'intorno allargato restano dove erano
+    wider_classes, wider_teachers = expand_neighbourhood(data, classes, teachers)
+    moved = [(t, cl) for t, change in diff_solutions(previous, result.solution).items()
+             for cl, _, _ in change['removed'] + change['added']]
+    assert moved and all(cl in wider_classes or t in wider_teachers for t, cl in moved)
+    untouched = frozen_part(previous, wider_classes, wider_teachers)
+    assert all(entry in result.solution['lessons'] for entry in untouched['lessons'])
@@ -0,0 +1,70 @@
+"""Cache dei risultati: si conservano tutti i risultati tranne quelli fermati dall'utente; reproducible distingue quelli che una nuova risoluzione non cambierebbe."""
+
+import copy
+import json
+import os
+import threading
+
+import pytest
+
+from engine import SOLVER_PROFILES, ScheduleResult
+from result_cache import ResultCache, reproducible
+from utils import config_from_json
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+@pytest.fixture(scope="module")
+def config():
+    with open(os.path.join(DATA_DIR, "baseline_config.json"), encoding="utf-8") as f:
+        return config_from_json(json.load(f))
+
+
+def _result(profile, stop_reason, seed=None):
+    settings = dict(SOLVER_PROFILES[profile], profile=profile)
+    if seed is not None:
+        settings['seed'] = seed
+    return ScheduleResult(df_classi=[], df_docenti=[], record={}, stats={'solver': settings, 'stop_reason': stop_reason})
+
+
+@pytest.mark.parametrize("profile, stop_reason, seed, cached, same_again", [
+    ('balanced', 'time_limit', None, True, False),       # seed casuale: un'altra esecuzione può trovare un orario diverso
+    ('balanced', 'first_solution', None, True, False),   # senza obiettivo ogni esecuzione dà un orario valido diverso
+    ('balanced', 'gap', None, True, False),
+    ('balanced', 'time_limit', 7, True, False),          # seed fisso ma ricerca parallela non deterministica
+    ('balanced', 'optimal', None, True, True),
+    ('balanced', 'user', None, False, False),            # fermata a mano: la prossima richiesta risolve di nuovo
+    ('reproducible', 'time_limit', None, True, True),
+    ('reproducible', 'stagnation', None, True, False),   # arresto misurato in secondi reali
+])
+def test_cached_and_reproducible_results(tmp_path, config, profile, stop_reason, seed, cached, same_again):
+    config = copy.deepcopy(config)
+    config['SOLVER_PROFILE'] = profile
+    cache = ResultCache(directory=str(tmp_path))
+    result = _result(profile, stop_reason, seed)
+    cache.put(config, None, result)
+    assert (cache.get(config) is result) == cached
+    assert bool(os.listdir(tmp_path)) == cached
+    assert reproducible(result.stats) == same_again
+
+
+def test_concurrent_stores_of_the_same_key(tmp_path, config):
+    cache = ResultCache(directory=str(tmp_path))
+    result = _result('balanced', 'time_limit')
+    errors = []
+
+    def store():
+        try:
+            for _ in range(20):
+                cache.put(config, None, result)
+        except Exception as e:  # os.replace di un file temporaneo già spostato da un altro thread
+            errors.append(e)
+
+    threads = [threading.Thread(target=store) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(os.listdir(tmp_path)) == 1
@@ -0,0 +1,55 @@
+"""Formato compatto della soluzione (encode_solution/decode_solution): andata e ritorno, versioni e indici danneggiati."""
+
+import json
+import os
+
+import pytest
+
+from solution import (COMPACT_FORMAT, COMPACT_VERSION, decode_solution, encode_solution, load_compact_solution,
+                      save_compact_solution, solution_from_dict)
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+@pytest.fixture(scope="module")
+def solution():
+    with open(os.path.join(DATA_DIR, "baseline_solution.json"), encoding="utf-8") as f:
+        return solution_from_dict(json.load(f))
+
+
+@pytest.fixture
+def record(solution):
+    return encode_solution(solution, config_hash="abc123", objective=40, stats={'stop_reason': 'optimal'})
+
+
+def test_round_trip(tmp_path, solution, record):
+    assert (record['format'], record['version']) == (COMPACT_FORMAT, COMPACT_VERSION)
+    path = save_compact_solution(record, str(tmp_path / "orario.soluzione.json"))
+    decoded, meta = load_compact_solution(path)
+    assert decoded == solution
+    assert (meta['config_hash'], meta['objective'], meta['stats']) == ("abc123", 40, {'stop_reason': 'optimal'})
+    # Le tabelle dei nomi non si ripetono e le voci sono solo interi
+    assert len(record['docenti']) == len({t for _, _, _, t in solution['lessons']} | {t for _, _, t in solution['copertura']})
+    assert all(isinstance(i, int) for entry in record['lessons'] + record['copertura'] for i in entry)
+    # solution_from_dict riconosce il formato compatto
+    assert solution_from_dict(json.loads(json.dumps(record))) == solution
+
+
+def test_newer_version_is_rejected(record):
+    record['version'] = COMPACT_VERSION + 1
+    with pytest.raises(ValueError, match="Versione del file di soluzione non supportata"):
+        decode_solution(record)
+
+
+@pytest.mark.parametrize("corrupt", [
+    lambda r: r['lessons'][0].__setitem__(0, len(r['classi'])),   # oltre la fine della tabella
+    lambda r: r['lessons'][0].__setitem__(3, -1),                 # negativo: non deve prendere l'ultimo nome
+    lambda r: r['copertura'][0].__setitem__(1, "9:00"),           # non intero
+    lambda r: r['copertura'].append([0, 0]),                      # voce incompleta
+    lambda r: r.pop('etichette'),                                  # tabella mancante
+], ids=["oltre la fine", "negativo", "non intero", "voce incompleta", "tabella mancante"])
+def test_corrupted_record_raises_value_error(record, corrupt):
+    corrupt(record)
+    with pytest.raises(ValueError, match="danneggiato"):
+        decode_solution(record)
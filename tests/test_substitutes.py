@@ -0,0 +1,59 @@
+"""Ricerca dei supplenti (AvailabilityIndex.find_substitutes) sulla soluzione di riferimento."""
+
+import json
+import os
+
+import pytest
+
+from solution import solution_from_dict
+from substitutes import STATUS_ORDER, AvailabilityIndex, main
+from utils import config_from_json
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+@pytest.fixture(scope="module")
+def index():
+    with open(os.path.join(DATA_DIR, "baseline_config.json"), encoding="utf-8") as f:
+        config = config_from_json(json.load(f))
+    with open(os.path.join(DATA_DIR, "baseline_solution.json"), encoding="utf-8") as f:
+        solution = solution_from_dict(json.load(f))
+    problems = []
+    index = AvailabilityIndex.from_solution(config, solution, problems)
+    assert problems == []
+    return index
+
+
+def _ranking(substitutes):
+    return [(s.teacher, s.status, s.copertura_hours, s.daily_hours) for s in substitutes]
+
+
+@pytest.mark.parametrize("day, label, expected", [
+    # Un docente per stato: copertura, buco, presente, assente
+    ("GIO", "9:00", [("SABATELLI", 'copertura', 4, 5.5), ("ANGELINI", 'buco', 2, 4.5),
+                     ("SIMEONE", 'presente', 0, 3.5), ("CICCIMARRA", 'assente', 0, 0.0)]),
+    # A parità di stato prima le ore di copertura settimanali, poi la giornata meno carica
+    ("MAR", "9:00-10:00", [("PALMISANO", 'copertura', 2, 4.0), ("ANGELINI", 'buco', 2, 3.5), ("SAVINO", 'buco', 2, 4.0),
+                           ("RUSSO", 'buco', 2, 4.5), ("MOTORIA", 'buco', 0, 4.0)]),
+])
+def test_ranking_order(index, day, label, expected):
+    substitutes = index.find_substitutes(day, label)
+    assert _ranking(substitutes) == expected
+    assert all(index.status(s.teacher, day, label) == s.status for s in substitutes)
+    keys = [(STATUS_ORDER[s.status], -s.copertura_hours, s.daily_hours) for s in substitutes]
+    assert keys == sorted(keys)
+
+
+def test_absent_teachers_are_excluded(index):
+    ranking = _ranking(index.find_substitutes("GIO", "9:00", absent=["ANGELINI", "SABATELLI"]))
+    assert ranking == [("SIMEONE", 'presente', 0, 3.5), ("CICCIMARRA", 'assente', 0, 0.0)]
+    assert [s.teacher for s in index.find_substitutes("GIO", "9:00", absent="SIMEONE", limit=2)] == ["SABATELLI", "ANGELINI"]
+
+
+def test_cli_rejects_unknown_absent_teacher(capsys):
+    files = ["--solution", os.path.join(DATA_DIR, "baseline_solution.json"), "--config", os.path.join(DATA_DIR, "baseline_config.json")]
+    assert main(["MAR", "10:00", "--absent", "ANGELIN", *files]) == 1
+    assert capsys.readouterr().out.strip() == "❌ Docente ANGELIN non presente nella configurazione."
+    assert main(["MAR", "10:00", "--absent", "ANGELINI", *files]) == 0
+    assert "ANGELINI" not in capsys.readouterr().out
@@ -1,8 +1,12 @@
 # --- START OF FILE utils.py ---
 
+import copy
+import hashlib
 import json
 import sys
 import os
+import time
+from dataclasses import dataclass, field, replace
 
 
 def _bundle_base_path():
@@ -25,6 +29,61 @@ def _writable_base_path():
     return os.path.dirname(os.path.abspath(__file__))
 
 
+def config_from_json(config: dict) -> dict:
+    """Porta una configurazione letta da JSON nel formato interno (default dei vincoli generici,
+    set, assegnazioni specifiche come liste [docente, classe, giorno, orario, durata]).
+    Modifica e ritorna lo stesso dizionario; su una configurazione già nel formato interno non cambia nulla."""
+    # Garantisce che solo le flag per i vincoli GENERICI esistano,
+    # con default True. I vincoli specifici sono attivati dalla loro stessa presenza.
+    generic_constraint_flags = [
+        'USE_MAX_DAILY_HOURS_PER_CLASS',
+        'USE_CONSECUTIVE_BLOCKS',
+        'USE_MAX_ONE_HOLE',
+        'USE_OPTIMIZE_HOLES'
+    ]
+    for flag in generic_constraint_flags:
+        config.setdefault(flag, True)
+
+    # Parametri numerici per i vincoli generici
+    config.setdefault('MAX_DAILY_HOURS_PER_CLASS', 4.0)
+
+    # Riconverte le liste in set dove necessario
+    if 'GROUP_DAILY_TWO_CLASSES' in config:
+        config['GROUP_DAILY_TWO_CLASSES'] = set(config['GROUP_DAILY_TWO_CLASSES'])
+    if 'HOURS_PER_DAY_PER_CLASS' in config:
+        # HOURS_PER_DAY_PER_CLASS è già un dizionario, non serve conversione
+        pass
+    if 'ASSEGNAZIONE_DOCENTI_SPECIFICHE' in config:
+        # Converte il formato da {docente: [classe, giorno, orario, durata]} o {docente: [[classe, giorno, orario, durata], ...]}
+        # al formato interno [docente, classe, giorno, orario, durata]
+        if config['ASSEGNAZIONE_DOCENTI_SPECIFICHE'] and isinstance(config['ASSEGNAZIONE_DOCENTI_SPECIFICHE'], dict):
+            converted_assignments = []
+            for docente, assignments in config['ASSEGNAZIONE_DOCENTI_SPECIFICHE'].items():
+                if isinstance(assignments, list):
+                    # Controlla se è una singola assegnazione [classe, giorno, orario, durata]
+                    if len(assignments) == 4 and isinstance(assignments[0], str):
+                        classe, giorno, orario, durata = assignments
+                        converted_assignments.append([docente, classe, giorno, orario, durata])
+                    # Oppure multiple assegnazioni [[classe, giorno, orario, durata], ...]
+                    else:
+                        for assignment in assignments:
+                            if isinstance(assignment, list) and len(assignment) >= 4:
+                                classe, giorno, orario, durata = assignment[0], assignment[1], assignment[2], assignment[3]
+                                converted_assignments.append([docente, classe, giorno, orario, durata])
+            config['ASSEGNAZIONE_DOCENTI_SPECIFICHE'] = converted_assignments
+    if 'MIN_TWO_HOURS_IF_PRESENT_SPECIFIC' in config:
+        config['MIN_TWO_HOURS_IF_PRESENT_SPECIFIC'] = set(config['MIN_TWO_HOURS_IF_PRESENT_SPECIFIC'])
+    if 'ONLY_DAYS' in config:
+        for teacher, days in config['ONLY_DAYS'].items():
+            config['ONLY_DAYS'][teacher] = set(days)
+    # Converte le liste di tuple per gli slot
+    for key in ['SLOT_1', 'SLOT_2', 'SLOT_3']:
+        if key in config:
+            config[key] = [tuple(item) for item in config[key]]
+
+    return config
+
+
 def load_config(config_path='config.json'):
     """Carica e processa la configurazione da un file JSON.
 
@@ -45,55 +104,7 @@ def load_config(config_path='config.json'):
         with open(final_path, 'r', encoding='utf-8') as f:
             config = json.load(f)
 
-        # Garantisce che solo le flag per i vincoli GENERICI esistano,
-        # con default True. I vincoli specifici sono attivati dalla loro stessa presenza.
-        generic_constraint_flags = [
-            'USE_MAX_DAILY_HOURS_PER_CLASS',
-            'USE_CONSECUTIVE_BLOCKS',
-            'USE_MAX_ONE_HOLE',
-            'USE_OPTIMIZE_HOLES'
-        ]
-        for flag in generic_constraint_flags:
-            config.setdefault(flag, True)
-
-        # Parametri numerici per i vincoli generici
-        config.setdefault('MAX_DAILY_HOURS_PER_CLASS', 4.0)
-
-        # Riconverte le liste in set dove necessario
-        if 'GROUP_DAILY_TWO_CLASSES' in config:
-            config['GROUP_DAILY_TWO_CLASSES'] = set(config['GROUP_DAILY_TWO_CLASSES'])
-        if 'HOURS_PER_DAY_PER_CLASS' in config:
-            # HOURS_PER_DAY_PER_CLASS è già un dizionario, non serve conversione
-            pass
-        if 'ASSEGNAZIONE_DOCENTI_SPECIFICHE' in config:
-            # Converte il formato da {docente: [classe, giorno, orario, durata]} o {docente: [[classe, giorno, orario, durata], ...]}
-            # al formato interno [docente, classe, giorno, orario, durata]
-            if config['ASSEGNAZIONE_DOCENTI_SPECIFICHE']:
-                converted_assignments = []
-                for docente, assignments in config['ASSEGNAZIONE_DOCENTI_SPECIFICHE'].items():
-                    if isinstance(assignments, list):
-                        # Controlla se è una singola assegnazione [classe, giorno, orario, durata]
-                        if len(assignments) == 4 and isinstance(assignments[0], str):
-                            classe, giorno, orario, durata = assignments
-                            converted_assignments.append([docente, classe, giorno, orario, durata])
-                        # Oppure multiple assegnazioni [[classe, giorno, orario, durata], ...]
-                        else:
-                            for assignment in assignments:
-                                if isinstance(assignment, list) and len(assignment) >= 4:
-                                    classe, giorno, orario, durata = assignment[0], assignment[1], assignment[2], assignment[3]
-                                    converted_assignments.append([docente, classe, giorno, orario, durata])
-                config['ASSEGNAZIONE_DOCENTI_SPECIFICHE'] = converted_assignments
-        if 'MIN_TWO_HOURS_IF_PRESENT_SPECIFIC' in config:
-            config['MIN_TWO_HOURS_IF_PRESENT_SPECIFIC'] = set(config['MIN_TWO_HOURS_IF_PRESENT_SPECIFIC'])
-        if 'ONLY_DAYS' in config:
-            for teacher, days in config['ONLY_DAYS'].items():
-                config['ONLY_DAYS'][teacher] = set(days)
-        # Converte le liste di tuple per gli slot
-        for key in ['SLOT_1', 'SLOT_2', 'SLOT_3']:
-            if key in config:
-                config[key] = [tuple(item) for item in config[key]]
-
-        return config
+        return config_from_json(config)
     except FileNotFoundError:
         print(f"ERRORE: File di configurazione '{config_path}' non trovato!")
         print("Assicurati che 'config.json' sia nella stessa cartella dell'eseguibile o inclusa nel bundle.")
@@ -105,13 +116,10 @@ def load_config(config_path='config.json'):
 
 def _to_jsonable(value):
     """Convert Python structures (set, tuple, nested dict/list) into JSON-serializable ones."""
-    # Handle numpy scalars if present (avoid hard dependency)
-    try:
-        import numpy as _np  # type: ignore
-        if isinstance(value, (_np.integer, _np.floating)):
-            return value.item()
-    except Exception:
-        pass
+    # Handle numpy scalars if present (avoid hard dependency: numpy values exist only if numpy is already imported)
+    _np = sys.modules.get('numpy')
+    if _np is not None and isinstance(value, (_np.integer, _np.floating)):
+        return value.item()
 
     if isinstance(value, set):
         return sorted([_to_jsonable(v) for v in value])
@@ -124,11 +132,434 @@ def _to_jsonable(value):
     return value
 
 
-def save_config(config: dict, dest_path: str | None = None) -> str:
-    """Salva la configurazione corrente in JSON, occupandosi delle conversioni necessarie.
+# Parametri della risoluzione (profilo, tempo, seed, portfolio, arresto anticipato, riparazione): non cambiano il problema
+SOLVER_PARAMETER_PREFIXES = ('SOLVER_', 'PORTFOLIO_', 'EARLY_STOP_', 'TWO_PHASE_', 'USE_TWO_PHASE_SOLVE', 'REPAIR_')
 
-    Ritorna il percorso del file salvato. Lancia eccezione in caso di errore.
-    """
+
+def config_hash(config: dict) -> str:
+    """Hash stabile del problema descritto dalla configurazione (formato interno di load_config):
+    set e chiavi ordinati, parametri del solver esclusi, così due configurazioni equivalenti
+    hanno lo stesso hash indipendentemente dall'ordine e dal profilo di risoluzione."""
+    problem = {k: v for k, v in config.items() if not k.startswith(SOLVER_PARAMETER_PREFIXES)}
+    canonical = json.dumps(_to_jsonable(problem), sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]
+
+
+
+# --- VALIDAZIONE DELLA CONFIGURAZIONE ---
+
+ERROR = 'error'
+WARNING = 'warning'
+
+SLOT_NAMES = ('SLOT_1', 'SLOT_2', 'SLOT_3')
+REQUIRED_KEYS = ('GIORNI', 'CLASSI', 'SLOT_1', 'SLOT_2', 'SLOT_3', 'ASSEGNAZIONE_SLOT', 'ORE_SETTIMANALI_CLASSI',
+                 'MAX_ORE_SETTIMANALI_DOCENTI', 'ASSEGNAZIONE_DOCENTI')
+
+# Esiti di validate_config per hash della configurazione (i più vecchi escono per primi)
+_VALIDATION_CACHE = {}
+_VALIDATION_CACHE_SIZE = 128
+
+
+@dataclass(frozen=True)
+class ConfigIssue:
+    """Problema della configurazione: gravità (ERROR o WARNING), chiave di primo livello,
+    percorso del valore dentro la chiave (es. ('ROSSI', '1A')) e messaggio per l'utente."""
+    severity: str
+    key: str
+    message: str
+    path: tuple = ()
+
+    def __str__(self):
+        return self.message
+
+
+@dataclass(frozen=True)
+class ConfigValidation:
+    """Esito di validate_config: problemi trovati, hash della configurazione, tempo impiegato e provenienza dalla cache."""
+    issues: tuple = ()
+    config_hash: str = ''
+    elapsed: float = 0.0
+    cached: bool = False
+
+    @property
+    def ok(self):
+        return not any(issue.severity == ERROR for issue in self.issues)
+
+    @property
+    def errors(self):
+        return [issue.message for issue in self.issues if issue.severity == ERROR]
+
+    @property
+    def warnings(self):
+        return [issue.message for issue in self.issues if issue.severity == WARNING]
+
+    def as_tuple(self):
+        """(ok, errori, avvisi) come messaggi di testo."""
+        return self.ok, self.errors, self.warnings
+
+
+def _number(value):
+    """Valore numerico come float (bool esclusi), None se non numerico."""
+    if isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_half_hour_multiple(v):
+    return abs(v * 2 - round(v * 2)) < 1e-6
+
+
+def _hour(time_str):
+    """Ora decimale di un orario 'H:MM' (es. '10:30' -> 10.5), None se il formato non è valido."""
+    try:
+        hours, minutes = time_str.split(':')
+        return int(hours) + int(minutes) / 60
+    except (AttributeError, ValueError):
+        return None
+
+
+def normalize_config(config: dict) -> dict:
+    """Copia della configurazione nel formato interno (config_from_json su una copia profonda), l'originale non cambia."""
+    return config_from_json(copy.deepcopy(config))
+
+
+def _check_config(cfg):
+    """Problemi (ConfigIssue) di una configurazione nel formato interno."""
+    issues = []
+
+    def error(key, message, *path):
+        issues.append(ConfigIssue(ERROR, key, message, path))
+
+    def warning(key, message, *path):
+        issues.append(ConfigIssue(WARNING, key, message, path))
+
+    for k in REQUIRED_KEYS:
+        if k not in cfg:
+            error(k, f"Chiave di configurazione mancante: {k}")
+    for k in ('ASSEGNAZIONE_SLOT', 'ORE_SETTIMANALI_CLASSI', 'ASSEGNAZIONE_DOCENTI'):
+        if k in cfg and not isinstance(cfg[k], dict):
+            error(k, f"'{k}' deve essere un dizionario.")
+    for k in ('GIORNI', 'CLASSI'):
+        if k in cfg and (not isinstance(cfg[k], (list, tuple)) or not cfg[k]):
+            error(k, f"'{k}' deve essere una lista non vuota.")
+    if issues:
+        return issues
+
+    giorni, classi, docenti = cfg['GIORNI'], cfg['CLASSI'], cfg['ASSEGNAZIONE_DOCENTI']
+    if len(set(giorni)) != len(giorni):
+        warning('GIORNI', "'GIORNI' contiene duplicati. Verranno considerati una sola volta.")
+    if len(set(classi)) != len(classi):
+        error('CLASSI', "'CLASSI' contiene classi ripetute.")
+
+    # SLOT: (orario di inizio, durata) di ogni fascia valida
+    slot_grids = {}
+    for slot_name in SLOT_NAMES:
+        slot = cfg[slot_name]
+        if not isinstance(slot, (list, tuple)) or len(slot) == 0:
+            error(slot_name, f"'{slot_name}' deve essere una lista non vuota di [fascia_oraria, durata].")
+            continue
+        grid = slot_grids[slot_name] = []
+        for idx, item in enumerate(slot):
+            if not isinstance(item, (list, tuple)) or len(item) != 2:
+                error(slot_name, f"{slot_name}[{idx}] non è una coppia valida [fascia_oraria, durata].", idx)
+                continue
+            fascia, durata = item
+            if not isinstance(fascia, str) or _hour(fascia.split('-')[0]) is None:
+                error(slot_name, f"{slot_name}[{idx}] ha una fascia oraria non valida: '{fascia}'. Formato atteso 'H:MM-H:MM'.", idx)
+                continue
+            if '-' not in fascia:
+                warning(slot_name, f"{slot_name}[{idx}] ha una fascia oraria non standard: '{fascia}'. Formato atteso 'H:MM-H:MM'.", idx)
+            d = _number(durata)
+            if d is None:
+                error(slot_name, f"{slot_name}[{idx}] durata non numerica: '{durata}'.", idx)
+                continue
+            if d <= 0:
+                error(slot_name, f"{slot_name}[{idx}] ha una durata <= 0.", idx)
+                continue
+            if not _is_half_hour_multiple(d):
+                warning(slot_name, f"{slot_name}[{idx}] durata {d:g} non è multiplo di 0.5h: sarà arrotondata internamente.", idx)
+            grid.append((fascia.split('-')[0], d))
+
+    # CLASSI: ore settimanali e griglia di ogni giorno
+    ore_cl = cfg['ORE_SETTIMANALI_CLASSI']
+    required_hours = {}
+    for cl in classi:
+        if cl not in ore_cl:
+            error('ORE_SETTIMANALI_CLASSI', f"Manca 'ORE_SETTIMANALI_CLASSI' per la classe {cl}.", cl)
+        elif _number(ore_cl[cl]) is None:
+            error('ORE_SETTIMANALI_CLASSI', f"Ore settimanali per {cl} non numeriche: '{ore_cl[cl]}'.", cl)
+        elif _number(ore_cl[cl]) <= 0:
+            error('ORE_SETTIMANALI_CLASSI', f"Ore settimanali per {cl} devono essere > 0.", cl)
+        else:
+            required_hours[cl] = _number(ore_cl[cl])
+        per_class = cfg['ASSEGNAZIONE_SLOT'].get(cl)
+        if not isinstance(per_class, dict):
+            error('ASSEGNAZIONE_SLOT', f"Manca 'ASSEGNAZIONE_SLOT' per la classe {cl}.", cl)
+            continue
+        for day in giorni:
+            if per_class.get(day) not in SLOT_NAMES:
+                error('ASSEGNAZIONE_SLOT', f"ASSEGNAZIONE_SLOT per {cl} nel giorno {day} non valido: {per_class.get(day)}.", cl, day)
+
+    # ASSEGNAZIONE_DOCENTI: ore per classe e copertura, massimo settimanale, ore richieste dalle classi
+    max_ore_doc = _number(cfg['MAX_ORE_SETTIMANALI_DOCENTI'])
+    if max_ore_doc is None:
+        error('MAX_ORE_SETTIMANALI_DOCENTI', "'MAX_ORE_SETTIMANALI_DOCENTI' non è numerico.")
+    elif max_ore_doc <= 0:
+        error('MAX_ORE_SETTIMANALI_DOCENTI', "'MAX_ORE_SETTIMANALI_DOCENTI' deve essere > 0.")
+    per_classe_assegnate = dict.fromkeys(classi, 0.0)
+    for docente, assignments in docenti.items():
+        if not isinstance(assignments, dict):
+            error('ASSEGNAZIONE_DOCENTI', f"Assegnazioni del docente {docente} non valide.", docente)
+            continue
+        total_doc_hours = 0.0
+        for k, v in assignments.items():
+            hv = _number(v)
+            if k == 'copertura':
+                if hv is None:
+                    error('ASSEGNAZIONE_DOCENTI', f"Docente {docente}: ore di copertura non numeriche: '{v}'.", docente, k)
+                elif hv < 0:
+                    error('ASSEGNAZIONE_DOCENTI', f"Docente {docente}: ore di copertura negative.", docente, k)
+                else:
+                    total_doc_hours += hv
+                continue
+            if k not in per_classe_assegnate:
+                error('ASSEGNAZIONE_DOCENTI', f"Docente {docente}: classe '{k}' non esiste nella lista CLASSI.", docente, k)
+            elif hv is None:
+                error('ASSEGNAZIONE_DOCENTI', f"Docente {docente} in {k}: ore non numeriche: '{v}'.", docente, k)
+            elif hv <= 0:
+                error('ASSEGNAZIONE_DOCENTI', f"Docente {docente} in {k}: ore devono essere > 0.", docente, k)
+            else:
+                if not _is_half_hour_multiple(hv):
+                    warning('ASSEGNAZIONE_DOCENTI', f"Docente {docente} in {k}: {hv:g}h non è multiplo di 0.5h: sarà arrotondato internamente.", docente, k)
+                per_classe_assegnate[k] += hv
+                total_doc_hours += hv
+        if max_ore_doc is not None and total_doc_hours > max_ore_doc:
+            error('ASSEGNAZIONE_DOCENTI', f"Docente {docente}: ore totali assegnate {total_doc_hours:g} superano il massimo {max_ore_doc:g}.", docente)
+    for cl, req in required_hours.items():
+        if per_classe_assegnate[cl] < req:
+            error('ASSEGNAZIONE_DOCENTI', f"Classe {cl}: ore assegnate {per_classe_assegnate[cl]:g} < richieste {req:g}.", cl)
+
+    # Vincoli generici con parametro
+    if cfg.get('USE_MAX_DAILY_HOURS_PER_CLASS') and (_number(cfg.get('MAX_DAILY_HOURS_PER_CLASS')) or 0) <= 0:
+        error('MAX_DAILY_HOURS_PER_CLASS', "'MAX_DAILY_HOURS_PER_CLASS' deve essere un numero > 0.")
+
+    # Vincoli specifici per docente
+    for key in ('ONLY_DAYS', 'START_AT', 'END_AT', 'HOURS_PER_DAY_PER_CLASS'):
+        rule = cfg.get(key)
+        if rule is None:
+            continue
+        if not isinstance(rule, dict):
+            error(key, f"'{key}' deve essere un dizionario per docente.")
+            continue
+        for t, value in rule.items():
+            if t not in docenti:
+                warning(key, f"{key}: docente {t} non presente in ASSEGNAZIONE_DOCENTI, regola ignorata.", t)
+            if key == 'ONLY_DAYS':
+                unknown = sorted(set(value) - set(giorni))
+                if unknown:
+                    warning(key, f"ONLY_DAYS di {t}: giorni {', '.join(unknown)} non presenti in GIORNI.", t)
+            elif key == 'HOURS_PER_DAY_PER_CLASS':
+                exact = _number(value)
+                if (exact or 0) <= 0:
+                    error(key, f"HOURS_PER_DAY_PER_CLASS di {t} deve essere un numero > 0: '{value}'.", t)
+                    continue
+                for cl, h in (docenti.get(t) or {}).items():
+                    if cl != 'copertura' and _number(h) and _number(h) % exact != 0:
+                        warning(key, f"HOURS_PER_DAY_PER_CLASS di {t}: {_number(h):g}h in {cl} non divisibili per {exact:g}h/giorno, vincolo ignorato per {cl}.", t, cl)
+            elif not isinstance(value, dict):
+                error(key, f"{key} di {t} deve essere un dizionario giorno -> ora.", t)
+            else:
+                for day, hour in value.items():
+                    if day not in giorni:
+                        warning(key, f"{key} di {t}: giorno {day} non presente in GIORNI.", t, day)
+                    if _number(hour) is None:
+                        error(key, f"{key} di {t} il {day}: ora non numerica '{hour}'.", t, day)
+    for key in ('MIN_TWO_HOURS_IF_PRESENT_SPECIFIC', 'GROUP_DAILY_TWO_CLASSES'):
+        for t in sorted(set(cfg.get(key, ())) - set(docenti)):
+            warning(key, f"{key}: docente {t} non presente in ASSEGNAZIONE_DOCENTI, regola ignorata.", t)
+
+    # ASSEGNAZIONE_DOCENTI_SPECIFICHE (formato interno: [docente, classe, giorno, orario, durata])
+    key = 'ASSEGNAZIONE_DOCENTI_SPECIFICHE'
+    specifiche = cfg.get(key, [])
+    if not isinstance(specifiche, list):
+        error(key, f"'{key}' non valida.")
+        specifiche = []
+    start_at, end_at, only_days = cfg.get('START_AT', {}), cfg.get('END_AT', {}), cfg.get('ONLY_DAYS', {})
+    hours_per_day = cfg.get('HOURS_PER_DAY_PER_CLASS', {})
+    specific_hours = {}
+    for i, assegnazione in enumerate(specifiche):
+        if not isinstance(assegnazione, (list, tuple)) or len(assegnazione) != 5:
+            error(key, f"Assegnazione specifica {i+1} deve essere [docente, classe, giorno, orario, durata].", i)
+            continue
+        docente, classe, giorno, orario, durata = assegnazione
+        if docente not in docenti:
+            error(key, f"Docente {docente} in assegnazione specifica {i+1} non trovato in ASSEGNAZIONE_DOCENTI.", docente)
+            continue
+        if classe not in per_classe_assegnate:
+            error(key, f"Classe {classe} per {docente} in ASSEGNAZIONE_DOCENTI_SPECIFICHE non esiste.", docente)
+            continue
+        if not isinstance(docenti[docente], dict) or classe not in docenti[docente]:
+            error(key, f"Docente {docente} ha assegnazione specifica per {classe} ma non è assegnato a quella classe.", docente)
+            continue
+        if giorno not in giorni:
+            error(key, f"Giorno {giorno} per {docente}-{classe} non valido.", docente)
+            continue
+        durata_num = _number(durata)
+        if durata_num is None or durata_num <= 0:
+            error(key, f"Durata {durata} per {docente}-{classe} non è un numero valido > 0.", docente)
+            continue
+        specific_hours[(docente, classe)] = specific_hours.get((docente, classe), 0.0) + durata_num
+
+        # Compatibilità con la griglia della classe nel giorno
+        slot_type = cfg['ASSEGNAZIONE_SLOT'].get(classe, {}).get(giorno)
+        grid = slot_grids.get(slot_type)
+        if grid is not None:
+            starts = [start for start, _ in grid]
+            if orario not in starts:
+                error(key, f"Orario {orario} non disponibile per classe {classe} il {giorno} (usa {slot_type}: {', '.join(starts)}).", docente)
+            else:
+                available = sum(d for _, d in grid[starts.index(orario):])
+                if durata_num > available:
+                    error(key, f"Durata {durata_num:g}h per {docente}-{classe} alle {orario} di {giorno} eccede il tempo disponibile ({available:g}h).", docente)
+
+        # Compatibilità con le disponibilità del docente
+        start_hour = _hour(orario)
+        min_start = _number(start_at.get(docente, {}).get(giorno))
+        if start_hour is not None and min_start is not None and start_hour < min_start:
+            error(key, f"Orario {orario} per {docente} il {giorno} viola il vincolo START_AT (min {min_start:g}).", docente)
+        max_end = _number(end_at.get(docente, {}).get(giorno))
+        if start_hour is not None and max_end is not None and start_hour + durata_num > max_end:
+            error(key, f"Orario {orario}+{durata_num:g}h per {docente} il {giorno} viola il vincolo END_AT (max {max_end:g}).", docente)
+        if docente in only_days and giorno not in only_days[docente]:
+            error(key, f"Giorno {giorno} per {docente} viola il vincolo ONLY_DAYS ({', '.join(sorted(only_days[docente]))}).", docente)
+        max_daily = _number(cfg.get('MAX_DAILY_HOURS_PER_CLASS'))
+        if cfg.get('USE_MAX_DAILY_HOURS_PER_CLASS') and durata_num > (max_daily or durata_num):
+            warning(key, f"Durata {durata_num:g}h per {docente}-{classe} eccede MAX_DAILY_HOURS_PER_CLASS ({max_daily:g}h).", docente)
+        exact, pair_hours = _number(hours_per_day.get(docente)), _number(docenti[docente][classe])
+        if exact and pair_hours and pair_hours % exact == 0 and durata_num > exact:
+            error(key, f"Durata {durata_num:g}h per {docente}-{classe} viola HOURS_PER_DAY_PER_CLASS (al massimo {exact:g}h al giorno).", docente)
+
+    for (docente, classe), total in specific_hours.items():
+        weekly = _number(docenti[docente][classe])
+        if weekly is not None and total > weekly:
+            error(key, f"Ore specifiche totali {total:g}h per {docente}-{classe} eccedono le ore assegnate ({weekly:g}h).", docente)
+        elif weekly is not None and total == weekly:
+            warning(key, f"Ore specifiche {total:g}h per {docente}-{classe} saturano completamente le ore assegnate.", docente)
+    return issues
+
+
+def validate_config(config: dict) -> ConfigValidation:
+    """Valida una configurazione (formato JSON o interno) senza modificarla: chiavi e tipi,
+    griglie degli slot, ore delle classi e dei docenti, vincoli specifici e assegnazioni
+    specifiche. L'esito è memorizzato per hash della configurazione (config_hash), così
+    GUI, CLI, engine e batch possono rivalidare la stessa configurazione senza costo."""
+    start = time.perf_counter()
+    try:
+        key = config_hash(config)
+    except (TypeError, ValueError):
+        key = None  # non serializzabile: validata senza cache
+    cached = _VALIDATION_CACHE.get(key) if key else None
+    if cached is not None:
+        return replace(cached, elapsed=time.perf_counter() - start, cached=True)
+
+    try:
+        issues = tuple(_check_config(normalize_config(config)))
+    except (TypeError, ValueError, AttributeError, KeyError) as e:
+        issues = (ConfigIssue(ERROR, '', f"Configurazione non leggibile: {e}"),)
+    result = ConfigValidation(issues, key or '', time.perf_counter() - start)
+    if key:
+        if len(_VALIDATION_CACHE) >= _VALIDATION_CACHE_SIZE:
+            _VALIDATION_CACHE.pop(next(iter(_VALIDATION_CACHE)))
+        _VALIDATION_CACHE[key] = result
+    return result
+
+
+# --- DIFFERENZE TRA CONFIGURAZIONI ---
+
+# Categorie delle modifiche (diff_configs), nell'ordine di impatto sul modello
+CHANGE_CATEGORIES = {
+    'slot_grid': "griglia oraria",
+    'assignments': "assegnazioni e monte ore",
+    'teacher_rules': "regole specifiche dei docenti",
+    'generic_flags': "vincoli generici",
+    'solver': "parametri del solver",
+    'other': "altro",
+}
+CATEGORY_KEYS = {
+    'slot_grid': ('GIORNI', 'CLASSI', 'SLOT_1', 'SLOT_2', 'SLOT_3', 'ASSEGNAZIONE_SLOT'),
+    'assignments': ('ASSEGNAZIONE_DOCENTI', 'ORE_SETTIMANALI_CLASSI', 'MAX_ORE_SETTIMANALI_DOCENTI'),
+    'teacher_rules': ('ONLY_DAYS', 'START_AT', 'END_AT', 'HOURS_PER_DAY_PER_CLASS', 'MIN_TWO_HOURS_IF_PRESENT_SPECIFIC',
+                      'GROUP_DAILY_TWO_CLASSES', 'ASSEGNAZIONE_DOCENTI_SPECIFICHE'),
+    'generic_flags': ('USE_MAX_DAILY_HOURS_PER_CLASS', 'MAX_DAILY_HOURS_PER_CLASS', 'USE_CONSECUTIVE_BLOCKS',
+                      'USE_MAX_ONE_HOLE', 'USE_OPTIMIZE_HOLES'),
+}
+
+
+def change_category(key):
+    """Categoria (chiave di CHANGE_CATEGORIES) di una chiave di configurazione."""
+    for category, keys in CATEGORY_KEYS.items():
+        if key in keys: return category
+    return 'solver' if key.startswith(SOLVER_PARAMETER_PREFIXES) else 'other'
+
+
+@dataclass(frozen=True)
+class ConfigDiff:
+    """Esito di diff_configs: chiavi cambiate con la loro categoria e, per chiave, i nomi
+    toccati (docenti, classi, giorni o fasce orarie; vuoto per i valori scalari)."""
+    changes: dict = field(default_factory=dict)
+    touched: dict = field(default_factory=dict)
+
+    @property
+    def empty(self):
+        return not self.changes
+
+    @property
+    def categories(self):
+        return [category for category in CHANGE_CATEGORIES if category in self.changes.values()]
+
+    def keys(self, category):
+        return [key for key, c in self.changes.items() if c == category]
+
+    def describe(self):
+        """Righe di testo: una per categoria, con le chiavi cambiate e i nomi toccati."""
+        lines = []
+        for category in self.categories:
+            parts = [f"{key} ({', '.join(map(str, self.touched[key][:8]))}{', ...' if len(self.touched[key]) > 8 else ''})"
+                     if self.touched[key] else key for key in self.keys(category)]
+            lines.append(f"{CHANGE_CATEGORIES[category]}: {'; '.join(parts)}")
+        return lines
+
+
+def _touched_names(old, new):
+    """Nomi toccati tra due valori di una chiave: voci di dizionario diverse o elementi di liste e
+    insiemi presenti in uno solo dei due (per le voci composte conta il primo campo, es. il docente)."""
+    if isinstance(old, dict) and isinstance(new, dict):
+        return sorted(str(k) for k in old.keys() | new.keys() if old.get(k) != new.get(k))
+    if isinstance(old, (list, tuple, set, frozenset)) and isinstance(new, (list, tuple, set, frozenset)):
+        as_key = lambda item: tuple(item) if isinstance(item, (list, tuple)) else item
+        changed = set(map(as_key, old)) ^ set(map(as_key, new))
+        return sorted({str(item[0] if isinstance(item, tuple) else item) for item in changed})
+    return []
+
+
+def diff_configs(old: dict, new: dict) -> ConfigDiff:
+    """Differenze strutturali tra due configurazioni (formato JSON o interno), confrontate
+    dopo normalize_config: set e liste con lo stesso contenuto o numeri come 2 e 2.0 non
+    contano come modifiche. Ogni chiave cambiata è classificata con change_category."""
+    old, new = normalize_config(old), normalize_config(new)
+    changes, touched = {}, {}
+    for key in dict.fromkeys([*old, *new]):
+        if old.get(key) != new.get(key):
+            changes[key] = change_category(key)
+            touched[key] = _touched_names(old.get(key), new.get(key))
+    return ConfigDiff(changes, touched)
+
+
+def config_to_json(config: dict) -> dict:
+    """Formato JSON (quello di config.json) di una configurazione nel formato interno: inverso di config_from_json."""
     # Serializza strutture non JSON (set, tuple, ecc.)
     data = dict(config)
 
@@ -163,6 +594,16 @@ def save_config(config: dict, dest_path: str | None = None) -> str:
 
     # Applica conversione ricorsiva come fallback generale
     data = _to_jsonable(data)
+    return data
+
+
+def save_config(config: dict, dest_path: str | None = None) -> str:
+    """Salva la configurazione corrente in JSON, occupandosi delle conversioni necessarie.
+    Se il file ha già lo stesso contenuto non viene riscritto.
+
+    Ritorna il percorso del file salvato. Lancia eccezione in caso di errore.
+    """
+    data = config_to_json(config)
 
     # Determina path di destinazione
     if not dest_path:
@@ -170,8 +611,47 @@ def save_config(config: dict, dest_path: str | None = None) -> str:
     elif not os.path.isabs(dest_path):
         dest_path = os.path.join(_writable_base_path(), dest_path)
 
-    # Scrive su disco
+    # Scrive su disco solo se il contenuto è cambiato
+    text = json.dumps(data, ensure_ascii=False, indent=2)
+    try:
+        with open(dest_path, 'r', encoding='utf-8') as f:
+            if f.read() == text:
+                return dest_path
+    except (OSError, UnicodeDecodeError):
+        pass
     with open(dest_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write(text)
+
+    return dest_path
+
+# --- POOL DI PROCESSI (portfolio e batch) ---
+
+def gather_pool_results(pool, futures, on_error):
+    """
+    Risultati dei `futures` di un ProcessPoolExecutor, nell'ordine dato; `on_error(i, e)`
+    ritorna il risultato del future i fallito o annullato (es. BrokenProcessPool).
+    Il primo Ctrl+C arriva anche ai processi figli, che chiudono la ricerca con la migliore
+    soluzione trovata: i futures non ancora avviati vengono annullati e l'attesa continua.
+    Un secondo Ctrl+C termina i processi figli e si propaga.
+    """
+    import multiprocessing
 
-    return dest_path
\ No newline at end of file
+    results = []
+    interrupted = False
+    for i, future in enumerate(futures):
+        while True:
+            try:
+                results.append(future.result())
+                break
+            except KeyboardInterrupt:
+                if interrupted:
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    for process in multiprocessing.active_children():
+                        process.terminate()
+                    raise
+                interrupted = True
+                pool.shutdown(wait=False, cancel_futures=True)
+            except Exception as e:  # processo terminato o future annullato
+                results.append(on_error(i, e))
+                break
+    return results
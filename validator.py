@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Verifica di un orario modificato a mano (l'Excel generato dall'engine) rispetto alla
+configurazione, senza risolvere di nuovo il modello. I fogli 'Classi' e 'Docenti'
+vengono letti in uno Schedule e controllati con le stesse verifiche della diagnostica
+post-risoluzione (verify_schedule), più i vincoli che il solver garantisce per
+costruzione: slot coperti, docenti ammessi, sovrapposizioni, copertura e coerenza tra i fogli.
+"""
+
+import argparse
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from engine import COPERTURA, FREE, DEFAULT_OUTPUT_FILE, Schedule, ScheduleData, hours_to_units, prevalidate, units_to_hours, verify_schedule
+from solution import class_sheet_solution, copertura_from_teacher_cells, teacher_sheet_cells
+
+
+@dataclass
+class ValidationResult:
+    """Esito della verifica: righe del report, numero di controlli falliti e orario letto."""
+    report: list = field(default_factory=list)
+    failures: int = 0
+    schedule: object = None
+    elapsed: float = 0.0
+
+    @property
+    def ok(self):
+        return self.failures == 0
+
+    @property
+    def text(self):
+        return "\n".join(self.report)
+
+
+def read_timetable(source, data):
+    """
+    Legge l'orario dall'Excel `source` (percorso o file-like). Ritorna (soluzione,
+    celle del foglio Docenti {(docente, giorno, etichetta): voce} oppure None se il foglio manca,
+    copertura della colonna 'Copertura' del foglio Classi, problemi di lettura). La copertura
+    della soluzione viene dal foglio Docenti (vedi solution_from_workbook); quella del foglio
+    Classi serve solo al controllo di coerenza tra i fogli.
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(source, read_only=True, data_only=True)
+    problems = []
+    try:
+        name = os.path.basename(source) if isinstance(source, str) else getattr(source, 'name', 'caricato')
+        solution = class_sheet_solution(wb, data.GLOBAL_SCHEDULING_TIMES, name, classes=data.CLASSI, problems=problems)
+        teacher_cells = teacher_sheet_cells(wb, data.GLOBAL_SCHEDULING_TIMES, teachers=data.teachers, problems=problems)
+    finally:
+        wb.close()
+    class_copertura = solution["copertura"]
+    if teacher_cells is not None:
+        copertura_hours = {day: [(sl, units_to_hours(u)) for sl, _, u in slots] for day, slots in data.copertura_slots.items()}
+        solution["copertura"] = copertura_from_teacher_cells(teacher_cells, data.GLOBAL_SCHEDULING_TIMES, copertura_hours)
+    return solution, teacher_cells, class_copertura, problems
+
+
+def structural_checks(schedule, teacher_cells=None, class_copertura=None):
+    """Vincoli che il modello impone per costruzione e che un orario modificato a mano può violare."""
+    d = schedule.data
+    report = []
+    labels = d.GLOBAL_SCHEDULING_TIMES
+    class_teacher = schedule.class_teacher
+
+    # Slot di classe senza docente
+    fails = np.argwhere((class_teacher == FREE) & (schedule.slot_units > 0))
+    report.append(f"[{'PASS' if len(fails) == 0 else 'FAIL'}] Ogni slot delle classi ha un docente")
+    report.extend(f"  - FAIL: {d.CLASSI[c]} il {d.GIORNI[di]} alle {labels[schedule.slot_label[c, di, s]]} non ha un docente." for c, di, s in fails)
+
+    # Docenti in classi non assegnate
+    allowed = np.zeros((len(d.teachers), len(d.CLASSI)), dtype=bool)
+    for t in d.teachers:
+        for cl in d.teacher_classes(t):
+            allowed[schedule.teacher_index[t], schedule.class_index[cl]] = True
+    c, di, s = np.nonzero(class_teacher >= 0)
+    bad = ~allowed[class_teacher[c, di, s], c]
+    report.append(f"[{'PASS' if not bad.any() else 'FAIL'}] Ogni docente insegna solo nelle classi assegnate")
+    report.extend(f"  - FAIL: {d.teachers[class_teacher[ci, dd, ss]]} in {d.CLASSI[ci]} il {d.GIORNI[dd]} alle {labels[schedule.slot_label[ci, dd, ss]]}: classe non assegnata al docente."
+                  for ci, dd, ss in zip(c[bad], di[bad], s[bad]))
+
+    # Sovrapposizioni: lezioni e copertura che occupano il docente alla stessa ora
+    places = np.zeros(schedule.busy.shape, dtype=np.int16)
+    np.add.at(places, (class_teacher[c, di, s], di, schedule.slot_label[c, di, s]), 1)
+    cdi, k = np.nonzero((schedule.copertura_teacher >= 0) & (schedule.copertura_label >= 0))
+    np.add.at(places, (schedule.copertura_teacher[cdi, k], cdi, schedule.copertura_label[cdi, k]), 1)
+    fails = np.argwhere(places > 1)
+    report.append(f"[{'PASS' if len(fails) == 0 else 'FAIL'}] Nessun docente in due posti alla stessa ora")
+    for ti, dd, l in fails:
+        where = [d.CLASSI[ci] for ci in np.flatnonzero(schedule.class_grid[:, dd, l] == ti)]
+        where += ["COPERTURA"] * int(((schedule.copertura_teacher[dd] == ti) & (schedule.copertura_label[dd] == l)).sum())
+        report.append(f"  - FAIL: {d.teachers[ti]} il {d.GIORNI[dd]} alle {labels[l]} è in {places[ti, dd, l]} posti ({', '.join(where)}).")
+
+    # Copertura: ogni slot coperto e ore di copertura per docente
+    if d.total_copertura_units > 0:
+        details = [f"  - FAIL: slot di copertura del {d.GIORNI[dd]} {d.copertura_slots[d.GIORNI[dd]][k][1]} senza docente."
+                   for dd, k in np.argwhere((schedule.copertura_teacher == FREE) & (schedule.copertura_slot_units > 0))]
+        required = np.array([hours_to_units(d.ASSEGNAZIONE_DOCENTI[t].get('copertura', 0)) for t in d.teachers], dtype=np.int64)
+        found = schedule.copertura_units.sum(axis=1)
+        details += [f"  - FAIL: Docente {d.teachers[ti]} - Copertura richiesta: {units_to_hours(int(required[ti]))}h, Trovata: {units_to_hours(int(found[ti]))}h"
+                    for ti in np.flatnonzero(required != found)]
+        report.append(f"[{'PASS' if not details else 'FAIL'}] Copertura: slot coperti e ore per docente"); report.extend(details)
+
+    # Coerenza con il foglio Docenti (i BUCO vengono ricalcolati, non letti)
+    if teacher_cells is not None:
+        details = []
+        for ti, t in enumerate(d.teachers):
+            for dd, day in enumerate(d.GIORNI):
+                for l, sl in enumerate(labels):
+                    code = schedule.teacher_grid[ti, dd, l]
+                    expected = d.CLASSI[code] if code >= 0 else "COPERTURA" if code == COPERTURA else None
+                    found = teacher_cells.get((t, day, sl), (None, None))[0]
+                    if expected != found:
+                        details.append(f"  - FAIL: {t} il {day} alle {sl}: foglio Docenti '{found or ''}', foglio Classi '{expected or ''}'.")
+        # Colonna Copertura: gli export precedenti riportano solo il primo docente di ogni etichetta,
+        # quindi basta che i docenti elencati siano in copertura e che nessuna etichetta coperta sia vuota
+        listed = {}
+        for day, sl, t in class_copertura or []:
+            listed.setdefault((day, sl), []).append(t)
+        for dd, day in enumerate(d.GIORNI):
+            for l, sl in enumerate(labels):
+                covering = [d.teachers[ti] for ti in np.flatnonzero(schedule.teacher_grid[:, dd, l] == COPERTURA)]
+                names = listed.get((day, sl), [])
+                extra = [t for t in names if t not in covering]
+                if extra or (covering and not names):
+                    details.append(f"  - FAIL: copertura del {day} alle {sl}: foglio Docenti '{' '.join(covering)}', foglio Classi '{' '.join(names)}'.")
+        report.append(f"[{'PASS' if not details else 'FAIL'}] Foglio Docenti coerente con il foglio Classi"); report.extend(details)
+    return report
+
+
+def validate_timetable(source, config):
+    """Legge l'orario `source` e lo verifica rispetto a `config` (formato interno di load_config). Ritorna un ValidationResult."""
+    start = time.perf_counter()
+    data = ScheduleData(config)
+    name = os.path.basename(source) if isinstance(source, str) else getattr(source, 'name', 'caricato')
+    result = ValidationResult(report=[f"--- VERIFICA DELL'ORARIO '{name}' RISPETTO ALLA CONFIGURAZIONE ---"])
+    errors = prevalidate(data)
+    if errors:
+        result.report.append("[FAIL] Configurazione non valida, orario non verificabile:")
+        result.report.extend(f"  - {e}" for e in errors)
+    else:
+        solution, teacher_cells, class_copertura, problems = read_timetable(source, data)
+        schedule = result.schedule = Schedule.from_solution(data, solution, problems)
+        result.report.append(f"[{'PASS' if not problems else 'FAIL'}] Lettura dei fogli: {len(solution['lessons'])} lezioni e {len(solution['copertura'])} slot di copertura")
+        result.report.extend(f"  - FAIL: {p}" for p in problems)
+        result.report.extend(structural_checks(schedule, teacher_cells, class_copertura))
+        result.report.extend(verify_schedule(schedule))
+        result.report.append(f"[INFO] Penalità buchi (la misura minimizzata dal solver): {schedule.hole_penalty}")
+    result.failures = sum(1 for line in result.report if line.startswith("[FAIL]"))
+    result.elapsed = time.perf_counter() - start
+    result.report.append(f"\n{'✅ Nessuna violazione' if result.ok else f'❌ {result.failures} controlli falliti'} (verifica in {result.elapsed * 1000:.0f} ms).")
+    return result
+
+
+def main(argv=None):
+    from utils import load_config
+
+    parser = argparse.ArgumentParser(
+        description="Verifica un orario Excel (anche modificato a mano) rispetto alla configurazione",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Esempi di utilizzo:
+  python validator.py                                   # Verifica orario_settimanale.xlsx con config.json
+  python validator.py orario_modificato.xlsx --config config_2025.json
+        """
+    )
+    parser.add_argument('timetable', nargs='?', default=DEFAULT_OUTPUT_FILE, help=f'Orario Excel da verificare (default: {DEFAULT_OUTPUT_FILE})')
+    parser.add_argument('--config', '-c', type=str, default='config.json', help='File di configurazione JSON (default: config.json)')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.timetable):
+        print(f"❌ File '{args.timetable}' non trovato.")
+        return 1
+    config = load_config(args.config)
+    try:
+        result = validate_timetable(args.timetable, config)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    print(result.text)
+    return 0 if result.ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())